@@ -0,0 +1,104 @@
+"""
+Benchmark sending level edits to a (fake, in-process) Minecraft server, either with a `spawnBlocks` call per edit (as
+`mc_render` does by default) or through a `BlockStream`.
+
+Each step of a simulated episode edits one random tile (highlighting it first, as `edit_3D_maze` does), and re-renders a
+path of random walkable tiles. The fake server sleeps for `--call-latency` seconds per call, to stand in for round trips.
+
+    python -m benchmarks.block_stream --size 15 --steps 500 --call-latency 0.001
+"""
+import argparse
+import time
+
+import numpy as np
+
+from control_pcgrl.envs.probs.minecraft.block_stream import BlockStream, FakeMinecraftService
+from control_pcgrl.envs.probs.minecraft.minecraft_pb2 import (
+    AIR,
+    DIRT,
+    PURPUR_SLAB,
+    RED_GLAZED_TERRACOTTA,
+    Block,
+    Blocks,
+    Point,
+)
+
+
+def make_episode(size: int, n_steps: int, path_len: int, seed: int = 0):
+    """An initial level, and the (edited tile, its new block type, path, level) of each step."""
+    rng = np.random.default_rng(seed)
+    init_level = np.where(rng.random((size, size, size)) < 0.5, DIRT, AIR)
+    level = init_level.copy()
+    steps = []
+    for _ in range(n_steps):
+        y, z, x = rng.integers(size, size=3)
+        level[y, z, x] = DIRT if level[y, z, x] == AIR else AIR
+        air = np.argwhere(level == AIR)
+        path = air[rng.choice(len(air), size=min(path_len, len(air)), replace=False)]
+        steps.append(((x, y, z), int(level[y, z, x]), [tuple(p) for p in path], level.copy()))
+    return init_level, steps
+
+
+def block(x, y, z, block_type):
+    return Block(position=Point(x=int(x), y=int(y), z=int(z)), type=block_type)
+
+
+def run_per_call(service, init_level, steps):
+    service.spawnBlocks(Blocks(blocks=[block(x, y, z, t) for (y, z, x), t in np.ndenumerate(init_level)]))
+    old_path = []
+    for (x, y, z), block_type, path, level in steps:
+        service.spawnBlocks(Blocks(blocks=[block(x, y, z, RED_GLAZED_TERRACOTTA)]))
+        service.spawnBlocks(Blocks(blocks=[block(x, y, z, block_type)]))
+        # As in `render_path_change`, do not erase the old path where it has been built over.
+        erased = [p for p in set(old_path) - set(path) if level[p] == AIR]
+        service.spawnBlocks(Blocks(blocks=[block(px, py, pz, AIR) for py, pz, px in erased]))
+        service.spawnBlocks(Blocks(blocks=[block(px, py, pz, PURPUR_SLAB) for py, pz, px in path]))
+        old_path = path
+
+
+def run_stream(service, init_level, steps, max_batch_size):
+    with BlockStream(service, max_batch_size=max_batch_size) as stream:
+        stream.put_array(init_level)
+        old_path = []
+        for (x, y, z), block_type, path, level in steps:
+            stream.put([block(x, y, z, RED_GLAZED_TERRACOTTA), block(x, y, z, block_type)])
+            stream.put(
+                [block(px, py, pz, AIR) for py, pz, px in old_path if level[py, pz, px] == AIR]
+                + [block(px, py, pz, PURPUR_SLAB) for py, pz, px in path]
+            )
+            old_path = path
+        stream.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--path-len", type=int, default=40)
+    parser.add_argument("--call-latency", type=float, default=0.001)
+    parser.add_argument("--max-batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    init_level, steps = make_episode(args.size, args.steps, args.path_len)
+    final_level = steps[-1][3]
+
+    for name, run in (
+        ("per-call", lambda s: run_per_call(s, init_level, steps)),
+        ("stream", lambda s: run_stream(s, init_level, steps, args.max_batch_size)),
+    ):
+        service = FakeMinecraftService(call_latency=args.call_latency)
+        t0 = time.perf_counter()
+        run(service)
+        elapsed = time.perf_counter() - t0
+        # Both must leave the final level (and path) in the world.
+        n_wrong = sum(
+            service.get_block(x, y, z) not in (t, PURPUR_SLAB) for (y, z, x), t in np.ndenumerate(final_level)
+        )
+        print(
+            f"{name:>9}: {elapsed:.3f}s ({args.steps / elapsed:.0f} steps/s), "
+            f"{service.n_calls['spawnBlocks']} calls, {service.n_blocks} blocks, {n_wrong} wrong blocks"
+        )
+
+
+if __name__ == "__main__":
+    main()
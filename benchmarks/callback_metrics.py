@@ -0,0 +1,140 @@
+"""
+Benchmark the episode metrics that rollout workers send to the driver each training iteration: either every episode's
+stats and control targets as single-element lists (as `StatsCallbacks` still does during evaluation), or a
+`MetricsAggregator` per worker (as it does during training).
+
+Episode stats are drawn from a pool collected by resetting the problem's env on random maps. For each number of envs
+per worker, we report the bytes sent by workers, the size of the driver's result dict, and the driver's time to
+deserialize and summarize the metrics (with RLlib's `summarize_episodes`).
+
+    python -m benchmarks.callback_metrics --problem zelda --n-workers 8 --envs-per-worker 1 8 32 128
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+from hydra import compose, initialize_config_dir
+from ray.rllib.evaluation.metrics import RolloutMetrics, summarize_episodes
+
+from benchmarks.env_steps import CONFIG_DIR
+from control_pcgrl import control_wrappers, wrappers
+from control_pcgrl.rl.metrics import MetricsAggregator
+from control_pcgrl.rl.utils import validate_config
+
+
+def get_stats_pool(problem: str, n_maps: int, seed: int = 0):
+    """The stats of random maps, the bounds of each metric, and the problem's control metrics."""
+    with initialize_config_dir(config_dir=CONFIG_DIR, version_base=None):
+        cfg = compose(config_name="train", overrides=[f"task={problem}", "render=false", "render_mode=null"])
+    cfg = validate_config(cfg)
+    ctrl_metrics = list(cfg.task.controls) if "controls" in cfg.task else []
+    env = wrappers.CroppedImagePCGRLWrapper(game=cfg.env_name, cfg=cfg)
+    env = control_wrappers.ControlWrapper(env, cfg=cfg, ctrl_metrics=ctrl_metrics)
+    np.random.seed(seed)
+    pool = []
+    for _ in range(n_maps):
+        env.reset()
+        pool.append({k: v for k, v in env.unwrapped._rep_stats.items() if k != "solution"})
+    return pool, env.unwrapped.cond_bounds, ctrl_metrics
+
+
+def sample_episodes(pool, bounds, ctrl_metrics, n_episodes, rng):
+    episodes = []
+    for i in rng.integers(len(pool), size=n_episodes):
+        trgs = {k: rng.uniform(*bounds[k]) for k in ctrl_metrics}
+        episodes.append((pool[i], trgs))
+    return episodes
+
+
+def rollout_metrics(custom_metrics=None, hist_data=None, rng=None):
+    return RolloutMetrics(
+        episode_length=100,
+        episode_reward=float(rng.random()),
+        agent_rewards={},
+        custom_metrics=custom_metrics or {},
+        perf_stats={},
+        hist_data=hist_data or {},
+    )
+
+
+def per_episode(worker_episodes, rng):
+    """What each worker sends when every episode's stats are kept."""
+    sent = []
+    for episodes in worker_episodes:
+        metrics = []
+        for stats, trgs in episodes:
+            hist_data = {f"{k}-trg": [v] for k, v in trgs.items()}
+            hist_data.update({f"{k}-val": [v] for k, v in stats.items()})
+            metrics.append(rollout_metrics({k: [v] for k, v in stats.items()}, hist_data, rng))
+        sent.append(pickle.dumps(metrics))
+
+    def summarize():
+        return summarize_episodes([m for s in sent for m in pickle.loads(s)])
+
+    return sent, summarize
+
+
+def aggregated(worker_episodes, bounds, ctrl_metrics, rng):
+    """What each worker sends when episodes are summarized on the worker."""
+    sent = []
+    for episodes in worker_episodes:
+        aggregator = MetricsAggregator(bounds, ctrl_metrics)
+        for stats, trgs in episodes:
+            aggregator.add_episode(stats, trgs)
+        sent.append(pickle.dumps(([rollout_metrics(rng=rng) for _ in episodes], aggregator)))
+
+    def summarize():
+        received = [pickle.loads(s) for s in sent]
+        result = summarize_episodes([m for metrics, _ in received for m in metrics])
+        aggregators = [a for _, a in received]
+        for aggregator in aggregators[1:]:
+            aggregators[0].merge(aggregator)
+        result["custom_metrics"].update(aggregators[0].summary())
+        result["ctrl_heatmaps"] = aggregators[0].get_heatmaps()
+        return result
+
+    return sent, summarize
+
+
+def timeit(fn, n_repeats):
+    times = []
+    for _ in range(n_repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problem", default="zelda_control")
+    parser.add_argument("--n-workers", type=int, default=8)
+    parser.add_argument("--envs-per-worker", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--episodes-per-env", type=int, default=4, help="Episodes per env per training iteration.")
+    parser.add_argument("--n-maps", type=int, default=200, help="Random maps in the pool of episode stats.")
+    parser.add_argument("--n-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    pool, bounds, ctrl_metrics = get_stats_pool(args.problem, args.n_maps)
+    print(f"{args.problem}: {len(pool[0])} metrics, controls: {ctrl_metrics}")
+    rng = np.random.default_rng(0)
+    for n_envs in args.envs_per_worker:
+        n_episodes = n_envs * args.episodes_per_env
+        worker_episodes = [
+            sample_episodes(pool, bounds, ctrl_metrics, n_episodes, rng) for _ in range(args.n_workers)
+        ]
+        print(f"{n_envs} envs/worker ({n_episodes * args.n_workers} episodes per iteration):")
+        for name, (sent, summarize) in [
+            ("per-episode", per_episode(worker_episodes, rng)),
+            ("aggregated", aggregated(worker_episodes, bounds, ctrl_metrics, rng)),
+        ]:
+            driver_time, result = timeit(summarize, args.n_repeats)
+            print(
+                f"  {name:>12}: sent {sum(len(s) for s in sent) / 1024:.1f}KB, "
+                f"result {len(pickle.dumps(result)) / 1024:.1f}KB, driver {driver_time * 1e3:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark generating maps with a population of CPPNs, on CPU: one forward pass per individual (setting its weights
+first, as when evaluating individuals one by one), against one `forward_population` call for the whole population. We
+also time building the coordinate grid on every call, against looking it up in the cache.
+
+    python -m benchmarks.cppn_population --sizes 16 32 --pop-sizes 50 100 200 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch as th
+
+import control_pcgrl
+
+# As in `evolve.py`, the evo models are imported from their own directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(control_pcgrl.__file__)), "evo"))
+import models  # noqa: E402
+
+MODELS = ["SinCPPN", "GenSinCPPN", "MixCPPN", "GenMixCPPN", "FixedGenCPPN", "CoordNCA"]
+
+
+def timeit(fn, n_runs: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n_runs):
+        fn()
+    return (time.perf_counter() - t0) / n_runs
+
+
+def forward_individuals(model, weights, x):
+    outs = []
+    for w in weights:
+        models.set_weights(model, w)
+        outs.append(model(x)[0])
+    return th.cat(outs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=MODELS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16])
+    parser.add_argument("--pop-sizes", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--n-chans", type=int, default=3, help="The number of tile types.")
+    parser.add_argument("--n-runs", type=int, default=3)
+    parser.add_argument("--n-threads", type=int, default=1)
+    args = parser.parse_args()
+    th.set_num_threads(args.n_threads)
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        x = th.rand(1, args.n_chans, size, size)
+        build = timeit(lambda: models._make_coord_grid((size, size), True, x.device) * 2, 100)
+        lookup = timeit(lambda: models.get_coord_grid(x, normalize=True, scale=2), 100)
+        print(f"{size}x{size} coord grid: built {build * 1e6:.1f}us, cached {lookup * 1e6:.1f}us")
+        for model_name in args.models:
+            model = getattr(models, model_name)(n_in_chans=args.n_chans, n_actions=args.n_chans)
+            models.set_nograd(model)
+            init_weights = models.get_init_weights(model, init=False)
+            for pop_size in args.pop_sizes:
+                weights = init_weights + rng.normal(0, 0.1, size=(pop_size, init_weights.size))
+                weights = weights.astype(np.float32)
+                assert th.allclose(
+                    model.forward_population(weights, x), forward_individuals(model, weights, x), atol=1e-5
+                )
+                t_ind = timeit(lambda: forward_individuals(model, weights, x), args.n_runs)
+                t_pop = timeit(lambda: model.forward_population(weights, x), args.n_runs)
+                print(
+                    f"{size}x{size} {model_name}, {pop_size} individuals: one by one {t_ind * 1e3:.1f}ms, "
+                    f"batched {t_pop * 1e3:.1f}ms ({t_ind / t_pop:.1f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmark environments for every registered problem and representation, across map sizes: steps per second (with
+random actions, through the same wrappers as in training), the time taken to compute the problem's stats and the
+representation's observation, and the memory taken up by each environment.
+
+2D problems are run on square maps, and 3D problems on cubic maps, of each size. Combinations that cannot be built, or
+that fail while stepping, are recorded along with their error, and the run goes on.
+
+Results are written as JSON. Given a baseline (the results of an earlier run), metrics that are worse by more than
+`--tolerance` are reported as regressions, and the script exits with an error. Timings in ms must also be worse by more
+than `--min-delta-ms`, since sub-ms timings vary by more than the tolerance from run to run.
+
+    python -m benchmarks.env_steps --sizes 8 16 --out env_steps.json
+    python -m benchmarks.env_steps --sizes 8 16 --problems binary zelda --out new.json --baseline env_steps.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import numpy as np
+from hydra import compose, initialize_config_dir
+
+import control_pcgrl
+from control_pcgrl.envs.probs import PROBLEMS
+from control_pcgrl.envs.probs.holey_prob import HoleyProblem
+from control_pcgrl.envs.probs.problem import Problem3D
+from control_pcgrl.envs.reps import REPRESENTATIONS
+from control_pcgrl.rl.envs import make_env
+from control_pcgrl.rl.utils import validate_config
+from control_pcgrl.wrappers import TransformObs
+
+CONFIG_DIR = os.path.join(os.path.dirname(control_pcgrl.__file__), "configs")
+
+# For each metric, whether higher values are better.
+METRICS = {
+    "steps_per_sec": True,
+    "stats_ms": False,
+    "obs_ms": False,
+    "memory_mb": False,
+}
+
+
+def get_cfg(problem: str, representation: str, size: int):
+    prob_cls = PROBLEMS[problem]
+    n_dims = 3 if issubclass(prob_cls, Problem3D) else 2
+    # As in `validate_config`, the observation window is twice the map (and takes in the border of holey maps).
+    obs_size = size * 2 + 2 if issubclass(prob_cls, HoleyProblem) else size * 2
+    cfg = compose(
+        config_name="train",
+        overrides=[
+            f"task.problem={problem}",
+            f"representation={representation}",
+            f"task.map_shape={[size] * n_dims}",
+            f"task.obs_window={[obs_size] * n_dims}",
+            "render=false",
+            "render_mode=null",
+        ],
+    )
+    return validate_config(cfg)
+
+
+def timeit(fn, n_runs: int, n_repeats: int) -> float:
+    """The mean time of a call, over `n_runs` calls, in the fastest of `n_repeats` repeats (to filter out noise)."""
+    times = []
+    for _ in range(n_repeats):
+        t0 = time.perf_counter()
+        for _ in range(n_runs):
+            fn()
+        times.append((time.perf_counter() - t0) / n_runs)
+    return min(times)
+
+
+def get_observation(env):
+    """Observe the env's current map as it does on each step: the representation's observation, transformed by each
+    of the wrappers in turn."""
+    transforms = []
+    wrapper = env
+    while wrapper is not env.unwrapped:
+        if isinstance(wrapper, TransformObs):
+            transforms.append(wrapper.transform)
+        wrapper = wrapper.env
+    unwrapped = env.unwrapped
+    obs = unwrapped._prob.process_observation(unwrapped._rep.get_observation())
+    for transform in reversed(transforms):
+        obs = transform(obs)
+    return obs
+
+
+def bench_env(cfg, n_steps: int, n_runs: int, n_repeats: int, max_seconds: float, seed: int = 0) -> dict:
+    # Representations generate maps with numpy's global random state, so we seed it too, to step through the same
+    # maps on each run.
+    np.random.seed(seed)
+    random.seed(seed)
+    # Only trace allocations while building the env, since tracing slows everything down.
+    tracemalloc.start()
+    env = make_env(cfg)
+    env.reset(seed=seed)
+    memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    env.action_space.seed(seed)
+
+    # Step in `n_repeats` chunks, and keep the fastest.
+    n_step, step_time, steps_per_sec = 0, 0.0, 0.0
+    for _ in range(n_repeats):
+        n_chunk, chunk_time = 0, 0.0
+        while n_chunk < n_steps // n_repeats and step_time + chunk_time < max_seconds:
+            action = env.action_space.sample()
+            t0 = time.perf_counter()
+            _, _, done, truncated, _ = env.step(action)
+            chunk_time += time.perf_counter() - t0
+            n_chunk += 1
+            if done or truncated:
+                env.reset()
+        if n_chunk > 0:
+            steps_per_sec = max(steps_per_sec, n_chunk / chunk_time)
+        n_step, step_time = n_step + n_chunk, step_time + chunk_time
+
+    unwrapped = env.unwrapped
+    stats_map = unwrapped._get_stats_map()
+    stats_time = timeit(lambda: unwrapped._prob.get_stats(stats_map), n_runs, n_repeats)
+    obs_time = timeit(lambda: get_observation(env), n_runs, n_repeats)
+    env.close()
+
+    return {
+        "n_dims": len(cfg.task.map_shape),
+        "n_steps": n_step,
+        "steps_per_sec": steps_per_sec,
+        "stats_ms": stats_time * 1e3,
+        "obs_ms": obs_time * 1e3,
+        "memory_mb": memory / 2**20,
+        "peak_memory_mb": peak_memory / 2**20,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float = 0.0) -> list:
+    """Print how each result compares to the baseline, and return a description of each regression. Timings (in ms)
+    only regress if they are also slower by more than `min_delta_ms`."""
+    regressions = []
+    for key, base in baseline.items():
+        if key not in results or "error" in base:
+            continue
+        result = results[key]
+        if "error" in result:
+            regressions.append(f"{key}: now fails ({result['error']})")
+            continue
+        ratios = []
+        for metric, higher_is_better in METRICS.items():
+            ratio = result[metric] / base[metric] if base[metric] else 1.0
+            ratios.append(f"{metric} x{ratio:.2f}")
+            worse = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+            if metric.endswith("_ms"):
+                worse = worse and result[metric] - base[metric] > min_delta_ms
+            if worse:
+                regressions.append(f"{key}: {metric} {base[metric]:.3g} -> {result[metric]:.3g}")
+        print(f"{key}: {', '.join(ratios)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", nargs="+", default=list(PROBLEMS))
+    parser.add_argument("--representations", nargs="+", default=list(REPRESENTATIONS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--n-dims", type=int, nargs="+", default=[2, 3], help="Only run problems of these dimensions.")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Stop stepping an env after this long.")
+    parser.add_argument("--n-runs", type=int, default=20)
+    parser.add_argument("--n-repeats", type=int, default=5, help="Keep the fastest of these repeats of each timing.")
+    parser.add_argument("--out", default="env_steps.json")
+    parser.add_argument("--baseline", default=None, help="Compare against the results in this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore timings slower by less than this.")
+    args = parser.parse_args()
+
+    problems = [p for p in args.problems if (3 if issubclass(PROBLEMS[p], Problem3D) else 2) in args.n_dims]
+    results = {}
+    with initialize_config_dir(config_dir=CONFIG_DIR, version_base=None):
+        for problem in problems:
+            for representation in args.representations:
+                for size in args.sizes:
+                    key = f"{problem}/{representation}/{size}"
+                    try:
+                        cfg = get_cfg(problem, representation, size)
+                        results[key] = bench_env(cfg, args.steps, args.n_runs, args.n_repeats, args.max_seconds)
+                    except Exception as e:
+                        results[key] = {"error": f"{type(e).__name__}: {e}"}
+                        print(f"{key}: {results[key]['error']}")
+                        continue
+                    result = results[key]
+                    print(
+                        f"{key}: {result['steps_per_sec']:.0f} steps/s, stats {result['stats_ms']:.3f}ms, "
+                        f"obs {result['obs_ms']:.3f}ms, {result['memory_mb']:.2f}MB"
+                    )
+
+    meta = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "steps": args.steps,
+        "max_seconds": args.max_seconds,
+        "n_runs": args.n_runs,
+        "n_repeats": args.n_repeats,
+    }
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=4)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regressions w.r.t. {args.baseline}:")
+            print("\n".join(regressions))
+            raise SystemExit(1)
+        print(f"No regressions w.r.t. {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark MAP-Elites generations (`MEOptimizer.ask`, then `tell`), with elites stored in a qdpy grid (`MEGrid`) against
+a `DenseMEGrid`, on grids of 10k cells by default.
+
+Individuals are flat weight vectors (of the size of a small CPPN), mutated with Gaussian noise, and evaluated with a
+cheap synthetic function of their weights, so that we time the archive and optimizer alone. Grids are first filled by
+running some generations, since the cost of qdpy grids grows with the number of elites.
+
+    python -m benchmarks.me_archive --bin-sizes 100 100 --n-weights 4500
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from qdpy import phenotype
+
+import control_pcgrl
+
+# As in `evolve.py`, the evo modules are imported from their own directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(control_pcgrl.__file__)), "evo"))
+from archives import MEGrid  # noqa: E402
+from dense_grid import DenseMEGrid  # noqa: E402
+from optimizer import MEOptimizer  # noqa: E402
+
+
+class VecModel:
+    def __init__(self, n_weights, step_size):
+        self.weights = np.random.normal(size=n_weights).astype(np.float32)
+        self.step_size = step_size
+
+    def mutate(self):
+        noise = np.random.normal(size=self.weights.shape) * np.sqrt(self.step_size)
+        self.weights = self.weights + noise.astype(np.float32)
+
+
+class VecIndividual(phenotype.Individual):
+    """Like `Individual`, with a model that is just a vector of weights."""
+
+    def __init__(self, n_weights, step_size):
+        super().__init__()
+        self.model = VecModel(n_weights, step_size)
+        self.fitness = phenotype.Fitness([0], weights=[1])
+        self.fitness.delValues()
+
+    def mutate(self):
+        self.model.mutate()
+
+    def get_weights(self):
+        return self.model.weights
+
+    def set_weights(self, weights):
+        self.model.weights = weights
+
+    def __eq__(self, ind_1):
+        return self is ind_1
+
+    __hash__ = object.__hash__
+
+
+def evaluate(inds, bin_bounds):
+    """Fitness and features, as functions of the weights, spread over the whole grid."""
+    weights = np.stack([ind.get_weights() for ind in inds])
+    objs = -np.abs(weights).mean(1)
+    unit = 0.5 + 0.5 * np.tanh(weights[:, : len(bin_bounds)] * 3)
+    bcs = np.array([lo for lo, _ in bin_bounds]) + unit * np.array([hi - lo for lo, hi in bin_bounds])
+    return objs, bcs
+
+
+def generation(optimizer, bin_bounds):
+    inds = optimizer.ask()
+    objs, bcs = evaluate(inds, bin_bounds)
+    # Silence the logbook.
+    with contextlib.redirect_stdout(io.StringIO()):
+        optimizer.tell(objs, bcs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bin-sizes", type=int, nargs="+", default=[100, 100])
+    parser.add_argument("--n-weights", type=int, default=4500)
+    parser.add_argument("--batch-size", type=int, default=150)
+    parser.add_argument("--n-fill-gens", type=int, default=200, help="Generations run before timing.")
+    parser.add_argument("--n-gens", type=int, default=20, help="Generations timed.")
+    args = parser.parse_args()
+
+    bin_bounds = [(0, 1) for _ in args.bin_sizes]
+    ind_cls_args = {"n_weights": args.n_weights, "step_size": 0.01}
+    times = {}
+    for grid_cls in [MEGrid, DenseMEGrid]:
+        np.random.seed(0)
+        grid = grid_cls(args.bin_sizes, bin_bounds)
+        optimizer = MEOptimizer(grid, VecIndividual, args.batch_size, ind_cls_args)
+        for _ in range(args.n_fill_gens):
+            generation(optimizer, bin_bounds)
+        t0 = time.perf_counter()
+        for _ in range(args.n_gens):
+            generation(optimizer, bin_bounds)
+        times[grid_cls] = (time.perf_counter() - t0) / args.n_gens
+        print(
+            f"{grid_cls.__name__}: {len(grid)} elites in {np.prod(args.bin_sizes)} cells, "
+            f"{times[grid_cls] * 1e3:.1f}ms per generation of {args.batch_size}"
+        )
+    print(f"Dense grid speedup: {times[MEGrid] / times[DenseMEGrid]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark jump-aware path-finding in 3D maps, as in the holey Minecraft problems: `run_dijkstra` from the entrance,
+against one search over a `MoveTable` (including the time to build the table).
+
+Maps are hilly terrain, so that most of the map's surface is reachable.
+
+    python -m benchmarks.paths_3D --sizes 15 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from control_pcgrl.envs.helper_3D import run_dijkstra
+from control_pcgrl.envs.paths_3D import MoveTable
+
+
+def make_map(size: int, rng) -> np.ndarray:
+    """A map of air (0) and dirt (1), indexed `[z][y][x]`: gently rolling hills, with some bumps."""
+    y, x = np.indices((size, size)) * 2 * np.pi / size
+    phase = rng.uniform(0, 2 * np.pi, size=2)
+    # Gentle enough that most of the surface can be walked on.
+    heights = size / 4 + size / 8 * np.sin(x + phase[0]) * np.cos(y + phase[1])
+    heights = heights.astype(int) + (rng.random((size, size)) < 0.05)
+    return (np.arange(size)[:, None, None] < heights[None]).astype(np.uint8)
+
+
+def timeit(fn, n_runs: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n_runs):
+        fn()
+    return (time.perf_counter() - t0) / n_runs
+
+
+def longest_path(moves: MoveTable, entrance):
+    """The longest shortest path from the entrance (as in `Minecraft3DholeymazeProblem.get_stats`)."""
+    field = moves.search([entrance])
+    return field.get_path(*field.get_furthest())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 32])
+    parser.add_argument("--n-maps", type=int, default=5)
+    parser.add_argument("--n-runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        t_legacy, t_table, t_search, n_reached = [], [], [], []
+        for _ in range(args.n_maps):
+            int_map = make_map(size, rng)
+            # Enter at a corner of the map, on the ground.
+            z = int(np.argmin(int_map[:, 0, 0]))
+            entrance = (0, 0, z)
+            paths, _, _ = run_dijkstra(*entrance, int_map, [0])
+            field = MoveTable.from_map(int_map, [0]).search([entrance])
+            assert (field.lengths >= 0).sum() == len(paths)
+            n_reached.append(len(paths))
+
+            t_legacy.append(timeit(lambda: run_dijkstra(*entrance, int_map, [0]), args.n_runs))
+            t_table.append(timeit(lambda: MoveTable.from_map(int_map, [0]), args.n_runs))
+            moves = MoveTable.from_map(int_map, [0])
+            t_search.append(timeit(lambda: longest_path(moves, entrance), args.n_runs))
+
+        legacy, table, search = np.mean(t_legacy) * 1e3, np.mean(t_table) * 1e3, np.mean(t_search) * 1e3
+        print(
+            f"{size}^3 ({np.mean(n_reached):.0f} tiles reached): run_dijkstra {legacy:.2f}ms, "
+            f"move table {table:.2f}ms + search {search:.2f}ms ({legacy / (table + search):.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark startup: the time a fresh Python process takes to import `control_pcgrl`, and then to make (and reset) an
+env with `gym.make`, as every subprocess-based vector env and Hydra launch does. We also report how many modules each
+leaves loaded, and which heavy dependencies (e.g. torch, ray) were pulled in along the way.
+
+Each measurement is taken in a new interpreter, repeated, and the fastest kept. Results are written as JSON. Given a
+baseline (e.g. the results of a run on an earlier commit), times that are worse by more than `--tolerance` are reported
+as regressions, and the script exits with an error.
+
+    python -m benchmarks.startup --problems binary zelda --out startup.json
+    python -m benchmarks.startup --problems binary zelda --out new.json --baseline startup.json
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+
+from hydra import initialize_config_dir
+
+import control_pcgrl
+from benchmarks.env_steps import CONFIG_DIR, get_cfg
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(control_pcgrl.__file__)))
+HEAVY_MODULES = ["torch", "ray", "matplotlib", "pandas", "grpc", "ribs", "qdpy", "sklearn"]
+# `make_s` is not compared, since imports that are deferred until an env is made count towards it.
+METRICS = ["import_s", "total_s"]
+
+CHILD = """
+import json, pickle, sys, time
+t0 = time.perf_counter()
+import gymnasium as gym
+t1 = time.perf_counter()
+import control_pcgrl
+t2 = time.perf_counter()
+n_modules = len(sys.modules)
+if len(sys.argv) > 1:
+    with open(sys.argv[1], "rb") as f:
+        cfg = pickle.load(f)
+    t3 = time.perf_counter()
+    env = gym.make(cfg.env_name, cfg=cfg)
+    env.reset()
+    t4 = time.perf_counter()
+else:
+    t3 = t4 = t2
+print(json.dumps({
+    "gymnasium_s": t1 - t0,
+    "import_s": t2 - t1,
+    "make_s": t4 - t3,
+    "n_modules_import": n_modules,
+    "n_modules": len(sys.modules),
+    "heavy": sorted({m.split(".")[0] for m in sys.modules} & set(%r)),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_child(cfg_path=None) -> dict:
+    args = [sys.executable, "-c", CHILD] + ([cfg_path] if cfg_path is not None else [])
+    proc = subprocess.run(args, env={**os.environ, "PYTHONPATH": REPO_DIR}, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.splitlines()[-1])
+    result["total_s"] = result["gymnasium_s"] + result["import_s"] + result["make_s"]
+    return result
+
+
+def bench(cfg_path, n_repeats) -> dict:
+    """The fastest of some runs (by total time)."""
+    return min((run_child(cfg_path) for _ in range(n_repeats)), key=lambda r: r["total_s"])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print how each result compares to the baseline, and return a description of each regression."""
+    regressions = []
+    for key, base in baseline.items():
+        if key not in results or "error" in base:
+            continue
+        result = results[key]
+        if "error" in result:
+            regressions.append(f"{key}: now fails ({result['error']})")
+            continue
+        ratios = []
+        for metric in METRICS:
+            ratio = result[metric] / base[metric] if base[metric] else 1.0
+            ratios.append(f"{metric} x{ratio:.2f}")
+            if ratio > 1 + tolerance:
+                regressions.append(f"{key}: {metric} {base[metric]:.3g} -> {result[metric]:.3g}")
+        print(f"{key}: {', '.join(ratios)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", nargs="+", default=["binary"])
+    parser.add_argument("--representation", default="narrow")
+    parser.add_argument("--size", type=int, default=16)
+    parser.add_argument("--n-repeats", type=int, default=5, help="Keep the fastest of this many runs.")
+    parser.add_argument("--out", default="startup.json")
+    parser.add_argument("--baseline", default=None, help="Compare against the results in this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {"import": bench(None, args.n_repeats)}
+    with tempfile.TemporaryDirectory() as tmp_dir, initialize_config_dir(config_dir=CONFIG_DIR, version_base=None):
+        for problem in args.problems:
+            key = f"{problem}/{args.representation}/{args.size}"
+            try:
+                cfg_path = os.path.join(tmp_dir, f"{problem}.pkl")
+                with open(cfg_path, "wb") as f:
+                    pickle.dump(get_cfg(problem, args.representation, args.size), f)
+                results[key] = bench(cfg_path, args.n_repeats)
+            except Exception as e:
+                results[key] = {"error": f"{type(e).__name__}: {e}"}
+    for key, result in results.items():
+        if "error" in result:
+            print(f"{key}: {result['error']}")
+            continue
+        print(
+            f"{key}: import {result['import_s'] * 1e3:.0f}ms ({result['n_modules_import']} modules), "
+            f"make {result['make_s'] * 1e3:.0f}ms, total {result['total_s'] * 1e3:.0f}ms "
+            f"({result['n_modules']} modules), heavy: {', '.join(result['heavy']) or 'none'}"
+        )
+
+    meta = {"python": platform.python_version(), "n_repeats": args.n_repeats}
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=4)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions w.r.t. {args.baseline}:")
+            print("\n".join(regressions))
+            raise SystemExit(1)
+        print(f"No regressions w.r.t. {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark the reward model surrogate (`surrogate_stats`) against exact stats: the time to compute a map's stats with the
+problem's `get_stats`, to predict them for a single map (as each env does, on each step), and to predict them for a
+batch of maps (per map, as if predictions were batched across the envs of a worker), as well as env steps per second
+with and without the surrogate. Times are averaged over the maps visited while stepping the env with random actions.
+
+The surrogate is an untrained reward model, of the same architecture (and so inference cost) as a trained one. Its 3D
+convolutions are benchmarked on their own, against the path search that dominates the stats of 3D maze problems (see
+`benchmarks/paths_3D.py`), since no 3D problem is registered.
+
+    python -m benchmarks.surrogate_stats --problems binary sokoban --sizes 16 32 --sizes-3D 15
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import torch as th
+from hydra import initialize_config_dir
+
+from benchmarks.env_steps import CONFIG_DIR, get_cfg, timeit
+from benchmarks.paths_3D import longest_path, make_map
+from control_pcgrl.envs.paths_3D import MoveTable
+from control_pcgrl.reward_model_wrappers import RewardModel, StatsSurrogate, init_reward_model, save_reward_model
+from control_pcgrl.rl.envs import make_env
+
+
+def save_surrogate(env, path: str):
+    model, _ = init_reward_model(env)
+    map_dims = env.get_map_dims()
+    save_reward_model(path, model, obs_shape=(map_dims[-1], *map_dims[:-1]), metric_keys=list(env.metrics.keys()))
+
+
+def step_env(env, n_steps: int, n_maps: int):
+    """Step the env with random actions. Returns steps per second, and some of the maps visited (as passed to the
+    problem's `get_stats`, and as tile ints)."""
+    env.reset(seed=0)
+    env.action_space.seed(0)
+    unwrapped = env.unwrapped
+    visited = []
+
+    def step():
+        _, _, done, truncated, _ = env.step(env.action_space.sample())
+        if done or truncated:
+            env.reset()
+
+    steps_per_sec = 1 / timeit(step, n_steps, 1)
+    for _ in range(n_maps):
+        for _ in range(n_steps // n_maps):
+            step()
+        visited.append((unwrapped._get_stats_map(), unwrapped._get_rep_map().copy()))
+    return steps_per_sec, visited
+
+
+def mean_time(fn, args, n_runs: int, n_repeats: int) -> float:
+    """The mean time of a call, in ms, over the given arguments."""
+    return np.mean([timeit(lambda: fn(*a), n_runs, n_repeats) for a in args]) * 1e3
+
+
+def bench_surrogate(cfg, surrogate_path: str, n_envs: int, n_steps: int, n_maps: int, n_runs: int, n_repeats: int):
+    env = make_env(cfg)
+    save_surrogate(env, surrogate_path)
+    surrogate = StatsSurrogate(surrogate_path)
+    steps_per_sec, visited = step_env(env, n_steps, n_maps)
+    stats_maps, disc_maps = zip(*visited)
+    batches = [(np.stack(disc_maps[i : i + n_envs]),) for i in range(0, len(disc_maps) - n_envs + 1, n_envs)]
+
+    result = {
+        "exact_ms": mean_time(env.unwrapped._prob.get_stats, [(m,) for m in stats_maps], n_runs, n_repeats),
+        "predict_ms": mean_time(surrogate.predict_stats, [(m,) for m in disc_maps], n_runs, n_repeats),
+        "batched_predict_ms": mean_time(surrogate.predict, batches, n_runs, n_repeats) / n_envs,
+        "steps_per_sec": steps_per_sec,
+    }
+    cfg.surrogate_stats = surrogate_path
+    result["surrogate_steps_per_sec"], _ = step_env(make_env(cfg), n_steps, 0)
+    return result
+
+
+def bench_surrogate_3D(size: int, n_envs: int, n_maps: int, n_runs: int, n_repeats: int) -> dict:
+    rng = np.random.default_rng(0)
+    maps = [make_map(size, rng) for _ in range(n_maps)]
+    model = RewardModel((2, size, size, size), 2).eval()
+
+    @th.no_grad()
+    def predict(batch):
+        return model(th.movedim(th.nn.functional.one_hot(th.from_numpy(batch).long(), 2).float(), -1, 1))
+
+    def exact(int_map):
+        z = int(np.argmin(int_map[:, 0, 0]))
+        return longest_path(MoveTable.from_map(int_map, [0]), (0, 0, z))
+
+    return {
+        "exact_ms": mean_time(exact, [(m,) for m in maps], n_runs, n_repeats),
+        "predict_ms": mean_time(predict, [(m[None],) for m in maps], n_runs, n_repeats),
+        "batched_predict_ms": mean_time(predict, [(np.stack(maps[:n_envs]),)], n_runs, n_repeats) / n_envs,
+    }
+
+
+def report(key: str, r: dict):
+    speedup = r["exact_ms"] / r["predict_ms"]
+    line = (
+        f"{key}: exact {r['exact_ms']:.3f}ms, predict {r['predict_ms']:.3f}ms (x{speedup:.2f}), "
+        f"batched {r['batched_predict_ms']:.3f}ms/map"
+    )
+    if "steps_per_sec" in r:
+        line += f"; {r['steps_per_sec']:.0f} -> {r['surrogate_steps_per_sec']:.0f} steps/s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", nargs="+", default=["binary", "sokoban", "zelda"])
+    parser.add_argument("--representation", default="narrow")
+    # The reward model's unpadded convolutions need maps of at least 11 tiles a side.
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--sizes-3D", type=int, nargs="+", default=[15, 32])
+    parser.add_argument("--n-envs", type=int, default=8, help="The batch size of batched predictions.")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--n-maps", type=int, default=20, help="Time stats over this many of the maps visited.")
+    parser.add_argument("--n-runs", type=int, default=5)
+    parser.add_argument("--n-repeats", type=int, default=3)
+    parser.add_argument("--n-threads", type=int, default=None, help="Torch threads (as in a rollout worker).")
+    args = parser.parse_args()
+
+    if args.n_threads is not None:
+        th.set_num_threads(args.n_threads)
+    with tempfile.TemporaryDirectory() as tmp_dir, initialize_config_dir(config_dir=CONFIG_DIR, version_base=None):
+        for problem in args.problems:
+            for size in args.sizes:
+                key = f"{problem}/{args.representation}/{size}"
+                try:
+                    cfg = get_cfg(problem, args.representation, size)
+                    path = os.path.join(tmp_dir, f"{problem}_{size}.pt")
+                    r = bench_surrogate(cfg, path, args.n_envs, args.steps, args.n_maps, args.n_runs, args.n_repeats)
+                except Exception as e:
+                    print(f"{key}: {type(e).__name__}: {e}")
+                    continue
+                report(key, r)
+    for size in args.sizes_3D:
+        report(f"3D maze path-length/{size}", bench_surrogate_3D(size, args.n_envs, 8, args.n_runs, args.n_repeats))
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,11 @@ class TaskConfig:
     weights: Dict[str, int] = MISSING
     controls: List[Any] = MISSING
     alp_gmm: bool = False
+    # The ALP-GMM teacher refits its mixture every `alp_gmm_fit_rate` episodes, on the last `alp_gmm_window` of them,
+    # and remembers only the last `alp_gmm_memory` (see `ALPGMM`, whose defaults are used where these are None).
+    alp_gmm_fit_rate: int = 250
+    alp_gmm_window: Optional[int] = None
+    alp_gmm_memory: Optional[int] = None
     map_shape: List[Any] = MISSING
     # for 2d problems, the list will be [height, width]
     #                width
@@ -314,6 +319,13 @@ class Config:
     multiagent: MultiagentConfig = MISSING
     task: TaskConfig = MISSING
     train_reward_model: bool = False
+    # Path to a reward model checkpoint (see `train_reward_model.py`). If set, the env uses the model's predictions in
+    # place of (expensive) exact stats on most steps. Each env predicts its own map's stats, which only pays off when
+    # exact stats cost more than a forward pass of the model: on binary (path-length), but not on sokoban or zelda,
+    # nor on 3D mazes, whose 3D convolutions are slower still (see `benchmarks/surrogate_stats.py`).
+    surrogate_stats: Optional[str] = None
+    # Fraction of non-terminal steps on which we still compute exact stats (and track the surrogate's error).
+    surrogate_exact_prob: float = 0.1
     train_batch_size: int = 10_000
 
     algorithm: str = "PPO"
@@ -322,6 +334,7 @@ class Config:
     render_mode: Optional[str] = None
     infer: bool = False
     evaluate: bool = False
+    export: bool = False
     load: bool = True
     overwrite: bool = False
     wandb: bool = False
@@ -406,6 +419,25 @@ class EvalConfig(Config):
     vary_map_shapes: bool = False
 
 
+@dataclass
+class ExportConfig(Config):
+    """Config for exporting a trained generator (see `control_pcgrl/rl/export.py`)."""
+
+    # Indicate that we cannot overwrite this
+    export: bool = True
+
+    # Either "torchscript" or "onnx".
+    export_format: str = "torchscript"
+
+    # Will default to `{log_dir}/export` if not specified.
+    export_dir: Optional[Path] = None
+
+    eval_random: bool = False
+
+    # Does nothing here (for cross-eval)
+    name: str = "export"
+
+
 @dataclass
 class CrossEvalConfig(EvalConfig):
     """Config for cross-evaluation."""
@@ -442,6 +474,7 @@ cs = ConfigStore.instance()
 cs.store(name="train_pcgrl", node=Config)
 cs.store(name="enjoy_pcgrl", node=EnjoyConfig)
 cs.store(name="eval_pcgrl", node=EvalConfig)
+cs.store(name="export_pcgrl", node=ExportConfig)
 cs.store(name="cross_eval_pcgrl", node=CrossEvalConfig)
 cs.store(name="pod_base", node=PoDConfig)
 
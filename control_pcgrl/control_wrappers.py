@@ -13,12 +13,12 @@ from typing import Dict, OrderedDict
 # from gi.repository import Gtk
 import gymnasium as gym
 import numpy as np
+from scipy.spatial import cKDTree
 
 from control_pcgrl.configs.config import Config
 
 # from opensimplex import OpenSimplex
 from control_pcgrl.envs.helper import get_range_reward
-import ray
 
 
 # TODO: Make this part of the PcgrlEnv class instead of a wrapper?
@@ -166,8 +166,8 @@ class ControlWrapper(gym.Wrapper):
 
         return scalars
 
-    def queue_control_trgs(self, idx_counter):
-        self._ctrl_trg_queue = ray.get(idx_counter.get.remote(hash(self)))
+    def queue_control_trgs(self, trgs):
+        self._ctrl_trg_queue = list(trgs)
 
     def set_trgs(self, trgs):
         self._ctrl_trg_queue = [trgs]
@@ -295,7 +295,10 @@ class ControlWrapper(gym.Wrapper):
                 print(f"Place tile {tile} at x:{x}, y:{y}")
 
                 # FIXME: This is a hack. Write a function in Representation for this.
-                self.unwrapped._rep.unwrapped._map[x, y] = tile_int
+                # (Replacing, rather than editing, the map, so that anything tracking its changes re-reads all of it.)
+                rep_map = self.unwrapped._rep.unwrapped._map.copy()
+                rep_map[x, y] = tile_int
+                self.unwrapped._rep.unwrapped._map = rep_map
 
                 if hasattr(self.unwrapped._rep, "static_builds"):
                     # Assuming borders of width 1 (different than `_border_size` above, which may be different for rendering purposes).
@@ -517,42 +520,256 @@ class UniformNoiseyTargets(gym.Wrapper):
         return self.env.reset(), {}
 
 
-# class ALPGMMTeacher(gym.Wrapper):
-#     def __init__(self, env, **kwargs):
-
-#         from teachDRL.teachers.algos.alp_gmm import ALPGMM
-
-#         super(ALPGMMTeacher, self).__init__(env)
-#         self.cond_bounds = self.env.unwrapped.cond_bounds
-#         self.midep_trgs = False
-#         env_param_lw_bounds = [self.cond_bounds[k][0] for k in self.ctrl_metrics]
-#         env_param_hi_bounds = [self.cond_bounds[k][1] for k in self.ctrl_metrics]
-#         self.alp_gmm = ALPGMM(env_param_lw_bounds, env_param_hi_bounds)
-#         self.trg_vec = None
-#         self.trial_reward = 0
-#         self.n_trial_steps = 0
-
-#     def reset(self, *, seed=None, options=None):
-#         if self.trg_vec is not None:
-#             if self.n_trial_steps == 0:
-#                 # This is some whackness that happens when we reset manually from the inference script.
-#                 rew = 0
-#             else:
-#                 rew = self.trial_reward / self.n_trial_steps
-#             self.alp_gmm.update(self.trg_vec, rew)
-#         trg_vec = self.alp_gmm.sample_task()
-#         self.trg_vec = trg_vec
-#         trgs = {k: trg_vec[i] for (i, k) in enumerate(self.ctrl_metrics)}
-#         #       print(trgs)
-#         self.set_trgs(trgs)
-#         self.trial_reward = 0
-#         self.n_trial_steps = 0
-
-#         return self.env.reset()
-
-#     def step(self, action, **kwargs):
-#         obs, rew, done, truncated, info = self.env.step(action, **kwargs)
-#         self.trial_reward += rew
-#         self.n_trial_steps += 1
-
-#         return obs, rew, done, truncated, info
+class ALPGMM:
+    """An ALP-GMM teacher (Portelas et al., 2019), which samples control targets where the agent's loss has recently
+    changed the most, i.e. where it is learning.
+
+    Each new (targets, loss) pair is given an absolute learning progress (ALP): the difference between its loss and
+    that of the nearest targets tried before. A Gaussian mixture is fit on recent (targets, ALP) pairs, and targets are
+    sampled from its components in proportion to their mean ALP (or uniformly at random, some of the time). Rather than
+    refitting from scratch, each fit continues EM from the previous mixture of each size, and the size with the best
+    AIC is kept.
+
+    Only the most recent `memory` pairs are kept (in a ring buffer), so that memory use and the cost of finding nearest
+    targets stay bounded over long runs.
+
+    Args:
+        lows: The lower bound of each target.
+        highs: The upper bound of each target.
+        fit_rate: Refit the mixture after this many new pairs (before the first fit, targets are sampled uniformly).
+        window: Fit on this many of the most recent pairs (defaults to `fit_rate`).
+        max_components: Try mixtures of 2 to this many components.
+        random_task_ratio: Sample this proportion of targets uniformly at random.
+        n_em_iters: The number of EM iterations per fit.
+        memory: Compute ALPs against, and fit on, only this many of the most recent pairs (defaults to 20 windows).
+    """
+
+    def __init__(
+        self,
+        lows,
+        highs,
+        fit_rate: int = 250,
+        window: int = None,
+        max_components: int = 10,
+        random_task_ratio: float = 0.2,
+        n_em_iters: int = 10,
+        seed: int = None,
+        memory: int = None,
+    ):
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.fit_rate = fit_rate
+        self.window = window if window is not None else fit_rate
+        self.max_components = max_components
+        self.random_task_ratio = random_task_ratio
+        self.n_em_iters = n_em_iters
+        self._rng = np.random.default_rng(seed)
+
+        self.memory = max(memory if memory is not None else 20 * self.window, self.window)
+
+        n_dims = len(self.lows)
+        # Ring buffers of the targets (scaled to the unit cube), losses and ALPs of the most recent pairs.
+        self._tasks = np.empty((self.memory, n_dims))
+        self._losses = np.empty(self.memory)
+        self._alps = np.empty(self.memory)
+        self._n_added = 0
+        self._n_unfit = 0
+        # The last mixture of each size, to continue EM from, as (weights, means, covariances).
+        self._mixtures = {}
+        self.means, self.covs = None, None
+        self._chols = None
+
+    def _scale(self, tasks):
+        return (np.asarray(tasks, dtype=np.float64) - self.lows) / np.maximum(self.highs - self.lows, 1e-8)
+
+    def _recent(self, n: int = None) -> np.ndarray:
+        """Indices into the ring buffers of the `n` most recent pairs (or of all those we keep), oldest first."""
+        n_stored = min(self._n_added, self.memory)
+        n = n_stored if n is None else min(n, n_stored)
+        return (self._n_added - n + np.arange(n)) % self.memory
+
+    @property
+    def tasks(self) -> np.ndarray:
+        return self._tasks[self._recent()]
+
+    @property
+    def losses(self) -> np.ndarray:
+        return self._losses[self._recent()]
+
+    @property
+    def alps(self) -> np.ndarray:
+        return self._alps[self._recent()]
+
+    def update(self, tasks, losses):
+        """Record the loss achieved on each of these (n, n_dims) targets, and refit if enough new pairs are in."""
+        tasks = self._scale(tasks).reshape(-1, len(self.lows))
+        losses = np.asarray(losses, dtype=np.float64).reshape(-1)
+        if len(tasks) == 0:
+            return
+
+        # Find the nearest earlier targets of each pair, among past pairs and those earlier in this batch.
+        nearest_dist = np.full(len(tasks), np.inf)
+        nearest_loss = np.zeros(len(tasks))
+        n_stored = min(self._n_added, self.memory)
+        if n_stored > 0:
+            # The order of the stored pairs does not matter here.
+            nearest_dist, idxs = cKDTree(self._tasks[:n_stored]).query(tasks)
+            nearest_loss = self._losses[idxs]
+        dists = np.linalg.norm(tasks[:, None] - tasks[None], axis=-1)
+        dists[np.triu_indices(len(tasks))] = np.inf
+        batch_idxs = np.argmin(dists, axis=1)
+        batch_dist = dists[np.arange(len(tasks)), batch_idxs]
+        closer = batch_dist < nearest_dist
+        nearest_loss[closer] = losses[batch_idxs[closer]]
+        # The very first pair has nothing to compare to.
+        alps = np.where(np.isfinite(np.minimum(nearest_dist, batch_dist)), np.abs(losses - nearest_loss), 0.0)
+
+        # Overwrite the oldest pairs (only the last `memory` of this batch, if it is larger than that).
+        n_new = min(len(tasks), self.memory)
+        idxs = (self._n_added + len(tasks) - n_new + np.arange(n_new)) % self.memory
+        self._tasks[idxs] = tasks[-n_new:]
+        self._losses[idxs] = losses[-n_new:]
+        self._alps[idxs] = alps[-n_new:]
+        self._n_added += len(tasks)
+        self._n_unfit += len(tasks)
+        if self._n_unfit >= self.fit_rate:
+            self.fit()
+
+    def fit(self):
+        """Fit the mixture on the most recent (targets, ALP) pairs."""
+        self._n_unfit = 0
+        recent = self._recent(self.window)
+        alps = self._alps[recent]
+        # Scale ALPs like the targets, so that both count in the fit. Only their ratios matter when sampling.
+        data = np.column_stack((self._tasks[recent], alps / max(alps.max(), 1e-8)))
+        best_aic, best = np.inf, None
+        for n_components in range(2, min(self.max_components, len(data)) + 1):
+            mixture = self._mixtures.get(n_components)
+            if mixture is None:
+                mixture = self._init_mixture(data, n_components)
+            for _ in range(self.n_em_iters):
+                mixture, log_likelihood = _em_step(data, *mixture)
+            self._mixtures[n_components] = mixture
+            n_dims = data.shape[1]
+            n_params = n_components * (n_dims + n_dims * (n_dims + 1) / 2) + n_components - 1
+            aic = 2 * n_params - 2 * log_likelihood
+            if aic < best_aic:
+                best_aic, best = aic, mixture
+        if best is not None:
+            _, means, covs = best
+            self.set_state({"means": means, "covs": covs})
+
+    def _init_mixture(self, data, n_components):
+        means = data[self._rng.choice(len(data), n_components, replace=False)]
+        covs = np.repeat(np.cov(data.T)[None] + _REG_COVAR * np.eye(data.shape[1]), n_components, axis=0)
+        return np.full(n_components, 1 / n_components), means, covs
+
+    def sample_tasks(self, n: int) -> np.ndarray:
+        """Sample `n` targets at once, as an (n, n_dims) array."""
+        n_dims = len(self.lows)
+        tasks = self._rng.random((n, n_dims))
+        if self.means is not None:
+            from_mixture = self._rng.random(n) >= self.random_task_ratio
+            # Pick components in proportion to their mean ALP (the last dimension of the mixture).
+            alps = np.clip(self.means[:, -1], 0, None)
+            probs = alps / alps.sum() if alps.sum() > 0 else np.full(len(alps), 1 / len(alps))
+            components = self._rng.choice(len(probs), size=from_mixture.sum(), p=probs)
+            noise = self._rng.standard_normal((len(components), n_dims + 1))
+            samples = self.means[components] + np.einsum("nij,nj->ni", self._chols[components], noise)
+            tasks[from_mixture] = np.clip(samples[:, :n_dims], 0, 1)
+        return self.lows + tasks * (self.highs - self.lows)
+
+    def get_state(self) -> dict:
+        """The current mixture, which is all that is needed to sample targets (e.g. on another worker)."""
+        return {"means": self.means, "covs": self.covs}
+
+    def set_state(self, state: dict):
+        self.means, self.covs = state["means"], state["covs"]
+        self._chols = None if self.covs is None else np.linalg.cholesky(self.covs)
+
+
+# Added to the diagonal of covariances, to keep them positive definite.
+_REG_COVAR = 1e-6
+
+
+def _em_step(data, weights, means, covs):
+    """One EM iteration of a full-covariance Gaussian mixture. Returns the new mixture, and the log-likelihood of the
+    data under the old one."""
+    n_dims = data.shape[1]
+    chols = np.linalg.cholesky(covs)
+    # Log-densities of each point under each component, as (n_components, n_points).
+    diffs = np.linalg.solve(chols[:, None], (data[None] - means[:, None])[..., None])[..., 0]
+    log_dets = 2 * np.log(np.diagonal(chols, axis1=1, axis2=2)).sum(axis=1)
+    log_probs = -0.5 * ((diffs**2).sum(axis=-1) + (log_dets + n_dims * np.log(2 * np.pi))[:, None])
+    log_probs += np.log(np.maximum(weights, 1e-300))[:, None]
+    log_norm = np.logaddexp.reduce(log_probs, axis=0)
+    resps = np.exp(log_probs - log_norm)
+
+    counts = resps.sum(axis=1) + 1e-10
+    means = resps @ data / counts[:, None]
+    centered = data[None] - means[:, None]
+    covs = np.einsum("kn,kni,knj->kij", resps, centered, centered) / counts[:, None, None]
+    covs += _REG_COVAR * np.eye(n_dims)
+    return (counts / counts.sum(), means, covs), log_norm.sum()
+
+
+class ALPGMMTeacher(gym.Wrapper):
+    """Sets the control targets of each episode with an `ALPGMM` teacher, on the loss achieved by the end of the
+    previous one.
+
+    To share a single teacher between the envs of many workers, fit it centrally on the outcomes collected from the
+    envs with `pop_outcomes`, and hand its state to the envs with `set_task`. From then on, envs only sample from the
+    shared mixture, and leave fitting to the central teacher. Until then, each env fits its own.
+    """
+
+    def __init__(self, env, cfg: Config):
+        super(ALPGMMTeacher, self).__init__(env)
+        self.cond_bounds = self.env.unwrapped.cond_bounds
+        self.teacher = ALPGMM(
+            [self.cond_bounds[k][0] for k in self.ctrl_metrics],
+            [self.cond_bounds[k][1] for k in self.ctrl_metrics],
+            fit_rate=cfg.task.alp_gmm_fit_rate,
+            window=cfg.task.alp_gmm_window,
+            memory=cfg.task.alp_gmm_memory,
+        )
+        self.shared = False
+        self._outcomes = []
+        self.trg_vec = None
+        self.n_trial_steps = 0
+
+    def reset(self, *, seed=None, options=None):
+        # This is skipped when we reset manually (e.g. from the inference script), without having taken a step.
+        if self.trg_vec is not None and self.n_trial_steps > 0:
+            if self.shared:
+                self._outcomes.append((self.trg_vec, self.env.last_loss))
+            else:
+                self.teacher.update([self.trg_vec], [self.env.last_loss])
+        self.trg_vec = self.teacher.sample_tasks(1)[0]
+        self.set_trgs({k: self.trg_vec[i] for i, k in enumerate(self.ctrl_metrics)})
+        self.n_trial_steps = 0
+
+        return self.env.reset(seed=seed, options=options)
+
+    def step(self, action, **kwargs):
+        self.n_trial_steps += 1
+
+        return self.env.step(action, **kwargs)
+
+    def sample_tasks(self, n_tasks):
+        """Sample control targets for `n_tasks` episodes at once."""
+        trg_vecs = self.teacher.sample_tasks(n_tasks)
+        return [{k: trg_vec[i] for i, k in enumerate(self.ctrl_metrics)} for trg_vec in trg_vecs]
+
+    def get_task(self):
+        return self.teacher.get_state()
+
+    def set_task(self, task):
+        """Sample targets from the mixture of a shared teacher (as returned by `ALPGMM.get_state`)."""
+        self.teacher.set_state(task)
+        self.shared = True
+
+    def pop_outcomes(self):
+        """The targets and final loss of each episode since the last call, as `(n, n_dims)` and `(n,)` arrays."""
+        outcomes, self._outcomes = self._outcomes, []
+        trg_vecs = np.array([o[0] for o in outcomes]).reshape(-1, len(self.ctrl_metrics))
+        return trg_vecs, np.array([o[1] for o in outcomes], dtype=np.float64)
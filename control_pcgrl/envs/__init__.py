@@ -1,16 +1,45 @@
-from control_pcgrl.envs.pcgrl_env import PcgrlEnv
+from control_pcgrl.envs.registry import LazyRegistry
 
-# for player functionality
-from control_pcgrl.envs.play_pcgrl_env import PlayPcgrlEnv
+# The env classes, imported (e.g. as `control_pcgrl.envs.PcgrlEnv`) only once they are used.
+ENVS = LazyRegistry(
+    {
+        "PcgrlEnv": "control_pcgrl.envs.pcgrl_env:PcgrlEnv",
+        # for player functionality
+        "PlayPcgrlEnv": "control_pcgrl.envs.play_pcgrl_env:PlayPcgrlEnv",
+        # for controllable design
+        "PcgrlCtrlEnv": "control_pcgrl.envs.pcgrl_ctrl_env:PcgrlCtrlEnv",
+        # for 3D envs
+        # "PcgrlEnv3D": "control_pcgrl.envs.pcgrl_env_3D:PcgrlEnv3D",
+        # for holey envs
+        "PcgrlHoleyEnv": "control_pcgrl.envs.pcgrl_holey_env:PcgrlHoleyEnv",
+        # for holey 3D envs
+        # "PcgrlHoleyEnv3D": "control_pcgrl.envs.pcgrl_holey_env_3D:PcgrlHoleyEnv3D",
+    }
+)
 
-# for controllable design
-from control_pcgrl.envs.pcgrl_ctrl_env import PcgrlCtrlEnv
 
-# for 3D envs
-# from control_pcgrl.envs.pcgrl_env_3D import PcgrlEnv3D
+def __getattr__(name):
+    if name in ENVS:
+        return ENVS[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# for holey envs
-from control_pcgrl.envs.pcgrl_holey_env import PcgrlHoleyEnv
 
-# for holey 3D envs
-# from control_pcgrl.envs.pcgrl_holey_env_3D import PcgrlHoleyEnv3D
+def make_pcgrl_env(prob, rep, **kwargs):
+    """The gym entry point of every problem and representation, which builds the env class suited to the problem."""
+    from control_pcgrl.envs.probs import PROBLEMS
+    from control_pcgrl.envs.probs.holey_prob import HoleyProblem
+    from control_pcgrl.envs.probs.problem import Problem3D
+
+    prob_cls = PROBLEMS[prob]
+    if issubclass(prob_cls, HoleyProblem):
+        if issubclass(prob_cls, Problem3D):
+            env_cls = "PcgrlHoleyEnv3D"
+        else:
+            env_cls = "PcgrlHoleyEnv"
+    # elif "play" in prob:  # Deprecated
+    #     env_cls = "PlayPcgrlEnv"
+    elif issubclass(prob_cls, Problem3D):
+        env_cls = "PcgrlEnv3D"
+    else:
+        env_cls = "PcgrlCtrlEnv"
+    return ENVS[env_cls](prob=prob, rep=rep, **kwargs)
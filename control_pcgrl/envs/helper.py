@@ -1,11 +1,15 @@
 """
 A helper module that can be used by all problems
 """
+from collections import deque
+
 import numpy as np
 import gymnasium as gym
 from gymnasium.utils import seeding
 from pdb import set_trace as TT
 
+from control_pcgrl.envs.regions import Regions, get_passable_mask
+
 """
 Public function to get a dictionary of all location of all tiles
 
@@ -177,39 +181,6 @@ def _get_certain_tiles(map_locations, tile_values):
     return tiles
 
 
-"""
-Private function that runs flood fill algorithm on the current color map
-
-Parameters:
-    x (int): the starting x position of the flood fill algorithm
-    y (int): the starting y position of the flood fill algorithm
-    color_map (int[][]): the color map that is being colored
-    map (any[][]): the current tile map to check
-    color_index (int): the color used to color in the color map
-    passable_values (any[]): the current values that can be colored over
-
-Returns:
-    int: the number of tiles that has been colored
-"""
-
-
-def _flood_fill(x, y, color_map, map, color_index, passable_values):
-    num_tiles = 0
-    queue = [(x, y)]
-    while len(queue) > 0:
-        (cx, cy) = queue.pop(0)
-        if color_map[cy][cx] != -1 or map[cy][cx] not in passable_values:
-            continue
-        num_tiles += 1
-        color_map[cy][cx] = color_index
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nx, ny = cx + dx, cy + dy
-            if nx < 0 or ny < 0 or nx >= len(map[0]) or ny >= len(map):
-                continue
-            queue.append((nx, ny))
-    return num_tiles
-
-
 """
 Calculates the number of regions in the current map with passable_values
 
@@ -217,23 +188,17 @@ Parameters:
     map (any[][]): the current map being tested
     map_locations(Dict(string,(int,int)[])): the histogram of locations of the current map
     passable_values (any[]): an array of all the passable tile values
+    regions (Regions): the regions of passable tiles, if these have already been labeled
 
 Returns:
     int: number of regions in the map
 """
 
 
-def calc_num_regions(map, map_locations, passable_values):
-    empty_tiles = _get_certain_tiles(map_locations, passable_values)
-    region_index = 0
-    color_map = np.full((len(map), len(map[0])), -1)
-    for x, y in empty_tiles:
-        num_tiles = _flood_fill(x, y, color_map, map, region_index + 1, passable_values)
-        if num_tiles > 0:
-            region_index += 1
-        else:
-            continue
-    return region_index
+def calc_num_regions(map, map_locations, passable_values, regions=None):
+    if regions is None:
+        regions = Regions.from_map(map, passable_values)
+    return regions.n_regions
 
 
 """
@@ -270,6 +235,41 @@ def run_dijkstra(x, y, map, passable_values):
     return dijkstra_map, visited_map
 
 
+"""
+Public function that finds the distance from a starting tile to every tile of the map, as `run_dijkstra` does, but
+over a mask of passable tiles, which can be built once and shared between searches
+
+Parameters:
+    passable (bool[][]): a mask of the passable tiles of the map (see `get_passable_mask`)
+    x (int): the starting x position
+    y (int): the starting y position
+
+Returns:
+    int[][]: the distance to each tile, or -1 if it is unreachable (everywhere, if the start is impassable)
+"""
+
+
+def get_distances(passable, x, y):
+    height, width = passable.shape
+    if not passable[y][x]:
+        return np.full((height, width), -1)
+    # Search a flat, padded copy of the mask, so that neighbors are a fixed offset away, and never out of bounds.
+    row = width + 2
+    pad = np.pad(passable, 1).ravel().tolist()
+    dist = [-1] * len(pad)
+    start = (y + 1) * row + x + 1
+    dist[start] = 0
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        d = dist[i] + 1
+        for j in (i - 1, i + 1, i - row, i + row):
+            if pad[j] and dist[j] < 0:
+                dist[j] = d
+                queue.append(j)
+    return np.array(dist).reshape(height + 2, row)[1:-1, 1:-1]
+
+
 ADJ_FILTER = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]])
 
 """
@@ -279,22 +279,22 @@ Parameters:
     map (any[][]): the current map being tested
     map_locations (Dict(string,(int,int)[])): the histogram of locations of the current map
     passable_values (any[]): an array of all passable tiles in the map
+    regions (Regions): the regions of passable tiles, if these have already been labeled
 
 Returns:
     int: the longest path in tiles in the current map
 """
 
 
-def calc_longest_path(map, map_locations, passable_values, get_path=False):
-    width, height = len(map), len(map[0])
+def calc_longest_path(map, map_locations, passable_values, get_path=False, regions=None):
     empty_tiles = _get_certain_tiles(map_locations, passable_values)
-    final_visited_map = np.zeros((width, height))
+    if regions is None:
+        regions = Regions.from_map(map, passable_values)
     final_value = 0
-    for x, y in empty_tiles:
-        if final_visited_map[y][x] > 0:
-            continue
-        dijkstra_map, visited_map = run_dijkstra(x, y, map, passable_values)
-        final_visited_map += visited_map
+    # Search each region once, from its first passable tile.
+    for i in regions.first_tiles(empty_tiles):
+        x, y = empty_tiles[i]
+        dijkstra_map, _ = run_dijkstra(x, y, map, passable_values)
         (my, mx) = np.unravel_index(
             np.argmax(dijkstra_map, axis=None), dijkstra_map.shape
         )
@@ -1,10 +1,22 @@
 """
 A helper module that can be used by all problems in cubic 3D game
+
+Maps can be given either as nested lists of tile names (see `get_string_map`), or as int arrays indexed `[z][y][x]` (as
+held by the representation), in which case tile values are tile ints, and most stats are computed with array operations.
 """
-import matplotlib.pyplot as plt
 import numpy as np
 from pdb import set_trace as TT
 
+from control_pcgrl.envs.paths_3D import MoveTable
+from control_pcgrl.envs.regions import Regions, get_passable_mask
+
+
+def _as_nested_lists(map):
+    """Int arrays as nested lists of ints, which are much faster to index tile by tile in pure python."""
+    if isinstance(map, np.ndarray):
+        return map.tolist()
+    return map
+
 """
 Public function to get a dictionary of all location of all tiles
 
@@ -23,6 +35,9 @@ Returns:
 
 
 def get_tile_locations(map, tile_values):
+    if isinstance(map, np.ndarray):
+        # An (n, 3) array of (x, y, z) positions per tile value, in the same order as below.
+        return {t: np.argwhere(map == t)[:, ::-1] for t in tile_values}
     tiles = {}
     for t in tile_values:
         tiles[t] = []
@@ -71,6 +86,8 @@ Returns:
 
 
 def get_floor_dist(map, fromTypes, floorTypes):
+    if isinstance(map, np.ndarray):
+        return _get_floor_dist_array(map, fromTypes, floorTypes)
     result = 0
     for z in range(len(map)):
         for y in range(len(map[z])):
@@ -80,6 +97,20 @@ def get_floor_dist(map, fromTypes, floorTypes):
     return result
 
 
+def _get_floor_dist_array(map, fromTypes, floorTypes):
+    """`get_floor_dist`, computed for all columns at once."""
+    n_z = map.shape[0]
+    z = np.arange(n_z).reshape(-1, 1, 1)
+    # The height of the nearest floor tile strictly below each tile (-1 if there is none).
+    floor_z = np.where(np.isin(map, list(floorTypes)), z, -1)
+    floor_below = np.full(map.shape, -1)
+    floor_below[1:] = np.maximum.accumulate(floor_z, axis=0)[:-1]
+    dists = np.where(floor_below >= 0, z - floor_below - 1, z)
+    # As in `_calc_dist_floor`, which only looks `n_z - 1` tiles down.
+    dists[-1][floor_below[-1] < 0] = max(n_z - 2, 0)
+    return int(dists[np.isin(map, list(fromTypes))].sum())
+
+
 """
 Get number of tiles that have certain value arround certain position
 
@@ -193,6 +224,8 @@ Returns:
 
 
 def _get_certain_tiles(map_locations, tile_values):
+    if tile_values and isinstance(map_locations[next(iter(tile_values))], np.ndarray):
+        return np.concatenate([map_locations[v] for v in tile_values])
     tiles = []
     for v in tile_values:
         tiles.extend(map_locations[v])
@@ -394,71 +427,6 @@ def check_jump(map, x, y, z, dir, passable_values):
     return
 
 
-"""
-Private function that runs flood fill algorithm on the current color map
-
-Parameters:
-    x (int): the starting x position of the flood fill algorithm
-    y (int): the starting y position of the flood fill algorithm
-    z (int): the starting z position of the flood fill algorithm
-    color_map (int[][][]): the color map that is being colored
-    map (any[][][]): the current tile map to check
-    color_index (int): the color used to color in the color map
-    passable_values (any[]): the current values that can be colored over
-
-Returns:
-    int: the number of tiles that has been colored
-"""
-
-
-def _flood_fill(x, y, z, color_map, map, color_index, passable_values):
-    num_tiles = 0
-    queue = [(x, y, z)]
-
-    while len(queue) > 0:
-        (cx, cy, cz) = queue.pop(0)
-
-        # If tile has been visited, skip it.
-        if (
-            color_map[cz][cy][cx] != -1
-        ):  # or (not _passablae(map, cx, cy, cz, passable_values) and not _standable(map, cx, cy, cz, passable_values)):
-            continue
-
-        num_tiles += 1
-        color_map[cz][cy][cx] = color_index
-
-        # Look at all adjacent tiles.
-        for dx, dy, dz in [
-            (-1, 0, 0),
-            (1, 0, 0),
-            (0, -1, 0),
-            (0, 1, 0),
-            (0, 0, -1),
-            (0, 0, 1),
-        ]:
-            nx, ny, nz = cx + dx, cy + dy, cz + dz
-
-            # If adjacent tile is out of bounds, skip it.
-            if (
-                nx < 0
-                or ny < 0
-                or nz < 0
-                or nx >= len(map[0][0])
-                or ny >= len(map[0])
-                or nz >= len(map)
-            ):
-                continue
-
-            # If adjacent tile is not passable, skip it.
-            if map[nz][ny][nx] not in passable_values:
-                continue
-
-            # Otherwise, add adjacent tile to the queue.
-            queue.append((nx, ny, nz))
-
-    return num_tiles
-
-
 """
 Calculates the number of regions in the current map with passable_values
 
@@ -466,25 +434,17 @@ Parameters:
     map (any[][][]): the current map being tested
     map_locations(Dict(string,(int,int,int)[])): the histogram of locations of the current map
     passable_values (any[]): an array of all the passable tile values
+    regions (Regions): the regions of passable tiles, if these have already been labeled
 
 Returns:
     int: number of regions in the map
 """
 
 
-def calc_num_regions(map, map_locations, passable_values):
-    empty_tiles = _get_certain_tiles(map_locations, passable_values)
-    region_index = 0
-    color_map = np.full((len(map), len(map[0]), len(map[0][0])), -1)
-    for x, y, z in empty_tiles:
-        num_tiles = _flood_fill(
-            x, y, z, color_map, map, region_index + 1, passable_values
-        )
-        if num_tiles > 0:
-            region_index += 1
-        else:
-            continue
-    return region_index
+def calc_num_regions(map, map_locations, passable_values, regions=None):
+    if regions is None:
+        regions = Regions.from_map(map, passable_values)
+    return regions.n_regions
 
 
 """
@@ -503,6 +463,7 @@ Returns:
 
 
 def run_dijkstra(x, y, z, map, passable_values):
+    map = _as_nested_lists(map)
     # dijkstra_map = np.full((len(map), len(map[0]), len(map[0][0])), -1)
     # visited_map = np.zeros((len(map), len(map[0]), len(map[0][0])))
     paths = {}
@@ -589,7 +550,10 @@ Returns:
 
 
 def calc_longest_path(map, map_locations, passable_values, get_path=False):
+    map = _as_nested_lists(map)
     empty_tiles = _get_certain_tiles(map_locations, passable_values)
+    if isinstance(empty_tiles, np.ndarray):
+        empty_tiles = empty_tiles.tolist()
     final_visited_map = np.zeros((len(map), len(map[0]), len(map[0][0])), dtype=bool)
     visited_map = np.zeros_like(final_visited_map)
     max_path = []
@@ -775,6 +739,7 @@ def debug_path(path, map, passable_values):
     """
     if len(path) == 0:
         return True
+    map = _as_nested_lists(map)
     for pos in path:
         x, y, z = pos[0], pos[1], pos[2]
         # checking if there is some issue with my head
@@ -831,11 +796,15 @@ def calc_num_reachable_tile(
     map, map_locations, start_value, passable_values, reachable_values
 ):
     (sx, sy, sz) = _get_certain_tiles(map_locations, [start_value])[0]
-    dijkstra_map, _, _ = run_dijkstra(sx, sy, sz, map, passable_values)
+    if isinstance(map, np.ndarray):
+        # The same moves as `run_dijkstra`, from a move table.
+        paths = MoveTable.from_map(map, passable_values).search([(sx, sy, sz)])
+        return int(np.count_nonzero(get_passable_mask(map, reachable_values) & (paths.lengths >= 0)))
+    paths, _, _ = run_dijkstra(sx, sy, sz, map, passable_values)
     tiles = _get_certain_tiles(map_locations, reachable_values)
     total = 0
     for tx, ty, tz in tiles:
-        if dijkstra_map[tz][ty][tx] >= 0:
+        if (tx, ty, tz) in paths:
             total += 1
     return total
 
@@ -885,6 +854,25 @@ def get_string_map(map, tiles):
     return result
 
 
+"""
+A method to convert the map to use the tile numbers instead of tile names (the inverse of `get_string_map`)
+
+Parameters:
+    map (string[][][] or numpy.int[][][]): the current map. Int arrays are returned as they are.
+    tiles (string[]): a list of all the tiles in order
+
+Returns:
+    numpy.uint8[][][]: a 3D array of tile numbers
+"""
+
+
+def get_int_map(map, tiles):
+    if isinstance(map, np.ndarray) and map.dtype.kind in "iu":
+        return map
+    string_to_int = dict((s, i) for i, s in enumerate(tiles))
+    return np.vectorize(string_to_int.__getitem__, otypes=[np.uint8])(np.asarray(map))
+
+
 """
 A method to convert the probability dictionary to use tile numbers instead of tile names
 
@@ -947,6 +935,8 @@ A function to plot the 3D structure of the map
 
 
 def plot_3D_path(size_x, size_y, size_z, path_coords):
+    import matplotlib.pyplot as plt
+
     # create the boolen map of the maze
     path_boolean_map = np.full((size_z, size_y, size_x), False, dtype=bool)
 
@@ -0,0 +1,238 @@
+"""
+Jump-aware shortest paths in 3D maps, over a move table computed once per map.
+
+Moves follow the rules of `helper_3D._passable` (which `run_dijkstra` applies tile by tile, as it explores the map):
+from a tile with head-room, the player can walk, step down or up a stair, or jump over a gap, in each of the four
+cardinal directions, in this order of priority. Here, the moves from every tile are found at once with array
+operations, and stored as a sparse graph (in flat arrays). Paths are then found from any number of sources in a single
+search, with ties in path length broken in favor of fewer jumps.
+
+Maps are indexed `[z][y][x]`, with `z` vertical, and coordinates are `(x, y, z)`, as in `helper_3D`. As in
+`run_dijkstra`, the length of a path is its number of tiles, including the tiles traversed mid-move (e.g. the tile
+above a stair we step up from).
+"""
+from typing import Iterable, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from control_pcgrl.envs.regions import get_passable_mask
+
+# Padding of the passable mask (below and above in z, and on either side in y and x), so that all tiles that a move
+# can check are in bounds. Padding tiles are impassable.
+_PAD = ((2, 3), (2, 2), (2, 2))
+
+# Moves, in order of priority: (name, horizontal steps to the destination, height of the destination, whether it is a
+# jump, tiles traversed on the way as (horizontal steps, height)). Heights are relative to the current tile.
+MOVES = [
+    ("walk", 1, 0, False, []),
+    ("step_down", 1, -1, False, [(1, 0)]),
+    ("step_up", 1, 1, False, [(0, 1)]),
+    ("jump", 2, 0, True, [(1, 0)]),
+    ("jump_up", 2, 1, True, [(1, 0), (1, 1)]),
+    ("jump_down", 2, -1, True, [(1, 0), (1, -1)]),
+]
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+Coords = Tuple[int, int, int]
+
+
+def _get_move_masks(pad: np.ndarray, shape, direction) -> List[np.ndarray]:
+    """For each move in `MOVES`, the tiles from which the player would make this move in this direction.
+
+    Args:
+        pad: The mask of passable tiles, padded by `_PAD`.
+        shape: The shape of the map.
+    """
+    n_z, n_y, n_x = shape
+    dx, dy = direction
+
+    def p(steps, height):
+        """Whether the tile `steps` ahead of (and `height` above) each tile is passable."""
+        z0, y0, x0 = _PAD[0][0] + height, _PAD[1][0] + steps * dy, _PAD[2][0] + steps * dx
+        return pad[z0 : z0 + n_z, y0 : y0 + n_y, x0 : x0 + n_x]
+
+    # Solid ground, then foot- and head-room, at the next tile.
+    walk = ~p(1, -1) & p(1, 0) & p(1, 1)
+    step_down = ~walk & ~p(1, -2) & p(1, -1) & p(1, 0) & p(1, 1)
+    # A (higher) stair to climb onto, foot- and head-room above it, and extra head-room above us.
+    step_up = ~walk & ~step_down & ~p(1, 0) & p(1, 1) & p(1, 2) & p(0, 2)
+    # Five passable tiles ahead (so that the gap is at least 2 deep), and extra head-room above us.
+    gap = ~walk & ~step_down & ~step_up & p(0, 2)
+    for height in range(-2, 3):
+        gap &= p(1, height)
+    # Landing on the same level, one higher, or one lower.
+    jump = gap & ~p(2, -1) & p(2, 0) & p(2, 1) & p(2, 2)
+    jump_up = gap & ~jump & ~p(2, 0) & p(2, 1) & p(2, 2) & p(2, 3)
+    jump_down = gap & ~jump & ~jump_up & ~p(2, -2) & p(2, -1) & p(2, 0) & p(2, 1)
+
+    # We only move from tiles with head-room.
+    head_room = p(0, 1)
+    return [m & head_room for m in (walk, step_down, step_up, jump, jump_up, jump_down)]
+
+
+class MoveTable:
+    """The moves available from every tile of a 3D map, as a sparse graph between (flat) tile indices.
+
+    Args:
+        passable: A boolean mask of passable tiles, indexed `[z][y][x]`.
+    """
+
+    def __init__(self, passable: np.ndarray):
+        self.shape = passable.shape
+        self.n_tiles = passable.size
+        self._passable = passable
+        pad = np.pad(passable, _PAD)
+        n_z, n_y, n_x = self.shape
+
+        srcs, dsts, n_moves, vias, footprint_vias = [], [], [], [], []
+        for dx, dy in DIRECTIONS:
+
+            def offset(steps, height):
+                # Moves never leave the map, so the offsets of their tiles can be added to flat indices directly.
+                return height * n_y * n_x + steps * (dy * n_x + dx)
+
+            for (_, steps, height, _, traversed), mask in zip(MOVES, _get_move_masks(pad, self.shape, (dx, dy))):
+                src = np.flatnonzero(mask)
+                n = len(src)
+                srcs.append(src)
+                dsts.append(src + offset(steps, height))
+                n_moves.append(n)
+                # Traversed tiles, padded with -1, with and without those stacked directly above another path tile.
+                via = np.full((n, 2), -1)
+                footprint_via = np.full((n, 2), -1)
+                stacked = {(s, h + 1) for s, h in traversed + [(0, 0), (steps, height)]}
+                for i, (s, h) in enumerate(traversed):
+                    via[:, i] = src + offset(s, h)
+                    if (s, h) not in stacked:
+                        footprint_via[:, i] = via[:, i]
+                vias.append(via)
+                footprint_vias.append(footprint_via)
+
+        srcs, dsts = np.concatenate(srcs), np.concatenate(dsts)
+        # The cost (in path tiles) of each move, and whether it is a jump.
+        costs = np.repeat(np.tile([1 + len(m[4]) for m in MOVES], len(DIRECTIONS)), n_moves)
+        jumps = np.repeat(np.tile([int(m[3]) for m in MOVES], len(DIRECTIONS)), n_moves)
+        # Sort moves by source tile, as in the graph's flat arrays, so that each move's traversed tiles can be found.
+        order = np.argsort(srcs * self.n_tiles + dsts)
+        self.srcs, self.dsts = srcs[order], dsts[order]
+        self.costs, self.jumps = costs[order], jumps[order]
+        self.vias = np.concatenate(vias)[order]
+        self.footprint_vias = np.concatenate(footprint_vias)[order]
+        self.indptr = np.zeros(self.n_tiles + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.srcs, minlength=self.n_tiles), out=self.indptr[1:])
+
+        # Search on (length, number of jumps), encoded exactly as `length * _jump_base + n_jumps`.
+        self._jump_base = self.n_tiles + 1
+        self._graph = csr_matrix(
+            ((self.costs * self._jump_base + self.jumps).astype(np.float64), self.dsts, self.indptr),
+            shape=(self.n_tiles, self.n_tiles),
+        )
+
+    @classmethod
+    def from_map(cls, map, passable_values: Iterable):
+        return cls(get_passable_mask(map, passable_values))
+
+    def search(self, sources: Iterable[Coords]) -> "PathField":
+        """Shortest paths from the nearest of these `(x, y, z)` sources to every tile reachable from any of them."""
+        sources = np.array([(z, y, x) for x, y, z in sources], dtype=np.intp).reshape(-1, 3)
+        # As in `run_dijkstra`, we cannot set out from a source without head-room.
+        z, y, x = sources.T
+        above = z + 1 < self.shape[0]
+        z, y, x = z[above], y[above], x[above]
+        idxs = np.ravel_multi_index((z, y, x), self.shape)[self._passable[z + 1, y, x]]
+
+        if len(idxs) == 0:
+            dist, preds = np.full(self.n_tiles, np.inf), np.full(self.n_tiles, -9999)
+        else:
+            dist, preds, _ = dijkstra(self._graph, indices=np.unique(idxs), return_predecessors=True, min_only=True)
+        return PathField(self, dist, preds)
+
+    def search_each(
+        self, sources: Iterable[Coords], targets: Iterable[Coords], chunk_size: int = 256
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Shortest paths from each of these `(x, y, z)` sources, separately, to each of these targets.
+
+        Sources are searched from a chunk at a time, which bounds the memory taken by their distances to every tile.
+
+        Returns:
+            The length (in tiles) of each path, or -1 if the target is unreachable, and its number of jumps, as
+            `(n_sources, n_targets)` arrays.
+        """
+        sources = np.array(list(sources), dtype=np.intp).reshape(-1, 3)
+        targets = np.array(list(targets), dtype=np.intp).reshape(-1, 3)
+        src_idxs = np.ravel_multi_index(sources[:, ::-1].T, self.shape)
+        trg_idxs = np.ravel_multi_index(targets[:, ::-1].T, self.shape)
+
+        dist = np.full((len(src_idxs), len(trg_idxs)), np.inf)
+        for start in range(0, len(src_idxs), chunk_size):
+            chunk = src_idxs[start : start + chunk_size]
+            dist[start : start + chunk_size] = dijkstra(self._graph, indices=chunk)[:, trg_idxs]
+        x, y, z = sources.T
+        head_room = np.zeros(len(sources), dtype=bool)
+        above = z + 1 < self.shape[0]
+        head_room[above] = self._passable[z[above] + 1, y[above], x[above]]
+        dist[~head_room] = np.inf
+        return self._decode(dist)
+
+    def _decode(self, dist: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Path lengths (in tiles, or -1 if unreachable) and numbers of jumps, from the distances of a search."""
+        reached = np.isfinite(dist)
+        lengths, n_jumps = np.divmod(np.where(reached, dist, 0).astype(np.int64), self._jump_base)
+        return np.where(reached, lengths + 1, -1), np.where(reached, n_jumps, 0)
+
+    def _find_move(self, src: int, dst: int) -> int:
+        """The index of the move from one tile to another."""
+        lo, hi = self.indptr[src], self.indptr[src + 1]
+        return lo + int(np.searchsorted(self.dsts[lo:hi], dst))
+
+
+class PathField:
+    """Shortest paths from a set of sources, as found by `MoveTable.search`.
+
+    Attributes:
+        lengths: The length (in tiles) of the shortest path to each tile, indexed `[z][y][x]`, or -1 if it is
+            unreachable.
+        n_jumps: The number of jumps along each of these paths (the fewest among paths of this length).
+    """
+
+    def __init__(self, moves: MoveTable, dist: np.ndarray, preds: np.ndarray):
+        self._moves = moves
+        self._preds = preds
+        lengths, n_jumps = moves._decode(dist)
+        self.lengths = lengths.reshape(moves.shape)
+        self.n_jumps = n_jumps.reshape(moves.shape)
+
+    def get_length(self, x: int, y: int, z: int) -> int:
+        return int(self.lengths[z, y, x])
+
+    def get_n_jump(self, x: int, y: int, z: int) -> int:
+        return int(self.n_jumps[z, y, x])
+
+    def get_furthest(self) -> Coords:
+        """The tile with the longest shortest path (the first of these, in flat order)."""
+        z, y, x = np.unravel_index(np.argmax(self.lengths), self.lengths.shape)
+        return int(x), int(y), int(z)
+
+    def get_path(self, x: int, y: int, z: int, footprint: bool = False) -> List[Coords]:
+        """The shortest path to a tile, as `(x, y, z)` coordinates from its source, or `[]` if it is unreachable.
+
+        Args:
+            footprint: Leave out the tiles traversed mid-move which are directly above another tile of the move (e.g.
+                when stepping up or down a stair), which `remove_stacked_path_tiles` would otherwise remove.
+        """
+        if self.lengths[z, y, x] < 0:
+            return []
+        vias = self._moves.footprint_vias if footprint else self._moves.vias
+        idx = int(np.ravel_multi_index((z, y, x), self._moves.shape))
+        # Walk back to the source.
+        path = [idx]
+        pred = self._preds[idx]
+        while pred >= 0:
+            via = vias[self._moves._find_move(pred, idx)]
+            path.extend(int(v) for v in via[::-1] if v >= 0)
+            path.append(int(pred))
+            idx, pred = pred, self._preds[pred]
+        zs, ys, xs = np.unravel_index(path[::-1], self._moves.shape)
+        return list(zip(xs.tolist(), ys.tolist(), zs.tolist()))
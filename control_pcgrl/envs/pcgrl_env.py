@@ -8,9 +8,6 @@ from gymnasium import spaces
 from control_pcgrl.configs.config import Config
 from control_pcgrl.envs.probs.holey_prob import HoleyProblem
 import numpy as np
-from ray.rllib.env.apis.task_settable_env import TaskSettableEnv
-from ray.rllib.env.env_context import EnvContext
-from ray.rllib.utils.annotations import override
 
 from control_pcgrl.envs.reps.wrappers import wrap_rep, MultiAgentRepresentationWrapper
 from control_pcgrl.envs.probs import PROBLEMS
@@ -42,7 +39,9 @@ class PcgrlEnv(gym.Env):
 
     def __init__(self, cfg: Config, prob="binary", rep="narrow"):
         self.render_mode = cfg.render_mode
-        self._has_been_assigned_map = False  # TODO: Factor this out into a ... wrapper?
+        # The eval maps assigned to this env (see `task_assignment`), and those it has yet to play in this pass.
+        self._assigned_maps = []
+        self._map_queue = []
         self.obs_window = cfg.task.obs_window
         self.map_shape = cfg.task.map_shape
 
@@ -97,6 +96,13 @@ class PcgrlEnv(gym.Env):
 
         self.compute_stats = False
 
+        # Optional learned model that predicts stats in place of `self._prob.get_stats` (see `_get_stats`).
+        self._surrogate = None
+        self._surrogate_exact_prob = 1.0
+        self._rep_stats_exact = True
+        # Absolute errors of the surrogate's predictions w.r.t. exact stats, over the current episode.
+        self._surrogate_errors = {}
+
         (
             self.observation_space,
             self.action_space,
@@ -105,23 +111,26 @@ class PcgrlEnv(gym.Env):
         ) = (None, None, None, None)
         self.adjust_param(cfg=cfg)
 
-    @override(TaskSettableEnv)
+    # The task API of RLlib's `TaskSettableEnv` (implemented here without importing RLlib, so as to keep envs light).
     def sample_tasks(self, n_maps):
         """Implement this to sample n random tasks."""
         return [np.random.randint(self._n_maps, n_maps)]
 
-    @override(TaskSettableEnv)
     def get_task(self):
         """Implement this to get the current task (curriculum level)."""
         return self.cur_map_idx
 
-    @override(TaskSettableEnv)
     def set_task(self, map_idx):
         """Implement this to set the task (curriculum level) for this env."""
         if map_idx is not None:
             self.cur_map_idx = map_idx
             self.switch_env = True
 
+    def queue_maps(self, map_idxs):
+        """Play the eval maps with the given indices, one per reset, starting over once all have been played."""
+        self._assigned_maps = list(map_idxs)
+        self._map_queue = list(self._assigned_maps)
+
     def get_rep(self):  # ZJ: why do we need this?
         return self._rep
 
@@ -178,6 +187,10 @@ class PcgrlEnv(gym.Env):
             self._prob._prob = {
                 tile: prob for tile, prob in zip(self._prob.get_tile_types(), probs)
             }
+        if self._assigned_maps and not self.switch_env:
+            if not self._map_queue:
+                self._map_queue = list(self._assigned_maps)
+            self.set_task(self._map_queue.pop(0))
         if self.switch_env:
             # self._rep.reset(self.get_map_dims()[:-1], get_int_prob(self._prob._prob, self._prob.get_tile_types()),
             self._rep.reset(
@@ -195,8 +208,10 @@ class PcgrlEnv(gym.Env):
         # continuous = False if not hasattr(self._prob, 'get_continuous') else self._prob.get_continuous()
         if self._get_stats_on_step:
             self._rep_stats = self._prob.get_stats(
-                self.get_string_map(self._get_rep_map(), self._prob.get_tile_types())
+                self._get_stats_map()
             )  # , continuous=continuous))
+        self._rep_stats_exact = True
+        self._surrogate_errors = {}
         self.metrics = self._rep_stats
         self._prob.reset(self._rep_stats)
         self._prob._prob = probs
@@ -271,6 +286,12 @@ class PcgrlEnv(gym.Env):
         self._max_iterations = (
             np.prod(self.get_map_dims()[:-1]) * cfg.max_board_scans + 1
         )
+        if cfg.surrogate_stats is not None:
+            from control_pcgrl.reward_model_wrappers import get_stats_surrogate
+
+            self._surrogate = get_stats_surrogate(cfg.surrogate_stats)
+            self._surrogate_exact_prob = cfg.surrogate_exact_prob
+
         self._prob.adjust_param(cfg=cfg)
         self._rep.adjust_param(cfg=cfg)
         self.action_space = self._rep.get_action_space(
@@ -318,7 +339,8 @@ class PcgrlEnv(gym.Env):
         # save copy of the old stats to calculate the reward
         old_stats = self._rep_stats
         # update the current state to the new state based on the taken action
-
+        # (Which tiles change is unknown, unless the representation records its edits.)
+        self._rep.unwrapped._changed_idxs = None
         change, map_coords = self._rep.update(action)
         if change > 0:
             self._changes += change
@@ -349,7 +371,8 @@ class PcgrlEnv(gym.Env):
 
         # Only get level stats at the end of the level, for sparse, loss-based reward.
         # Uncomment the below to use dense rewards (also need to modify the ParamRew wrapper).
-        if change > 0:
+        # (If stats have been predicted by the surrogate, make sure they are exact at the end of the episode.)
+        if change > 0 or (done and not self._rep_stats_exact):
             # if done:
             # if done or self.compute_stats:
 
@@ -358,9 +381,7 @@ class PcgrlEnv(gym.Env):
             # if last_build_coords in old_path_coords:
             #     old_path_coords.remove(last_build_coords)
             #     self._prob.path_to_erase = old_path_coords
-            self._rep_stats = self._prob.get_stats(
-                self.get_string_map(self._get_rep_map(), self._prob.get_tile_types())
-            )
+            self._rep_stats = self._get_stats(done)
 
             if self._rep_stats is None:
                 raise Exception(
@@ -388,6 +409,35 @@ class PcgrlEnv(gym.Env):
     def _get_rep_map(self):
         return self._rep.unwrapped._map
 
+    def _get_stats_map(self):
+        """The map as passed to the problem's `get_stats`: as tile ints if the problem supports it, else as tile names."""
+        if self._prob.int_map_stats:
+            return self._get_rep_map()
+        return self.get_string_map(self._get_rep_map(), self._prob.get_tile_types())
+
+    def _get_stats(self, done: bool):
+        """Compute the stats of the current map.
+
+        If we have a surrogate model, use its (cheap) predictions in place of exact stats, except on terminal steps and
+        on a random `surrogate_exact_prob` fraction of other steps. On exact steps, record the surrogate's error.
+        """
+        if self._surrogate is None:
+            return self._prob.get_stats(self._get_stats_map())
+
+        preds = self._surrogate.predict_stats(self._get_rep_map())
+        if not done and self.np_random.random() >= self._surrogate_exact_prob:
+            stats = dict(self._rep_stats)
+            for k, v in preds.items():
+                stats[k] = float(np.clip(v, *self._prob.cond_bounds.get(k, (-np.inf, np.inf))))
+            self._rep_stats_exact = False
+            return stats
+
+        stats = self._prob.get_stats(self._get_stats_map())
+        for k, v in preds.items():
+            self._surrogate_errors.setdefault(k, []).append(abs(v - stats[k]))
+        self._rep_stats_exact = True
+        return stats
+
     """
     Render the current state of the environment
 
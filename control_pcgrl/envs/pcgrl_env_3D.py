@@ -6,16 +6,22 @@ from control_pcgrl.envs.probs import PROBLEMS
 from control_pcgrl.envs.probs.problem import Problem
 from control_pcgrl.envs.reps import REPRESENTATIONS
 from control_pcgrl.envs.helper_3D import get_int_prob, get_string_map
+from control_pcgrl.envs.probs.minecraft.voxel_render import VoxelRenderer
 from control_pcgrl.envs.reps.representation import Representation
 import numpy as np
 from gymnasium import spaces
 
 RENDER_OPENGL = 0
 RENDER_MINECRAFT = 1
+# Headless, numpy-only rendering to RGB frames. Always used when the env's `render_mode` asks for frames.
+RENDER_NUMPY = 2
 
 RENDER_MODE = RENDER_MINECRAFT
 # RENDER_MODE = RENDER_OPENGL
 
+# Render modes in which we return frames (as in `PcgrlEnv.render`).
+FRAME_RENDER_MODES = {"rgb_array", "save_gif"}
+
 if RENDER_MODE == RENDER_OPENGL:
     from control_pcgrl.envs.probs.minecraft.gl_render import Scene
 
@@ -29,10 +35,13 @@ class PcgrlEnv3D(PcgrlCtrlEnv):
         super().__init__(cfg, prob, rep)
         self.get_string_map = get_string_map
         self.gl_scene = None
+        self.voxel_renderer = None
         self.is_holey = False
 
     def render(self, mode="human"):
-        if RENDER_MODE == RENDER_OPENGL:
+        if RENDER_MODE == RENDER_NUMPY or self.render_mode in FRAME_RENDER_MODES:
+            return self.render_numpy()
+        elif RENDER_MODE == RENDER_OPENGL:
             self.render_opengl(self._get_rep_map())
             return
         elif RENDER_MODE == RENDER_MINECRAFT:
@@ -62,3 +71,13 @@ class PcgrlEnv3D(PcgrlCtrlEnv):
         self.gl_scene.render(
             rep_map, paths=[self._prob.path_coords], bordered=self.is_holey
         )
+
+    def render_numpy(self):
+        """Render the map and the current path as an RGB frame, without Minecraft or OpenGL."""
+        if self.voxel_renderer is None:
+            self.voxel_renderer = VoxelRenderer(self._prob.get_tile_types())
+        return self.voxel_renderer.render(
+            self._get_rep_map(),
+            path_coords=self._prob.path_coords,
+            bordered=self.is_holey,
+        )
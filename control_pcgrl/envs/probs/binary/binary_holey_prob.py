@@ -1,4 +1,4 @@
-from control_pcgrl.envs.probs.holey_prob import HoleyProblem
+from control_pcgrl.envs.probs.holey_prob import HoleyProblem, get_door_path_lengths
 import numpy as np
 import os
 from pdb import set_trace as TT
@@ -16,6 +16,7 @@ from control_pcgrl.envs.helper import (
     run_dijkstra,
 )
 from control_pcgrl.envs.probs.binary.binary_prob import BinaryProblem
+from control_pcgrl.envs.regions import get_passable_mask
 
 
 class BinaryHoleyProblem(HoleyProblem, BinaryProblem):
@@ -120,6 +121,12 @@ class BinaryHoleyProblem(HoleyProblem, BinaryProblem):
             # "path-coords": self.path_coords,
         }
 
+    def get_door_stats(self, map, hole_pairs):
+        entrances, exits = (np.array([pair[i] for pair in hole_pairs]) for i in range(2))
+        lengths = get_door_path_lengths(get_passable_mask(map, ["empty"]), entrances, exits)
+        # As in `get_stats`, unconnected holes have a path length of 0.
+        return {"connected-path-length": np.maximum(lengths, 0)}
+
     def process_observation(self, observation):
         if self.connected_path_coords == []:
             return observation
@@ -12,6 +12,7 @@ from control_pcgrl.envs.helper import (
     calc_num_regions,
     calc_longest_path,
 )
+from control_pcgrl.envs.regions import Regions
 
 # from control_pcgrl.envs.probs.minecraft.mc_render import spawn_2D_maze
 
@@ -166,11 +167,12 @@ class BinaryProblem(Problem):
 
     def get_stats(self, map, lenient_paths=False):
         map_locations = get_tile_locations(map, self.get_tile_types())
+        regions = Regions.from_map(map, ["empty"])
         self.path_length, self.path_coords = calc_longest_path(
-            map, map_locations, ["empty"], get_path=True
+            map, map_locations, ["empty"], get_path=True, regions=regions
         )
         return {
-            "regions": calc_num_regions(map, map_locations, ["empty"]),
+            "regions": calc_num_regions(map, map_locations, ["empty"], regions=regions),
             "path-length": self.path_length,
         }
 
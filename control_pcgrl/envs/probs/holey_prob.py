@@ -1,11 +1,59 @@
-import itertools
 from pdb import set_trace as TT
 
 import numpy as np
-import ray
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
 
 from control_pcgrl.envs.probs.problem import Problem
 
+# The indices (into the border indices) of all valid (entrance, exit) pairs, per problem class and map shape.
+_HOLE_PAIR_IDXS = {}
+
+
+def get_inward_coords(holes, bordered_shape):
+    """The coordinates of the tile just inside the map from each of these holes in its border (excluding corners)."""
+    return np.clip(holes, 1, np.array(bordered_shape) - 2)
+
+
+def get_door_path_lengths(passable, entrances, exits):
+    """The length of the shortest path from each entrance to its exit, through a bordered 2D map, as `run_dijkstra`
+    would find it with only these two holes dug into the border. All pairs are measured in one search.
+
+    Args:
+        passable: A boolean mask of the passable tiles of the bordered map. Its border is taken to be solid.
+        entrances, exits: `(n, 2)` arrays of the (row, column) coordinates of each pair of holes.
+
+    Returns:
+        An array of the length (in steps) of each path, or -1 where the holes are not connected.
+    """
+    shape = passable.shape
+    interior = np.zeros(shape, dtype=bool)
+    interior[1:-1, 1:-1] = passable[1:-1, 1:-1]
+
+    # A graph between adjacent passable tiles.
+    flat_idxs = np.arange(interior.size).reshape(shape)
+    srcs, dsts = [], []
+    for a, b in [(flat_idxs[:, :-1], flat_idxs[:, 1:]), (flat_idxs[:-1], flat_idxs[1:])]:
+        both = interior.ravel()[a] & interior.ravel()[b]
+        srcs.append(a[both])
+        dsts.append(b[both])
+    srcs, dsts = np.concatenate(srcs), np.concatenate(dsts)
+    graph = csr_matrix((np.ones(len(srcs)), (srcs, dsts)), shape=(interior.size, interior.size))
+
+    # Each path steps in from the entrance, and out to the exit, so we only search between the tiles inside them.
+    entrances, exits = np.asarray(entrances).reshape(-1, 2), np.asarray(exits).reshape(-1, 2)
+    inward_entrances = get_inward_coords(entrances, shape)
+    inward_exits = get_inward_coords(exits, shape)
+    sources, source_idxs = np.unique(np.ravel_multi_index(inward_entrances.T, shape), return_inverse=True)
+    if len(sources) == 0:
+        return np.zeros(0, dtype=int)
+    dist = shortest_path(graph, directed=False, unweighted=True, indices=sources)
+    dist = dist[source_idxs, np.ravel_multi_index(inward_exits.T, shape)] + 2
+    dist[~interior[tuple(inward_entrances.T)] | ~interior[tuple(inward_exits.T)]] = np.inf
+    # Holes side by side are connected directly.
+    dist[np.abs(entrances - exits).sum(axis=1) == 1] = 1
+    return np.where(np.isfinite(dist), dist, -1).astype(int)
+
 
 class HoleyProblem(Problem):
     """
@@ -63,22 +111,58 @@ class HoleyProblem(Problem):
 
         return self.entrance_coords, self.exit_coords
 
-    def queue_holes(self, idx_counter):
+    def queue_holes(self, holes):
         """
-        Gets a list of holes to be used on reset. `idx_counter` is a global ray actor object. It uses the hash of `self`
-        to give a unique id to this environment.
+        Sets the list of (entrance, exit) hole pairs to be used, one per reset, e.g. this env's slice of all hole pairs
+        (see `task_assignment.assign_tasks`). Once they have been used up, holes are generated as usual.
         """
-        self._hole_queue = ray.get(idx_counter.get.remote(hash(self)))
+        self._hole_queue = list(holes)
 
     def gen_all_holes(self):
         """
         Generate all the holes in the map for evaluation.
         """
-        hole_pairs = list(itertools.product(self._border_idxs, self._border_idxs))
-        hole_pairs = [
-            pair for pair in hole_pairs if self._valid_holes(pair[0], pair[1])
-        ]
-        return hole_pairs
+        entrance_idxs, exit_idxs = self._get_hole_pair_idxs()
+        return list(zip(self._border_idxs[entrance_idxs], self._border_idxs[exit_idxs]))
+
+    def _get_hole_pair_idxs(self):
+        """
+        The indices into `self._border_idxs` of all valid (entrance, exit) pairs, in the order of
+        `itertools.product(self._border_idxs, self._border_idxs)`. These are computed once per problem class and map
+        shape.
+        """
+        key = (type(self), self._height, self._width, getattr(self, "_length", None))
+        if key not in _HOLE_PAIR_IDXS:
+            valid = self._valid_hole_pairs(self._border_idxs[:, None], self._border_idxs[None])
+            _HOLE_PAIR_IDXS[key] = np.nonzero(valid)
+        return _HOLE_PAIR_IDXS[key]
+
+    def _valid_hole_pairs(self, entrance_coords, exit_coords):
+        """
+        Vectorized `_valid_holes`, over arrays of entrance and exit coordinates (broadcast against one another).
+        """
+        holes = []
+        for coords in (entrance_coords, exit_coords):
+            x, y = coords[..., 0], coords[..., 1]
+            # As in `_valid_holes`, only the first of these adjustments applies.
+            x_moved = (x == 0) | (x == self._width - 1)
+            x = np.where(x == 0, 1, np.where(x == self._width - 1, self._width - 2, x))
+            y = np.where(
+                x_moved, y, np.where(y == 0, 1, np.where(y == self._height - 1, self._height - 2, y))
+            )
+            holes.append(np.stack([x, y], axis=-1))
+        return np.max(np.abs(holes[0] - holes[1]), axis=-1) > 1
+
+    def get_door_stats(self, map, hole_pairs):
+        """
+        Get the stats of the path between each of these (entrance, exit) pairs (as returned by `gen_all_holes`) in a
+        finished level, as `get_stats` would report them were these the holes dug into its border, without regenerating
+        the level for each pair.
+
+        Returns:
+            dict(string,np.ndarray): the value of each path stat, for each pair.
+        """
+        raise NotImplementedError
 
     def _valid_holes(self, entrance_coords, exit_coords):
         """
@@ -1,12 +1,120 @@
-import itertools
 from pdb import set_trace as TT
-from control_pcgrl.envs.probs.holey_prob import HoleyProblem
+from control_pcgrl.envs.probs.holey_prob import HoleyProblem, get_inward_coords
 
 import numpy as np
 import ray
 
+from control_pcgrl.envs.paths_3D import MoveTable
 from control_pcgrl.envs.probs.problem import Problem, Problem3D
 
+# The offset from the foot tile of a hole to its head tile.
+HEAD = np.array([1, 0, 0])
+
+
+def get_door_departures(closed, entrances):
+    """How the player leaves each of these entrance holes, in a bordered 3D map with only this hole dug into it.
+
+    Since there is solid border above a hole's head tile, the player can only leave it by walking or stepping down onto
+    the tile just inside it (see `paths_3D._get_move_masks`). This does not hold when another hole is stacked on top of
+    it.
+
+    Args:
+        closed: A boolean mask of the passable tiles of the bordered map, with a solid border.
+        entrances: An `(n, 3)` array of the `(z, y, x)` coordinates of the foot tile of each hole.
+
+    Returns:
+        Whether the player can leave each hole, the `(z, y, x)` coordinates of the tile they land on, and the length
+        (in tiles, excluding the hole) of the move.
+    """
+    z, y, x = get_inward_coords(entrances, closed.shape).T
+    walk = ~closed[z - 1, y, x] & closed[z, y, x] & closed[z + 1, y, x]
+    # (Below the lowest holes, the floor is solid, so there is no stepping down, whichever tile is below it.)
+    room = closed[z, y, x] & closed[z + 1, y, x]
+    step_down = ~walk & ~closed[np.maximum(z - 2, 0), y, x] & closed[z - 1, y, x] & room
+    return walk | step_down, np.stack([z - step_down, y, x], axis=1), np.where(walk, 1, 2)
+
+
+def get_door_arrivals(closed, exits):
+    """The ways into each of these exit holes, in a bordered 3D map with only this hole dug into it: walking from the
+    tile just inside it, or stepping up from the tile below that one (see `get_door_departures`).
+
+    Returns:
+        For each way in, the `(z, y, x)` coordinates of the tile the player sets out from, for each hole, the length
+        (in tiles) of the move, and whether it is possible for each hole.
+    """
+    z, y, x = get_inward_coords(exits, closed.shape).T
+    step_up = closed[z, y, x] & closed[z + 1, y, x]
+    return [
+        (np.stack([z, y, x], axis=1), 1, np.ones(len(exits), dtype=bool)),
+        (np.stack([z - 1, y, x], axis=1), 2, step_up),
+    ]
+
+
+def get_stacked_doors(entrances, exits):
+    """Whether the holes of each pair are stacked in one column, so that one can be left or entered via the other."""
+    return (entrances[:, 1:] == exits[:, 1:]).all(axis=1) & (np.abs(entrances[:, 0] - exits[:, 0]) <= 2)
+
+
+def close_border(passable):
+    """A copy of a bordered map's passable mask, with a solid border."""
+    closed = np.zeros(passable.shape, dtype=bool)
+    closed[1:-1, 1:-1, 1:-1] = passable[1:-1, 1:-1, 1:-1]
+    return closed
+
+
+def dig_doors(closed, entrance, exit):
+    """A copy of a passable mask with a solid border, with these two holes dug into it."""
+    dug = closed.copy()
+    for foot in (entrance, exit):
+        dug[tuple(foot)] = dug[tuple(foot + HEAD)] = True
+    return dug
+
+
+def get_door_paths(passable, entrances, exits):
+    """The shortest path from the entrance to the exit of each pair of holes, through a bordered 3D map, as
+    `MoveTable.search` would find it with only these two holes dug into the border. All pairs are measured in one
+    search, from the tiles just inside the entrances.
+
+    Args:
+        passable: A boolean mask of the passable tiles of the bordered map, indexed `[z][y][x]`. Its border is taken to
+            be solid.
+        entrances, exits: `(n, 3)` arrays of the `(z, y, x)` coordinates of the foot tiles of each pair of holes.
+
+    Returns:
+        The length (in tiles) of each path, or -1 where the holes are not connected, and its number of jumps.
+    """
+    closed = close_border(passable)
+    moves = MoveTable(closed)
+    entrances, exits = np.asarray(entrances).reshape(-1, 3), np.asarray(exits).reshape(-1, 3)
+    departs, landings, leave_cost = get_door_departures(closed, entrances)
+    arrivals = get_door_arrivals(closed, exits)
+
+    # One search from all the tiles that entrances lead onto (with a placeholder for those we cannot leave).
+    sources, source_idxs = np.unique(np.where(departs[:, None], landings, 0), axis=0, return_inverse=True)
+    targets, target_idxs = np.unique(np.concatenate([a[0] for a in arrivals]), axis=0, return_inverse=True)
+    lengths, n_jumps = moves.search_each(sources[:, ::-1], targets[:, ::-1])
+
+    # The shortest path, with the fewest jumps among these, over the ways into the exit.
+    jump_base = closed.size + 1
+    best = np.full(len(entrances), np.inf)
+    rows = source_idxs.ravel()
+    for i, (_, enter_cost, possible) in enumerate(arrivals):
+        cols = target_idxs.ravel()[i * len(exits) : (i + 1) * len(exits)]
+        length, n_jump = lengths[rows, cols], n_jumps[rows, cols]
+        connected = departs & possible & (length >= 0)
+        cost = np.where(connected, (length + leave_cost + enter_cost - 1) * jump_base + n_jump, np.inf)
+        best = np.minimum(best, cost)
+    connected = np.isfinite(best)
+    path_lengths, path_jumps = np.divmod(np.where(connected, best, 0).astype(np.int64), jump_base)
+    path_lengths = np.where(connected, path_lengths + 1, -1)
+
+    # Stacked holes are searched separately (with both dug, as neither is a dead end then).
+    for i in np.flatnonzero(get_stacked_doors(entrances, exits)):
+        paths = MoveTable(dig_doors(closed, entrances[i], exits[i])).search([tuple(entrances[i][::-1])])
+        path_lengths[i], path_jumps[i] = paths.get_length(*exits[i][::-1]), paths.get_n_jump(*exits[i][::-1])
+
+    return path_lengths, path_jumps
+
 
 class HoleyProblem3D(HoleyProblem, Problem3D):
     """
@@ -36,20 +144,23 @@ class HoleyProblem3D(HoleyProblem, Problem3D):
         return border_idxs
 
     def gen_all_holes(self):
-        hole_pairs = list(itertools.product(self._border_idxs, self._border_idxs))
-        hole_pairs = [
-            pair
-            for pair in hole_pairs
-            if self._valid_holes((pair[0], pair[0] + np.array([1, 0, 0])), pair[1])
+        entrance_idxs, exit_idxs = self._get_hole_pair_idxs()
+        return [
+            ((entrance, entrance + HEAD), (exit, exit + HEAD))
+            for entrance, exit in zip(self._border_idxs[entrance_idxs], self._border_idxs[exit_idxs])
         ]
-        hole_pairs = [
-            (
-                (pair[0], pair[0] + np.array([1, 0, 0])),
-                (pair[1], pair[1] + np.array([1, 0, 0])),
+
+    def _valid_hole_pairs(self, entrance_coords, exit_coords):
+        """
+        Vectorized `_valid_holes`, over arrays of the foot tiles of entrances and exits (broadcast against one another).
+        """
+        return (
+            np.maximum(
+                np.max(np.abs(entrance_coords - exit_coords), axis=-1),
+                np.max(np.abs(entrance_coords + HEAD - exit_coords), axis=-1),
             )
-            for pair in hole_pairs
-        ]
-        return hole_pairs
+            > 1
+        )
 
     def gen_holes(self):
         """Generate one entrance and one exit hole into/out of the map randomly. Ensure they will not necessarily result
@@ -0,0 +1,349 @@
+"""
+Stream block edits to a Minecraft (Evocraft) server with as few, and as large, `spawnBlocks` calls as possible.
+
+A `BlockStream` keeps the state of every block it has sent. Blocks put to the stream are compared against this state, so
+that only those that actually change are sent, and are coalesced (by position) until a background thread sends them in
+batches of bounded size. Rendering a frame thus costs a single non-blocking call, no matter how many blocks it touches,
+and a block that is edited several times before it is sent (e.g. highlighted, then restored) is only sent once.
+
+`FakeMinecraftService` implements the `MinecraftService` interface in-process, so that the stream can be tested and
+benchmarked without a Minecraft server.
+"""
+import collections
+import itertools
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from google.protobuf.empty_pb2 import Empty
+
+from control_pcgrl.envs.probs.minecraft.minecraft_pb2 import (
+    AIR,
+    NORTH,
+    Block,
+    Blocks,
+    Entities,
+    FillCubeRequest,
+    Point,
+    Uuids,
+)
+
+
+Coords = Tuple[int, int, int]
+
+
+def _coords(point: Point) -> Coords:
+    return (point.x, point.y, point.z)
+
+
+def _in_cube(coords: Coords, cube) -> bool:
+    lo = (min(cube.min.x, cube.max.x), min(cube.min.y, cube.max.y), min(cube.min.z, cube.max.z))
+    hi = (max(cube.min.x, cube.max.x), max(cube.min.y, cube.max.y), max(cube.min.z, cube.max.z))
+    return all(lo[i] <= coords[i] <= hi[i] for i in range(3))
+
+
+class BlockStream:
+    """Send blocks to a Minecraft server as minimal diffs, in bounded batches, from a background thread.
+
+    Args:
+        client: A `MinecraftServiceStub` (or anything with the same methods, e.g. a `FakeMinecraftService`).
+        max_batch_size: Maximum number of blocks sent per `spawnBlocks` call.
+        asynchronous: Send blocks from a background thread as soon as they are put. Otherwise, blocks are only sent on
+            `flush`.
+    """
+
+    def __init__(self, client, max_batch_size: int = 4096, asynchronous: bool = True):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.asynchronous = asynchronous
+
+        # The last (type, orientation) sent to each position, and those waiting to be sent.
+        self._sent: Dict[Coords, Tuple[int, int]] = {}
+        self._pending: Dict[Coords, Tuple[int, int]] = {}
+        # The last array put to each region (see `put_array`), by origin and shape.
+        self._arrays: Dict[tuple, np.ndarray] = {}
+        self._n_in_flight = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.n_blocks_put = 0
+        self.n_blocks_sent = 0
+        self.n_batches = 0
+
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(target=self._send_loop, daemon=True)
+            self._thread.start()
+
+    def put(self, blocks: Iterable[Block]):
+        """Queue blocks to be sent. Later blocks at the same position override earlier ones."""
+        with self._cond:
+            self._raise_error()
+            n = 0
+            for block in blocks:
+                self._put(_coords(block.position), (block.type, block.orientation))
+                n += 1
+            self.n_blocks_put += n
+            self._cond.notify_all()
+
+    def _put(self, coords: Coords, value: Tuple[int, int]):
+        if self._sent.get(coords) == value:
+            # Drop any pending edit, which would only undo itself.
+            self._pending.pop(coords, None)
+        else:
+            self._pending[coords] = value
+
+    def put_array(self, block_types: np.ndarray, origin: Coords = (0, 0, 0), orientation: int = NORTH):
+        """Queue a box of blocks, e.g. a whole level.
+
+        Args:
+            block_types: Block types, indexed `[y][z][x]` (i.e. `map[k][j][i]` in `mc_render`, with `y` vertical).
+            origin: Minecraft coordinates `(x, y, z)` of the block at `block_types[0, 0, 0]`.
+        """
+        block_types = np.asarray(block_types)
+        key = (tuple(origin), block_types.shape)
+        with self._cond:
+            self._raise_error()
+            last = self._arrays.get(key)
+            if last is None:
+                idxs = np.indices(block_types.shape).reshape(3, -1)
+            else:
+                # Only positions that differ from the last array put to this region can differ from what was sent.
+                idxs = np.array(np.nonzero(block_types != last))
+            self._arrays[key] = block_types.copy()
+            types = block_types[tuple(idxs)].tolist()
+            ys, zs, xs = (idxs + np.array([origin[1], origin[2], origin[0]])[:, None]).tolist()
+            for x, y, z, t in zip(xs, ys, zs, types):
+                self._put((x, y, z), (t, orientation))
+            self.n_blocks_put += block_types.size
+            self._cond.notify_all()
+
+    def fill_cube(self, request: FillCubeRequest):
+        """Fill a cube through the client, after any pending blocks (which it may overwrite) have been sent."""
+        self.flush()
+        self.client.fillCube(request)
+        with self._cond:
+            # Blocks we knew of in the cube now have the fill type. (The rest are still unknown, so will always be sent.)
+            for coords in self._sent:
+                if _in_cube(coords, request.cube):
+                    self._sent[coords] = (request.type, NORTH)
+            self._arrays.clear()
+
+    def reset(self):
+        """Forget the state of the world (e.g. if it was edited without going through this stream)."""
+        self.flush()
+        with self._cond:
+            self._sent.clear()
+            self._arrays.clear()
+
+    def flush(self, timeout: Optional[float] = None):
+        """Send all pending blocks, and wait until they have been sent."""
+        if not self.asynchronous:
+            with self._cond:
+                while self._pending:
+                    self._send_batch()
+                self._raise_error()
+            return
+        with self._cond:
+            self._cond.notify_all()
+            if not self._cond.wait_for(
+                lambda: (not self._pending and self._n_in_flight == 0) or self._error is not None,
+                timeout,
+            ):
+                raise TimeoutError("Timed out waiting for blocks to be sent.")
+            self._raise_error()
+
+    def close(self):
+        """Send all pending blocks and stop the background thread."""
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return {
+                "n_blocks_put": self.n_blocks_put,
+                "n_blocks_sent": self.n_blocks_sent,
+                "n_batches": self.n_batches,
+                "n_pending": len(self._pending),
+            }
+
+    def _raise_error(self):
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise RuntimeError("Failed to send blocks to the Minecraft server.") from e
+
+    def _take_batch(self):
+        """Pop up to `max_batch_size` pending blocks, which count as sent from now on. Called with the lock held."""
+        batch = []
+        for coords in list(itertools.islice(self._pending, self.max_batch_size)):
+            value = self._pending.pop(coords)
+            self._sent[coords] = value
+            batch.append((coords, value))
+        return batch
+
+    @staticmethod
+    def _to_blocks(batch) -> Blocks:
+        return Blocks(
+            blocks=[
+                Block(position=Point(x=x, y=y, z=z), type=t, orientation=o)
+                for (x, y, z), (t, o) in batch
+            ]
+        )
+
+    def _send_batch(self):
+        """Send one batch synchronously. Called with the lock held."""
+        batch = self._take_batch()
+        try:
+            self.client.spawnBlocks(self._to_blocks(batch))
+        except Exception as e:
+            self._on_error(e)
+            return
+        self.n_blocks_sent += len(batch)
+        self.n_batches += 1
+
+    def _on_error(self, e: BaseException):
+        # We no longer know what the server holds.
+        self._error = e
+        self._pending.clear()
+        self._sent.clear()
+        self._arrays.clear()
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    return
+                batch = self._take_batch()
+                self._n_in_flight += 1
+            # Send without holding the lock, so that the next frame can be diffed meanwhile.
+            try:
+                self.client.spawnBlocks(self._to_blocks(batch))
+                error = None
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._n_in_flight -= 1
+                if error is None:
+                    self.n_blocks_sent += len(batch)
+                    self.n_batches += 1
+                else:
+                    self._on_error(error)
+                self._cond.notify_all()
+
+
+class FakeMinecraftService:
+    """An in-process stand-in for the Evocraft `MinecraftService`, holding the world as a dictionary of blocks.
+
+    It has the methods of both the servicer and the client stub, so it can be used in place of
+    `mc_render.CLIENT`.
+
+    Args:
+        call_latency: Seconds each call takes (as for a round trip to the server).
+        block_latency: Additional seconds each block that is spawned takes.
+    """
+
+    def __init__(self, call_latency: float = 0.0, block_latency: float = 0.0):
+        self.call_latency = call_latency
+        self.block_latency = block_latency
+        # (type, orientation) by position. Positions that are not stored are air.
+        self.world: Dict[Coords, Tuple[int, int]] = {}
+        self.player_loc = Point(x=0, y=0, z=0)
+        self.player_rot = Point(x=0, y=0, z=0)
+        self.n_calls = collections.Counter()
+        self.n_blocks = 0
+        self._lock = threading.Lock()
+
+    def _call(self, name: str, n_blocks: int = 0):
+        delay = self.call_latency + n_blocks * self.block_latency
+        if delay > 0:
+            time.sleep(delay)
+        self.n_calls[name] += 1
+        self.n_blocks += n_blocks
+
+    def _set(self, coords: Coords, block_type: int, orientation: int = NORTH):
+        if block_type == AIR:
+            self.world.pop(coords, None)
+        else:
+            self.world[coords] = (block_type, orientation)
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        """The type of the block at this position."""
+        return self.world.get((x, y, z), (AIR, NORTH))[0]
+
+    def spawnBlocks(self, request, context=None):
+        with self._lock:
+            self._call("spawnBlocks", len(request.blocks))
+            for block in request.blocks:
+                self._set(_coords(block.position), block.type, block.orientation)
+        return Empty()
+
+    def fillCube(self, request, context=None):
+        cube = request.cube
+        with self._lock:
+            self._call("fillCube")
+            for x in range(min(cube.min.x, cube.max.x), max(cube.min.x, cube.max.x) + 1):
+                for y in range(min(cube.min.y, cube.max.y), max(cube.min.y, cube.max.y) + 1):
+                    for z in range(min(cube.min.z, cube.max.z), max(cube.min.z, cube.max.z) + 1):
+                        self._set((x, y, z), request.type)
+        return Empty()
+
+    def readCube(self, request, context=None):
+        with self._lock:
+            self._call("readCube")
+            blocks = [
+                Block(position=Point(x=x, y=y, z=z), type=t, orientation=o)
+                for (x, y, z), (t, o) in sorted(self.world.items())
+                if _in_cube((x, y, z), request)
+            ]
+        return Blocks(blocks=blocks)
+
+    def readEntities(self, request, context=None):
+        self._call("readEntities")
+        return Entities()
+
+    def spawnEntities(self, request, context=None):
+        self._call("spawnEntities")
+        return Uuids()
+
+    def readEntitiesInSphere(self, request, context=None):
+        self._call("readEntitiesInSphere")
+        return Entities()
+
+    def setLoc(self, request, context=None):
+        self._call("setLoc")
+        self.player_loc = Point(x=request.x, y=self._highest_y(request.x, request.z) + 1, z=request.z)
+        return self.player_loc
+
+    def setRot(self, request, context=None):
+        self._call("setRot")
+        self.player_rot = Point(x=request.x, y=request.y, z=request.z)
+        return Empty()
+
+    def initDataGen(self, request, context=None):
+        self._call("initDataGen")
+        return Empty()
+
+    def getHighestYAt(self, request, context=None):
+        self._call("getHighestYAt")
+        return Point(x=request.x, y=self._highest_y(request.x, request.z), z=request.z)
+
+    def _highest_y(self, x: int, z: int) -> int:
+        with self._lock:
+            ys = [c[1] for c in self.world if c[0] == x and c[2] == z]
+        return max(ys, default=0)
@@ -10,6 +10,7 @@ import grpc
 # from minecraft_pb2 import *
 import control_pcgrl.envs.probs.minecraft.minecraft_pb2_grpc as minecraft_pb2_grpc
 from control_pcgrl.envs.probs.minecraft.minecraft_pb2 import *
+from control_pcgrl.envs.probs.minecraft.block_stream import BlockStream
 import pyscreenshot as ImageGrab
 from pdb import set_trace as TT
 
@@ -39,6 +40,43 @@ inv_block_map = dict(zip(b_map, string_map))
 N_BLOCK_TYPE = 3
 # RENDER_PATH_SEQUENCE = False
 CLIENT = None
+# If set (with `init_block_stream`), blocks are sent through this `BlockStream` instead of directly through `CLIENT`.
+BLOCK_STREAM = None
+
+
+def init_block_stream(client=None, **kwargs):
+    """Send all subsequent blocks as minimal diffs, batched in the background. See `block_stream.BlockStream`."""
+    global BLOCK_STREAM
+    close_block_stream()
+    BLOCK_STREAM = BlockStream(CLIENT if client is None else client, **kwargs)
+    return BLOCK_STREAM
+
+
+def close_block_stream():
+    global BLOCK_STREAM
+    if BLOCK_STREAM is not None:
+        BLOCK_STREAM.close()
+        BLOCK_STREAM = None
+
+
+def spawn_blocks(blocks: Blocks):
+    if BLOCK_STREAM is not None:
+        BLOCK_STREAM.put(blocks.blocks)
+    else:
+        CLIENT.spawnBlocks(blocks)
+
+
+def fill_cube(request: FillCubeRequest):
+    if BLOCK_STREAM is not None:
+        BLOCK_STREAM.fill_cube(request)
+    else:
+        CLIENT.fillCube(request)
+
+
+def get_block_types(map):
+    """The Minecraft block types of a (3D) map of tile names."""
+    tiles, inverse = np.unique(np.asarray(map), return_inverse=True)
+    return np.array([get_tile(t) for t in tiles])[inverse].reshape(np.shape(map))
 
 
 def render_blocks(blocks, base_pos=5):
@@ -52,7 +90,7 @@ def render_blocks(blocks, base_pos=5):
         Block(position=Point(x=i, y=k + 5, z=j), type=block_type, orientation=NORTH)
         for (i, j, k), block_type in blocks.items()
     ]
-    CLIENT.spawnBlocks(Blocks(blocks=block_lst))
+    spawn_blocks(Blocks(blocks=block_lst))
 
 
 def clear(n, e, boundary_size=3, backgroud_type=QUARTZ_BLOCK):
@@ -65,7 +103,7 @@ def clear(n, e, boundary_size=3, backgroud_type=QUARTZ_BLOCK):
         boundary_size (int): the border of the background
         backgroud_type (any): the block type of the background
     """
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(x=-boundary_size, y=4, z=-boundary_size),
@@ -74,7 +112,7 @@ def clear(n, e, boundary_size=3, backgroud_type=QUARTZ_BLOCK):
             type=AIR,
         )
     )
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(x=-boundary_size, y=4, z=-boundary_size),
@@ -145,7 +183,7 @@ def spawn_2D_maze(map, border_tile, border_size=(1, 1), base_pos=5, maze_height=
                         orientation=NORTH,
                     )
                 )
-    CLIENT.spawnBlocks(Blocks(blocks=blocks))
+    spawn_blocks(Blocks(blocks=blocks))
     # time.sleep(0.2)
 
 
@@ -156,7 +194,7 @@ def spawn_2D_path(path=None, base_pos=5, item=LEAVES):
             blocks.append(
                 Block(position=Point(x=pos[0], y=base_pos, z=pos[1]), type=item)
             )
-    CLIENT.spawnBlocks(Blocks(blocks=blocks))
+    spawn_blocks(Blocks(blocks=blocks))
     return
 
 
@@ -165,7 +203,7 @@ def spawn_base(
 ):
     i, k, j = len(map[0][0]), len(map), len(map[0])
     # render the base
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(
@@ -211,7 +249,7 @@ def spawn_3D_border(
     spawn_base(map, border_size, base_pos, boundary_size, backgroud_type)
 
     # render the border
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(x=-border_size[0], y=base_pos, z=-border_size[1]),
@@ -224,7 +262,7 @@ def spawn_3D_border(
             type=item,
         )
     )
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(x=0, y=base_pos, z=0),
@@ -237,7 +275,7 @@ def spawn_3D_border(
     # render the entrance's door on the border
     # entrance_coords and exit_coords are (z,y,x), the coordinates of Evocraft is (x,z,y)
     if entrance_coords is not None:
-        CLIENT.fillCube(
+        fill_cube(
             FillCubeRequest(
                 cube=Cube(
                     min=Point(
@@ -266,7 +304,7 @@ def spawn_3D_border(
 
     # render the exit on the border
     if exit_coords is not None:
-        CLIENT.fillCube(
+        fill_cube(
             FillCubeRequest(
                 cube=Cube(
                     min=Point(
@@ -308,6 +346,10 @@ def spawn_3D_maze(map, base_pos=5):
         map (string[][][]): the current game map
         base_pos (int): the vertical height of the bottom of the maze
     """
+    if BLOCK_STREAM is not None:
+        # Only the blocks that changed since the last frame are sent.
+        BLOCK_STREAM.put_array(get_block_types(map), origin=(0, 5, 0))
+        return
     blocks = []
     for k in range(len(map)):
         for j in range(len(map[k])):
@@ -320,11 +362,17 @@ def spawn_3D_maze(map, base_pos=5):
                         position=Point(x=i, y=k + 5, z=j), type=item, orientation=NORTH
                     )
                 )
-    CLIENT.spawnBlocks(Blocks(blocks=blocks))
+    spawn_blocks(Blocks(blocks=blocks))
     return
 
 
 def spawn_3D_bordered_map(map, base_pos=5, offset=(0, 0, 0)):
+    if BLOCK_STREAM is not None:
+        BLOCK_STREAM.put_array(
+            get_block_types(map),
+            origin=(1 + offset[0], base_pos + 1 + offset[2], 1 + offset[1]),
+        )
+        return
     blocks = []
     for k in range(len(map)):
         for j in range(len(map[k])):
@@ -343,7 +391,7 @@ def spawn_3D_bordered_map(map, base_pos=5, offset=(0, 0, 0)):
                         orientation=NORTH,
                     )
                 )
-    CLIENT.spawnBlocks(Blocks(blocks=blocks))
+    spawn_blocks(Blocks(blocks=blocks))
     return
 
 
@@ -392,7 +440,7 @@ def spawn_3D_path(
                     type=item,
                 )
             )
-        CLIENT.spawnBlocks(Blocks(blocks=blocks))
+        spawn_blocks(Blocks(blocks=blocks))
 
     else:
         old_points = []
@@ -435,9 +483,9 @@ def spawn_3D_path(
                     )
                 ]
             old_points = points
-            CLIENT.spawnBlocks(Blocks(blocks=block_lst))
+            spawn_blocks(Blocks(blocks=block_lst))
             sleep(0.1)
-        CLIENT.spawnBlocks(
+        spawn_blocks(
             Blocks(
                 blocks=[
                     Block(
@@ -476,10 +524,37 @@ def erase_3D_path(path, base_pos=5, item=AIR, offset=(0, 0, 0)):
                 type=item,
             )
         )
-    CLIENT.spawnBlocks(Blocks(blocks=blocks))
+    spawn_blocks(Blocks(blocks=blocks))
     return
 
 
+def stream_3D_path_change(
+    map, path_coords, old_path_coords, base_pos=5, item=PATH_BLOCK, offset=(0, 0, 0)
+):
+    """
+    Replace the old path with the new one through the `BLOCK_STREAM`, which only sends the blocks that differ (so that
+    we need not work out which parts of the old path to erase).
+
+    Parameters:
+        map (string[][][]): the current game map, with the path coordinates as (x, y, z)
+        path_coords, old_path_coords (list[(int, int, int)]): the paths to render and to erase
+    """
+
+    def to_block(pos, block_type):
+        return Block(
+            position=Point(
+                x=pos[0] + offset[0], y=pos[2] + base_pos + offset[2], z=pos[1] + offset[1]
+            ),
+            type=block_type,
+        )
+
+    # Paths are only drawn over air. Later blocks override earlier ones, so that the new path overrides the old.
+    BLOCK_STREAM.put(
+        [to_block(p, AIR) for p in old_path_coords if map[p[2]][p[1]][p[0]] == "AIR"]
+        + [to_block(p, item) for p in path_coords if map[p[2]][p[1]][p[0]] == "AIR"]
+    )
+
+
 def get_3D_path_blocks(path, item=LEAVES):
     return {(pos[0], pos[2], pos[1]): item for pos in path}
 
@@ -499,7 +574,7 @@ def edit_3D_maze(map, i, j, k, base_pos=5):
         j (int) : the y position that the action take place
         k (int) : the z position that the action take place
     """
-    CLIENT.spawnBlocks(
+    spawn_blocks(
         Blocks(
             blocks=[
                 Block(
@@ -512,7 +587,7 @@ def edit_3D_maze(map, i, j, k, base_pos=5):
     )
     # time.sleep(2)
     item = get_tile(map[k][j][i])
-    CLIENT.spawnBlocks(
+    spawn_blocks(
         Blocks(
             blocks=[
                 Block(
@@ -538,7 +613,7 @@ def edit_bordered_3D_maze(map, i, j, k, base_pos=5, offset=(0, 0, 0)):
         j (int) : the y position that the action take place
         k (int) : the z position that the action take place
     """
-    CLIENT.spawnBlocks(
+    spawn_blocks(
         Blocks(
             blocks=[
                 Block(
@@ -555,7 +630,7 @@ def edit_bordered_3D_maze(map, i, j, k, base_pos=5, offset=(0, 0, 0)):
     )
     # time.sleep(0.5)
     item = get_tile(map[k + 1][j + 1][i + 1])
-    CLIENT.spawnBlocks(
+    spawn_blocks(
         Blocks(
             blocks=[
                 Block(
@@ -586,7 +661,7 @@ def spawn_3D_doors(map, entrance, exit, base_pos=5):
     # render a border (and inner map) of air
     border_size = (1, 1, 1)
     i, k, j = len(map[0][0]), len(map), len(map[0])
-    CLIENT.fillCube(
+    fill_cube(
         FillCubeRequest(
             cube=Cube(
                 min=Point(x=-border_size[0], y=base_pos + 1, z=-border_size[1]),
@@ -601,7 +676,7 @@ def spawn_3D_doors(map, entrance, exit, base_pos=5):
     )
 
     # spawn colored blocks as supports for the entrance and exit
-    CLIENT.spawnBlocks(
+    spawn_blocks(
         Blocks(
             blocks=[
                 Block(
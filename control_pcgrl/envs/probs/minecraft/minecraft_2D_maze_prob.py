@@ -8,6 +8,7 @@ from control_pcgrl.envs.helper import (
     calc_num_regions,
     calc_longest_path,
 )
+from control_pcgrl.envs.regions import Regions
 from control_pcgrl.envs.probs.minecraft.mc_render import spawn_2D_maze, spawn_2D_path
 
 """
@@ -95,11 +96,12 @@ class Minecraft2DmazeProblem(Problem):
 
     def get_stats(self, map):
         map_locations = get_tile_locations(map, self.get_tile_types())
+        regions = Regions.from_map(map, ["AIR"])
         self.path_length, self.path_coords = calc_longest_path(
-            map, map_locations, ["AIR"], get_path=self.render_path
+            map, map_locations, ["AIR"], get_path=self.render_path, regions=regions
         )
         return {
-            "regions": calc_num_regions(map, map_locations, ["AIR"]),
+            "regions": calc_num_regions(map, map_locations, ["AIR"], regions=regions),
             "path-length": self.path_length,
         }
 
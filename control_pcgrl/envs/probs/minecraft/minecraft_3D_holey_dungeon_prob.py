@@ -5,11 +5,18 @@ from sklearn.utils import check_X_y
 from control_pcgrl.envs.helper_3D import (
     calc_certain_tile,
     calc_num_regions,
+    get_int_map,
     get_path_coords,
     get_tile_locations,
     plot_3D_path,
-    remove_stacked_path_tiles,
-    run_dijkstra,
+)
+from control_pcgrl.envs.paths_3D import MoveTable
+from control_pcgrl.envs.probs.holey_prob_3D import (
+    close_border,
+    dig_doors,
+    get_door_arrivals,
+    get_door_departures,
+    get_stacked_doors,
 )
 from control_pcgrl.envs.probs.minecraft.mc_render import (
     erase_3D_path,
@@ -20,6 +27,7 @@ from control_pcgrl.envs.probs.minecraft.mc_render import (
     spawn_3D_path,
     spawn_base,
 )
+from control_pcgrl.envs.regions import get_passable_mask
 import numpy as np
 
 from control_pcgrl.envs.probs.minecraft.minecraft_3D_holey_maze_prob import (
@@ -115,13 +123,17 @@ class Minecraft3DholeyDungeonProblem(Minecraft3DholeymazeProblem):
         self._ctrl_reward_weights = self._reward_weights
 
     def get_stats(self, map):
-        map_locations = get_tile_locations(map, self.get_tile_types())
+        map = get_int_map(map, self.get_tile_types())
+        map_locations = get_tile_locations(map, range(len(self.get_tile_types())))
+        passable = self.get_tile_ints(self._passable)
+        (chest,) = self.get_tile_ints(["CHEST"])
+        enemy_tiles = self.get_tile_ints(["SKULL", "PUMPKIN"])
 
         map_stats = {
-            "regions": calc_num_regions(map, map_locations, ["AIR"]),
+            "regions": calc_num_regions(map, map_locations, self.get_tile_ints(["AIR"])),
             "path-length": 0,
-            "chests": calc_certain_tile(map_locations, ["CHEST"]),
-            "enemies": calc_certain_tile(map_locations, ["SKULL", "PUMPKIN"]),
+            "chests": calc_certain_tile(map_locations, [chest]),
+            "enemies": calc_certain_tile(map_locations, enemy_tiles),
             "nearest-enemy": 0,
             "n_jump": 0,
         }
@@ -130,51 +142,103 @@ class Minecraft3DholeyDungeonProblem(Minecraft3DholeymazeProblem):
         # entrance is self.entrance_coords, a hole on the border(we use the foot room for path finding), in the form of (z, y, x)
         p_z, p_y, p_x = self.entrance_coords[0]
 
-        enemies = []
-        enemies.extend(map_locations["SKULL"])
-        enemies.extend(map_locations["PUMPKIN"])
+        enemies = np.concatenate([map_locations[t] for t in enemy_tiles]).tolist()
         self.min_e_path = set({})
         self.ordered_e_path = []
+        # One search from the player gives the paths to all enemies and to the chest.
+        moves = MoveTable.from_map(map, passable)
+        paths_p = moves.search([(p_x, p_y, p_z)])
         if len(enemies) > 0:
-            paths_e, _, _ = run_dijkstra(p_x, p_y, p_z, map, self._passable)
             min_dist = 0
             for e_x, e_y, e_z in enemies:  # wtf
-                e_path = paths_e.get((e_x, e_y, e_z), [])
-                e_dist = len(e_path)
+                e_dist = max(paths_p.get_length(e_x, e_y, e_z), 0)
                 if e_dist > 0 and (e_dist < min_dist or min_dist == 0):
                     min_dist = e_dist
-                    self.ordered_e_path = e_path
-                    self.min_e_path = remove_stacked_path_tiles(self.ordered_e_path)
+                    self.ordered_e_path = paths_p.get_path(e_x, e_y, e_z)
+                    self.min_e_path = paths_p.get_path(e_x, e_y, e_z, footprint=True)
             map_stats["nearest-enemy"] = min_dist
 
         if map_stats["chests"] > 0:
-            c_xyz = map_locations["CHEST"][0]
+            c_xyz = tuple(map_locations[chest][0].tolist())
 
             # exit is self.exit_coords, a hole on the border(we use the foot room the find the path), in the form of (z, y, x)
             d_xyz = tuple(self.exit_coords[0][::-1])  # lol
 
             # start point is player
-            paths_c, _, jumps_c = run_dijkstra(p_x, p_y, p_z, map, self._passable)
-            path_c = paths_c.get(c_xyz, [])
+            path_c = paths_p.get_path(*c_xyz)
             map_stats["path-length"] += len(path_c)
-            map_stats["n_jump"] += jumps_c.get(c_xyz, 0)
+            map_stats["n_jump"] += paths_p.get_n_jump(*c_xyz)
 
             # start point is chests
-            paths_d, _, jumps_d = run_dijkstra(*c_xyz, map, self._passable)
-            path_d = paths_d.get(d_xyz, [])
+            paths_d = moves.search([c_xyz])
+            path_d = paths_d.get_path(*d_xyz)
             map_stats["path-length"] += len(path_d)
-            map_stats["n_jump"] += jumps_d.get(d_xyz, 0)
+            map_stats["n_jump"] += paths_d.get_n_jump(*d_xyz)
             # if self.render_path:
             # self.path_coords = np.vstack((get_path_coords(paths_c, c_x, c_y, c_z),
             #   get_path_coords(pathd_d, d_x, d_y, d_z)))
             self.ordered_path = path_c + path_d
-            self.path_coords = remove_stacked_path_tiles(self.ordered_path)
+            self.path_coords = paths_p.get_path(*c_xyz, footprint=True) + paths_d.get_path(*d_xyz, footprint=True)
             # self.path_coords = np.vstack((path_c, path_d))
 
         self.path_length = map_stats["path-length"]
         self.n_jump = map_stats["n_jump"]
         return map_stats
 
+    def get_door_stats(self, map, hole_pairs):
+        """As `get_stats` measures paths from the player (at the entrance) to the chest, then on to the exit, and to the
+        nearest enemy: with one search from the tiles just inside the entrances, and one from the chest."""
+        map = get_int_map(map, self.get_tile_types())
+        map_locations = get_tile_locations(map, range(len(self.get_tile_types())))
+        (chest,) = self.get_tile_ints(["CHEST"])
+        enemies = np.concatenate([map_locations[t] for t in self.get_tile_ints(["SKULL", "PUMPKIN"])])
+        chests = map_locations[chest][:1]
+        entrances, exits = (np.array([pair[i][0] for pair in hole_pairs]) for i in range(2))
+        closed = close_border(get_passable_mask(map, self.get_tile_ints(self._passable)))
+        moves = MoveTable(closed)
+
+        # Paths from the player, to the chest (if any) and each enemy.
+        departs, landings, leave_cost = get_door_departures(closed, entrances)
+        sources, source_idxs = np.unique(np.where(departs[:, None], landings, 0), axis=0, return_inverse=True)
+        lengths, n_jumps = moves.search_each(sources[:, ::-1], np.concatenate([chests, enemies]))
+        lengths, n_jumps = lengths[source_idxs.ravel()], n_jumps[source_idxs.ravel()]
+        reached = departs[:, None] & (lengths >= 0)
+        lengths = np.where(reached, lengths + leave_cost[:, None], 0)
+        n_jumps = np.where(reached, n_jumps, 0)
+        enemy_dists = np.where(lengths[:, len(chests) :] > 0, lengths[:, len(chests) :], np.inf)
+        nearest_enemy = enemy_dists.min(axis=1, initial=np.inf)
+        nearest_enemy = np.where(np.isfinite(nearest_enemy), nearest_enemy, 0).astype(np.int64)
+
+        path_lengths, path_jumps = np.zeros(len(entrances), dtype=np.int64), np.zeros(len(entrances), dtype=np.int64)
+        if len(chests) > 0:
+            # Paths from the chest to the exit, over the ways into it.
+            paths_d = moves.search([tuple(chests[0])])
+            jump_base = closed.size + 1
+            best = np.full(len(exits), np.inf)
+            for tiles, enter_cost, possible in get_door_arrivals(closed, exits):
+                z, y, x = tiles.T
+                length, n_jump = paths_d.lengths[z, y, x], paths_d.n_jumps[z, y, x]
+                best = np.minimum(
+                    best, np.where(possible & (length >= 0), (length + enter_cost) * jump_base + n_jump, np.inf)
+                )
+            connected = np.isfinite(best)
+            to_exit, to_exit_jumps = np.divmod(np.where(connected, best, 0).astype(np.int64), jump_base)
+            path_lengths = lengths[:, 0] + to_exit
+            path_jumps = n_jumps[:, 0] + to_exit_jumps
+
+        # Stacked holes are searched separately (with both dug, as neither is a dead end then).
+        for i in np.flatnonzero(get_stacked_doors(entrances, exits)):
+            moves_i = MoveTable(dig_doors(closed, entrances[i], exits[i]))
+            paths_p = moves_i.search([tuple(entrances[i][::-1])])
+            dists = [max(paths_p.get_length(*e), 0) for e in enemies.tolist()]
+            nearest_enemy[i] = min([d for d in dists if d > 0], default=0)
+            if len(chests) > 0:
+                paths_d = moves_i.search([tuple(chests[0])])
+                path_lengths[i] = max(paths_p.get_length(*chests[0]), 0) + max(paths_d.get_length(*exits[i][::-1]), 0)
+                path_jumps[i] = paths_p.get_n_jump(*chests[0]) + paths_d.get_n_jump(*exits[i][::-1])
+
+        return {"path-length": path_lengths, "n_jump": path_jumps, "nearest-enemy": nearest_enemy}
+
     # def process_observation(self, observation):
     #     if self.path_coords == []:
     #         return observation
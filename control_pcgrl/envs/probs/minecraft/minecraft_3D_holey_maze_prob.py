@@ -8,22 +8,23 @@ vertical blocks available on the lower step (and two vertical blocks available o
 """
 import itertools
 from pdb import set_trace as TT
-from control_pcgrl.envs.probs.holey_prob_3D import HoleyProblem3D
+from control_pcgrl.envs.probs.holey_prob_3D import HoleyProblem3D, get_door_paths
 
 import numpy as np
 from timeit import default_timer as timer
 
 from control_pcgrl.envs.helper_3D import (
     get_path_coords,
+    get_int_map,
     get_range_reward,
     get_tile_locations,
     calc_num_regions,
     calc_longest_path,
     debug_path,
     plot_3D_path,
-    remove_stacked_path_tiles,
-    run_dijkstra,
 )
+from control_pcgrl.envs.paths_3D import MoveTable
+from control_pcgrl.envs.regions import get_passable_mask
 from control_pcgrl.envs.probs.minecraft.mc_render import (
     erase_3D_path,
     spawn_3D_bordered_map,
@@ -109,7 +110,9 @@ class Minecraft3DholeymazeProblem(HoleyProblem3D, Minecraft3DmazeProblem):
     """
 
     def get_stats(self, map):
-        map_locations = get_tile_locations(map, self.get_tile_types())
+        map = get_int_map(map, self.get_tile_types())
+        air = self.get_tile_ints(["AIR"])
+        map_locations = get_tile_locations(map, range(len(self.get_tile_types())))
 
         # for earsing the path of the previous iteration in Minecraft
         # new path coords are updated in the render function
@@ -117,33 +120,20 @@ class Minecraft3DholeymazeProblem(HoleyProblem3D, Minecraft3DmazeProblem):
         # do not fix the positions of entrance and exit (calculating the longest path among 2 random positions)
         # start_time = timer()
 
-        paths, _, jumps = run_dijkstra(
-            self.entrance_coords[0][2],
-            self.entrance_coords[0][1],
-            self.entrance_coords[0][0],
-            map,
-            ["AIR"],
-        )
-        # connected_path_length = dijkstra_map[self.exit_coords[0][0], self.exit_coords[0][1], self.exit_coords[0][2]]
+        # One search from the entrance gives both the path to the exit and the longest path.
+        paths = MoveTable.from_map(map, air).search([tuple(self.entrance_coords[0][::-1])])
         exit_coords = tuple(
             self.exit_coords[0][::-1]
         )  # lol ... why? Because the entrance/exit coords was (z, y, x)
-        self.connected_path_length = (
-            len(paths[exit_coords]) if exit_coords in paths else -1
-        )
-        self.ordered_connected_path = (
-            np.array(paths[exit_coords]) if exit_coords in paths else []
-        )
-        self.connected_path_coords = remove_stacked_path_tiles(
-            self.ordered_connected_path
-        )
+        self.connected_path_length = paths.get_length(*exit_coords)
+        self.ordered_connected_path = np.array(paths.get_path(*exit_coords))
+        self.connected_path_coords = paths.get_path(*exit_coords, footprint=True)
 
-        self.n_jump = jumps[exit_coords] if exit_coords in jumps else 0
-        tiles_paths = [(tile, path) for tile, path in paths.items()]
-        max_id = np.argmax(np.array([len(p) for (_, p) in tiles_paths]))
-        max_tile, self.ordered_path = tiles_paths[max_id]
+        self.n_jump = paths.get_n_jump(*exit_coords)
+        max_tile = paths.get_furthest()
+        self.ordered_path = paths.get_path(*max_tile)
         self.path_length = len(self.path_coords)
-        self.path_coords = remove_stacked_path_tiles(self.ordered_path)
+        self.path_coords = paths.get_path(*max_tile, footprint=True)
 
         assert not (
             self.connected_path_length == 0 and len(self.connected_path_coords) > 0
@@ -151,10 +141,8 @@ class Minecraft3DholeymazeProblem(HoleyProblem3D, Minecraft3DmazeProblem):
         # print(f"minecraft path-finding time: {timer() - start_time}")
 
         if self.render:
-            path_is_valid = debug_path(self.path_coords, map, ["AIR"])
-            connected_path_is_valid = debug_path(
-                self.connected_path_coords, map, ["AIR"]
-            )
+            path_is_valid = debug_path(self.path_coords, map, air)
+            connected_path_is_valid = debug_path(self.connected_path_coords, map, air)
             if not path_is_valid:
                 raise ValueError(
                     "The path is not valid, may have some where unstandable for a 2-tile high agent"
@@ -182,13 +170,19 @@ class Minecraft3DholeymazeProblem(HoleyProblem3D, Minecraft3DmazeProblem):
         #     # print("path coords: ", self.path_coords)
 
         return {
-            "regions": calc_num_regions(map, map_locations, ["AIR"]),
+            "regions": calc_num_regions(map, map_locations, air),
             "path-length": self.path_length,
             "connected-path-length": self.connected_path_length,
             # "path-coords": self.path_coords,
             "n_jump": self.n_jump,
         }
 
+    def get_door_stats(self, map, hole_pairs):
+        map = get_int_map(map, self.get_tile_types())
+        entrances, exits = (np.array([pair[i][0] for pair in hole_pairs]) for i in range(2))
+        lengths, n_jumps = get_door_paths(get_passable_mask(map, self.get_tile_ints(self._passable)), entrances, exits)
+        return {"connected-path-length": lengths, "n_jump": n_jumps}
+
     def process_observation(self, observation):
         return super().process_observation(observation, self.connected_path_coords)
 
@@ -17,6 +17,7 @@ from control_pcgrl.envs.probs.problem import Problem, Problem3D
 from control_pcgrl.envs.helper_3D import (
     get_floor_dist,
     get_path_coords,
+    get_int_map,
     get_range_reward,
     get_tile_locations,
     calc_num_regions,
@@ -26,6 +27,7 @@ from control_pcgrl.envs.helper_3D import (
     remove_stacked_path_tiles,
     run_dijkstra,
 )
+from control_pcgrl.envs.probs.minecraft import mc_render
 from control_pcgrl.envs.probs.minecraft.mc_render import (
     erase_3D_path,
     spawn_3D_maze,
@@ -42,6 +44,8 @@ from control_pcgrl.envs.probs.minecraft.mc_render import (
 
 
 class Minecraft3Drain(Problem3D):
+    int_map_stats = True
+
     """
     The constructor is responsible of initializing all the game parameters
     """
@@ -182,7 +186,9 @@ class Minecraft3Drain(Problem3D):
     """
 
     def get_stats(self, map):
-        map_locations = get_tile_locations(map, self.get_tile_types())
+        map = get_int_map(map, self.get_tile_types())
+        air = self.get_tile_ints(["AIR"])
+        map_locations = get_tile_locations(map, range(len(self.get_tile_types())))
 
         # for erasing the path of the previous iteration in Minecraft
         # new path coords are updated in the render function
@@ -190,13 +196,13 @@ class Minecraft3Drain(Problem3D):
         # do not fix the positions of entrance and exit (calculating the longest path among 2 random positions)
         # start_time = timer()
         self.path_length, self.ordered_path, self.n_jump = calc_longest_path(
-            map, map_locations, ["AIR"], get_path=self.render_path
+            map, map_locations, air, get_path=self.render_path
         )
         self.path_coords = remove_stacked_path_tiles(self.ordered_path)
 
         # print(f"minecraft path-finding time: {timer() - start_time}")
         if self.render:
-            path_is_valid = debug_path(self.path_coords, map, ["AIR"])
+            path_is_valid = debug_path(self.path_coords, map, air)
             if not path_is_valid:
                 raise ValueError(
                     "The path is not valid, may have some where unstandable for a 2-tile high agent"
@@ -219,8 +225,10 @@ class Minecraft3Drain(Problem3D):
         #     # print("path coords: ", self.path_coords)
 
         return {
-            "floating_blocks": get_floor_dist(map, ["DIRT"], ["DIRT"]),
-            "regions": calc_num_regions(map, map_locations, ["AIR"]),
+            "floating_blocks": get_floor_dist(
+                map, self.get_tile_ints(["DIRT"]), self.get_tile_ints(["DIRT"])
+            ),
+            "regions": calc_num_regions(map, map_locations, air),
             "path-length": self.path_length,
             # "path-coords": self.path_coords,
             "n_jump": self.n_jump,
@@ -284,6 +292,9 @@ class Minecraft3Drain(Problem3D):
     def render_path_change(
         self, map, path_coords, old_path_coords, ordered_path=None, **kwargs
     ):
+        if mc_render.BLOCK_STREAM is not None:
+            mc_render.stream_3D_path_change(map, path_coords, old_path_coords, **kwargs)
+            return
         path_to_erase = set([tuple(coords) for coords in old_path_coords])
         path_to_render = set(
             [
@@ -9,6 +9,9 @@ def patch_grpc_evocraft_imports():
     fp = os.path.join(gym_pcgrl_dir, "minecraft/minecraft_pb2_grpc.py")
     with open(fp, "r") as f:
         contents = f.read()
+    if "from src.main.proto" not in contents:
+        # Already patched (rewriting it anyway, on every import, races between processes importing it at once).
+        return
     contents = contents.replace(
         "from src.main.proto", "from control_pcgrl.envs.probs.minecraft"
     )
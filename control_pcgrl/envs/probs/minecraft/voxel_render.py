@@ -0,0 +1,175 @@
+"""
+A headless, CPU-only isometric renderer for 3D levels.
+
+Unlike `mc_render.py` (which needs a running Minecraft server) and `gl_render.py` (which needs an OpenGL window), this
+only uses numpy, so that frames can be recorded on headless machines.
+
+Each non-air voxel is drawn as an isometric cube, whose top and two front faces are shaded differently. All voxels (and
+all pixels of their cubes) are drawn at once: each pixel of the frame shows the nearest voxel (i.e. the one with the
+greatest `x + y + z`) that covers it, so no per-voxel drawing loop is needed.
+
+Maps are indexed as `map[z][y][x]`, with `z` vertical (as in `mc_render.py`), and path coordinates are `(x, y, z)`.
+"""
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+
+# Colors of tiles (by name), of the path, and of holes in the border of holey maps.
+TILE_COLORS = {
+    "DIRT": (139, 98, 66),
+    "CHEST": (196, 146, 56),
+    "SKULL": (210, 210, 200),
+    "PUMPKIN": (232, 128, 32),
+}
+PATH_COLOR = (170, 110, 200)
+ENTRANCE_COLOR = (40, 60, 210)
+# Colors of tile types we have no color for.
+DEFAULT_COLORS = [
+    (31, 119, 180),
+    (44, 160, 44),
+    (214, 39, 40),
+    (148, 103, 189),
+    (140, 86, 75),
+    (227, 119, 194),
+]
+
+# Brightness of the top, left (+y) and right (+x) faces of each cube, and of the edges of faces.
+FACE_SHADES = np.array([1.0, 0.8, 0.62])
+EDGE_SHADE = 0.8
+
+AIR = "AIR"
+
+
+def _cube_sprite(a: int):
+    """The pixels of an isometric cube of width `2 * a`, as the face (0: top, 1: left, 2: right, -1: none) covering each
+    pixel, and the brightness of each pixel."""
+    h = a // 2
+    v, u = np.mgrid[0 : 2 * a, 0 : 2 * a] + 0.5
+    top = np.abs(u - a) / a + np.abs(v - h) / h <= 1
+    left = (u < a) & (v >= h + u / 2) & (v < h + a + u / 2)
+    right = (u >= a) & (v >= 2 * h - (u - a) / 2) & (v < 2 * h + a - (u - a) / 2)
+    faces = np.full(u.shape, -1)
+    faces[right] = 2
+    faces[left] = 1
+    faces[top] = 0
+
+    # Darken pixels on the edges of faces, so that neighboring cubes of the same color can be told apart.
+    padded = np.pad(faces, 1, constant_values=-1)
+    edge = np.zeros(faces.shape, dtype=bool)
+    for dv, du in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        edge |= padded[1 + dv : 1 + dv + faces.shape[0], 1 + du : 1 + du + faces.shape[1]] != faces
+    shades = np.where(faces >= 0, FACE_SHADES[faces], 0) * np.where(edge, EDGE_SHADE, 1.0)
+
+    return faces, shades
+
+
+class VoxelRenderer:
+    """Render 3D int maps as RGB frames.
+
+    Args:
+        tile_types: Names of the tile types, indexed by the ints in the map. "AIR" tiles are not drawn.
+        voxel_size: Half the width, in pixels, of each rendered cube. Rounded up to an even number.
+        tile_colors: Colors of tile types, by name (defaults to `TILE_COLORS`).
+        background: Color of the background.
+    """
+
+    def __init__(
+        self,
+        tile_types: Sequence[str],
+        voxel_size: int = 8,
+        tile_colors: Optional[Dict[str, tuple]] = None,
+        background: tuple = (255, 255, 255),
+    ):
+        tile_colors = TILE_COLORS if tile_colors is None else tile_colors
+        self.a = voxel_size + voxel_size % 2
+        self.tile_types = list(tile_types)
+        self.air = np.array([t == AIR for t in self.tile_types])
+        self.background = np.array(background, dtype=np.uint8)
+
+        # Colors of map tiles, then of the path, then of entrances (one past the tile types).
+        colors = []
+        for i, t in enumerate(self.tile_types):
+            colors.append(tile_colors.get(t, DEFAULT_COLORS[i % len(DEFAULT_COLORS)]))
+        colors += [PATH_COLOR, ENTRANCE_COLOR]
+        self.path_idx, self.entrance_idx = len(self.tile_types), len(self.tile_types) + 1
+        self.colors = np.array(colors, dtype=np.float32)
+
+        faces, shades = _cube_sprite(self.a)
+        sprite_v, sprite_u = np.nonzero(faces >= 0)
+        self._sprite_v, self._sprite_u = sprite_v, sprite_u
+        self._sprite_shades = shades[sprite_v, sprite_u].astype(np.float32)
+
+        # Geometry of the frame, which depends on the shape of the map (see `_set_shape`).
+        self._shape = None
+
+    def _set_shape(self, shape):
+        """Compute the position of each voxel's cube in the frame, for maps of this shape."""
+        self._shape = shape
+        a, h = self.a, self.a // 2
+        n_z, n_y, n_x = shape
+        self.height = (n_x + n_y) * h + n_z * a
+        self.width = (n_x + n_y) * a
+        z, y, x = np.indices(shape).reshape(3, -1)
+        # Top-left corners of cubes in the frame.
+        v0 = (x + y) * h + (n_z - 1 - z) * a
+        u0 = (x - y + n_y - 1) * a
+        self._voxel_pixels = v0 * self.width + u0
+        self._sprite_pixels = self._sprite_v * self.width + self._sprite_u
+        # Voxels nearer to the viewer have a greater depth.
+        self._depths = x + y + z
+
+    def render(
+        self,
+        int_map: np.ndarray,
+        path_coords: Optional[Iterable] = None,
+        bordered: bool = False,
+    ) -> np.ndarray:
+        """Render a map (and optionally a path through it) as an RGB frame of shape `(height, width, 3)`.
+
+        Args:
+            int_map: The map, as tile ints indexed `[z][y][x]`.
+            path_coords: `(x, y, z)` coordinates of the path, drawn in place of the tiles at these coordinates.
+            bordered: Whether the map includes the border (as in holey problems). If so, the border is not drawn
+                (so as not to hide the level), except for the holes in it.
+        """
+        int_map = np.asarray(int_map)
+        if int_map.shape != self._shape:
+            self._set_shape(int_map.shape)
+        tiles = int_map.astype(np.intp)
+        solid = ~self.air[tiles]
+
+        if bordered:
+            border = np.ones(int_map.shape, dtype=bool)
+            border[1:-1, 1:-1, 1:-1] = False
+            tiles = np.where(border & ~solid, self.entrance_idx, tiles)
+            solid ^= border
+        if path_coords is not None:
+            path_coords = np.array(list(path_coords), dtype=np.intp).reshape(-1, 3)
+            if len(path_coords) > 0:
+                x, y, z = path_coords.T
+                tiles[z, y, x] = self.path_idx
+                solid[z, y, x] = True
+
+        # Skip voxels that are hidden behind their three nearer neighbors.
+        padded = np.pad(solid, ((0, 1), (0, 1), (0, 1)))
+        hidden = padded[1:, :-1, :-1] & padded[:-1, 1:, :-1] & padded[:-1, :-1, 1:]
+        voxels = np.flatnonzero(solid & ~hidden)
+        voxels = voxels[np.argsort(self._depths[voxels], kind="stable")]
+
+        # Every pixel of every cube, keyed by the depth order of its voxel, so that the nearest cube covering each pixel
+        # has the greatest key.
+        n_sprite = len(self._sprite_pixels)
+        pixels = (self._voxel_pixels[voxels, None] + self._sprite_pixels[None, :]).ravel()
+        keys = np.arange(len(voxels) * n_sprite)
+        top_keys = np.full(self.height * self.width, -1, dtype=np.int64)
+        np.maximum.at(top_keys, pixels, keys)
+
+        frame = np.empty((self.height * self.width, 3), dtype=np.uint8)
+        frame[:] = self.background
+        drawn = np.flatnonzero(top_keys >= 0)
+        voxel_rank, sprite_idx = np.divmod(top_keys[drawn], n_sprite)
+        colors = self.colors[tiles.ravel()[voxels[voxel_rank]]]
+        frame[drawn] = (colors * self._sprite_shades[sprite_idx, None]).astype(np.uint8)
+
+        return frame.reshape(self.height, self.width, 3)
@@ -24,6 +24,9 @@ map in prob are list of strings
 class Problem(ABC):
     _tile_types = []
     eval_maps = []
+    # Whether `get_stats` takes maps of tile ints (as held by the representation) instead of tile names, in which case
+    # the env passes it the representation's map as is.
+    int_map_stats = False
     """
     Constructor for the problem that initialize all the basic parameters. Abstract Base Class (ABS) that cannot be
     directly instantiated.
@@ -73,6 +76,11 @@ class Problem(ABC):
     def get_tile_int(self, tile):
         return self._tile_int_dict[tile]
 
+    def get_tile_ints(self, tiles):
+        """The ints of the given tile names, e.g. to compute stats on int maps."""
+        tile_types = self.get_tile_types()
+        return [tile_types.index(t) for t in tiles]
+
     def is_continuous(self):
         return False
 
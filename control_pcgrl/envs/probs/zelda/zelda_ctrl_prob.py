@@ -7,9 +7,10 @@ from control_pcgrl.envs.helper import (
     calc_num_regions,
     get_range_reward,
     get_tile_locations,
-    run_dijkstra,
+    get_distances,
     get_path_coords,
 )
+from control_pcgrl.envs.regions import Regions, get_passable_mask
 from control_pcgrl.envs.probs.zelda.zelda_prob import ZeldaProblem
 
 
@@ -92,6 +93,9 @@ class ZeldaCtrlProblem(ZeldaProblem):
     def get_stats(self, map, lenient_paths=False):
         self.path = []
         map_locations = get_tile_locations(map, self.get_tile_types())
+        # The same tiles are passable on the way to the enemies and the key, and the door too on the way from the key
+        # to the door.
+        passable = get_passable_mask(map, ["empty", "player", "key", "bat", "spider", "scorpion"])
         map_stats = {
             "player": calc_certain_tile(map_locations, ["player"]),
             "key": calc_certain_tile(map_locations, ["key"]),
@@ -101,6 +105,7 @@ class ZeldaCtrlProblem(ZeldaProblem):
                 map,
                 map_locations,
                 ["empty", "player", "key", "bat", "spider", "scorpion"],
+                regions=Regions(passable),
             ),
             "nearest-enemy": 0,
             "path-length": 0,
@@ -109,6 +114,8 @@ class ZeldaCtrlProblem(ZeldaProblem):
         if map_stats["player"] == 1:  # and map_stats["regions"] == 1:
             # NOTE: super whack, just taking random player. The RL agent may learn some weird bias about this but the alternatives seem worse.
             p_x, p_y = map_locations["player"][0]
+            # One search from the player, for the distances to the enemies and to the key.
+            dijkstra_k = get_distances(passable, p_x, p_y)
             enemies = []
             enemies.extend(map_locations["spider"])
             enemies.extend(map_locations["bat"])
@@ -117,17 +124,11 @@ class ZeldaCtrlProblem(ZeldaProblem):
             UPPER_DIST = self._width * self._height * 100
 
             if len(enemies) > 0:
-                dijkstra, _ = run_dijkstra(
-                    p_x,
-                    p_y,
-                    map,
-                    ["empty", "player", "key", "bat", "spider", "scorpion"],
-                )
                 min_dist = UPPER_DIST
 
                 for e_x, e_y in enemies:
-                    if dijkstra[e_y][e_x] > 0 and dijkstra[e_y][e_x] < min_dist:
-                        min_dist = dijkstra[e_y][e_x]
+                    if dijkstra_k[e_y][e_x] > 0 and dijkstra_k[e_y][e_x] < min_dist:
+                        min_dist = dijkstra_k[e_y][e_x]
 
                 if min_dist == UPPER_DIST:
                     # And this
@@ -137,19 +138,8 @@ class ZeldaCtrlProblem(ZeldaProblem):
             if map_stats["key"] == 1 and map_stats["door"] == 1:
                 k_x, k_y = map_locations["key"][0]
                 d_x, d_y = map_locations["door"][0]
-                dijkstra_k, _ = run_dijkstra(
-                    p_x,
-                    p_y,
-                    map,
-                    ["empty", "key", "player", "bat", "spider", "scorpion"],
-                )
                 map_stats["path-length"] += dijkstra_k[k_y][k_x]
-                dijkstra_d, _ = run_dijkstra(
-                    k_x,
-                    k_y,
-                    map,
-                    ["empty", "player", "key", "door", "bat", "spider", "scorpion"],
-                )
+                dijkstra_d = get_distances(passable | get_passable_mask(map, ["door"]), k_x, k_y)
                 map_stats["path-length"] += dijkstra_d[d_y][d_x]
 
                 if self.render_path:  # and map_stats["regions"] == 1:
@@ -10,9 +10,10 @@ from control_pcgrl.envs.helper import (
     get_tile_locations,
     calc_num_regions,
     calc_certain_tile,
-    run_dijkstra,
+    get_distances,
     get_path_coords,
 )
+from control_pcgrl.envs.regions import Regions, get_passable_mask
 
 """
 Generate a fully connected GVGAI zelda level where the player can reach key then the door.
@@ -110,6 +111,10 @@ class ZeldaProblem(Problem):
     def get_stats(self, map, lenient_paths=False):
         self.path = []
         map_locations = get_tile_locations(map, self.get_tile_types())
+        # NOTE: for evo-pcgrl, we don't want these super-high nearest-enemy scores from when the player is cornered
+        # behind a key (it distorts our map of elites), so we make key passable. The same tiles are passable on the
+        # way to the key, and the door too on the way from the key to the door.
+        passable = get_passable_mask(map, ["empty", "player", "key", "bat", "spider", "scorpion"])
         map_stats = {
             "player": calc_certain_tile(map_locations, ["player"]),
             "key": calc_certain_tile(map_locations, ["key"]),
@@ -119,57 +124,40 @@ class ZeldaProblem(Problem):
                 map,
                 map_locations,
                 ["empty", "player", "key", "bat", "spider", "scorpion"],
+                regions=Regions(passable),
             ),
             "nearest-enemy": 0,
             "path-length": 0,
         }
         if map_stats["player"] == 1 and map_stats["regions"] == 1:
             p_x, p_y = map_locations["player"][0]
+            # One search from the player, for the distances to the enemies and to the key.
+            dijkstra_p = get_distances(passable, p_x, p_y)
             enemies = []
             enemies.extend(map_locations["spider"])
             enemies.extend(map_locations["bat"])
             enemies.extend(map_locations["scorpion"])
             if len(enemies) > 0:
-                # NOTE: for evo-pcgrl, we don't want these super-high nearest-enemy scores from when
-                # the player is cornered behind a key (it distorts our map of elites), so we make key passable
-                dijkstra, _ = run_dijkstra(
-                    p_x,
-                    p_y,
-                    map,
-                    ["key", "empty", "player", "bat", "spider", "scorpion"],
-                )
-                #               dijkstra,_ = run_dijkstra(p_x, p_y, map, ["empty", "player", "bat", "spider", "scorpion"])
                 min_dist = self._width * self._height
                 for e_x, e_y in enemies:
-                    if dijkstra[e_y][e_x] > 0 and dijkstra[e_y][e_x] < min_dist:
-                        min_dist = dijkstra[e_y][e_x]
+                    if dijkstra_p[e_y][e_x] > 0 and dijkstra_p[e_y][e_x] < min_dist:
+                        min_dist = dijkstra_p[e_y][e_x]
                 map_stats["nearest-enemy"] = min_dist
             if map_stats["key"] == 1 and map_stats["door"] == 1:
                 k_x, k_y = map_locations["key"][0]
                 d_x, d_y = map_locations["door"][0]
 
                 # start point is people
-                dijkstra_k, _ = run_dijkstra(
-                    p_x,
-                    p_y,
-                    map,
-                    ["empty", "key", "player", "bat", "spider", "scorpion"],
-                )
-                map_stats["path-length"] += dijkstra_k[k_y][k_x]
+                map_stats["path-length"] += dijkstra_p[k_y][k_x]
 
                 # start point is key
-                dijkstra_d, _ = run_dijkstra(
-                    k_x,
-                    k_y,
-                    map,
-                    ["empty", "player", "key", "door", "bat", "spider", "scorpion"],
-                )
+                dijkstra_d = get_distances(passable | get_passable_mask(map, ["door"]), k_x, k_y)
                 map_stats["path-length"] += dijkstra_d[d_y][d_x]
                 if self.render_path:
                     # end point is key
                     self.path = np.hstack(
                         (
-                            get_path_coords(dijkstra_k, init_coords=(k_y, k_x)),
+                            get_path_coords(dijkstra_p, init_coords=(k_y, k_x)),
                             get_path_coords(dijkstra_d, init_coords=(d_y, d_x)),
                         )
                     )
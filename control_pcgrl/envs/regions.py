@@ -0,0 +1,57 @@
+"""
+Connected regions of passable tiles, in 2D and 3D maps.
+
+Regions are labeled in a single two-pass (union-find) sweep over the map, with face-adjacency (i.e. 4-connectivity in
+2D, 6-connectivity in 3D), rather than by flood-filling from each passable tile in turn. The labels can then be shared
+between stats, e.g. so that `calc_longest_path` searches each region once, without rediscovering it.
+"""
+from typing import Iterable
+
+import numpy as np
+from scipy import ndimage
+
+
+def get_passable_mask(map, passable_values: Iterable) -> np.ndarray:
+    """A boolean mask of the passable tiles of a map (an int array, or nested lists of tile names)."""
+    return np.isin(np.asarray(map), list(passable_values))
+
+
+class Regions:
+    """The connected regions of passable tiles in a map.
+
+    Attributes:
+        labels: An int array of the map's shape, with the (1-indexed) region of each passable tile, and 0 elsewhere.
+        n_regions: The number of regions.
+    """
+
+    def __init__(self, passable: np.ndarray):
+        structure = ndimage.generate_binary_structure(passable.ndim, 1)
+        self.labels, self.n_regions = ndimage.label(passable, structure=structure)
+        self._sizes = None
+
+    @classmethod
+    def from_map(cls, map, passable_values: Iterable):
+        return cls(get_passable_mask(map, passable_values))
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """The number of tiles in each region (region `i` at index `i - 1`)."""
+        if self._sizes is None:
+            self._sizes = np.bincount(self.labels.ravel(), minlength=self.n_regions + 1)[1:]
+        return self._sizes
+
+    def largest_region_mask(self) -> np.ndarray:
+        """A boolean mask of the largest region (the first of these, if there are several). Empty if there are none."""
+        if self.n_regions == 0:
+            return np.zeros(self.labels.shape, dtype=bool)
+        return self.labels == np.argmax(self.sizes) + 1
+
+    def first_tiles(self, coords) -> list:
+        """The index of the first of these coordinates (`(x, y)` or `(x, y, z)`) in each region, in order.
+
+        Passable coordinates in the same region as an earlier one are skipped, as are impassable ones.
+        """
+        coords = np.asarray(coords, dtype=np.intp).reshape(-1, self.labels.ndim)
+        labels = self.labels[tuple(coords[:, ::-1].T)]
+        regions, idxs = np.unique(labels, return_index=True)
+        return sorted(idxs[regions > 0].tolist())
@@ -0,0 +1,34 @@
+"""
+A registry of classes by name, each of which is only imported (along with its module's dependencies) when first looked
+up. This lets us list, and register with gymnasium, every problem and representation without importing any of them.
+"""
+from collections.abc import Mapping
+import importlib
+from typing import Dict
+
+
+class LazyRegistry(Mapping):
+    """A mapping of names to classes, given by their import paths, as `"package.module:ClassName"`.
+
+    Listing names, or checking whether a name is registered, imports nothing. Looking up a name imports its class's
+    module, once. (As with any mapping, `values()` and `items()` look up, and so import, every class.)
+    """
+
+    def __init__(self, paths: Dict[str, str]):
+        self._paths = dict(paths)
+        self._classes = {}
+
+    def __getitem__(self, name: str):
+        if name not in self._classes:
+            module_name, cls_name = self._paths[name].split(":")
+            self._classes[name] = getattr(importlib.import_module(module_name), cls_name)
+        return self._classes[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
@@ -1,23 +1,19 @@
-from control_pcgrl.envs.reps.narrow_rep import NarrowRepresentation
-from control_pcgrl.envs.reps.narrow_cast_rep import NarrowCastRepresentation
-from control_pcgrl.envs.reps.narrow_multi_rep import NarrowMultiRepresentation
-from control_pcgrl.envs.reps.turtle_rep import TurtleRepresentation
-from control_pcgrl.envs.reps.turtle_cast_rep import TurtleCastRepresentation
-from control_pcgrl.envs.reps.wide_rep import WideRepresentation
-from control_pcgrl.envs.reps.ca_rep import CARepresentation
+from control_pcgrl.envs.registry import LazyRegistry
 
 
-# all the representations should be defined here with its corresponding class
-REPRESENTATIONS = {
-    "narrow": NarrowRepresentation,
-    "narrowcast": NarrowCastRepresentation,
-    "narrowmulti": NarrowMultiRepresentation,
-    # "narrow3D": Narrow3DRepresentation,
-    "turtle": TurtleRepresentation,
-    "turtlecast": TurtleCastRepresentation,
-    # "turtle3D": Turtle3DRepresentation,
-    "wide": WideRepresentation,
-    # "wide3D": Wide3DRepresentation,
-    "cellular": CARepresentation,
-    # "cellular3D": CARepresentation,
-}
+# all the representations should be defined here with the import path of its corresponding class
+REPRESENTATIONS = LazyRegistry(
+    {
+        "narrow": "control_pcgrl.envs.reps.narrow_rep:NarrowRepresentation",
+        "narrowcast": "control_pcgrl.envs.reps.narrow_cast_rep:NarrowCastRepresentation",
+        "narrowmulti": "control_pcgrl.envs.reps.narrow_multi_rep:NarrowMultiRepresentation",
+        # "narrow3D": Narrow3DRepresentation,
+        "turtle": "control_pcgrl.envs.reps.turtle_rep:TurtleRepresentation",
+        "turtlecast": "control_pcgrl.envs.reps.turtle_cast_rep:TurtleCastRepresentation",
+        # "turtle3D": Turtle3DRepresentation,
+        "wide": "control_pcgrl.envs.reps.wide_rep:WideRepresentation",
+        # "wide3D": Wide3DRepresentation,
+        "cellular": "control_pcgrl.envs.reps.ca_rep:CARepresentation",
+        # "cellular3D": CARepresentation,
+    }
+)
@@ -40,15 +40,23 @@ class CARepresentation(Representation):
 
     def update(self, action: np.ndarray, continuous=False):
         next_map = action.argmax(axis=0) if not continuous else action
-        if self._map is None:
-            # This is the case when using an actual latent seed (so we do only one pass through the generator and have
-            # no need to set an initial map in the environment).
-            change = True
+        if self._map is not None and next_map.shape != self._map.shape:
+            print(next_map.shape, self._map.shape)
+            raise Exception
+
+        if self._map is None or continuous:
+            # A `None` map is the case when using an actual latent seed (so we do only one pass through the generator and
+            # have no need to set an initial map in the environment).
+            change = self._map is None or np.any(next_map != self._map)
+            self._map = next_map
+            self._changed_idxs = np.arange(self._map.size)
         else:
-            if next_map.shape != self._map.shape:
-                print(next_map.shape, self._map.shape)
-                raise Exception
-            change = np.any(next_map != self._map)
-        self._map = next_map
+            # Once the generator has (mostly) converged, few tiles change, so only write those.
+            self._changed_idxs = np.flatnonzero(next_map != self._map)
+            change = len(self._changed_idxs) > 0
+            if change:
+                self._map[np.unravel_index(self._changed_idxs, self._map.shape)] = (
+                    next_map.ravel()[self._changed_idxs]
+                )
         super().update(action)
         return change, [None] * len(self._map.shape)
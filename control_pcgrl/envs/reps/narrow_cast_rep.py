@@ -1,4 +1,5 @@
 from control_pcgrl.envs.reps.narrow_rep import NarrowRepresentation
+from control_pcgrl.envs.reps.representation import NO_CHANGES
 from PIL import Image
 from gymnasium import spaces
 import numpy as np
@@ -24,7 +25,7 @@ class NarrowCastRepresentation(NarrowRepresentation):
         correspond to two values. The first is the type of action and the second is the tile type
     """
 
-    def get_action_space(self, width, height, num_tiles):
+    def get_action_space(self, dims, num_tiles):
         return spaces.MultiDiscrete([3, num_tiles])
 
     """
@@ -37,27 +38,13 @@ class NarrowCastRepresentation(NarrowRepresentation):
         boolean: True if the action change the map, False if nothing changed
     """
 
-    def update(self, action):
+    def update(self, action, **kwargs):
         type, value = action
         change = 0
-        if type == 1:
-            change += [0, 1][self._map[self._y][self._x] != value]
-            self._map[self._y][self._x] = value
-        elif type == 2:
-            low_y, high_y = max(self._y - 1, 0), min(self._y + 2, self._map.shape[0])
-            low_x, high_x = max(self._x - 1, 0), min(self._x + 2, self._map.shape[1])
-            for y in range(low_y, high_y):
-                for x in range(low_x, high_x):
-                    change += [0, 1][self._map[y][x] != value]
-                    self._map[y][x] = value
-        if self._random_tile:
-            self._x = self._random.randint(self._map.shape[1])
-            self._y = self._random.randint(self._map.shape[0])
-        else:
-            self._x += 1
-            if self._x >= self._map.shape[1]:
-                self._x = 0
-                self._y += 1
-                if self._y >= self._map.shape[0]:
-                    self._y = 0
-        return change, [self._x, self._y]
+        self._changed_idxs = NO_CHANGES
+        if type > 0:
+            # The current tile, or the 3x3 patch around it.
+            change = self._fill_around(self._pos, type - 1, value)
+        self._advance_pos()
+        super(NarrowRepresentation, self).update(action)
+        return change, self._pos
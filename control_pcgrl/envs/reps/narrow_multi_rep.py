@@ -24,7 +24,7 @@ class NarrowMultiRepresentation(NarrowRepresentation):
         correspond to 9 values. The for all the tiles in a 3x3 grid
     """
 
-    def get_action_space(self, width, height, num_tiles):
+    def get_action_space(self, dims, num_tiles):
         action_space = []
         for i in range(9):
             action_space.append(num_tiles + 1)
@@ -40,30 +40,18 @@ class NarrowMultiRepresentation(NarrowRepresentation):
         boolean: True if the action change the map, False if nothing changed
     """
 
-    def update(self, action):
-        change = 0
-        low_y, high_y = max(self._y - 1, 0), min(self._y + 2, self._map.shape[0])
-        low_x, high_x = max(self._x - 1, 0), min(self._x + 2, self._map.shape[1])
-        for i in range(len(action)):
-            x, y = self._x + (i % 3) - 1, self._y + int(i / 3) - 1
-            if (
-                x >= low_x
-                and x < high_x
-                and y >= low_y
-                and y < high_y
-                and action[i] > 0
-            ):
-                change += [0, 1][self._map[y][x] != action[i] - 1]
-                self._map[y][x] = action[i] - 1
-
-        if self._random_tile:
-            self._x = self._random.randint(self._map.shape[1])
-            self._y = self._random.randint(self._map.shape[0])
-        else:
-            self._x += 1
-            if self._x >= self._map.shape[1]:
-                self._x = 0
-                self._y += 1
-                if self._y >= self._map.shape[0]:
-                    self._y = 0
-        return change, [self._x, self._y]
+    def update(self, action, **kwargs):
+        # The 3x3 patch around the current tile, without the tiles outside the map.
+        action = np.asarray(action).reshape(3, 3)
+        top_left = np.maximum(self._pos - 1, 0)
+        bottom_right = np.minimum(self._pos + 2, self._map.shape)
+        patch = tuple(slice(lo, hi) for lo, hi in zip(top_left, bottom_right))
+        action = action[tuple(slice(lo, hi) for lo, hi in zip(top_left - self._pos + 1, bottom_right - self._pos + 1))]
+
+        # (0 leaves a tile as it is.)
+        changed = (action > 0) & (self._map[patch] != action - 1)
+        self._record_patch_edit(top_left, changed)
+        self._map[patch][changed] = action[changed] - 1
+        self._advance_pos()
+        super(NarrowRepresentation, self).update(action)
+        return int(changed.sum()), self._pos
@@ -46,8 +46,8 @@ class NarrowRepresentation(EgocentricRepresentation):
         prob (dict(int,float)): the probability distribution of each tile value
     """
 
-    def reset(self, dims, prob):
-        super().reset(dims, prob)
+    def reset(self, dims, prob, next_map=None):
+        super().reset(dims, prob, next_map=next_map)
         self.n_step = 0
         if self._act_coords is None:
             self._act_coords = self.get_act_coords()
@@ -102,6 +102,13 @@ class NarrowRepresentation(EgocentricRepresentation):
         # if action > 0:
         change += [0, 1][self._map[tuple(self._pos)] != action]
         self._map[tuple(self._pos)] = action
+        self._record_edit(self._pos, change)
+        self._advance_pos()
+        super().update(action)
+        return change, self._pos
+
+    def _advance_pos(self):
+        """Move on to the next tile to be edited."""
         if self._random_tile:
             if self.n_step == len(self._act_coords):
                 np.random.shuffle(self._act_coords)
@@ -110,8 +117,6 @@ class NarrowRepresentation(EgocentricRepresentation):
             self._pos
         ]  # In case cfg.show_agents is True in single-player setting.
         self.n_step += 1
-        super().update(action)
-        return change, self._pos
 
     def update_state(self, action):  # ZJ: why do we need this?
         return self.update(action)
@@ -13,6 +13,10 @@ from control_pcgrl.envs import helper
 from control_pcgrl.envs.probs.problem import Problem
 
 
+# The (empty) array of changed tile indices reported by updates that change nothing.
+NO_CHANGES = np.empty(0, dtype=np.intp)
+
+
 """
 The base class of all the representations
 """
@@ -36,12 +40,34 @@ class Representation(ABC):
         self._wall_tile = wall_tile_index
         self._random_start: bool = True
         self.seed_val: int = None
+        # Flat indices (into `_map`) of the tiles changed by the last update.
+        self._changed_idxs: np.ndarray = NO_CHANGES
 
         self.seed()
 
     def get_pos(self):
         return self._pos
 
+    def get_changed_idxs(self):
+        """Flat indices (into the map) of the tiles changed by the last update, so that consumers of the map need only
+        touch these, or None if they are not known (e.g. if the map was replaced), in which case any tile may have
+        changed."""
+        return self._changed_idxs
+
+    def _record_edit(self, coords, change):
+        """Record the changed tiles of an update that edits (at most) the single tile at `coords`."""
+        self._changed_idxs = (
+            np.array([np.ravel_multi_index(tuple(coords), self._map.shape)])
+            if change
+            else NO_CHANGES
+        )
+
+    def _record_patch_edit(self, top_left, changed):
+        """Record the changed tiles of an update that edits a patch of the map, given the coordinates of its first
+        tile, and a mask of the tiles of the patch that changed."""
+        coords = np.argwhere(changed) + np.asarray(top_left)
+        self._changed_idxs = np.ravel_multi_index(tuple(coords.T), self._map.shape)
+
     """
     Seeding the used random variable to get the same result. If the seed is None,
     it will seed it with random start.
@@ -70,19 +96,23 @@ class Representation(ABC):
     """
 
     def reset(self, dims: tuple, prob: Problem, next_map: np.ndarray = None):
-        self._bordered_map = np.empty(tuple([i + 2 for i in dims]), dtype=int)
-        self._bordered_map.fill(self._border_tile_index)
+        # We own a single (uint8) bordered map, and `_map` is a view of its interior, so that edits to `_map` are
+        # reflected in `_bordered_map` without any copying.
+        self._bordered_map = np.full(
+            tuple([i + 2 for i in dims]), self._border_tile_index, dtype=np.uint8
+        )
+        self._map = self._bordered_map[tuple([slice(1, -1) for _ in dims])]
+        self._changed_idxs = NO_CHANGES
         if next_map is not None:
-            self._map = next_map
+            self._map[...] = next_map
             self._old_map = self._map.copy()
         elif self._random_start or self._old_map is None:
-            self._map = type(self).gen_random_map(
+            self._map[...] = type(self).gen_random_map(
                 self._random, dims, prob, self.seed_val
             )
             self._old_map = self._map.copy()
         else:
-            self._map = self._old_map.copy()
-        self._update_bordered_map()
+            self._map[...] = self._old_map
 
     """
     Adjust current representation parameter
@@ -177,10 +207,17 @@ class Representation(ABC):
         return lvl_image
 
     def _update_bordered_map(self):
-        # self._bordered_map[1:-1, 1:-1] = self._map
-        self.unwrapped._bordered_map[
-            tuple([slice(1, -1) for _ in range(len(self._map.shape))])
-        ] = self.unwrapped._map
+        """Make `_map` a view of the interior of `_bordered_map` again. This only copies anything if `_map` has been
+        replaced by another array (e.g. by the cellular representation, or when setting maps by hand), in which case
+        any tile may have changed."""
+        rep = self.unwrapped
+        if rep._map.base is not rep._bordered_map:
+            interior = tuple([slice(1, -1) for _ in range(len(rep._map.shape))])
+            rep._bordered_map[interior] = rep._map
+            rep._changed_idxs = None
+            # (Continuous maps, as produced by the cellular representation, are kept as they are.)
+            if np.issubdtype(rep._map.dtype, np.integer):
+                rep._map = rep._bordered_map[interior]
 
     @property
     def unwrapped(self):
@@ -218,6 +255,16 @@ class EgocentricRepresentation(Representation):
     def get_valid_agent_coords(self):
         return np.argwhere(np.ones(self._map_shape))
 
+    def _fill_around(self, pos, radius: int, value: int) -> int:
+        """Set the tiles within `radius` of `pos` (in each dimension, and within the map) to `value`, recording the
+        edit. Returns the number of tiles changed."""
+        top_left = np.maximum(np.asarray(pos) - radius, 0)
+        patch = tuple(slice(lo, p + radius + 1) for lo, p in zip(top_left, pos))
+        changed = self._map[patch] != value
+        self._record_patch_edit(top_left, changed)
+        self._map[patch] = value
+        return int(changed.sum())
+
     """
     Resets the current representation where it resets the parent and the current
     turtle location
@@ -229,8 +276,8 @@ class EgocentricRepresentation(Representation):
         prob (dict(int,float)): the probability distribution of each tile value
     """
 
-    def reset(self, dims, prob):
-        super().reset(dims, prob)
+    def reset(self, dims, prob, next_map=None):
+        super().reset(dims, prob, next_map=next_map)
         # TODO: Remove this?
         self._new_coords = self._pos
         self._old_coords = self._pos
@@ -26,7 +26,7 @@ class TurtleCastRepresentation(TurtleRepresentation):
         and the tile values
     """
 
-    def get_action_space(self, width, height, num_tiles):
+    def get_action_space(self, dims, num_tiles):
         return spaces.MultiDiscrete([len(self._dirs) + 2, num_tiles])
 
     """
@@ -39,46 +39,11 @@ class TurtleCastRepresentation(TurtleRepresentation):
         boolean: True if the action change the map, False if nothing changed
     """
 
-    def update(self, action):
+    def update(self, action, pos=None):
         type, value = action
-        change = 0
         if type < len(self._dirs):
-            self._x += self._dirs[type][0]
-            if self._x < 0:
-                if self._wrap:
-                    self._x += self._map.shape[1]
-                else:
-                    self._x = 0
-            if self._x >= self._map.shape[1]:
-                if self._wrap:
-                    self._x -= self._map.shape[1]
-                else:
-                    self._x = self._map.shape[1] - 1
-            self._y += self._dirs[type][1]
-            if self._y < 0:
-                if self._wrap:
-                    self._y += self._map.shape[0]
-                else:
-                    self._y = 0
-            if self._y >= self._map.shape[0]:
-                if self._wrap:
-                    self._y -= self._map.shape[0]
-                else:
-                    self._y = self._map.shape[0] - 1
-        else:
-            type = type - len(self._dirs)
-            if type == 0:
-                change = [0, 1][self._map[self._y][self._x] != value]
-                self._map[self._y][self._x] = value
-            elif type == 1:
-                low_y, high_y = max(self._y - 1, 0), min(
-                    self._y + 2, self._map.shape[0]
-                )
-                low_x, high_x = max(self._x - 1, 0), min(
-                    self._x + 2, self._map.shape[1]
-                )
-                for y in range(low_y, high_y):
-                    for x in range(low_x, high_x):
-                        change += [0, 1][self._map[y][x] != value]
-                        self._map[y][x] = value
-        return change, [self._x, self._y]
+            return super().update(type, pos=pos)
+        # The current tile, or the 3x3 patch around it.
+        change = self._fill_around(self._pos, type - len(self._dirs), value)
+        super(TurtleRepresentation, self).update(action)
+        return change, self._pos
@@ -1,5 +1,6 @@
 from pdb import set_trace as TT
 from control_pcgrl.envs.reps.representation import (
+    NO_CHANGES,
     EgocentricRepresentation,
     Representation,
 )
@@ -35,9 +36,9 @@ class TurtleRepresentation(EgocentricRepresentation):
         prob (dict(int,float)): the probability distribution of each tile value
     """
 
-    def reset(self, dims, prob):
+    def reset(self, dims, prob, next_map=None):
         self._pos = self.get_pos_at_step(dims, -1)
-        ret = super().reset(dims, prob)
+        ret = super().reset(dims, prob, next_map=next_map)
         return ret
 
         # self._x = self._random.randint(width)
@@ -97,6 +98,7 @@ class TurtleRepresentation(EgocentricRepresentation):
 
     def update_pos(self, action, pos):
         change = 0
+        self._changed_idxs = NO_CHANGES
         if action < len(self._dirs):
             for i, d in enumerate(self._dirs[action]):
                 pos[i] += d
@@ -114,6 +116,7 @@ class TurtleRepresentation(EgocentricRepresentation):
             change: bool = self._map[tuple(pos)] != action - len(self._dirs)
             change: int = int(change)
             self._map[tuple(pos)] = action - len(self._dirs)
+            self._record_edit(pos, change)
         super().update(action)
         return change, pos
 
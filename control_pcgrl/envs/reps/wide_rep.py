@@ -51,6 +51,7 @@ class WideRepresentation(Representation):
         ]  # Agent "chooses" location to act on, record this as our position.
         change = [0, 1][self._map[tuple(action[:-1])] != action[-1]]
         self._map[tuple(action[:-1])] = action[-1]
+        self._record_edit(action[:-1], change)
         super().update(action)
         return change, action[:-1]
 
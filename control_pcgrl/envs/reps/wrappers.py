@@ -282,6 +282,26 @@ class StaticTileRepresentation(RepresentationWrapper):
         # upper bound and sampling uniformly for the epiusode's static tile probability from within that bound.
         self._eval_mode = False
 
+        # How the wrapped representation edits the map, so that we can find the tiles an action would edit (and reject
+        # edits to static tiles) before the action is applied. (Subclasses of the narrow and turtle representations may
+        # edit more than the tile at the agent's position, e.g. the cast representations, so they may rewrite the map.)
+        base_rep = rep.unwrapped
+        if isinstance(rep, RepresentationWrapper) and rep.is_wrapped_by(
+            MultiActionRepresentation
+        ):
+            self._edit_mode = "patch"
+        elif type(base_rep) is TurtleRepresentation:
+            self._edit_mode = "turtle"
+        elif type(base_rep) is NarrowRepresentation:
+            self._edit_mode = "narrow"
+        elif isinstance(base_rep, WideRepresentation):
+            self._edit_mode = "wide"
+        else:
+            self._edit_mode = "map"
+
+        # Static tiles inside the border (i.e. indexed by map, rather than bordered map, coordinates).
+        self._static_mask = None
+
     # def adjust_param(self, **kwargs):
     # self.prob_static = kwargs.get('static_prob')
     # self.n_aux_tiles = kwargs.get('n_aux_tiles')
@@ -292,13 +312,9 @@ class StaticTileRepresentation(RepresentationWrapper):
         old_valid_agent_positions = self.rep.get_valid_agent_coords()
 
         # Remove coordinates that are occupied by static builds
-        valid_agent_positions = np.array(
-            [
-                ap
-                for ap in old_valid_agent_positions
-                if self.static_tiles[tuple(ap)] == 0
-            ]
-        )
+        valid_agent_positions = old_valid_agent_positions[
+            ~self._static_mask[tuple(old_valid_agent_positions.T)]
+        ]
 
         valid_agent_positions = (
             old_valid_agent_positions
@@ -376,6 +392,9 @@ class StaticTileRepresentation(RepresentationWrapper):
         # Borders are always static
         self.static_tiles[(0, -1), :] = 1
         self.static_tiles[:, (0, -1)] = 1
+        self._static_mask = self.static_tiles[
+            tuple(slice(1, -1) for _ in range(self.static_tiles.ndim))
+        ].astype(bool)
 
         # Remove any action coordinates that correspond to static tiles (unless we have aux chans, in which case
         # we'll let the agent leave messages for itself on those channels, even on static tiles.)
@@ -441,26 +460,49 @@ class StaticTileRepresentation(RepresentationWrapper):
         return lvl_image
 
     def update(self, action, pos=None):
-        old_state = self.unwrapped._bordered_map.copy()
-        change, new_pos = super().update(action, pos=copy.copy(pos))
-        new_state = self.unwrapped._bordered_map
-
-        # Undo invalid builds.
-        if change > 0:
-            self.unwrapped._bordered_map = np.where(
-                self.static_tiles < 1, new_state, old_state
+        # Only pass on `pos` if we were given it (as by multi-agent wrappers), since not all representations take it.
+        kwargs = {} if pos is None else {"pos": copy.copy(pos)}
+        base_rep = self.unwrapped
+
+        if self._edit_mode == "map":
+            # The whole map may be rewritten, so revert any edited static tiles afterward.
+            old_map = base_rep._map.copy()
+            change, new_pos = super().update(action, **kwargs)
+            base_rep._map[self._static_mask] = old_map[self._static_mask]
+            base_rep._update_bordered_map()
+            base_rep._changed_idxs = np.flatnonzero(old_map != base_rep._map)
+            change = len(base_rep._changed_idxs) > 0
+            return change, new_pos
+
+        # Otherwise, replace any edits to static tiles with the tiles already there, before applying the action, so
+        # that the map is left untouched at those coordinates (while the agent still moves as it normally would).
+        if self._edit_mode == "patch":
+            action = np.array(action).reshape(self.rep.action_size)
+            top_left = base_rep._pos - self.rep.inner_l_pads
+            patch = tuple(
+                slice(top_left[i], top_left[i] + s)
+                for i, s in enumerate(self.rep.action_size)
             )
-            self.unwrapped._map = self.unwrapped._bordered_map[
-                tuple([slice(1, -1) for _ in range(len(self.unwrapped._map.shape))])
-            ]
-
-            change = np.any(old_state != new_state)
-
-            # Prevent the agent from moving into a static tile (bug: only multiagent)
-            # if self.static_tiles[new_pos[0]+1, new_pos[1]+1] == 1:
-            #     new_pos = pos
-
-        return change, new_pos
+            static_patch = self._static_mask[patch]
+            if static_patch.any():
+                action = action.copy()
+                action[static_patch] = base_rep._map[patch][static_patch]
+        elif self._edit_mode == "narrow":
+            coords = tuple(base_rep._pos)
+            if self._static_mask[coords]:
+                action = base_rep._map[coords]
+        elif self._edit_mode == "turtle":
+            n_dirs = len(base_rep._dirs)
+            if action >= n_dirs:
+                coords = tuple(base_rep._pos if pos is None else pos)
+                if self._static_mask[coords]:
+                    action = n_dirs + base_rep._map[coords]
+        elif self._edit_mode == "wide":
+            coords = tuple(action[:-1])
+            if self._static_mask[coords]:
+                action = np.array([*coords, base_rep._map[coords]])
+
+        return super().update(action, **kwargs)
 
 
 # class RainRepresentation(RepresentationWrapper):
@@ -577,8 +619,6 @@ class MultiActionRepresentation(RepresentationWrapper):
         # unravel the action from a vector to a matrix (of size action_size)
         action = action.reshape(self.action_size)
 
-        old_state = self.unwrapped._map.copy()
-
         # replace the map at self._pos with the action TODO: is there any better way to make it dimension independent? (sam: yes. Slices!) (copilot: yes, np.take_along_axis)(zehua:is this right?) (copilot:I think so)
         _pos = (
             self.unwrapped._pos
@@ -605,13 +645,14 @@ class MultiActionRepresentation(RepresentationWrapper):
         ), f"Action patch is outside the map. Bottom right corner: {bottom_right}"
         ################################################################
 
+        self.unwrapped._record_patch_edit(top_left, self.unwrapped._map[tuple(slices)] != action)
+        change = len(self.unwrapped._changed_idxs) > 0
         self.unwrapped._map[tuple(slices)] = action
         # if self.map_dim == 2:
         #     self.unwrapped._map[top_left[0]:bottom_right[0]+1, top_left[1]:bottom_right[1]+1] = action
         # elif self.map_dim == 3:
         #     self.unwrapped._map[top_left[0]:bottom_right[0]+1, top_left[1]:bottom_right[1]+1, top_left[2]:bottom_right[2]+1] = action
 
-        new_state = self.unwrapped._map
         if self.unwrapped._random_tile:
             if self.unwrapped.n_step == len(self._act_coords):
                 np.random.shuffle(self._act_coords)
@@ -620,12 +661,6 @@ class MultiActionRepresentation(RepresentationWrapper):
         self._set_pos(self.get_pos_at_step(self.n_step))
         self.unwrapped.n_step += 1
 
-        self.unwrapped._bordered_map[
-            tuple(slice(1, -1) for _ in range(len(self.unwrapped._map.shape)))
-        ] = self.unwrapped._map
-
-        change = np.any(old_state != new_state)
-
         return change, self.unwrapped._pos
 
     def render(self, lvl_image, tile_size=16, border_size=None):
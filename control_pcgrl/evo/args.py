@@ -172,6 +172,11 @@ def get_args(load_args=None):
         default=0,
     )
     opts.add_argument("--mega", help="Use CMA-MEGA.", action="store_true")
+    opts.add_argument(
+        "--dense_archive",
+        help="With MAP-Elites (ME), store elites as dense arrays of weights rather than as qdpy individuals.",
+        action="store_true",
+    )
 
     opts.add_argument(
         "--render_profiling",
@@ -0,0 +1,250 @@
+"""A MAP-Elites grid that stores its elites as dense arrays, rather than as qdpy individuals in per-cell lists.
+
+Elites' weights, fitness and features are rows of arrays indexed by (flat) cell, so that a whole batch of offspring can
+be inserted, and parents selected, with a few array operations. The grid still exposes the parts of the qdpy `Grid`
+interface that `MEOptimizer` and `EvoPCGRL` rely on (`quality_array`, `index_grid`, `solutions`, `features`, etc.),
+building individuals on demand from a template individual.
+"""
+import copy
+from functools import reduce
+from operator import mul
+
+import numpy as np
+
+
+class _CellView:
+    """Maps a grid index to the list of its (0 or 1) elites' attributes, as qdpy's `Grid.solutions` etc. do."""
+
+    def __init__(self, grid, get):
+        self._grid = grid
+        self._get = get
+
+    def __getitem__(self, index):
+        cell = np.ravel_multi_index(index, self._grid.shape)
+        return [self._get(cell)] if self._grid.occupied[cell] else []
+
+
+def elite_insertions(cells, fitness, occupied, cell_fitness):
+    """Which of a sequence of candidates would be inserted, one after the other, into a grid with (at most) one elite
+    per cell: those that are the first to land in an empty cell, or whose fitness is strictly higher than that of every
+    elite their cell has held so far.
+
+    Take the (flat) cell and fitness of each candidate, and the grid's occupancy and elites' fitness, by cell. Return a
+    mask of the inserted candidates, and the indices of the candidates left in the grid (the last inserted in each
+    cell).
+    """
+    # Group candidates by cell, keeping them in the order they were given within each group.
+    order = np.argsort(cells, kind="stable")
+    cells, fits = cells[order], fitness[order]
+    group_start = np.r_[True, cells[1:] != cells[:-1]]
+    group_i = np.cumsum(group_start) - 1
+    # The best fitness among earlier candidates in the same cell, by taking the running maximum of the candidates'
+    # fitness ranks, offset so that no group's ranks are lower than those of the groups before it.
+    uniq_fits, ranks = np.unique(fits, return_inverse=True)
+    offset = group_i * len(uniq_fits)
+    best_so_far = uniq_fits[np.maximum.accumulate(ranks + offset) - offset]
+    best_before = np.r_[-np.inf, best_so_far[:-1]]
+    best_before[group_start] = -np.inf
+    occupied = occupied[cells]
+    best_before = np.maximum(best_before, np.where(occupied, cell_fitness[cells], -np.inf))
+    inserted = (fits > best_before) | (group_start & ~occupied)
+
+    # The last candidate inserted in each cell is the one left there.
+    ins_idxs = np.flatnonzero(inserted)
+    ins_cells = cells[ins_idxs]
+    last = ins_idxs[np.append(ins_cells[1:] != ins_cells[:-1], True)] if len(ins_idxs) else ins_idxs
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[inserted]] = True
+    return mask, order[last]
+
+
+class DenseMEGrid:
+    """A MAP-Elites grid, with (at most) one elite per cell, for single-objective evolution of individuals that can be
+    represented by a flat vector of weights (see `Individual.get_weights`).
+
+    Insertion is as in `MEGrid`: features are clipped to their domain, and a candidate replaces the elite in its cell if
+    its fitness is strictly higher. A batch of candidates is inserted as if one after the other, in order.
+    """
+
+    def __init__(self, bin_sizes, bin_bounds, **kwargs):
+        if np.all(np.array(bin_sizes) == 1):
+            raise ValueError("Dense grids keep one elite per cell, so cannot replace MEGrid's single-cell archive.")
+        self._shape = tuple(bin_sizes)
+        self.features_domain = tuple(tuple(b) for b in bin_bounds)
+        self.fitness_domain = ((-np.inf, np.inf),)
+        self._lower = np.array([b[0] for b in self.features_domain], dtype=float)
+        self._upper = np.array([b[1] for b in self.features_domain], dtype=float)
+        # As computed by qdpy, so that features are binned exactly as in `MEGrid`.
+        self._bins_size = np.array(
+            [(self._upper[i] - self._lower[i]) / float(self._shape[i]) for i in range(len(self._shape))]
+        )
+        self._nb_bins = reduce(mul, self._shape)
+
+        self.occupied = np.zeros(self._nb_bins, dtype=bool)
+        self.fitness_array = np.full(self._nb_bins, np.nan)
+        self.features_array = np.full((self._nb_bins, len(self._shape)), np.nan)
+        # Allocated on first insertion, when we know the number of weights.
+        self.weights_array = None
+        # An individual from which to build elites, when they are looked up as individuals.
+        self.template = None
+
+    def set_template(self, individual):
+        self.template = copy.deepcopy(individual)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def filled_bins(self):
+        return int(self.occupied.sum())
+
+    @property
+    def capacity(self):
+        return self._nb_bins
+
+    @property
+    def size(self):
+        return self.filled_bins
+
+    def size_str(self):
+        return "%i/%i" % (self.size, self.capacity)
+
+    def __len__(self):
+        return self.filled_bins
+
+    @property
+    def quality_array(self):
+        """The fitness of the elite in each cell (NaN if empty), of shape `shape + (1,)`, as in qdpy."""
+        return self.fitness_array.reshape(self._shape + (1,))
+
+    @property
+    def fitness_extrema(self):
+        if len(self) == 0:
+            return None
+        fits = self.fitness_array[self.occupied]
+        return ((fits.min(), fits.max()),)
+
+    def get_cells(self, features):
+        """The flat index of the cell of each row of (clipped) features."""
+        norm = np.asarray(features, dtype=float) - self._lower
+        last_bin = np.array(self._shape) - 1
+        idxs = np.where(norm == self._upper - self._lower, last_bin, (norm / self._bins_size).astype(int))
+        idxs = np.minimum(idxs, last_bin)
+        return np.ravel_multi_index(tuple(idxs.T), self._shape)
+
+    def index_grid(self, features):
+        """The grid index of some (clipped) features, as in qdpy."""
+        if len(features) != len(self._shape):
+            raise IndexError(
+                f"Length of parameter ``features`` ({len(features)}) does not corresponds to the number of dimensions "
+                f"of the grid ({len(self._shape)})."
+            )
+        cell = self.get_cells(np.array([features]))[0]
+        return tuple(int(i) for i in np.unravel_index(cell, self._shape))
+
+    def add_batch(self, weights, fitness, features):
+        """Insert a batch of candidates, given as rows of weights, fitness values and features. Return the number of
+        insertions (counting a candidate that is replaced later in the same batch)."""
+        weights = np.asarray(weights)
+        fitness = np.asarray(fitness, dtype=float).reshape(-1)
+        if np.isnan(fitness).any():
+            raise ValueError(f"Fitness is not valid: {fitness}.")
+        features = np.clip(np.asarray(features, dtype=float), self._lower, self._upper)
+        if len(fitness) == 0:
+            return 0
+        if self.weights_array is None:
+            self.weights_array = np.zeros((self._nb_bins, weights.shape[1]), dtype=weights.dtype)
+        cells = self.get_cells(features)
+        inserted, last = elite_insertions(cells, fitness, self.occupied, self.fitness_array)
+        new_cells = cells[last]
+        self.weights_array[new_cells] = weights[last]
+        self.fitness_array[new_cells] = fitness[last]
+        self.features_array[new_cells] = features[last]
+        self.occupied[new_cells] = True
+        self._on_insert(new_cells)
+
+        return int(inserted.sum())
+
+    def _on_insert(self, cells):
+        pass
+
+    def sample(self, n, extra=None):
+        """The weights of `n` elites, drawn uniformly at random (with replacement). Draw from the rows of `extra` too,
+        if given."""
+        cells = np.flatnonzero(self.occupied)
+        n_extra = 0 if extra is None else len(extra)
+        choices = np.random.randint(len(cells) + n_extra, size=n)
+        from_grid = choices < len(cells)
+        weights = np.empty((n, self.weights_array.shape[1]), dtype=self.weights_array.dtype)
+        # Only gather the chosen rows, rather than copying every elite.
+        weights[from_grid] = self.weights_array[cells[choices[from_grid]]]
+        if n_extra:
+            weights[~from_grid] = extra[choices[~from_grid] - len(cells)]
+        return weights
+
+    def update(self, iterable, ignore_exceptions=True, issue_warning=False):
+        """Insert some individuals, as in qdpy. Their fitness and features must be set."""
+        inds = list(iterable)
+        if self.template is None:
+            self.set_template(inds[0])
+        return self.add_batch(
+            np.stack([ind.get_weights() for ind in inds]),
+            [ind.fitness.values[0] for ind in inds],
+            [ind.features.values for ind in inds],
+        )
+
+    def add(self, individual):
+        """Insert an individual, as in qdpy, returning None if it was not inserted."""
+        if self.update([individual]) == 0:
+            return None
+        return self.index_grid(np.clip(individual.features.values, self._lower, self._upper))
+
+    def get_individual(self, cell):
+        """The elite in a (flat) cell, as an individual."""
+        ind = copy.deepcopy(self.template)
+        ind.set_weights(self.weights_array[cell])
+        ind.fitness.setValues([self.fitness_array[cell]])
+        ind.features.setValues(self.features_array[cell])
+        return ind
+
+    def get_features(self, cell):
+        features = copy.deepcopy(self.template.features)
+        features.setValues(self.features_array[cell])
+        return features
+
+    @property
+    def solutions(self):
+        return _CellView(self, self.get_individual)
+
+    @property
+    def features(self):
+        return _CellView(self, self.get_features)
+
+    @property
+    def items(self):
+        return list(self)
+
+    def __iter__(self):
+        return (self.get_individual(cell) for cell in np.flatnonzero(self.occupied))
+
+
+class DenseMEInitStatesArchive(DenseMEGrid):
+    """Save (some of) the initial states upon which the elites were evaluated when added to the archive, so that we can
+    reproduce their behavior at evaluation time (as `MEInitStatesArchive` does).
+    """
+
+    def __init__(self, bin_sizes, bin_bounds, n_init_states, map_dims, **kwargs):
+        super().__init__(bin_sizes, bin_bounds, **kwargs)
+        self.init_states_archive = np.empty(shape=(*bin_sizes, n_init_states, *map_dims))
+        self.door_coords_archive = np.empty(shape=(*bin_sizes, n_init_states, 2, 2, len(map_dims)))
+
+    def set_init_states(self, init_states, door_coords):
+        self.init_states = init_states
+        self.door_coords = door_coords
+
+    def _on_insert(self, cells):
+        idxs = np.unravel_index(cells, self._shape)
+        self.init_states_archive[idxs] = self.init_states
+        if self.door_coords is not None:
+            self.door_coords_archive[idxs] = self.door_coords
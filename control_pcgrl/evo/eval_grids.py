@@ -0,0 +1,191 @@
+"""Aggregate the evaluation of a trained archive's elites as they stream in from remote workers.
+
+Elites are evaluated by remote tasks (see `multi_evo`), whose results we consume as they finish (`stream_results`),
+recording their scores in heatmaps over the training archive (`EvalScoreGrids`) and writing their levels to a single
+file (`LevelWriter`), so that we hold only a bounded number of results (and no levels) in memory at any time.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import ray
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from dense_grid import elite_insertions
+
+SCORE_NAMES = ("fitness", "playability", "diversity", "reliability")
+
+
+def stream_results(launch, n_tasks, max_in_flight):
+    """Launch `n_tasks` remote tasks, keeping at most `max_in_flight` of them running (or finished but not yet
+    consumed) at a time. Yield them in batches, as they finish, as lists of `(index, result)` pairs.
+
+    `launch(i)` launches the `i`-th task, returning the reference to its result.
+    """
+    in_flight = {}
+    n_launched = 0
+    while n_launched < n_tasks or in_flight:
+        while n_launched < n_tasks and len(in_flight) < max_in_flight:
+            in_flight[launch(n_launched)] = n_launched
+            n_launched += 1
+        # Wait for one task, then take any others that have finished in the meantime.
+        ray.wait(list(in_flight), num_returns=1)
+        ready, _ = ray.wait(list(in_flight), num_returns=len(in_flight), timeout=0)
+        results = ray.get(ready)
+        yield [(in_flight.pop(ref), result) for ref, result in zip(ready, results)]
+
+
+class ScoreGrids:
+    """Heatmaps of the fitness, playability, diversity and reliability of the elites recorded in each cell."""
+
+    def __init__(self, shape):
+        for name in SCORE_NAMES:
+            setattr(self, name, np.full(shape, np.nan))
+
+    def record(self, idxs, scores):
+        """Record rows of scores (in the order of `SCORE_NAMES`) at the given grid indices, as if one after the other:
+        each cell is left with the last scores recorded there. NaN diversity or reliability (where they were not
+        computed, or None) leave the cell's previous value.
+        """
+        if len(idxs) == 0:
+            return
+        scores = np.array(scores, dtype=float)
+        cells = np.ravel_multi_index(tuple(np.asarray(idxs).T), self.fitness.shape)
+        for j, name in enumerate(SCORE_NAMES):
+            keep = np.ones(len(cells), dtype=bool) if j < 2 else ~np.isnan(scores[:, j])
+            last = _last_per_cell(cells[keep])
+            getattr(self, name).flat[cells[keep][last]] = scores[keep, j][last]
+
+
+def _last_per_cell(cells):
+    """The indices of the last occurrence of each cell."""
+    _, rev_idxs = np.unique(cells[::-1], return_index=True)
+    return len(cells) - 1 - rev_idxs
+
+
+class EvalScoreGrids:
+    """Scores of the elites of a training archive, evaluated anew, and of the elites they form in some evaluation
+    archives (with their own features and bins).
+
+    Results are recorded as if one after the other, in the order their tasks were launched: in `scores`, each cell of
+    the training archive is left with the last elite evaluated there. Each evaluation archive keeps the best elite in
+    each of its cells, and when an elite enters it, its scores are recorded in the corresponding `eval_scores`. Results
+    arriving out of order wait (as a few scalars) for those launched before them.
+    """
+
+    def __init__(self, shape, eval_shapes):
+        self.scores = ScoreGrids(shape)
+        self.eval_scores = [ScoreGrids(shape) for _ in eval_shapes]
+        self.eval_shapes = [tuple(s) for s in eval_shapes]
+        self.eval_occupied = [np.zeros(int(np.prod(s)), dtype=bool) for s in self.eval_shapes]
+        self.eval_fitness = [np.full(int(np.prod(s)), np.nan) for s in self.eval_shapes]
+        self._pending = {}
+        self.n_recorded = 0
+
+    def add(self, i, idx, eval_idxs, eval_record_idxs, batch_reward, targets_penalty, diversity_bonus,
+            variance_penalty):
+        """Add the `i`-th result: the elite's scores, its index in the training archive, and, for each evaluation
+        archive, its index in that archive and the index at which to record its scores there."""
+        # Scores that were not computed (None) become NaN.
+        scores = [batch_reward, targets_penalty, diversity_bonus, variance_penalty]
+        self._pending[i] = (idx, eval_idxs, eval_record_idxs, scores)
+        batch = []
+        while self.n_recorded in self._pending:
+            batch.append(self._pending.pop(self.n_recorded))
+            self.n_recorded += 1
+        if batch:
+            self._record(batch)
+
+    @property
+    def n_pending(self):
+        return len(self._pending)
+
+    def _record(self, batch):
+        idxs, eval_idxs, eval_record_idxs, scores = zip(*batch)
+        scores = np.array(scores, dtype=float)
+        self.scores.record(idxs, scores)
+        for j, shape in enumerate(self.eval_shapes):
+            cells = np.ravel_multi_index(tuple(np.array([e[j] for e in eval_idxs]).T), shape)
+            inserted, last = elite_insertions(cells, scores[:, 0], self.eval_occupied[j], self.eval_fitness[j])
+            self.eval_fitness[j][cells[last]] = scores[last, 0]
+            self.eval_occupied[j][cells[last]] = True
+            record_idxs = np.array([r[j] for r in eval_record_idxs])
+            self.eval_scores[j].record(record_idxs[inserted], scores[inserted])
+
+    def eval_filled_bins(self, j):
+        return int(self.eval_occupied[j].sum())
+
+    def eval_qd_score(self, j, max_loss):
+        """The QD score of an evaluation archive, as `get_qd_score` computes it."""
+        return np.nansum(self.eval_fitness[j] + max_loss)
+
+
+class LevelWriter:
+    """Write levels (as returned by `simulate`) to a single parquet file, one row group at a time, or, without
+    `pyarrow`, to a CSV file."""
+
+    def __init__(self, path_stem, rows_per_group=10000):
+        self.path = path_stem + (".parquet" if pq is not None else ".csv")
+        self.rows_per_group = rows_per_group
+        self._dfs = []
+        self._n_rows = 0
+        self._writer = None
+        self._csv_header = True
+
+    def write(self, level_json):
+        df = pd.DataFrame.from_dict(level_json)
+        self._dfs.append(df)
+        self._n_rows += len(df)
+        if self._n_rows >= self.rows_per_group:
+            self._flush()
+
+    def _flush(self):
+        if not self._dfs:
+            return
+        df = pd.concat(self._dfs, ignore_index=True)
+        self._dfs, self._n_rows = [], 0
+        if pq is None:
+            df.to_csv(self.path, mode="w" if self._csv_header else "a", header=self._csv_header, index=False)
+            self._csv_header = False
+            return
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_levels(path_stem):
+    """Read the levels written by a `LevelWriter`, with each level as an array."""
+    if os.path.exists(path_stem + ".parquet"):
+        df = pd.read_parquet(path_stem + ".parquet")
+    else:
+        df = pd.read_csv(path_stem + ".csv", header=0, skipinitialspace=True)
+    df["level"] = [_level_array(level) for level in df["level"]]
+    return df
+
+
+def _level_array(level):
+    if isinstance(level, str):
+        return np.array(json.loads(level))
+    if isinstance(level, np.ndarray) and level.dtype == object:
+        # Nested lists, as read from parquet.
+        return np.stack([_level_array(row) for row in level])
+    return np.asarray(level)
+
@@ -21,14 +21,12 @@ import scipy
 from skimage import measure
 import torch as th
 from tqdm import tqdm
-from qdpy.phenotype import Fitness, Features
 from ribs.archives import GridArchive
 from ribs.emitters import (
     # GradientImprovementEmitter,
     ImprovementEmitter,
     OptimizingEmitter,
 )
-from ribs.archives._add_status import AddStatus
 from ribs.optimizers import Optimizer
 from ribs.visualize import grid_archive_heatmap
 from torch import nn
@@ -47,6 +45,8 @@ from archives import (
     MEInitStatesArchive,
     FlexArchive,
 )
+from dense_grid import DenseMEGrid, DenseMEInitStatesArchive
+from eval_grids import EvalScoreGrids, LevelWriter, read_levels, stream_results
 from control_pcgrl.configs.config import Config, MultiagentConfig, TaskConfig
 from models import (
     Individual,
@@ -62,6 +62,7 @@ from models import (
     GenSin2CPPN2,
     Sin2CPPN,
     CPPN,
+    ConvCPPN,
     DirectEncoding,
 )
 from optimizer import MEOptimizer
@@ -159,21 +160,15 @@ def save_grid(csv_name="levels", d=4):
     if CMAES:
         # TODO: implement me
         return
-    # save grid using csv file
-    # get path to CSV
-    levels_path = os.path.join(SAVE_PATH, csv_name + ".csv")
+    # save grid using the levels saved at evaluation
     # get env name
     env_name = "{}-{}-v0".format(PROBLEM, REPRESENTATION)
     # create env
     env = gym.make(env_name)
     env = ControlWrapper(env, problem={"weights": {}})
     env.reset()
-    map_width = env.unwrapped._prob._width
-    map_height = env.unwrapped._prob._height
-    if ENV3D:
-        map_length = env.unwrapped._prob._length
 
-    df = pd.read_csv(levels_path, header=0, skipinitialspace=True)
+    df = read_levels(os.path.join(SAVE_PATH, csv_name))
     #   .rename(
     #       index=str,
     #       header=0,
@@ -220,18 +215,7 @@ def save_grid(csv_name="levels", d=4):
 
         for col_num in range(len(row)):
             axs[row_num, col_num].set_axis_off()
-            if CONTINUOUS:
-                level = np.zeros((3, map_width, map_height), dtype=int)
-            if ENV3D:
-                level = np.zeros((map_length, map_width, map_height), dtype=int)
-            else:
-                level = np.zeros((map_height, map_width), dtype=int)
-
-            for i, l_rows in enumerate(grid_models[col_num].split("], [")):
-                for j, l_col in enumerate(l_rows.split(",")):
-                    level[i, j] = int(
-                        l_col.replace("[", "").replace("]", "").replace(" ", "")
-                    )
+            level = grid_models[col_num].astype(int)
 
             # Set map
             env.unwrapped._rep.unwrapped._x = env.unwrapped._rep.unwrapped._y = 0
@@ -842,6 +826,7 @@ def multi_evo(
     door_coords_archive=None,
     index=None,
     door_coords=None,
+    first_outputs=None,
 ):
     if init_states is None:
         init_states, door_coords = get_init_states(
@@ -863,10 +848,30 @@ def multi_evo(
         player_1=player_1,
         player_2=player_2,
         door_coords=door_coords,
+        first_outputs=first_outputs,
     )
     return result
 
 
+def get_population_outputs(model, weights, init_states):
+    """The outputs of a population of generators of `model`'s architecture, with the given weights, on each initial
+    state (as observed on the first step of `simulate`), in an array of shape (n_models, n_init_states, n_actions, ...).
+
+    These are computed in one batch per initial state, if the architecture allows it (see
+    `ConvCPPN.forward_population`). Otherwise, returns None.
+    """
+    if ALGO == "ME" or not isinstance(model, ConvCPPN) or "CPPN" not in MODEL:
+        return None
+    weights = np.array(weights)
+    return np.stack(
+        [
+            model.forward_population(weights, th.unsqueeze(th.Tensor(init_state), 0)).numpy()
+            for init_state in init_states
+        ],
+        axis=1,
+    )
+
+
 @ray.remote
 def multi_play_evo(
     env,
@@ -1019,6 +1024,7 @@ def simulate(
     player_2=None,
     render_levels=False,
     door_coords=None,
+    first_outputs=None,
 ):
     """
     Function to run a single trajectory and return results.
@@ -1028,6 +1034,8 @@ def simulate(
         model (np.ndarray): The array of weights for the policy.
         seed (int): The seed for the environment.
         player_sim (bool): Are we collecting obj and bcs for the player, rather than the generator?
+        first_outputs (np.ndarray): The model's outputs on each initial state, if already computed (see
+            `get_population_outputs`), which are then used in place of the model's first pass in each episode.
     Returns:
         total_reward (float): The reward accrued by the lander throughout its
             trajectory.
@@ -1149,9 +1157,12 @@ def simulate(
                     level_frames.append(env.render(mode="image"))
             #           in_tensor = th.unsqueeze(
             #               th.unsqueeze(th.tensor(np.float32(obs['map'])), 0), 0)
-            in_tensor = th.unsqueeze(th.Tensor(obs), 0)
-            action, done = model(in_tensor)
-            action = action[0].numpy()
+            if first_outputs is not None and n_step == 0:
+                action, done = first_outputs[n_episode], model.done
+            else:
+                in_tensor = th.unsqueeze(th.Tensor(obs), 0)
+                action, done = model(in_tensor)
+                action = action[0].numpy()
             # There is probably a better way to do this, so we are not passing unnecessary kwargs, depending on representation
             if not IS_HOLEY:
                 int_map = (
@@ -1504,9 +1515,9 @@ class EvoPCGRL:
 
         if ALGO == "ME":
             if RANDOM_INIT_LEVELS and args.n_init_states != 0:
-                gen_archive_cls = MEInitStatesArchive
+                gen_archive_cls = DenseMEInitStatesArchive if args.dense_archive else MEInitStatesArchive
             else:
-                gen_archive_cls = MEGrid
+                gen_archive_cls = DenseMEGrid if args.dense_archive else MEGrid
 
         elif REEVALUATE_ELITES:
             # If we are constantly providing new random seeds to generators, we may want to regularly re-evaluate
@@ -1800,6 +1811,8 @@ class EvoPCGRL:
                 init_states = gen_latent_seeds(N_INIT_STATES, self.env)
             else:
                 init_states = self.init_states
+            # Where possible, do the generators' first pass on the initial states for the whole population at once.
+            first_outputs = get_population_outputs(self.gen_model, gen_sols, init_states)
 
             if THREADS:
                 n_sols = len(gen_sols)
@@ -1824,10 +1837,12 @@ class EvoPCGRL:
                             player_1=self.player_1,
                             player_2=self.player_2,
                             door_coords=self.door_coords,
+                            first_outputs=None if first_outputs is None else first_outputs[i],
+                        )
+                        for i, model_w in enumerate(
+                            gen_sols[n_launch * n_proc : (n_launch + 1) * n_proc],
+                            start=n_launch * n_proc,
                         )
-                        for model_w in gen_sols[
-                            n_launch * n_proc : (n_launch + 1) * n_proc
-                        ]
                     ]
                     results += ray.get(futures)
                     del futures
@@ -1853,7 +1868,7 @@ class EvoPCGRL:
                 del results
                 auto_garbage_collect()
             else:
-                for model_w in gen_sols:
+                for i, model_w in enumerate(gen_sols):
                     gen_model = set_weights(self.gen_model, model_w, algo=ALGO)
                     level_json, m_obj, m_bcs = simulate(
                         env=self.env,
@@ -1867,6 +1882,7 @@ class EvoPCGRL:
                         player_1=self.player_1,
                         player_2=self.player_2,
                         door_coords=self.door_coords,
+                        first_outputs=None if first_outputs is None else first_outputs[i],
                     )
 
                     if SAVE_LEVELS:
@@ -2561,10 +2577,6 @@ class EvoPCGRL:
                         )
                         for eval_bcs in eval_bc_names
                     ]
-                    [
-                        eval_archive.initialize(solution_dim=len(models[0]))
-                        for eval_archive in eval_archives
-                    ]
             else:
                 eval_archive = gen_archive_cls(
                     [1, 1], [(0, 1), (0, 1)], **self.init_level_archive_args
@@ -2592,69 +2604,17 @@ class EvoPCGRL:
             x_bounds = np.linspace(lower_bounds[0], upper_bounds[0], x_dim + 1)
             y_bounds = np.linspace(lower_bounds[1], upper_bounds[1], y_dim + 1)
 
-            # Color for each cell in the heatmap
-            fitness_scores = np.full((y_dim, x_dim), np.nan)
-            playability_scores = np.full((y_dim, x_dim), np.nan)
-            diversity_scores = np.full((y_dim, x_dim), np.nan)
-            reliability_scores = np.full((y_dim, x_dim), np.nan)
-            eval_fitness_scores = []
-            eval_playability_scores = []
-            eval_diversity_scores = []
-            eval_reliability_scores = []
-
-            if not CMAES:
-                for j in range(len(eval_archives)):
-                    eval_fitness_scores.append(np.full((y_dim, x_dim), np.nan))
-                    eval_playability_scores.append(np.full((y_dim, x_dim), np.nan))
-                    eval_reliability_scores.append(np.full((y_dim, x_dim), np.nan))
-                    eval_diversity_scores.append(np.full((y_dim, x_dim), np.nan))
-
-            def record_scores(
-                id_0,
-                id_1,
-                batch_reward,
-                targets_penalty,
-                diversity_bonus,
-                variance_penalty,
-                fitness_scores,
-                playability_scores,
-                diversity_scores,
-                reliability_scores,
-            ):
-                fitness_scores[id_0, id_1] = batch_reward
-                playability_scores[id_0, id_1] = targets_penalty
-
-                if diversity_bonus is not None:
-                    diversity_scores[id_0, id_1] = diversity_bonus
-
-                if variance_penalty is not None:
-                    reliability_scores[id_0, id_1] = variance_penalty
-
-            def save_levels(level_json, overwrite=False, headers=False):
-                df = pd.DataFrame.from_dict(level_json)
-                #               df = df[df['targets'] == 0]
-
-                if overwrite:
-                    write_mode = "w"
-                else:
-                    write_mode = "a"
-
-                if len(df) > 0:
-                    csv_name = "eval_levels"
+            # Color for each cell in the heatmap. The eval archives (which only bin the elites' features here) keep the
+            # best elite in each cell, and we record the scores of each elite entering them.
+            eval_shapes = [] if CMAES else [
+                [N_BINS for _ in eval_bcs] for eval_bcs in eval_bc_names
+            ]
+            score_grids = EvalScoreGrids((y_dim, x_dim), eval_shapes)
+            levels_name = "eval_levels"
 
-                    if not RANDOM_INIT_LEVELS:
-                        csv_name += "_fixLvls"
-                    csv_name += ".csv"
-                    if headers:
-                        header = df.columns
-                    else:
-                        header = None
-                    df.to_csv(
-                        os.path.join(SAVE_PATH, csv_name),
-                        mode=write_mode,
-                        header=header,
-                        index=False,
-                    )
+            if not RANDOM_INIT_LEVELS:
+                levels_name += "_fixLvls"
+            level_writer = LevelWriter(os.path.join(SAVE_PATH, levels_name))
 
             init_states_archive = None
             door_coords_archive = None
@@ -2688,11 +2648,16 @@ class EvoPCGRL:
             n_train_bcs = len(self.bc_names)
 
             if THREADS:
-                futures = [
-                    multi_evo.remote(
-                        self.env,
-                        self.gen_model,
-                        model_w,
+                # Put the arguments shared by all tasks in the object store once, rather than with each task.
+                env_ref, gen_model_ref = ray.put(self.env), ray.put(self.gen_model)
+                init_states_archive_ref = ray.put(init_states_archive)
+                door_coords_archive_ref = ray.put(door_coords_archive)
+
+                def launch(i):
+                    return multi_evo.remote(
+                        env_ref,
+                        gen_model_ref,
+                        models[i],
                         self.n_tile_types,
                         init_states,
                         [bc for bc_names in eval_bc_names for bc in bc_names],
@@ -2702,110 +2667,79 @@ class EvoPCGRL:
                         player_1=self.player_1,
                         player_2=self.player_2,
                         proc_id=i,
-                        init_states_archive=init_states_archive,
-                        door_coords_archive=door_coords_archive,
+                        init_states_archive=init_states_archive_ref,
+                        door_coords_archive=door_coords_archive_ref,
                         index=tuple(idxs[i]),
                         door_coords=self.door_coords,
                     )
-                    for (i, model_w) in enumerate(models)
-                ]
-                results = ray.get(futures)
-                i = 0
 
-                for result in results:
-                    (
-                        level_json,
-                        batch_reward,
-                        final_bcs,
+                max_in_flight = 2 * int(ray.cluster_resources().get("CPU", 1))
+
+                for results in stream_results(launch, len(models), max_in_flight):
+                    for i, result in results:
                         (
-                            time_penalty,
+                            level_json,
+                            batch_reward,
+                            final_bcs,
+                            (
+                                time_penalty,
+                                batch_targets_penalty,
+                                variance_penalty,
+                                diversity_bonus,
+                            ),
+                        ) = result
+                        grid_bcs = final_bcs[:n_train_bcs]
+                        # TODO: remove this (it's for backward compatibility) since we've implemented get_index for
+                        #   qdpy grid
+                        if ALGO == "ME":
+                            # Clip features to within the feature domain (shouldn't be outside of this domain in
+                            # theory though).
+                            grid_bcs = [
+                                np.clip(bc, *archive.features_domain[k])
+                                for k, bc in enumerate(grid_bcs)
+                            ]
+                            idx = archive.index_grid(tuple(grid_bcs))
+                        else:
+                            idx = archive.get_index(np.array(grid_bcs))
+
+                        if SAVE_LEVELS:
+                            level_writer.write(level_json)
+
+                        eval_idxs, eval_record_idxs = [], []
+                        if not CMAES:
+                            for j, eval_archive in enumerate(eval_archives):
+                                # Record componentes of the fitness for each cell in each evaluation archive
+                                # NOTE: assume 2 BCs per eval archive
+                                eval_bcs = np.array(final_bcs[2 * j : 2 * (j + 1)])
+                                if ALGO == "ME":
+                                    eval_idxs.append(
+                                        eval_archive.index_grid(
+                                            tuple(np.clip(bc, *eval_archive.features_domain[k]) for k, bc in
+                                                  enumerate(eval_bcs))
+                                        )
+                                    )
+                                    eval_record_idxs.append(
+                                        archive.index_grid(
+                                            tuple(np.clip(bc, *archive.features_domain[k]) for k, bc in
+                                                  enumerate(eval_bcs))
+                                        )
+                                    )
+                                else:
+                                    eval_idxs.append(eval_archive.get_index(eval_bcs))
+                                    eval_record_idxs.append(eval_idxs[-1])
+
+                        # Record directly from evolved archive since we are guaranteed to have only one elite per
+                        # cell. For eval archives, only record new best individuals in each filled cell.
+                        score_grids.add(
+                            i,
+                            idx,
+                            eval_idxs,
+                            eval_record_idxs,
+                            batch_reward,
                             batch_targets_penalty,
-                            variance_penalty,
                             diversity_bonus,
-                        ),
-                    ) = result
-                    # id_0 = idxs_0[i]
-                    # id_1 = idxs_1[i]
-                    grid_bcs = final_bcs[:n_train_bcs]
-                    # TODO: remove this (it's for backward compatibility) since we've implemented get_index for qdpy
-                    #   grid
-                    if ALGO == "ME":
-                        # Clip features to within the feature domain (shouldn't be outside of this domain in theory
-                        # though).
-                        grid_bcs = [
-                            np.clip(bc, *archive.features_domain[i])
-                            for i, bc in enumerate(grid_bcs)
-                        ]
-                        id_0, id_1 = archive.index_grid(tuple(grid_bcs))
-                    else:
-                        id_0, id_1 = archive.get_index(np.array(grid_bcs))
-
-                    if SAVE_LEVELS:
-                        save_levels(level_json, overwrite=i == 0, headers=i == 0)
-                    # Record directly from evolved archive since we are guaranteed to have only one elite per cell
-                    record_scores(
-                        id_0,
-                        id_1,
-                        batch_reward,
-                        batch_targets_penalty,
-                        diversity_bonus,
-                        variance_penalty,
-                        fitness_scores,
-                        playability_scores,
-                        diversity_scores,
-                        reliability_scores,
-                    )
-
-                    if not CMAES:
-                        for j, eval_archive in enumerate(eval_archives):
-                            # Record componentes of the fitness for each cell in each evaluation archive
-                            # NOTE: assume 2 BCs per eval archive
-                            eval_bcs = np.array(
-                                #                               final_bcs[n_train_bcs + 2 * j : n_train_bcs + 2 * j + 2]
-                                final_bcs[2 * j : 2 * (j + 1)]
-                            )
-                            if ALGO == "ME":
-                                eval_bcs = [
-                                    np.clip(bc, *archive.features_domain[i])
-                                    for i, bc in enumerate(eval_bcs)
-                                ]
-                                id_0, id_1 = archive.index_grid(tuple(eval_bcs))
-                                # Dummy individual
-                                individual = Individual(
-                                    type(self.gen_model),
-                                    self.n_tile_types,
-                                    self.n_tile_types,
-                                    map_dims=self.env.unwrapped.get_map_dims()[:-1],
-                                )
-                                individual.fitness = Fitness([batch_reward])
-                                individual.features = Features(final_bcs)
-                                idx = eval_archive.add(individual)
-                                ind_added = idx is not None
-                            else:
-                                id_0, id_1 = eval_archive.get_index(eval_bcs)
-                                # Add dummy solution weights for now
-                                status, _ = eval_archive.add(
-                                    np.zeros(eval_archive.solution_dim),
-                                    batch_reward,
-                                    eval_bcs,
-                                )
-                                ind_added = status != AddStatus.NOT_ADDED
-
-                            if ind_added:
-                                # For eval archive, only record new best individuals in each filled cell
-                                record_scores(
-                                    id_0,
-                                    id_1,
-                                    batch_reward,
-                                    batch_targets_penalty,
-                                    diversity_bonus,
-                                    variance_penalty,
-                                    eval_fitness_scores[j],
-                                    eval_playability_scores[j],
-                                    eval_diversity_scores[j],
-                                    eval_reliability_scores[j],
-                                )
-                    i += 1
+                            variance_penalty,
+                        )
 
                 auto_garbage_collect()
 
@@ -2853,30 +2787,29 @@ class EvoPCGRL:
                     )
 
                     if SAVE_LEVELS:
-                        save_levels(level_json)
-                    record_scores(
-                        id_0,
-                        id_1,
-                        batch_reward,
-                        targets_penalty,
-                        diversity_bonus,
-                        variance_penalty,
-                        fitness_scores,
-                        playability_scores,
-                        diversity_scores,
-                        reliability_scores,
+                        level_writer.write(level_json)
+                    score_grids.scores.record(
+                        [(id_0, id_1)],
+                        [[batch_reward, targets_penalty, diversity_bonus, variance_penalty]],
                     )
 
+            level_writer.close()
+            scores = score_grids.scores
+
             if ALGO == "ME":
-                n_filled_bins = eval_archive.filled_bins
                 assert len(models) == archive.filled_bins
                 n_total_bins = archive.size
             else:
-                n_filled_bins = len(eval_archive._occupied_indices)
                 assert len(models) == len(archive._occupied_indices)
                 n_total_bins = archive.bins
             qd_score = get_qd_score(archive, self.args)
-            eval_qd_score = get_qd_score(eval_archive, self.args)
+            if CMAES:
+                n_filled_bins = 0
+                eval_qd_score = get_qd_score(eval_archive, self.args)
+            else:
+                # From the last eval archive.
+                n_filled_bins = score_grids.eval_filled_bins(-1)
+                eval_qd_score = score_grids.eval_qd_score(-1, self.args.max_loss)
             stats = {
                 "generations completed": self.n_itr,
                 "% train archive full": len(models) / n_total_bins,
@@ -2896,58 +2829,57 @@ class EvoPCGRL:
                     "y_bounds": y_bounds,
                 }
                 plot_score_heatmap(
-                    playability_scores,
+                    scores.playability,
                     "playability",
                     self.bc_names,
                     **plot_args,
                     bcs_in_filename=False,
                 )
                 plot_score_heatmap(
-                    diversity_scores / 10,
+                    scores.diversity / 10,
                     "diversity",
                     self.bc_names,
                     **plot_args,
                     bcs_in_filename=False,
                 )
                 plot_score_heatmap(
-                    reliability_scores,
+                    scores.reliability,
                     "reliability",
                     self.bc_names,
                     **plot_args,
                     bcs_in_filename=False,
                 )
                 plot_score_heatmap(
-                    fitness_scores,
+                    scores.fitness,
                     "fitness_eval",
                     self.bc_names,
                     **plot_args,
                     bcs_in_filename=False,
                 )
 
-                for j, eval_archive in enumerate(eval_archives):
-                    bc_names = eval_bc_names[j]
+                for j, bc_names in enumerate(eval_bc_names):
 
                     if bc_names != ("NONE") and bc_names != tuple(self.bc_names):
                         plot_score_heatmap(
-                            eval_playability_scores[j],
+                            score_grids.eval_scores[j].playability,
                             "playability",
                             bc_names,
                             **plot_args,
                         )
                         plot_score_heatmap(
-                            eval_diversity_scores[j] / 10,
+                            score_grids.eval_scores[j].diversity / 10,
                             "diversity",
                             bc_names,
                             **plot_args,
                         )
                         plot_score_heatmap(
-                            eval_reliability_scores[j],
+                            score_grids.eval_scores[j].reliability,
                             "reliability",
                             bc_names,
                             **plot_args,
                         )
                         plot_score_heatmap(
-                            eval_fitness_scores[j],
+                            score_grids.eval_scores[j].fitness,
                             "fitness_eval",
                             bc_names,
                             **plot_args,
@@ -2990,15 +2922,15 @@ class EvoPCGRL:
                     )
                     stats["eval QD scores"].update(
                         {
-                            bcs_key: get_qd_score(eval_archive, self.args),
+                            bcs_key: score_grids.eval_qd_score(j, self.args.max_loss),
                         }
                     )
 
             stats.update(
                 {
-                    "playability": get_stats(playability_scores),
-                    "diversity": get_stats(diversity_scores / 10),
-                    "reliability": get_stats(reliability_scores),
+                    "playability": get_stats(scores.playability),
+                    "diversity": get_stats(scores.diversity / 10),
+                    "reliability": get_stats(scores.reliability),
                 }
             )
             f_name = "stats"
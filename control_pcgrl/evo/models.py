@@ -3,10 +3,7 @@ from pdb import set_trace as TT
 
 import cv2
 from einops import rearrange
-import neat
-from neat import DefaultGenome
 import numpy as np
-from pytorch_neat.cppn import create_cppn, Leaf
 from qdpy import phenotype
 import torch as th
 from torch import nn
@@ -52,7 +49,7 @@ class MixActiv(nn.Module):
         chan_i = 0
         xs = []
         for i, activ in enumerate(self.activations):
-            xs.append(activ(x[:, int(chan_i) : int(chan_i + chans_per_activ), :, :]))
+            xs.append(activ(x[:, int(chan_i) : int(chan_i + chans_per_activ)]))
             chan_i += chans_per_activ
         x = th.cat(xs, axis=1)
         return x
@@ -345,10 +342,108 @@ class MixNCA(ResettableNN):
             x = th.sigmoid(x)
 
 
-class CoordNCA(ResettableNN):
+# Coordinate grids, by map shape, device, normalization and scale (see `get_coord_grid`).
+_COORD_GRIDS = {}
+
+
+def get_coord_grid(x, normalize=False, env3d=False, scale=1):
+    """The coordinates of the cells of a map, given a (batch of) map(s) `x`, as a tensor of shape (1, 2, width, height)
+    (or (1, 3, width, height, length) for 3D maps).
+
+    Grids only depend on the map's shape, so are built once and cached. They are shared between calls, so they must not
+    be modified in place.
+
+    Args:
+        normalize: Whether to divide coordinates by the size of the map along their axis.
+        scale: A factor by which to multiply (e.g. normalized) coordinates.
+    """
+    dims = tuple(x.shape[-3:] if env3d else x.shape[-2:])
+    key = (dims, normalize, scale, x.device)
+    if key not in _COORD_GRIDS:
+        _COORD_GRIDS[key] = _make_coord_grid(dims, normalize, x.device) * scale
+    return _COORD_GRIDS[key]
+
+
+def _make_coord_grid(dims, normalize, device):
+    axes = [th.arange(n, device=device) / (n if normalize else 1) for n in dims]
+    if len(dims) == 3:
+        # Coordinates are ordered (x, y, z), for maps of shape (length, width, height).
+        axes = axes[1:] + axes[:1]
+    return th.stack(th.meshgrid(*axes, indexing="ij")).unsqueeze(0)
+
+
+class ConvCPPN(ResettableNN):
+    """A CPPN-like generator: a fixed stack of conv layers (`self.layers`), each followed by an activation
+    (`self.activations`), applied to an input that includes the map's coordinates (see `get_input`).
+
+    All layers but the first must be 1x1 convs. Then, a whole population of weight vectors can be evaluated on the same
+    input at once, with one conv for the first layer and one batched matrix product for each later layer (see
+    `forward_population`).
+    """
+
+    # Whether generation is done after a single pass.
+    done = True
+
+    def get_input(self, x):
+        raise NotImplementedError
+
+    def forward(self, x):
+        with th.no_grad():
+            x = self.get_input(x)
+            for layer, activ in zip(self.layers, self.activations):
+                x = activ(layer(x))
+
+        return x, self.done
+
+    def forward_population(self, weights, x):
+        """The outputs of a population of models of this architecture, each with its own weights, on the same input.
+
+        Args:
+            weights: The (flat) weight vector of each model, as returned by `get_init_weights`, in an array of shape
+                (n_models, n_weights).
+            x: The input, of shape (1, n_in_chans, width, height).
+
+        Returns:
+            th.Tensor: Of shape (n_models, n_actions, width, height), where each output is as given by `forward` (up
+                to float error) with the model's weights.
+        """
+        weights = th.as_tensor(weights, dtype=th.float32)
+        n_models = weights.shape[0]
+        with th.no_grad():
+            x = self.get_input(x)
+            dims = x.shape[2:]
+            n_el = 0
+            for i, (layer, activ) in enumerate(zip(self.layers, self.activations)):
+                n_weights = layer.weight.numel()
+                w = weights[:, n_el : n_el + n_weights].reshape(n_models, *layer.weight.shape)
+                n_el += n_weights
+                if layer.bias is not None:
+                    b = weights[:, n_el : n_el + layer.out_channels]
+                    n_el += layer.out_channels
+                else:
+                    b = th.zeros(n_models, layer.out_channels)
+                if i == 0:
+                    # The input is shared, so the first layers of all models act as one conv with more output channels.
+                    x = nn.functional.conv2d(
+                        x, w.flatten(0, 1), b.flatten(), stride=layer.stride, padding=layer.padding
+                    )
+                    x = x.reshape(n_models, layer.out_channels, -1)
+                else:
+                    assert layer.kernel_size == (1, 1)
+                    # A 1x1 conv is a matrix product over the channels of all cells.
+                    x = th.baddbmm(b.unsqueeze(-1), w.flatten(2), x)
+                x = activ(x)
+
+        return x.reshape(n_models, -1, *dims)
+
+
+class CoordNCA(ConvCPPN):
     """A neural cellular automata-type NN to generate levels or wide-representation action distributions.
     With coordinates as additional input, like a CPPN."""
 
+    # The output is a new map, to which the NCA is applied again.
+    done = False
+
     def __init__(self, n_in_chans, n_actions, **kwargs):
         super().__init__(**kwargs)
         n_hid_1 = 28
@@ -358,57 +453,12 @@ class CoordNCA(ResettableNN):
         self.l2 = Conv2d(n_hid_1, n_hid_1, 1, 1, 0, bias=True)
         self.l3 = Conv2d(n_hid_1, n_actions, 1, 1, 0, bias=True)
         self.layers = [self.l1, self.l2, self.l3]
+        self.activations = (th.relu, th.relu, th.sigmoid)
         self.apply(init_weights)
 
-    def forward(self, x):
-        with th.no_grad():
-            coords = get_coord_grid(x, normalize=True)
-            x = th.hstack((coords, x))
-            x = self.l1(x)
-            x = th.relu(x)
-            x = self.l2(x)
-            x = th.relu(x)
-            x = self.l3(x)
-            x = th.sigmoid(x)
-
-        # axis 0 is batch
-        # axis 1 is the tile-type (one-hot)
-        # axis 0,1 is the x value
-        # axis 0,2 is the y value
-
-        return x, False
-
-
-def get_coord_grid(x, normalize=False, env3d=False):
-    if env3d:
-        length = x.shape[-3]
-    width = x.shape[-2]
-    height = x.shape[-1]
-
-    X = th.arange(width)
-    Y = th.arange(height)
-
-    if env3d:
-        Z = th.arange(length)
-
-    if normalize:
-        X = X / width
-        Y = Y / height
-        if env3d:
-            Z = Z / length
-    else:
-        X = X / 1
-        Y = Y / 1
-        if env3d:
-            Z = Z / 1
-    if not env3d:
-        X, Y = th.meshgrid(X, Y)
-        x = th.stack((X, Y)).unsqueeze(0)
-    else:
-        X, Y, Z = th.meshgrid(X, Y, Z)
-        x = th.stack((X, Y, Z)).unsqueeze(0)
-
-    return x
+    def get_input(self, x):
+        coords = get_coord_grid(x, normalize=True)
+        return th.hstack((coords, x))
 
 
 class FeedForwardCPPN(nn.Module):
@@ -431,7 +481,7 @@ class FeedForwardCPPN(nn.Module):
         return x, True
 
 
-class GenReluCPPN(ResettableNN):
+class GenReluCPPN(ConvCPPN):
     def __init__(self, n_in_chans, n_actions, **kwargs):
         super().__init__(**kwargs)
         n_hid = 64
@@ -439,20 +489,15 @@ class GenReluCPPN(ResettableNN):
         self.l2 = Conv2d(n_hid, n_hid, kernel_size=1)
         self.l3 = Conv2d(n_hid, n_actions, kernel_size=1)
         self.layers = [self.l1, self.l2, self.l3]
+        self.activations = (th.relu, th.relu, th.sigmoid)
         self.apply(init_weights)
 
-    def forward(self, x):
+    def get_input(self, x):
         coord_x = get_coord_grid(x, normalize=True)
-        x = th.cat((x, coord_x), axis=1)
-        with th.no_grad():
-            x = th.relu(self.l1(x))
-            x = th.relu(self.l2(x))
-            x = th.sigmoid(self.l3(x))
-
-        return x, True
+        return th.cat((x, coord_x), axis=1)
 
 
-class SinCPPN(ResettableNN):
+class SinCPPN(ConvCPPN):
     """A vanilla CPPN that only takes (x, y) coordinates. #TODO: merge with GenSinCPPN"""
 
     def __init__(self, n_in_chans, n_actions, n_latents=2, **kwargs):
@@ -462,6 +507,7 @@ class SinCPPN(ResettableNN):
         self.l2 = Conv2d(n_hid, n_hid, kernel_size=1)
         self.l3 = Conv2d(n_hid, n_actions, kernel_size=1)
         self.layers = [self.l1, self.l2, self.l3]
+        self.activations = (th.sin, th.sin, th.sigmoid)
         # if "Sin2" in MODEL:
         # print('init_siren')
         init_siren_weights(self.layers[0], first_layer=True)
@@ -469,17 +515,11 @@ class SinCPPN(ResettableNN):
         # else:
         # self.apply(init_weights)
 
-    def forward(self, x):
-        x = get_coord_grid(x, normalize=True) * 2
-        with th.no_grad():
-            x = th.sin(self.l1(x))
-            x = th.sin(self.l2(x))
-            x = th.sigmoid(self.l3(x))
-
-        return x, True
+    def get_input(self, x):
+        return get_coord_grid(x, normalize=True, scale=2)
 
 
-class GenSinCPPN(ResettableNN):
+class GenSinCPPN(ConvCPPN):
     def __init__(self, n_in_chans, n_actions, n_latents=2, **kwargs):
         super().__init__(**kwargs)
         n_hid = 64
@@ -487,24 +527,19 @@ class GenSinCPPN(ResettableNN):
         self.l2 = Conv2d(n_hid, n_hid, kernel_size=1)
         self.l3 = Conv2d(n_hid, n_actions, kernel_size=1)
         self.layers = [self.l1, self.l2, self.l3]
+        self.activations = (th.sin, th.sin, th.sigmoid)
         # if "Sin2" in MODEL:
         init_siren_weights(self.layers[0], first_layer=True)
         [init_siren_weights(li, first_layer=False) for li in self.layers[1:]]
         # else:
         # self.apply(init_weights)
 
-    def forward(self, x):
-        coord_x = get_coord_grid(x, normalize=True) * 2
-        x = th.cat((x, coord_x), axis=1)
-        with th.no_grad():
-            x = th.sin(self.l1(x))
-            x = th.sin(self.l2(x))
-            x = th.sigmoid(self.l3(x))
+    def get_input(self, x):
+        coord_x = get_coord_grid(x, normalize=True, scale=2)
+        return th.cat((x, coord_x), axis=1)
 
-        return x, True
 
-
-class MixCPPN(ResettableNN):
+class MixCPPN(ConvCPPN):
     def __init__(self, n_in_chans, n_actions, **kwargs):
         super().__init__(**kwargs)
         n_hid = 64
@@ -514,18 +549,13 @@ class MixCPPN(ResettableNN):
         self.layers = [self.l1, self.l2, self.l3]
         self.apply(init_weights)
         self.mix_activ = MixActiv()
+        self.activations = (self.mix_activ, self.mix_activ, th.sigmoid)
 
-    def forward(self, x):
-        x = get_coord_grid(x, normalize=True) * 2
-        with th.no_grad():
-            x = self.mix_activ(self.l1(x))
-            x = self.mix_activ(self.l2(x))
-            x = th.sigmoid(self.l3(x))
-
-        return x, True
+    def get_input(self, x):
+        return get_coord_grid(x, normalize=True, scale=2)
 
 
-class GenMixCPPN(ResettableNN):
+class GenMixCPPN(ConvCPPN):
     def __init__(self, n_in_chans, n_actions, **kwargs):
         super().__init__(**kwargs)
         n_hid = 64
@@ -535,19 +565,14 @@ class GenMixCPPN(ResettableNN):
         self.layers = [self.l1, self.l2, self.l3]
         self.apply(init_weights)
         self.mix_activ = MixActiv()
+        self.activations = (self.mix_activ, self.mix_activ, th.sigmoid)
 
-    def forward(self, x):
-        coord_x = get_coord_grid(x, normalize=True) * 2
-        x = th.cat((x, coord_x), axis=1)
-        with th.no_grad():
-            x = self.mix_activ(self.l1(x))
-            x = self.mix_activ(self.l2(x))
-            x = th.sigmoid(self.l3(x))
-
-        return x, True
+    def get_input(self, x):
+        coord_x = get_coord_grid(x, normalize=True, scale=2)
+        return th.cat((x, coord_x), axis=1)
 
 
-class FixedGenCPPN(ResettableNN):
+class FixedGenCPPN(ConvCPPN):
     """A fixed-topology CPPN that takes additional channels of noisey input to prompts its output.
     Like a CoordNCA but without the repeated passes and with 1x1 rather than 3x3 kernels.
     """
@@ -560,17 +585,12 @@ class FixedGenCPPN(ResettableNN):
         self.l2 = Conv2d(n_hid, n_hid, kernel_size=1)
         self.l3 = Conv2d(n_hid, n_actions, kernel_size=1)
         self.layers = [self.l1, self.l2, self.l3]
+        self.activations = (th.sin, th.sin, th.sigmoid)
         self.apply(init_weights)
 
-    def forward(self, x):
-        coord_x = get_coord_grid(x, normalize=True) * 2
-        x = th.cat((x, coord_x), axis=1)
-        with th.no_grad():
-            x = th.sin(self.l1(x))
-            x = th.sin(self.l2(x))
-            x = th.sigmoid(self.l3(x))
-
-        return x, True
+    def get_input(self, x):
+        coord_x = get_coord_grid(x, normalize=True, scale=2)
+        return th.cat((x, coord_x), axis=1)
 
 
 class DirectEncoding:
@@ -608,8 +628,16 @@ class DirectEncoding:
 neat_config_path = "evo/config_cppn"
 
 
+# NEAT (`neat` and `pytorch_neat`) is only imported by the NEAT CPPNs below, so that the other models can be used without
+# it.
+
+
 class CPPN(ResettableNN):
     def __init__(self, n_in_chans, n_actions, **kwargs):
+        import neat
+        from neat import DefaultGenome
+        from pytorch_neat.cppn import create_cppn
+
         super().__init__(**kwargs)
         self.neat_config = neat.config.Config(
             DefaultGenome,
@@ -637,6 +665,8 @@ class CPPN(ResettableNN):
         )
 
     def mutate(self):
+        from pytorch_neat.cppn import create_cppn
+
         #       print(self.input_names, self.neat_config.genome_config.input_keys, self.genome.nodes)
         self.genome.mutate(self.neat_config.genome_config)
         self.cppn = create_cppn(
@@ -698,6 +728,10 @@ class CPPNCA(ResettableNN):
 
 class GenCPPN(CPPN):
     def __init__(self, n_in_chans, n_actions, **kwargs):
+        import neat
+        from neat import DefaultGenome
+        from pytorch_neat.cppn import create_cppn
+
         super().__init__(n_in_chans, n_actions, **kwargs)
         self.neat_config = neat.config.Config(
             DefaultGenome,
@@ -766,6 +800,13 @@ class Individual(phenotype.Individual):
     def mutate(self):
         self.model.mutate()
 
+    def get_weights(self):
+        """The model's weights, as a flat array (as stored by `DenseMEGrid`)."""
+        return get_init_weights(self.model, init=False, torch=True).detach().cpu().numpy()
+
+    def set_weights(self, weights):
+        set_weights(self.model, weights)
+
     def mate(self, ind_1):
         assert len(self.fitness.values) == 1 == len(ind_1.fitness.values)
         self.model.mate(
@@ -954,6 +995,8 @@ def get_init_weights(nn, init=True, torch=False):
     init_params = []
 
     if isinstance(nn, CPPN):
+        from pytorch_neat.cppn import Leaf
+
         for node in nn.cppn:
             if isinstance(node, Leaf):
                 continue
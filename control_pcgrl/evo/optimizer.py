@@ -1,7 +1,10 @@
 import copy
+import math
 from timeit import default_timer as timer
 
 import deap
+import deap.algorithms
+import deap.tools
 from deap.base import Toolbox
 import numpy as np
 from qdpy import tools
@@ -17,6 +20,13 @@ def mutate_individual(ind):
 
 
 class MEOptimizer:
+    """Vanilla MAP-Elites, over a qdpy grid of individuals, or over a `DenseMEGrid`.
+
+    With a dense grid, elites are stored as rows of weights, and each generation's offspring are bred as one matrix:
+    parents are sampled from the grid, and mutated by adding Gaussian noise to their weights (as in
+    `ResettableNN.mutate`), then loaded into the same, reused, individuals.
+    """
+
     def __init__(
         self, grid, ind_cls, batch_size, ind_cls_args, start_time=None, stats=None
     ):
@@ -44,10 +54,39 @@ class MEOptimizer:
             + ["meanFitness", "maxFitness", "elapsed"]
         )
         self.i = 0
+        self.dense = hasattr(grid, "add_batch")
+        if self.dense:
+            grid.set_template(self.inds[0])
+            self.weights = np.stack([ind.get_weights() for ind in self.inds])
+            self.step_size = self.inds[0].model.step_size
 
     def tell(self, objective_values, behavior_values):
         """Tell MAP-Elites about the performance (and diversity measures) of new offspring / candidate individuals,
         after evaluation on the task."""
+        if self.dense:
+            nb_updated = self.grid.add_batch(self.weights, objective_values, behavior_values)
+            fits = self.grid.fitness_array[self.grid.occupied]
+        else:
+            nb_updated, fits = self._update_grid(objective_values, behavior_values)
+        # Compile stats and update logs
+        record = self.stats.compile(self.grid) if self.stats else {}
+
+        maxFitness = np.max(fits)
+        meanFitness = np.mean(fits)
+        self.logbook.record(
+            iteration=self.i,
+            containerSize=self.grid.size_str(),
+            evals=len(self.inds),
+            nbUpdated=nb_updated,
+            elapsed=timer() - self.start_time,
+            meanFitness=meanFitness,
+            maxFitness=maxFitness,
+            **record
+        )
+        self.i += 1
+        print(self.logbook.stream)
+
+    def _update_grid(self, objective_values, behavior_values):
         # Update individuals' stats with results of last batch of simulations
         #       [(ind.fitness.setValues(obj), ind.fitness.features.setValues(bc)) for
         #        (ind, obj, bc) in zip(self.inds, objective_values, behavior_values)]
@@ -58,8 +97,6 @@ class MEOptimizer:
         nb_updated = self.grid.update(
             self.inds, issue_warning=True, ignore_exceptions=False
         )
-        # Compile stats and update logs
-        record = self.stats.compile(self.grid) if self.stats else {}
 
         assert (
             len(self.grid._best_fitness.values) == 1
@@ -69,26 +106,16 @@ class MEOptimizer:
         # maxFitness = self.grid._best_fitness[0]
 
         fits = [ind.fitness.values[0] for ind in self.grid]
-        maxFitness = np.max(fits)
-        meanFitness = np.mean(fits)
-        self.logbook.record(
-            iteration=self.i,
-            containerSize=self.grid.size_str(),
-            evals=len(self.inds),
-            nbUpdated=nb_updated,
-            elapsed=timer() - self.start_time,
-            meanFitness=meanFitness,
-            maxFitness=maxFitness,
-            **record
-        )
-        self.i += 1
-        print(self.logbook.stream)
+        return nb_updated, fits
 
     def ask(self):
         if len(self.grid) == 0:
             # Return the initial batch
             return self.inds
 
+        elif self.dense:
+            return self._ask_dense()
+
         elif len(self.grid) < self.batch_size:
             # If few elites, supplement the population with individuals from the last generation
             np.random.shuffle(self.inds)
@@ -104,3 +131,17 @@ class MEOptimizer:
         self.inds = deap.algorithms.varAnd(batch, self.toolbox, self.cxpb, self.mutpb)
 
         return self.inds
+
+    def _ask_dense(self):
+        extra = None
+        if len(self.grid) < self.batch_size:
+            # If few elites, supplement the population with individuals from the last generation
+            extra = np.random.permutation(self.weights)[: self.batch_size - len(self.grid)]
+        # Select the next batch of individuals, and mutate them
+        parents = self.grid.sample(self.batch_size, extra=extra)
+        noise = np.random.standard_normal(parents.shape) * math.sqrt(self.step_size)
+        self.weights = (parents + noise).astype(parents.dtype)
+        for ind, w in zip(self.inds, self.weights):
+            ind.set_weights(w)
+
+        return self.inds
@@ -1,8 +1,17 @@
+"""Assemble the frames saved by `evolve.py --render_levels` (one directory of PNGs per model) into GIFs and MP4s.
+
+Each model's frames are read once into a uint8 array. For a grid, each model's frames are written, with one strided
+write, into their tile of a memory-mapped array holding every grid frame, in a worker process per model. Frames are then
+encoded in worker processes, by piping raw frames to ffmpeg, or, if it is not installed, with Pillow (GIFs only).
+"""
+import itertools
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pdb import set_trace as TT
 import re
+import shutil
+import subprocess
 
-import imageio
 import numpy as np
 from PIL import Image
 
@@ -10,6 +19,14 @@ from control_pcgrl.evo.args import get_args, get_exp_dir, get_exp_name
 
 RENDER_GRID = True
 
+FFMPEG = shutil.which("ffmpeg")
+
+# Frames of the last level repeated at the end of a model's GIF, so that we "pause" on it.
+N_PAUSE_FRAMES = 20
+# Frame rates of a model's GIF and MP4, and of the grid's GIF and MP4 (each paused for a second on the last frame).
+MODEL_GIF_FPS, MODEL_MP4_FPS = 10, 30
+GRID_GIF_FPS, GRID_MP4_FPS = 15, 10
+
 
 def atoi(text):
     return int(text) if text.isdigit() else text
@@ -24,115 +41,191 @@ def natural_keys(text):
     return [atoi(c) for c in re.split(r"(\d+)", text)]
 
 
-def render_gifs(settings_list):
-    batch_exp_name = settings_list[0]["exp_name"]
-    for i, settings in enumerate(settings_list):
-        n_steps = settings["n_steps"]
-        args, arg_dict = get_args(load_args=settings)
-        exp_name = get_exp_name(args, arg_dict)
-        exp_dir = get_exp_dir(exp_name)
-        if not os.path.isdir(exp_dir):
-            print("Skipping experiment, as directory does not exist: ", exp_dir)
-            continue
-        render_path = os.path.join(exp_dir, "renders")
-        if not os.path.isdir(render_path):
-            continue
-        model_dirs = [
-            m
-            for m in os.listdir(render_path)
-            if os.path.isdir(os.path.join(render_path, m)) and "model" in m
+def get_frame_paths(model_path):
+    """The paths of a model's frames, in order."""
+    frames = [m for m in os.listdir(model_path) if re.match(r"frame.*.png", m)]
+    frames.sort(key=natural_keys)
+    return [os.path.join(model_path, m) for m in frames]
+
+
+def get_model_dirs(render_path):
+    """The directories of the models rendered as tiles of a grid, and the (x, y) index of each tile."""
+    model_dirs, model_idxs = [], []
+    for m in sorted(os.listdir(render_path)):
+        match = re.match(r".*model.*_(\d+)_(\d+)$", m)
+        if match is not None and os.path.isdir(os.path.join(render_path, m)):
+            model_dirs.append(m)
+            model_idxs.append((int(match.group(1)), int(match.group(2))))
+    return model_dirs, model_idxs
+
+
+def load_frames(frame_paths, n_steps=0, out=None):
+    """Read frames into a (n_frames, height, width, 3) uint8 array (or into `out`), repeating the last frame so that
+    there are at least `n_steps`."""
+    n_frames = max(len(frame_paths), n_steps) if out is None else len(out)
+    n_read = min(len(frame_paths), n_frames)
+    for i, path in enumerate(frame_paths[:n_read]):
+        im = np.asarray(Image.open(path).convert("RGB"))
+        if out is None:
+            out = np.empty((n_frames, *im.shape), dtype=np.uint8)
+        out[i] = im
+    out[n_read:] = out[n_read - 1]
+    return out
+
+
+def grid_tile(grid_shape, tile_shape, idx):
+    """The (row, column) slices of the tile of model (x, y) in a grid frame: x counts columns from the left, and y
+    rows from the bottom."""
+    n_rows = grid_shape[0] // tile_shape[0]
+    x, y = idx
+    row = n_rows - 1 - y
+    return (
+        slice(row * tile_shape[0], (row + 1) * tile_shape[0]),
+        slice(x * tile_shape[1], (x + 1) * tile_shape[1]),
+    )
+
+
+def tile_model_frames(grid_path, frame_paths, idx, tile_shape):
+    """Read a model's frames into its tile of the (memory-mapped) grid frames, repeating its last frame to fill the
+    grid's."""
+    grid = np.load(grid_path, mmap_mode="r+")
+    rows, cols = grid_tile(grid.shape[1:], tile_shape, idx)
+    load_frames(frame_paths, out=grid[:, rows, cols])
+    grid.flush()
+
+
+def write_gif(frames, path, fps, n_pause=0):
+    """Encode frames (an array, or memmap, of RGB frames) as a GIF, repeating the last frame `n_pause` times."""
+    if FFMPEG is not None:
+        _ffmpeg_encode(frames, path, fps, n_pause)
+        return
+    # Without ffmpeg, use Pillow's GIF encoder.
+    ims = (Image.fromarray(np.asarray(f)) for f in _paused(frames, n_pause))
+    first = next(ims)
+    first.save(path, save_all=True, append_images=ims, duration=1000 / fps, loop=0)
+
+
+def write_mp4(frames, path, fps, n_pause=0):
+    """Encode frames as an MP4 (with ffmpeg), repeating the last frame `n_pause` times."""
+    if FFMPEG is None:
+        print("Skipping {}, as ffmpeg is not installed.".format(path))
+        return
+    _ffmpeg_encode(frames, path, fps, n_pause, ["-c:v", "libx264", "-crf", "20", "-pix_fmt", "yuv420p"])
+
+
+def _paused(frames, n_pause):
+    return itertools.chain(frames, itertools.repeat(frames[-1], n_pause))
+
+
+def _ffmpeg_encode(frames, path, fps, n_pause, out_args=()):
+    height, width = frames.shape[1:3]
+    cmd = [FFMPEG, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}"]
+    cmd += ["-r", str(fps), "-i", "-", *out_args, path]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    for frame in _paused(frames, n_pause):
+        proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+    proc.stdin.close()
+    if proc.wait() != 0:
+        print("ffmpeg failed to write {}.".format(path))
+
+
+def render_model(frame_paths, n_steps, out_name):
+    """Write a model's GIF and MP4."""
+    frames = load_frames(frame_paths, n_steps)
+    write_gif(frames, out_name + ".gif", MODEL_GIF_FPS, N_PAUSE_FRAMES)
+    write_mp4(frames, out_name + ".mp4", MODEL_MP4_FPS, N_PAUSE_FRAMES)
+    print(out_name)
+
+
+def encode_grid(grid_path, out_name, ext):
+    """Write the grid's GIF or MP4, from its memory-mapped frames, pausing for a second on the last frame (and for
+    another second in the MP4, which is encoded from the paused GIF frames)."""
+    grid = np.load(grid_path, mmap_mode="r")
+    if ext == "gif":
+        write_gif(grid, out_name + ".gif", GRID_GIF_FPS, GRID_GIF_FPS)
+    else:
+        write_mp4(grid, out_name + ".mp4", GRID_MP4_FPS, GRID_GIF_FPS + GRID_MP4_FPS)
+
+
+def build_grid(grid_path, model_frame_paths, model_idxs, n_steps, pool=None):
+    """Write the grid frames, tiling each model's frames in place, to a memory-mapped `.npy` file. The grid has as
+    many frames as the model with the fewest (after padding each model's frames to `n_steps`)."""
+    tile_shape = np.asarray(Image.open(model_frame_paths[0][0]).convert("RGB")).shape
+    n_frames = min(max(len(f), n_steps) for f in model_frame_paths)
+    n_cols = max(x for x, _ in model_idxs) + 1
+    n_rows = max(y for _, y in model_idxs) + 1
+    shape = (n_frames, n_rows * tile_shape[0], n_cols * tile_shape[1], 3)
+    np.lib.format.open_memmap(grid_path, mode="w+", dtype=np.uint8, shape=shape).flush()
+    # Short frame sequences are padded (with their last frame) up to the number of grid frames as they are loaded.
+    jobs = [(grid_path, paths, idx, tile_shape) for paths, idx in zip(model_frame_paths, model_idxs)]
+    _map(pool, tile_model_frames, jobs)
+    return np.load(grid_path, mmap_mode="r")
+
+
+def _map(pool, fn, jobs):
+    if pool is None:
+        return [fn(*job) for job in jobs]
+    return list(pool.map(fn, *zip(*jobs)))
+
+
+def render_gifs(settings_list, n_procs=None):
+    n_procs = os.cpu_count() if n_procs is None else n_procs
+    pool = ProcessPoolExecutor(max_workers=n_procs) if n_procs > 1 else None
+    try:
+        for settings in settings_list:
+            render_experiment(settings, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def render_experiment(settings, pool=None):
+    n_steps = settings["n_steps"]
+    args, arg_dict = get_args(load_args=settings)
+    exp_name = get_exp_name(args, arg_dict)
+    exp_dir = get_exp_dir(exp_name)
+    if not os.path.isdir(exp_dir):
+        print("Skipping experiment, as directory does not exist: ", exp_dir)
+        return
+    render_path = os.path.join(exp_dir, "renders")
+    if not os.path.isdir(render_path):
+        return
+    model_dirs, model_idxs = get_model_dirs(render_path)
+    model_frame_paths = [get_frame_paths(os.path.join(render_path, m)) for m in model_dirs]
+    for m_dir, frames in zip(model_dirs, model_frame_paths):
+        if len(frames) == 0:
+            print("No gif created for {}, no frames gathered.".format(m_dir))
+    model_idxs = [idx for idx, frames in zip(model_idxs, model_frame_paths) if frames]
+    model_dirs = [m for m, frames in zip(model_dirs, model_frame_paths) if frames]
+    model_frame_paths = [frames for frames in model_frame_paths if frames]
+    if not model_dirs:
+        return
+
+    if not RENDER_GRID:
+        jobs = [
+            (frames, n_steps, os.path.join(render_path, m_dir))
+            for m_dir, frames in zip(model_dirs, model_frame_paths)
         ]
-        model_idxs = [re.match(r".*_(\d)_(\d)", m).groups() for m in model_dirs]
-        model_idxs = [(int(m0), int(m1)) for (m0, m1) in model_idxs]
-        grid_tiles_w = max([m[0] for m in model_idxs])
-        grid_tiles_h = max([m[1] for m in model_idxs])
-        model_frame_seqs = []
-        for m_dir, m_idx in zip(model_dirs, model_idxs):
-            model_path = os.path.join(render_path, m_dir)
-            model_dirs = os.listdir(model_path)
-            model_dirs.sort(key=natural_keys)
-            frames = [
-                os.path.join(model_path, m)
-                for m in model_dirs
-                if m.endswith("png") and re.match(r"frame.*.png", m)
-            ]
-            if len(frames) < n_steps:
-                frames += [frames[-1]] * (n_steps - len(frames))
-            if RENDER_GRID:
-                model_frame_seqs.append(frames)
-            #           os.system("ffmpeg -r 30 -i \"{0}.gif\" -movflags faststart -pix_fmt yuv420p -vf \"scale=trunc(iw/2)*2:trunc(ih/2)*2\" \"{0}.mp4\"".format(gif_name))
-            elif len(frames) > 0:
-                gif_name = os.path.join(render_path, "{}".format(m_dir))
-                frames_to_gif("{}.gif".format(gif_name), frames)
-                os.system(
-                    'ffmpeg -y -r 30 -f gif -i "{0}.gif" -pix_fmt yuv420p "{0}.mp4"'.format(
-                        gif_name
-                    )
-                )
-
-            else:
-                print("No gif created, no frames gathered.")
-        #           curdir = os.path.abspath(os.curdir)
-        #           os.chdir(model_path)
-        #           os.system("ffmpeg -y -r 30 -i frame_%04d.png \"{}.mp4\"".format(gif_name.split('/')[-1]))
-        #           os.chdir(curdir)
-        im_w, im_h = None, None
-        if RENDER_GRID:
-            grid_frames = []
-            grid_frames_dir = os.path.join(render_path, "grid_frames")
-            if not os.path.isdir(grid_frames_dir):
-                os.mkdir(grid_frames_dir)
-            for i, frames in enumerate(zip(*model_frame_seqs)):
-                ims = [imageio.imread(f) for f in frames]
-                if im_w is None:
-                    im_w, im_h = ims[0].shape[0], ims[0].shape[1]
-                grid_frame = np.empty(
-                    shape=(im_w * (grid_tiles_w + 1), im_h * (grid_tiles_h + 1), 3),
-                    dtype=np.uint8,
-                )
-                print(grid_frame.shape)
-                for j, im in enumerate(ims):
-                    #               grid_frame = Image.new(mode="RGBA", size=(grid_w, grid_h))
-                    x, y = model_idxs[j]
-                    grid_frame[
-                        (-y - 1) * im_w : (grid_tiles_w + 1 - y) * im_w,
-                        (x) * im_h : (x + 1) * im_h,
-                        :,
-                    ] = np.array(im)
-                grid_frame = Image.fromarray(grid_frame, mode="RGB")
-                grid_frame.save(
-                    open(
-                        os.path.join(grid_frames_dir, "frame_{:04d}.png".format(i)),
-                        mode="wb",
-                    )
-                )
-            gif_name = os.path.join(grid_frames_dir)
-            #           with imageio.get_writer(gif_name, mode='I') as writer:
-            #               for im in grid_frames:
-            #                   writer.append_data(np.array(im))
-            print(gif_name)
-            #           frames_to_gif('{}.gif'.format(gif_name), grid_frames)
-            os.system(
-                'ffmpeg -y -r 15 -i "{0}/frame_%04d.png" -vf tpad=stop_mode=clone:stop_duration=1 "{0}".gif'.format(
-                    grid_frames_dir
-                )
-            )
-            os.system(
-                'ffmpeg -y -r 10 -f gif -i "{0}.gif" -c:v libx264 -crf 20 -pix_fmt yuv420p -vf tpad=stop_mode=clone:stop_duration=1 "{0}.mp4"'.format(
-                    gif_name
-                )
-            )
+        _map(pool, render_model, jobs)
+        return
+
+    gif_name = os.path.join(render_path, "grid_frames")
+    grid_path = gif_name + ".npy"
+    try:
+        build_grid(grid_path, model_frame_paths, model_idxs, n_steps, pool)
+        _map(pool, encode_grid, [(grid_path, gif_name, "gif"), (grid_path, gif_name, "mp4")])
+    finally:
+        if os.path.exists(grid_path):
+            os.remove(grid_path)
+    print(gif_name)
 
 
 def frames_to_gif(gif_path, filenames):
     # Repeat the last frame a bunch, so that we "pause" on the final generated level
-    filenames = filenames + [filenames[-1]] * 20
-    with imageio.get_writer(gif_path, mode="I") as writer:
-        for filename in filenames:
-            try:
-                image = imageio.imread(filename)
-            except ValueError:
-                print("Failed to read image {}, aborting.".format(filename))
-                return
-            writer.append_data(image)
+    try:
+        frames = load_frames(filenames)
+    except (OSError, ValueError):
+        print("Failed to read images for {}, aborting.".format(gif_path))
+        return
+    write_gif(frames, gif_path, MODEL_GIF_FPS, N_PAUSE_FRAMES)
     print(gif_path)
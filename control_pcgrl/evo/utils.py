@@ -1,9 +1,13 @@
 import copy
-import graphviz
 import warnings
 
 import numpy as np
 
+try:
+    import graphviz
+except ImportError:
+    graphviz = None
+
 
 def get_one_hot_map(int_map, n_tile_types, continuous=False):
     if continuous:
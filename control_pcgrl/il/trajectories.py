@@ -0,0 +1,161 @@
+"""
+Sharded, compressed storage of imitation-learning trajectories.
+
+Trajectories are written as `np.savez_compressed` shards of fixed size, with observations stored as uint8 (our image
+observations are one-hot maps, so this is lossless) and actions as ints. An `index.json` in the trajectory directory
+lists every shard and its number of samples, so that readers (e.g. the `ShardInputReader` used by `train_imitation.py`)
+can stream samples back without any JSON decoding of the samples themselves.
+"""
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from ray.rllib.offline.input_reader import InputReader
+from ray.rllib.offline.io_context import IOContext
+from ray.rllib.policy.sample_batch import SampleBatch
+
+
+INDEX_FILE = "index.json"
+
+# Per-sample fields stored in each shard, with their on-disk dtypes. (`obs` is stored as uint8, see above.)
+SHARD_FIELDS = {
+    "obs": np.uint8,
+    "actions": np.int64,
+    "rewards": np.float32,
+    "prev_actions": np.int64,
+    "prev_rewards": np.float32,
+    "terminateds": np.bool_,
+    "eps_id": np.int64,
+    "t": np.int32,
+}
+
+
+class ShardWriter:
+    """Accumulates samples into preallocated buffers, and writes a compressed shard whenever `shard_size` samples have
+    been collected."""
+
+    def __init__(self, traj_dir: str, prefix: str, shard_size: int = 10_000):
+        self.traj_dir = traj_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.entries: List[Dict] = []
+        self._bufs = None
+        self._n = 0
+        os.makedirs(traj_dir, exist_ok=True)
+
+    def _alloc(self, sample: Dict[str, np.ndarray]):
+        self._bufs = {
+            k: np.empty((self.shard_size, *np.shape(sample[k])), dtype=dtype)
+            for k, dtype in SHARD_FIELDS.items()
+        }
+
+    def add(self, **sample):
+        if self._bufs is None:
+            self._alloc(sample)
+        obs = sample["obs"]
+        if obs.dtype != np.uint8:
+            # Only lossless for integer-valued (e.g. one-hot) observations in [0, 255].
+            obs_u8 = obs.astype(np.uint8)
+            assert np.array_equal(
+                obs_u8, obs
+            ), "Can only store integer-valued observations as uint8."
+            sample["obs"] = obs_u8
+        for k in SHARD_FIELDS:
+            self._bufs[k][self._n] = sample[k]
+        self._n += 1
+        if self._n == self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if self._n == 0:
+            return
+        fname = f"{self.prefix}-{len(self.entries):05d}.npz"
+        np.savez_compressed(
+            os.path.join(self.traj_dir, fname),
+            **{k: v[: self._n] for k, v in self._bufs.items()},
+        )
+        self.entries.append({"file": fname, "n_samples": self._n})
+        self._n = 0
+
+    def close(self) -> List[Dict]:
+        self.flush()
+        return self.entries
+
+
+def write_index(traj_dir: str, entries: List[Dict], obs_shape: tuple):
+    index = {
+        "obs_shape": list(obs_shape),
+        "n_samples": int(sum(e["n_samples"] for e in entries)),
+        "shards": entries,
+    }
+    with open(os.path.join(traj_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=4)
+
+
+def load_index(traj_dir: str) -> Dict:
+    with open(os.path.join(traj_dir, INDEX_FILE), "r") as f:
+        return json.load(f)
+
+
+def load_shard(traj_dir: str, entry: Dict, obs_dtype=np.float32) -> Dict[str, np.ndarray]:
+    with np.load(os.path.join(traj_dir, entry["file"])) as shard:
+        batch = {k: shard[k] for k in SHARD_FIELDS}
+    batch["obs"] = batch["obs"].astype(obs_dtype)
+    return batch
+
+
+def iter_shards(
+    traj_dir: str, shuffle: bool = False, seed: Optional[int] = None
+) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield each shard in the trajectory directory as a dictionary of arrays."""
+    entries = load_index(traj_dir)["shards"]
+    order = np.arange(len(entries))
+    if shuffle:
+        np.random.default_rng(seed).shuffle(order)
+    for i in order:
+        yield load_shard(traj_dir, entries[i])
+
+
+class ShardInputReader(InputReader):
+    """Offline input for RLlib algorithms that streams samples from trajectory shards. Each rollout worker cycles
+    through the shards in its own random order, returning chunks of `chunk_size` samples at a time."""
+
+    def __init__(self, traj_dir: str, ioctx: Optional[IOContext] = None, chunk_size: int = 1_000):
+        self.traj_dir = traj_dir
+        self.chunk_size = chunk_size
+        self._seed = ioctx.worker_index if ioctx is not None else 0
+        self._epoch = 0
+        self._shards = iter(())
+        self._shard = None
+        self._i = 0
+
+    def _next_shard(self):
+        try:
+            self._shard = next(self._shards)
+        except StopIteration:
+            self._shards = iter_shards(self.traj_dir, shuffle=True, seed=(self._seed, self._epoch))
+            self._epoch += 1
+            self._shard = next(self._shards)
+        self._i = 0
+
+    def next(self) -> SampleBatch:
+        if self._shard is None or self._i >= len(self._shard["obs"]):
+            self._next_shard()
+        chunk = {
+            k: v[self._i : self._i + self.chunk_size] for k, v in self._shard.items()
+        }
+        self._i += self.chunk_size
+        return SampleBatch(
+            {
+                SampleBatch.OBS: chunk["obs"],
+                SampleBatch.ACTIONS: chunk["actions"],
+                SampleBatch.REWARDS: chunk["rewards"],
+                SampleBatch.PREV_ACTIONS: chunk["prev_actions"],
+                SampleBatch.PREV_REWARDS: chunk["prev_rewards"],
+                SampleBatch.TERMINATEDS: chunk["terminateds"],
+                SampleBatch.TRUNCATEDS: np.zeros_like(chunk["terminateds"]),
+                SampleBatch.EPS_ID: chunk["eps_id"],
+                SampleBatch.T: chunk["t"],
+            }
+        )
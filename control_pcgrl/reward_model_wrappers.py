@@ -1,5 +1,6 @@
 import copy
-from einops import rearrange
+import ctypes
+import multiprocessing as mp
 import gym
 import numpy as np
 import torch as th
@@ -18,6 +19,11 @@ class RewardModelWrapper(gym.Wrapper):
         self.datapoints = []
         self._last_changes = -1
 
+    def reset(self, *args, **kwargs):
+        ret = self.env.reset(*args, **kwargs)
+        self._last_changes = self.unwrapped._changes
+        return ret
+
     def step(self, action):
         """Take a step in the environment."""
         ret = self.env.step(action)
@@ -25,41 +31,139 @@ class RewardModelWrapper(gym.Wrapper):
         if self.unwrapped._changes == self._last_changes:
             # No changes were made to the map, so don't collect data
             return ret
+        self._last_changes = self.unwrapped._changes
 
-        metric_values = np.array([self.env.metrics[key] for key in self.metric_keys])
+        metric_values = np.array(
+            [self.env.metrics[key] for key in self.metric_keys], dtype=np.float32
+        )
 
-        disc_map = self.get_map()
-        n_tiles = self.get_map_dims()[-1]
-        onehot_map = np.eye(n_tiles)[disc_map]
+        # Store the discrete map (as uint8). We only one-hot encode it once a batch of datapoints is used for training.
+        disc_map = np.array(self.get_map(), dtype=np.uint8)
 
         # Collect the datapoint
-        self.datapoints.append((onehot_map, metric_values))
+        self.datapoints.append((disc_map, metric_values))
         return ret
 
     def collect_data(self):
         """Collect data from the environment."""
-        feats, metrics = zip(*self.datapoints)
-        feats = th.from_numpy(np.stack(feats))
+        maps, metrics = zip(*self.datapoints)
+        feats = onehot_maps(np.stack(maps), self.get_map_dims()[-1])
         metrics = th.from_numpy(np.stack(metrics))
         self.datapoints = []
         return feats, metrics
 
 
+def onehot_maps(maps: np.ndarray, n_tiles: int) -> th.Tensor:
+    """One-hot encode a batch of discrete (uint8) maps, returning a float tensor of shape (b, h, w, n_tiles)."""
+    return th.nn.functional.one_hot(th.from_numpy(maps).long(), n_tiles).float()
+
+
+class SharedReplayBuffer:
+    """A fixed-size ring buffer of (discrete map, metrics) datapoints for training the reward model, in shared memory so
+    that collector processes can write to it while the trainer samples minibatches from it.
+
+    Maps are stored as uint8. For each slot, we also record the value of the global insertion counter at the time the
+    datapoint was added, so that we can report the staleness (in number of datapoints collected since) of sampled data.
+    """
+
+    def __init__(self, capacity: int, map_shape: tuple, n_metrics: int, ctx=None):
+        ctx = mp.get_context() if ctx is None else ctx
+        self.capacity = capacity
+        self.map_shape = tuple(map_shape)
+        self.n_metrics = n_metrics
+        self._maps_raw = ctx.RawArray(ctypes.c_uint8, capacity * int(np.prod(map_shape)))
+        self._metrics_raw = ctx.RawArray(ctypes.c_float, capacity * n_metrics)
+        self._added_at_raw = ctx.RawArray(ctypes.c_int64, capacity)
+        self._n_added = ctx.RawValue(ctypes.c_int64, 0)
+        self._lock = ctx.Lock()
+        self._views = None
+
+    def __getstate__(self):
+        # Numpy views are rebuilt lazily in each process.
+        state = self.__dict__.copy()
+        state["_views"] = None
+        return state
+
+    def _get_views(self):
+        if self._views is None:
+            self._views = (
+                np.frombuffer(self._maps_raw, dtype=np.uint8).reshape(self.capacity, *self.map_shape),
+                np.frombuffer(self._metrics_raw, dtype=np.float32).reshape(self.capacity, self.n_metrics),
+                np.frombuffer(self._added_at_raw, dtype=np.int64),
+            )
+        return self._views
+
+    @property
+    def n_added(self) -> int:
+        """Total number of datapoints ever added to the buffer."""
+        return self._n_added.value
+
+    def __len__(self):
+        return min(self.n_added, self.capacity)
+
+    def add(self, maps: np.ndarray, metrics: np.ndarray):
+        """Add a batch of datapoints, overwriting the oldest ones once the buffer is full."""
+        buf_maps, buf_metrics, buf_added_at = self._get_views()
+        n = len(maps)
+        with self._lock:
+            start = self._n_added.value
+            idxs = np.arange(start, start + n) % self.capacity
+            buf_maps[idxs] = maps
+            buf_metrics[idxs] = metrics
+            buf_added_at[idxs] = np.arange(start, start + n)
+            self._n_added.value = start + n
+
+    def sample(self, batch_size: int, rng: np.random.Generator):
+        """Sample a minibatch (with replacement). Returns maps, metrics, and the mean staleness of the sampled
+        datapoints."""
+        buf_maps, buf_metrics, buf_added_at = self._get_views()
+        with self._lock:
+            n_added = self._n_added.value
+            idxs = rng.integers(0, min(n_added, self.capacity), size=batch_size)
+            maps, metrics = buf_maps[idxs], buf_metrics[idxs]
+            staleness = n_added - buf_added_at[idxs].mean()
+        return maps, metrics, staleness
+
+
+def collect_reward_model_data(
+    make_env_fn, cfg, buffer: SharedReplayBuffer, n_envs: int, stop_event, flush_every: int = 64
+):
+    """Step a vector of envs with random actions, adding the collected datapoints to the buffer, until `stop_event` is
+    set. Runs in a background process."""
+    envs = [make_env_fn(cfg) for _ in range(n_envs)]
+    for env in envs:
+        env.reset()
+    while not stop_event.is_set():
+        for env in envs:
+            _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+            if terminated or truncated:
+                env.reset()
+        datapoints = [dp for env in envs for dp in env.datapoints]
+        if len(datapoints) < flush_every:
+            continue
+        maps, metrics = zip(*datapoints)
+        buffer.add(np.stack(maps), np.stack(metrics))
+        for env in envs:
+            env.datapoints = []
+
+
 class RewardModel(th.nn.Module):
     def __init__(self, obs_shape, n_metrics):
         super().__init__()
         n_in_chan = obs_shape[0]
+        # obs_shape is (n_tiles, *map_shape), so use 3D convolutions for 3D maps.
+        conv = th.nn.Conv3d if len(obs_shape) == 4 else th.nn.Conv2d
 
         self.conv = th.nn.Sequential(
-            th.nn.Conv2d(n_in_chan, 32, 3, padding=0),
+            conv(n_in_chan, 32, 3, padding=0),
             th.nn.ReLU(),
-            th.nn.Conv2d(32, 32, 3, padding=0),
+            conv(32, 32, 3, padding=0),
             th.nn.ReLU(),
-            th.nn.Conv2d(32, 32, 3, padding=0),
+            conv(32, 32, 3, padding=0),
             th.nn.ReLU(),
-            th.nn.Conv2d(32, 32, 3, padding=0),
+            conv(32, 32, 3, padding=0),
             th.nn.ReLU(),
-            th.nn.Conv2d(32, 32, 3, padding=0),
+            conv(32, 32, 3, padding=0),
             th.nn.ReLU(),
         )
 
@@ -82,13 +186,8 @@ class RewardModel(th.nn.Module):
 def init_reward_model(env: PcgrlEnv):
     """Initialize a reward model and optimizer."""
     r_model_obs_shape = env.get_map_dims()
-    r_model_obs_shape = (
-        r_model_obs_shape[2],
-        r_model_obs_shape[0],
-        r_model_obs_shape[1],
-    )
-    n_in_chan = r_model_obs_shape[-1]
-    r_model_obs_size = np.prod(r_model_obs_shape)
+    # Channels first.
+    r_model_obs_shape = (r_model_obs_shape[-1], *r_model_obs_shape[:-1])
     r_model_out_size = len(env.metrics)
     # Make the reward model a small MLP
     reward_model = RewardModel(r_model_obs_shape, r_model_out_size)
@@ -101,7 +200,7 @@ def train_reward_model(reward_model, optimizer, feats, metrics):
     # Compute the loss
     loss = 0
     # feats = feats.view(feats.shape[0], -1)
-    feats = rearrange(feats, "b h w c -> b c h w")
+    feats = th.movedim(feats, -1, 1)
     pred = reward_model(feats.float())
     loss += th.nn.functional.mse_loss(pred, metrics.float())
     # Backprop
@@ -109,3 +208,47 @@ def train_reward_model(reward_model, optimizer, feats, metrics):
     loss.backward()
     optimizer.step()
     return loss.item()
+
+
+def save_reward_model(path: str, reward_model: RewardModel, obs_shape: tuple, metric_keys: list):
+    """Save a reward model's weights, along with what we need to rebuild it and interpret its outputs."""
+    th.save(
+        {
+            "state_dict": reward_model.state_dict(),
+            "obs_shape": tuple(obs_shape),
+            "metric_keys": list(metric_keys),
+        },
+        path,
+    )
+
+
+class StatsSurrogate:
+    """Predicts a level's stats with a trained reward model, as a cheap stand-in for `Problem.get_stats`."""
+
+    def __init__(self, path: str):
+        ckpt = th.load(path, map_location="cpu")
+        self.obs_shape = ckpt["obs_shape"]
+        self.metric_keys = ckpt["metric_keys"]
+        self.model = RewardModel(self.obs_shape, len(self.metric_keys))
+        self.model.load_state_dict(ckpt["state_dict"])
+        self.model.eval()
+
+    @th.no_grad()
+    def predict(self, maps: np.ndarray) -> np.ndarray:
+        """Predict stats for a batch of discrete maps, of shape (b, *map_shape). Returns an array of shape
+        (b, len(metric_keys))."""
+        feats = onehot_maps(np.asarray(maps, dtype=np.uint8), self.obs_shape[0])
+        return self.model(th.movedim(feats, -1, 1)).numpy()
+
+    def predict_stats(self, disc_map: np.ndarray) -> dict:
+        return dict(zip(self.metric_keys, self.predict(disc_map[None])[0].tolist()))
+
+
+# Surrogates are shared by all envs in a process, so that we only load each checkpoint once.
+_SURROGATES = {}
+
+
+def get_stats_surrogate(path: str) -> StatsSurrogate:
+    if path not in _SURROGATES:
+        _SURROGATES[path] = StatsSurrogate(path)
+    return _SURROGATES[path]
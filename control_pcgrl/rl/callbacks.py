@@ -1,22 +1,48 @@
 from pdb import set_trace as TT
-from typing import Dict
+from typing import Dict, Optional
 
 import numpy as np
 from ray.rllib.algorithms.callbacks import DefaultCallbacks
 from ray.rllib.env import BaseEnv
+from ray.rllib.env.env_context import EnvContext
 from ray.rllib.evaluation import Episode, RolloutWorker
 from ray.rllib.policy import Policy
 from ray.rllib.policy.sample_batch import SampleBatch
 from ray.rllib.algorithms import Algorithm
-from ray.rllib.utils.typing import AgentID, PolicyID
+from ray.rllib.utils.typing import AgentID, EnvType, PolicyID
 from ray.tune import Callback
 
+from control_pcgrl.rl.metrics import MetricsAggregator
+from control_pcgrl.task_assignment import assign_tasks
+
 
 class StatsCallbacks(DefaultCallbacks):
     def __init__(self, cfg, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.metrics_callback = {}
         self.holey = "holey" in cfg.task.name
+        # As in `make_env`, which then wraps training envs in an `ALPGMMTeacher`.
+        self.alp_gmm = not cfg.evaluate and cfg.controls is not None and cfg.controls.alp_gmm
+        self.teacher = None
+        # Summaries of this worker's training episodes since the driver last collected them (see `pop_metrics`).
+        self.aggregator = None
+
+    def on_sub_environment_created(
+        self,
+        *,
+        worker: RolloutWorker,
+        sub_environment: EnvType,
+        env_context: EnvContext,
+        env_index: Optional[int] = None,
+        **kwargs,
+    ) -> None:
+        if not worker.config.in_evaluation:
+            return
+        # Give each eval env its own contiguous slice of the problem's eval maps, which it then plays in turn.
+        env = sub_environment
+        unwrapped = env._unwrapped if hasattr(env, "_unwrapped") else env.unwrapped
+        n_maps = len(unwrapped._prob.eval_maps)
+        unwrapped.queue_maps(assign_tasks(range(n_maps), env_context, worker.config.num_envs_per_worker))
 
     def on_episode_start(
         self,
@@ -35,6 +61,8 @@ class StatsCallbacks(DefaultCallbacks):
             "ERROR: `on_episode_start()` callback should be called right "
             "after env reset!"
         )
+        if not worker.config.in_evaluation:
+            return
         for k in env.ctrl_metrics:
             episode.hist_data.update(
                 {
@@ -101,6 +129,19 @@ class StatsCallbacks(DefaultCallbacks):
         unwrapped = env._unwrapped if hasattr(env, "_unwrapped") else env.unwrapped
         episode_stats = unwrapped._rep_stats
 
+        # Training episodes are only summarized here, on the worker. Evaluation keeps each episode's stats, to match
+        # them with the targets (or holes) each env was assigned.
+        if not worker.config.in_evaluation:
+            if self.aggregator is None:
+                self.aggregator = MetricsAggregator(unwrapped.cond_bounds, env.ctrl_metrics)
+            stats = {k: v for k, v in episode_stats.items() if k != "solution"}
+            stats.update({f"surrogate_error-{k}": np.mean(errs) for k, errs in unwrapped._surrogate_errors.items()})
+            for k in ["static_prob", "n_static_walls"]:
+                if hasattr(unwrapped._rep, k):
+                    stats[k] = getattr(unwrapped._rep, k)
+            self.aggregator.add_episode(stats, {k: env.metric_trgs[k] for k in env.ctrl_metrics})
+            return
+
         # stats_list = ['regions', 'connectivity', 'path-length']
         # write to tensorboard file (if enabled)
         # episode.hist_data.update({k: [v] for k, v in episode_stats.items()})
@@ -108,6 +149,14 @@ class StatsCallbacks(DefaultCallbacks):
             {k: [v] for k, v in episode_stats.items() if k != "solution"}
         )
 
+        # Mean absolute error of the stats surrogate (if any) over this episode's exact steps.
+        episode.custom_metrics.update(
+            {
+                f"surrogate_error-{k}": [np.mean(errs)]
+                for k, errs in unwrapped._surrogate_errors.items()
+            }
+        )
+
         # TODO: log ctrl targets and success rate as heatmap: x is timestep, y is ctrl target, heatmap is success rate
 
         for k in env.ctrl_metrics:
@@ -168,3 +217,34 @@ class StatsCallbacks(DefaultCallbacks):
                     "n_static_walls": [unwrapped._rep.n_static_walls],
                 }
             )
+
+    def pop_metrics(self):
+        """The summaries of this worker's training episodes since the last call (or None, if there were none)."""
+        aggregator, self.aggregator = self.aggregator, None
+        return aggregator
+
+    def on_train_result(self, *, algorithm: Algorithm, result: dict, **kwargs) -> None:
+        # Merge the summaries of all workers' episodes into this iteration's custom metrics.
+        aggregators = algorithm.workers.foreach_worker(lambda w: w.callbacks.pop_metrics())
+        aggregators = [a for a in aggregators if a is not None]
+        if aggregators:
+            for aggregator in aggregators[1:]:
+                aggregators[0].merge(aggregator)
+            result["custom_metrics"].update(aggregators[0].summary())
+            result["ctrl_heatmaps"] = aggregators[0].get_heatmaps()
+
+        if self.alp_gmm:
+            self._update_teacher(algorithm.workers)
+
+    def _update_teacher(self, workers) -> None:
+        """Fit a single ALP-GMM teacher on the episodes of all workers' envs, then share it with them, so that they
+        do not each fit their own."""
+        if self.teacher is None:
+            # Start from a copy of an env's teacher, with the same bounds on control targets.
+            self.teacher = next(t for w in workers.foreach_env(lambda env: env.teacher) for t in w)
+        for worker_outcomes in workers.foreach_env(lambda env: env.pop_outcomes()):
+            for trg_vecs, losses in worker_outcomes:
+                self.teacher.update(trg_vecs, losses)
+        # Until the teacher is first fit, this has envs sample targets uniformly.
+        state = self.teacher.get_state()
+        workers.foreach_env(lambda env: env.set_task(state))
@@ -17,6 +17,7 @@ import seaborn as sns
 from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
 
 from control_pcgrl.configs.config import Config, CrossEvalConfig
+from control_pcgrl.rl.results_store import ResultsStore, flatten_dict
 from control_pcgrl.rl.utils import get_log_dir, PROB_CONTROLS, validate_config
 from tex_formatting import newline
 
@@ -26,6 +27,7 @@ from tex_formatting import newline
 
 RUNS_DIR = os.path.join(Path(__file__).parent.parent.parent, "rl_runs")
 EVAL_DIR = os.path.join(Path(__file__).parent.parent.parent, "rl_eval")
+RESULTS_STORE_DIR = os.path.join(EVAL_DIR, "results_store")
 
 
 # flatten the dictionary here
@@ -82,47 +84,24 @@ def flatten_stats(stats, controllable=False):
     return flat_stats
 
 
-def flatten_dict(d, parent_key="", sep="_"):
-    items = []
-    for k, v in d.items():
-        new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        else:
-            items.append((new_key, v))
-    return dict(items)
-
-
 def cross_evaluate_static(
-    cross_eval_cfg: Config, sweep_configs: List[Config], sweep_params: Dict[str, str]
+    cross_eval_cfg: Config,
+    sweep_configs: List[Config],
+    sweep_params: Dict[str, str],
+    store: ResultsStore,
 ):
     static_trains_to_eval_stats = {}
+    log_dir_to_exp_tpl = {}
     for exp_cfg in sweep_configs:
-        exp_path = exp_cfg.log_dir
         exp_tpl = (exp_cfg.static_prob, exp_cfg.n_static_walls)
         static_trains_to_eval_stats[exp_tpl] = {}
-        eval_stat_files = [
-            f
-            for f in os.listdir(exp_path)
-            if f.startswith("static") and f.endswith(".json")
-        ]
-        for eval_stat_file in eval_stat_files:
-            # Use regular expression to get floats `static-prob-{0}_static-walls-{1}_eval_stats.json`
-            groups = re.findall(
-                r"static-prob-(.+)_static-walls-(\d+)_eval_stats.json", eval_stat_file
-            )
-            static_prob, static_walls = float(groups[0][0]), int(groups[0][1])
-            with open(os.path.join(exp_path, eval_stat_file), "r") as f:
-                eval_stats = json.load(f)
-            eval_tpl = (static_prob, static_walls)
-            if eval_tpl in static_trains_to_eval_stats[exp_tpl]:
-                static_trains_to_eval_stats[exp_tpl][eval_tpl].append(
-                    eval_stats["episode_reward_mean"]
-                )
-            else:
-                static_trains_to_eval_stats[exp_tpl][eval_tpl] = [
-                    eval_stats["episode_reward_mean"]
-                ]
+        log_dir_to_exp_tpl[str(exp_cfg.log_dir)] = exp_tpl
+    static_df = store.query_static(list(log_dir_to_exp_tpl.keys()))
+    for log_dir, static_prob, static_walls, val in static_df.itertuples(index=False):
+        eval_tpl = (static_prob, int(static_walls))
+        static_trains_to_eval_stats[log_dir_to_exp_tpl[log_dir]].setdefault(
+            eval_tpl, []
+        ).append(val)
     static_trains_to_agg_stats = {
         exp_tpl: {k: (np.mean(v), np.std(v)) for k, v in eval_stats.items()}
         for exp_tpl, eval_stats in static_trains_to_eval_stats.items()
@@ -173,26 +152,17 @@ def cross_evaluate(
     """
     # validate_config(cross_eval_config)
     # [validate_config(c) for c in sweep_configs]
-    if cross_eval_cfg.plot_loss:
-        for cfg in sweep_configs:
-            tensorboard_dir = str(cfg.log_dir)
-            # Find all files names `progress.csv` stored in any child of this directory using glob
-            progress_files = glob.glob(
-                os.path.join(tensorboard_dir, "**", "progress.csv"), recursive=True
-            )
-            loss_values = {}
-            df = None
 
-            for progress_file in progress_files:
-                # Load the progress.csv file
-                if df is None:
-                    df = pd.read_csv(progress_file)
-                else:
-                    # Concatenate the dataframes
-                    df = pd.concat([df, pd.read_csv(progress_file)])
+    # Ingest any new or modified eval outputs into the results store. Everything below queries the store.
+    store = ResultsStore(RESULTS_STORE_DIR)
+    log_dirs = [str(cfg.log_dir) for cfg in sweep_configs]
+    n_ingested = store.refresh(log_dirs, find_progress=cross_eval_cfg.plot_loss)
+    print(f"Ingested {n_ingested} new or modified result files into {store.store_dir}")
 
-            # Sort the dataframe by `timesteps_total`
-            df = df.sort_values(by=["timesteps_total"])
+    if cross_eval_cfg.plot_loss:
+        for cfg in sweep_configs:
+            # Rows from all `progress.csv` files stored in any child of this directory, sorted by `timesteps_total`
+            df = store.query_progress(str(cfg.log_dir))
 
             # Plot the loss curve with `timesteps_total` on the x-axis and `episode_reward_mean` on the y-axis
             plt.plot(df["timesteps_total"], df["episode_reward_mean"])
@@ -205,7 +175,7 @@ def cross_evaluate(
             plt.close()
 
     if cross_eval_cfg.name == "static_tiles":
-        cross_evaluate_static(cross_eval_cfg, sweep_configs, sweep_params)
+        cross_evaluate_static(cross_eval_cfg, sweep_configs, sweep_params, store)
 
     keys = [
         "task",
@@ -300,23 +270,9 @@ def cross_evaluate(
     # row_headers = sorted(row_headers, key=sort_map.__getitem__)
 
     rows = []
-    vals = []
+    row_log_dirs = []
 
     for experiment in sweep_configs:
-        exp_path = experiment.log_dir
-        path = os.path.join(exp_path, "eval_stats.json")
-
-        if not os.path.isfile(path):
-            print(f"No eval_stats.json found in {path}")
-            continue
-
-        print(f"Loading eval stats from {path}")
-
-        with open(path, "r") as f:
-            stats = json.load(f)
-            # stats = flatten_stats(stats)
-            stats = flatten_dict(stats)
-
         row = []
 
         for k in row_headers:
@@ -340,9 +296,21 @@ def cross_evaluate(
                 row.append(str(v))
 
         rows.append(row)
+        row_log_dirs.append(str(experiment.log_dir))
 
-        exp_stats = [stats[k] for k in col_headers if k in stats]
-        vals.append(exp_stats)
+    store.register_experiments(
+        pd.DataFrame(rows, columns=row_headers, index=pd.Index(row_log_dirs, name="log_dir"))
+    )
+    store.save()
+
+    stats_df = store.query_eval(row_log_dirs, col_headers)
+    for log_dir in row_log_dirs:
+        if log_dir not in stats_df.index:
+            print(f"No eval_stats.json found in {log_dir}")
+    log_dir_to_row = dict(zip(row_log_dirs, rows))
+    rows = [log_dir_to_row[log_dir] for log_dir in stats_df.index]
+    col_headers = list(stats_df.columns)
+    vals = stats_df.to_numpy()
 
     # Rename row_headers
     row_headers = [
@@ -17,11 +17,14 @@ import seaborn as sns
 
 from control_pcgrl.configs.config import EvalConfig
 from control_pcgrl.envs.pcgrl_env import PcgrlEnv
-from control_pcgrl.rl.utils import IdxCounter
+from control_pcgrl.task_assignment import assign_tasks
 
 
 LOAD_STATS = True
 CONTROL_DOORS = False
+# When evaluating door placement, generate a single level and measure the path between every pair of doors in it (in
+# one search), rather than generating a level for each pair.
+SEARCH_DOORS = False
 CONTROLS = False
 GENERAL_EVAL = True
 
@@ -243,31 +246,15 @@ def test_doors(trainer, env, cfg):
         for hole in all_holes_total
         if (tuple(hole[0][0]), tuple(hole[1][0])) not in ctrl_stats
     ]
-    n_envs = max(1, cfg.num_workers) * cfg.num_envs_per_worker
-    if len(all_holes) >= n_envs:
-        # holes_tpl = [tuple([tuple([coord for coord in hole]) for hole in hole_pair]) for hole_pair in all_holes]
-        env_hole_int = len(all_holes) // n_envs
-        env_holes = [
-            all_holes[env_hole_int * i : env_hole_int * (i + 1)] for i in range(n_envs)
-        ]
-        envs = trainer.evaluation_workers.foreach_env(lambda env: env)
-        envs = [env for worker_env in envs for env in worker_env]
-        idx_counter = IdxCounter.options(name="idx_counter", max_concurrency=1).remote()
-        idx_counter.set_keys.remote(all_holes)
-        hashes = trainer.evaluation_workers.foreach_env(
-            lambda env: hash(env.unwrapped._prob)
-        )
-        hashes = [hash for worker_hash in hashes for hash in worker_hash]
-        # hashes = [hash(env.unwrapped._prob) for env in envs]
-        idx_counter.set_hashes.remote(hashes)
-        # FIXME: Sometimes hash-to-idx dict is not set by the above call?
-        assert ray.get(idx_counter.scratch.remote())
-        # Assign envs to worlds
-        # trainer.workers.foreach_worker(
-        # lambda worker: worker.foreach_env(lambda env: env.queue_worlds(worlds=eval_mazes, idx_counter=idx_counter, load_now=True)))
-
-        trainer.evaluation_workers.foreach_env(
-            lambda env: env.unwrapped._prob.queue_holes(idx_counter)
+    if SEARCH_DOORS:
+        ctrl_stats = search_doors(trainer, env, all_holes_total)
+        pickle.dump(ctrl_stats, open(ctrl_stats_fname, "wb"))
+    else:
+        # Give each eval env its own contiguous slice of the remaining holes.
+        trainer.evaluation_workers.foreach_env_with_context(
+            lambda env, env_ctx: env.unwrapped._prob.queue_holes(
+                assign_tasks(all_holes, env_ctx, cfg.num_envs_per_worker)
+            )
         )
 
         while len(ctrl_stats) < len(all_holes_total):
@@ -509,6 +496,19 @@ def test_doors(trainer, env, cfg):
     return {}
 
 
+def search_doors(trainer, env, hole_pairs):
+    """Generate a level, then get the length of the path between the doors of each of these pairs in it."""
+    obs, info = env.reset()
+    done = False
+    while not done:
+        obs, reward, done, truncated, info = env.step(trainer.compute_single_action(obs))
+    door_stats = env.unwrapped._prob.get_door_stats(env.unwrapped._get_stats_map(), hole_pairs)
+    return {
+        (tuple(hole[0][0]), tuple(hole[1][0])): path_len
+        for hole, path_len in zip(hole_pairs, door_stats["connected-path-length"].tolist())
+    }
+
+
 # TODO Rename this here and in `test_doors`
 def _extracted_from_test_doors_(ax, i):
     ax.set_xlabel("x difference")
@@ -545,18 +545,9 @@ def _extracted_from_test_control_4(env, ctrl, cfg, trainer):
     # Repeat certain targets so we can take the average over noisy behavior (we're assuming that eval explore=True here)
     all_trgs *= 5
     # holes_tpl = [tuple([tuple([coord for coord in hole]) for hole in hole_pair]) for hole_pair in all_holes]
-    n_envs = max(1, cfg.num_workers) * cfg.num_envs_per_worker
-    idx_counter = IdxCounter.options(name="idx_counter").remote()
-    idx_counter.set_keys.remote(all_trgs)
-    hashes = trainer.evaluation_workers.foreach_env(lambda env: hash(env))
-    hashes = [hash for worker_hash in hashes for hash in worker_hash]
-    # hashes = [hash(env.unwrapped._prob) for env in envs]
-    idx_counter.set_hashes.remote(hashes)
-    # FIXME: Sometimes hash-to-idx dict is not set by the above call?
-    ret = ray.get(idx_counter.scratch.remote())
     result = {v: [] for v in all_trg_ints}
-    trainer.evaluation_workers.foreach_env(
-        lambda env: env.queue_control_trgs(idx_counter)
+    trainer.evaluation_workers.foreach_env_with_context(
+        lambda env, env_ctx: env.queue_control_trgs(assign_tasks(all_trgs, env_ctx, cfg.num_envs_per_worker))
     )
 
     n_eps = 0
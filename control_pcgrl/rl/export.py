@@ -0,0 +1,132 @@
+"""
+Export a trained generator policy as a standalone TorchScript or ONNX artifact, for use with `control_pcgrl.runtime`.
+
+The export directory contains the model (`policy.pt` or `policy.onnx`) and `spec.json`, which describes the observation
+pipeline (cropping, one-hot encoding, control-target channels) and the representation's dynamics, so that levels can be
+generated without rebuilding the env or an RLlib trainer.
+"""
+import json
+import os
+
+import hydra
+import numpy as np
+import torch as th
+from torch import nn
+
+from control_pcgrl.configs.config import ExportConfig
+from control_pcgrl.envs.probs.holey_prob import HoleyProblem
+from control_pcgrl.envs.probs.problem import Problem3D
+
+
+SPEC_FILE = "spec.json"
+MODEL_FILES = {"torchscript": "policy.pt", "onnx": "policy.onnx"}
+
+
+class _PolicyLogits(nn.Module):
+    """Wraps an RLlib `TorchModelV2`, mapping a batch of (channel-last) observations to action logits."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, obs):
+        logits, _ = self.model({"obs": obs}, [], None)
+        return logits
+
+
+def get_obs_pipeline_spec(env, cfg: ExportConfig) -> dict:
+    """Describe how the (wrapped) env turns its map into observations, and how actions edit the map."""
+    unwrapped = env.unwrapped
+    rep = unwrapped._rep.unwrapped
+    prob = unwrapped._prob
+
+    if issubclass(type(prob), Problem3D) or issubclass(type(prob), HoleyProblem):
+        raise NotImplementedError("Exporting generators for 3D or holey problems is not supported.")
+    if cfg.static_tile_wrapper or cfg.show_agents or cfg.n_aux_tiles > 0:
+        raise NotImplementedError(
+            "Exporting generators with static tiles, agent channels or auxiliary tiles is not supported."
+        )
+    if cfg.multiagent.n_agents != 0:
+        raise NotImplementedError("Exporting multi-agent generators is not supported.")
+
+    spec = {
+        "representation": cfg.representation,
+        "map_shape": list(cfg.task.map_shape),
+        "tile_types": list(prob.get_tile_types()),
+        "n_tiles": unwrapped.get_num_tiles(),
+        "max_iterations": int(unwrapped._max_iterations),
+        "max_changes": None
+        if unwrapped._max_changes is None
+        else int(unwrapped._max_changes),
+        "obs_shape": list(env.observation_space.shape),
+        "action_space_n": int(env.action_space.n),
+    }
+
+    if cfg.representation == "narrow":
+        if rep._random_tile:
+            raise NotImplementedError("Exporting narrow generators with random tile order is not supported.")
+        spec["obs_window"] = list(cfg.task.obs_window)
+        # The order in which the agent visits tiles.
+        spec["act_coords"] = np.asarray(rep._act_coords).tolist()
+    elif cfg.representation != "wide":
+        raise NotImplementedError(
+            f"Exporting generators for the {cfg.representation} representation is not supported."
+        )
+
+    ctrl_metrics = list(env.ctrl_metrics) if env.controllable else []
+    spec["ctrl_metrics"] = ctrl_metrics
+    spec["param_ranges"] = {k: float(env.param_ranges[k]) for k in ctrl_metrics}
+    spec["default_ctrl_trgs"] = {k: env.metric_trgs[k] for k in ctrl_metrics}
+
+    return spec
+
+
+def export_policy(policy, env, cfg: ExportConfig, export_dir: str, fmt: str = "torchscript"):
+    """Export an RLlib torch policy's model, along with the spec of its observation pipeline.
+
+    Args:
+        policy: The (restored) RLlib policy whose model we export.
+        env: An env built with the same config as the policy was trained on.
+        cfg: The config of the experiment.
+        export_dir: Directory in which to write the model and its spec.
+        fmt: Either "torchscript" or "onnx".
+    """
+    if fmt not in MODEL_FILES:
+        raise ValueError(f"Invalid export format: {fmt}")
+    spec = get_obs_pipeline_spec(env, cfg)
+    spec["format"] = fmt
+    spec["model"] = type(policy.model).__name__
+    spec["model_file"] = MODEL_FILES[fmt]
+
+    os.makedirs(export_dir, exist_ok=True)
+    module = _PolicyLogits(policy.model).cpu().eval()
+    dummy_obs = th.zeros((1, *spec["obs_shape"]), dtype=th.float32)
+    model_path = os.path.join(export_dir, spec["model_file"])
+    with th.no_grad():
+        if fmt == "torchscript":
+            traced = th.jit.trace(module, dummy_obs)
+            traced = th.jit.freeze(traced)
+            traced.save(model_path)
+        else:
+            th.onnx.export(
+                module,
+                dummy_obs,
+                model_path,
+                input_names=["obs"],
+                output_names=["logits"],
+                dynamic_axes={"obs": {0: "batch"}, "logits": {0: "batch"}},
+            )
+
+    with open(os.path.join(export_dir, SPEC_FILE), "w") as f:
+        json.dump(spec, f, indent=4)
+
+    return export_dir
+
+
+@hydra.main(version_base="1.3", config_path="../configs", config_name="export")
+def main(cfg: ExportConfig):
+    assert cfg.export is True
+    # Restore the trained policy with the usual machinery in our main training function, which calls `export_policy`.
+    from control_pcgrl.rl.train import main as train_main
+
+    train_main(cfg)
@@ -0,0 +1,182 @@
+"""
+Fixed-size, mergeable summaries of episode stats, kept on each rollout worker over a training iteration.
+
+Rather than sending every episode's stats (and control targets) to the driver as single-element lists, which RLlib then
+keeps as histograms, each worker adds them to a `MetricsAggregator`. Once per iteration, the driver collects and merges
+the aggregators of all workers, and reports a handful of numbers per metric: running moments, quantiles from a
+fixed-bin sketch, and, for each control metric, a heatmap of episodes by control target and achieved value.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def _get_bin(value: float, low: float, high: float, n_bins: int) -> int:
+    """The index of the (equal-width) bin between `low` and `high` of a value, clipped to the first or last bin."""
+    width = (high - low) / n_bins
+    if width <= 0:
+        return 0
+    return int(np.clip((value - low) // width, 0, n_bins - 1))
+
+
+class RunningMoments:
+    """The count, mean, variance, min and max of a stream of values (merged with Chan et al.'s parallel update)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningMoments"):
+        count = self.count + other.count
+        if other.count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.m2 / self.count) if self.count > 0 else 0.0
+
+
+class QuantileSketch:
+    """A histogram of values over fixed bins between known bounds, from which quantiles are interpolated.
+
+    Values outside the bounds are counted in the first or last bin. Quantiles are within a bin's width of the exact
+    ones (and so exact for integer values, if bins are at most 1 wide).
+    """
+
+    def __init__(self, low: float, high: float, n_bins: int = 64):
+        self.low, self.high = float(low), float(high)
+        self.counts = np.zeros(n_bins, dtype=np.int32)
+
+    def add(self, value: float):
+        self.counts[_get_bin(value, self.low, self.high, len(self.counts))] += 1
+
+    def merge(self, other: "QuantileSketch"):
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> float:
+        total = self.counts.sum()
+        if total == 0:
+            return np.nan
+        cum_counts = np.cumsum(self.counts)
+        # Interpolate within the bin in which the quantile falls.
+        i = int(np.searchsorted(cum_counts, q * total))
+        before = cum_counts[i - 1] if i > 0 else 0
+        frac = (q * total - before) / self.counts[i] if self.counts[i] > 0 else 0.0
+        width = (self.high - self.low) / len(self.counts)
+        return self.low + (i + frac) * width
+
+
+class CtrlHeatmap:
+    """Counts of episodes by (binned) control target and achieved value, with their mean success, `1 - |value -
+    target| / range` (as in `ControllableTrainer.train`)."""
+
+    def __init__(self, low: float, high: float, n_bins: int = 16):
+        self.low, self.high = float(low), float(high)
+        self.counts = np.zeros((n_bins, n_bins), dtype=np.int32)
+        self.success = RunningMoments()
+
+    def add(self, trg: float, val: float):
+        n_bins = len(self.counts)
+        self.counts[_get_bin(trg, self.low, self.high, n_bins), _get_bin(val, self.low, self.high, n_bins)] += 1
+        value_range = self.high - self.low
+        self.success.add(1 - abs(val - trg) / value_range if value_range > 0 else float(val == trg))
+
+    def merge(self, other: "CtrlHeatmap"):
+        self.counts += other.counts
+        self.success.merge(other.success)
+
+
+class MetricsAggregator:
+    """Summaries of the stats of a worker's episodes, for each metric, and for each control metric.
+
+    Args:
+        bounds: The (low, high) bounds of metrics, for their quantile sketches. Metrics without bounds only get moments.
+        ctrl_metrics: The metrics whose targets are controlled.
+    """
+
+    def __init__(
+        self,
+        bounds: Dict[str, Tuple[float, float]],
+        ctrl_metrics: Iterable[str] = (),
+        n_bins: int = 64,
+        n_heatmap_bins: int = 16,
+    ):
+        self.bounds = dict(bounds)
+        self.n_bins = n_bins
+        self.n_episodes = 0
+        self.moments: Dict[str, RunningMoments] = {}
+        self.sketches: Dict[str, QuantileSketch] = {}
+        self.heatmaps = {k: CtrlHeatmap(*self.bounds[k], n_heatmap_bins) for k in ctrl_metrics}
+
+    def add_episode(self, stats: Dict[str, float], trgs: Optional[Dict[str, float]] = None):
+        """Add the stats at the end of an episode, and the control targets it was given."""
+        self.n_episodes += 1
+        for k, v in stats.items():
+            if k not in self.moments:
+                self.moments[k] = RunningMoments()
+                if k in self.bounds:
+                    self.sketches[k] = QuantileSketch(*self.bounds[k], self.n_bins)
+            self.moments[k].add(float(v))
+            if k in self.sketches:
+                self.sketches[k].add(float(v))
+        for k, heatmap in self.heatmaps.items():
+            if trgs is not None and k in trgs:
+                trg = trgs[k]
+                # A target range counts as its midpoint.
+                if isinstance(trg, tuple):
+                    trg = (trg[0] + trg[1]) / 2
+                heatmap.add(float(trg), float(stats[k]))
+
+    def merge(self, other: "MetricsAggregator"):
+        self.n_episodes += other.n_episodes
+        for k, moments in other.moments.items():
+            if k not in self.moments:
+                self.moments[k] = RunningMoments()
+            self.moments[k].merge(moments)
+        for k, sketch in other.sketches.items():
+            if k not in self.sketches:
+                self.sketches[k] = QuantileSketch(sketch.low, sketch.high, len(sketch.counts))
+            self.sketches[k].merge(sketch)
+        for k, heatmap in other.heatmaps.items():
+            if k not in self.heatmaps:
+                self.heatmaps[k] = CtrlHeatmap(heatmap.low, heatmap.high, len(heatmap.counts))
+            self.heatmaps[k].merge(heatmap)
+
+    def summary(self) -> Dict[str, float]:
+        """Scalar summaries of each metric, named as RLlib names its custom metrics (e.g. `path-length_mean`)."""
+        summary = {}
+        for k, moments in self.moments.items():
+            summary[f"{k}_mean"] = moments.mean
+            summary[f"{k}_std"] = moments.std
+            summary[f"{k}_min"] = moments.min
+            summary[f"{k}_max"] = moments.max
+            if k in self.sketches:
+                for q in QUANTILES:
+                    summary[f"{k}_p{int(q * 100)}"] = self.sketches[k].quantile(q)
+        for k, heatmap in self.heatmaps.items():
+            if heatmap.success.count > 0:
+                summary[f"{k}-scc_mean"] = heatmap.success.mean
+        return summary
+
+    def get_heatmaps(self) -> Dict[str, np.ndarray]:
+        """For each control metric, the number of episodes in each (target bin, achieved value bin)."""
+        return {k: heatmap.counts for k, heatmap in self.heatmaps.items()}
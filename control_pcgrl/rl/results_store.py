@@ -0,0 +1,239 @@
+"""
+An on-disk store of evaluation results, used by cross-evaluation.
+
+Each experiment's eval outputs (`eval_stats.json`, the `static-prob-{p}_static-walls-{n}_eval_stats.json` files written
+by `evaluate_static`, and any `progress.csv` written by tune) are parsed once and kept in columnar (parquet) tables. On
+later invocations, only files whose mtime or size has changed are re-read, and these are parsed in a process pool. Table
+and figure generation in `cross_eval.py` then queries the store instead of globbing and re-reading every experiment
+directory.
+"""
+import glob
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+STATIC_EVAL_RE = re.compile(r"static-prob-(.+)_static-walls-(\d+)_eval_stats.json")
+
+# Columns of `progress.csv` that we keep around (for plotting loss curves).
+PROGRESS_COLS = ["timesteps_total", "episode_reward_mean"]
+
+# Kinds of files we ingest.
+EVAL = "eval"
+STATIC_EVAL = "static_eval"
+PROGRESS = "progress"
+
+
+def flatten_dict(d, parent_key="", sep="_"):
+    items = []
+    for k, v in d.items():
+        new_key = parent_key + sep + k if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flatten_dict(v, new_key, sep=sep).items())
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+
+def _scalar_stats(stats: dict) -> Dict[str, float]:
+    """Keep only the numeric leaves of a (flattened) stats dictionary."""
+    return {
+        k: float(v)
+        for k, v in flatten_dict(stats).items()
+        if isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+    }
+
+
+def _find_eval_files(log_dir: str, find_progress: bool):
+    """Return (path, kind) for every result file belonging to an experiment."""
+    files = []
+    if not os.path.isdir(log_dir):
+        return files
+    with os.scandir(log_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            if entry.name == "eval_stats.json":
+                files.append((entry.path, EVAL))
+            elif STATIC_EVAL_RE.fullmatch(entry.name):
+                files.append((entry.path, STATIC_EVAL))
+    if find_progress:
+        files += [
+            (f, PROGRESS)
+            for f in glob.glob(
+                os.path.join(log_dir, "**", "progress.csv"), recursive=True
+            )
+        ]
+    return files
+
+
+def _parse_file(path: str, kind: str, log_dir: str) -> pd.DataFrame:
+    """Parse a single result file into rows of the corresponding table. Runs in worker processes."""
+    if kind == PROGRESS:
+        df = pd.read_csv(path, usecols=lambda c: c in PROGRESS_COLS)
+        df["log_dir"] = log_dir
+        df["path"] = path
+        return df
+
+    with open(path, "r") as f:
+        stats = _scalar_stats(json.load(f))
+    static_prob, n_static_walls = np.nan, -1
+    if kind == STATIC_EVAL:
+        groups = STATIC_EVAL_RE.findall(os.path.basename(path))
+        static_prob, n_static_walls = float(groups[0][0]), int(groups[0][1])
+
+    # Long format, so that experiments logging different metrics share a schema.
+    return pd.DataFrame(
+        {
+            "log_dir": log_dir,
+            "path": path,
+            "kind": kind,
+            "eval_static_prob": static_prob,
+            "eval_n_static_walls": n_static_walls,
+            "metric": list(stats.keys()),
+            "value": list(stats.values()),
+        }
+    )
+
+
+def _parse_file_star(args):
+    return _parse_file(*args)
+
+
+def _concat(df: pd.DataFrame, new_dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    frames = [f for f in [df, *new_dfs] if len(f) > 0]
+    if not frames:
+        return df
+    return pd.concat(frames, ignore_index=True)
+
+
+class ResultsStore:
+    """Consolidated tables of evaluation results, refreshed incrementally based on file mtimes.
+
+    Tables (each a parquet file in `store_dir`):
+        files: the manifest of ingested files, with their mtime and size.
+        experiments: one row per experiment (log directory), with a column for each swept parameter.
+        stats: scalar eval stats in long format (log_dir, kind, eval_static_prob, eval_n_static_walls, metric, value).
+        progress: the `PROGRESS_COLS` of each experiment's `progress.csv` files.
+    """
+
+    TABLES = ("files", "experiments", "stats", "progress")
+
+    def __init__(self, store_dir: str, n_procs: Optional[int] = None):
+        self.store_dir = store_dir
+        self.n_procs = n_procs if n_procs is not None else os.cpu_count()
+        os.makedirs(store_dir, exist_ok=True)
+        self.files = self._load("files", ["path", "log_dir", "kind", "mtime", "size"])
+        self.experiments = self._load("experiments", ["log_dir"])
+        self.stats = self._load(
+            "stats",
+            [
+                "log_dir",
+                "path",
+                "kind",
+                "eval_static_prob",
+                "eval_n_static_walls",
+                "metric",
+                "value",
+            ],
+        )
+        self.progress = self._load("progress", ["log_dir", "path"] + PROGRESS_COLS)
+
+    def _table_path(self, name):
+        return os.path.join(self.store_dir, f"{name}.parquet")
+
+    def _load(self, name, columns):
+        path = self._table_path(name)
+        if os.path.isfile(path):
+            return pd.read_parquet(path)
+        return pd.DataFrame(columns=columns)
+
+    def save(self):
+        for name in self.TABLES:
+            getattr(self, name).reset_index(drop=True).to_parquet(
+                self._table_path(name), index=False
+            )
+
+    def register_experiments(self, experiments: pd.DataFrame):
+        """Upsert rows of swept parameters, indexed by `log_dir`."""
+        experiments = experiments.reset_index()
+        old = self.experiments[~self.experiments.log_dir.isin(experiments.log_dir)]
+        self.experiments = _concat(old, [experiments])
+
+    def refresh(self, log_dirs: Iterable[str], find_progress: bool = False) -> int:
+        """Ingest new or modified result files under the given experiment directories, and drop rows of files that
+        have since been deleted. Returns the number of (re-)ingested files."""
+        log_dirs = [str(d) for d in log_dirs]
+        on_disk = []
+        for log_dir in log_dirs:
+            for path, kind in _find_eval_files(log_dir, find_progress):
+                st = os.stat(path)
+                on_disk.append((path, log_dir, kind, st.st_mtime_ns, st.st_size))
+        on_disk = pd.DataFrame(on_disk, columns=self.files.columns)
+
+        # Files that are new, or have changed since we last read them.
+        known = set(zip(self.files.path, self.files.mtime, self.files["size"]))
+        stale = on_disk[
+            [
+                (p, m, s) not in known
+                for p, m, s in zip(on_disk.path, on_disk.mtime, on_disk["size"])
+            ]
+        ]
+        # Drop rows of stale files, and of files that have been removed from the experiments we are refreshing. We only
+        # looked for progress files if `find_progress`, so otherwise keep those we have.
+        removed = self.files.log_dir.isin(log_dirs) & ~self.files.path.isin(
+            on_disk.path
+        )
+        if not find_progress:
+            removed &= self.files.kind != PROGRESS
+        drop_paths = set(stale.path) | set(self.files.path[removed])
+
+        jobs = list(zip(stale.path, stale.kind, stale.log_dir))
+        if len(jobs) > 1 and self.n_procs > 1:
+            with ProcessPoolExecutor(max_workers=min(self.n_procs, len(jobs))) as ex:
+                parsed = list(ex.map(_parse_file_star, jobs, chunksize=8))
+        else:
+            parsed = [_parse_file(*job) for job in jobs]
+
+        new_stats = [p for p, (_, kind, _) in zip(parsed, jobs) if kind != PROGRESS]
+        new_progress = [p for p, (_, kind, _) in zip(parsed, jobs) if kind == PROGRESS]
+        self.stats = _concat(self.stats[~self.stats.path.isin(drop_paths)], new_stats)
+        self.progress = _concat(
+            self.progress[~self.progress.path.isin(drop_paths)], new_progress
+        )
+        self.files = _concat(self.files[~self.files.path.isin(drop_paths)], [stale])
+        return len(jobs)
+
+    def query_eval(self, log_dirs: List[str], metrics: List[str]) -> pd.DataFrame:
+        """Wide table of `eval_stats.json` metrics, one row per experiment (in the order of `log_dirs`), indexed by
+        `log_dir`. Experiments without eval stats are left out."""
+        stats = self.stats[
+            (self.stats.kind == EVAL)
+            & self.stats.log_dir.isin(log_dirs)
+            & self.stats.metric.isin(metrics)
+        ]
+        df = stats.pivot_table(index="log_dir", columns="metric", values="value")
+        with_eval = set(self.stats.log_dir[self.stats.kind == EVAL])
+        order = [d for d in log_dirs if d in with_eval]
+        return df.reindex(index=order, columns=[m for m in metrics if m in df.columns])
+
+    def query_static(
+        self, log_dirs: List[str], metric: str = "episode_reward_mean"
+    ) -> pd.DataFrame:
+        """Rows (log_dir, eval_static_prob, eval_n_static_walls, value) of per-setting static tile evaluations."""
+        stats = self.stats[
+            (self.stats.kind == STATIC_EVAL)
+            & (self.stats.metric == metric)
+            & self.stats.log_dir.isin(log_dirs)
+        ]
+        return stats[["log_dir", "eval_static_prob", "eval_n_static_walls", "value"]]
+
+    def query_progress(self, log_dir: str) -> pd.DataFrame:
+        return self.progress[self.progress.log_dir == log_dir].sort_values(
+            by=["timesteps_total"]
+        )
@@ -145,11 +145,14 @@ def ControllableTrainerFactory(trainer_cls):
                     / result["time_this_iter_s"]
                 )
 
-            # TODO: Send a heatmap to tb/wandb representing success reaching various control targets?
+            # Training episodes are summarized on workers, with a heatmap of control targets and achieved values (see
+            # `StatsCallbacks`), so that each episode's targets and values are only in `hist_stats` during evaluation.
             if len(result["custom_metrics"]) > 0:
                 n_bins = 20
                 result["custom_plots"] = {}
                 for metric in self.ctrl_metrics:
+                    if f"{metric}-trg" not in result["hist_stats"]:
+                        continue
                     # Scatter plots via wandb
                     # trgs = result['hist_stats'][f'{metric}-trg']
                     # vals = result['hist_stats'][f'{metric}-val']
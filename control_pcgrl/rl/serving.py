@@ -0,0 +1,232 @@
+"""
+An in-process level-generation server.
+
+Requests (optionally with control targets) are queued, and assigned to a pool of envs as these become free. All envs
+with a request in flight are stepped in lockstep, so that concurrent requests share batched policy forward passes.
+"""
+import collections
+import copy
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from control_pcgrl.configs.config import Config
+from control_pcgrl.rl.envs import make_env
+
+
+@dataclass
+class GenerationResult:
+    map: np.ndarray
+    stats: Dict
+    # Targets of all metrics the level was generated with (the defaults, updated with those requested).
+    ctrl_trgs: Dict
+    # Seconds from submission to completion, and the part of this spent waiting for a free env.
+    latency: float
+    queue_time: float
+
+
+@dataclass
+class _Request:
+    ctrl_trgs: Optional[Dict]
+    future: Future
+    t_submit: float
+    t_start: float = 0.0
+
+
+def rllib_policy_fn(policy) -> Callable[[np.ndarray], np.ndarray]:
+    """Batched (deterministic) actions from an RLlib policy, e.g. `trainer.get_policy()`."""
+
+    def policy_fn(obs):
+        actions, _, _ = policy.compute_actions(obs, explore=False)
+        return actions
+
+    return policy_fn
+
+
+class GenerationServer:
+    """Serve generated levels from a pool of envs, batching the policy over all requests in flight.
+
+    Args:
+        cfg: Config used to make the envs (as in training).
+        policy_fn: Maps a batch of observations to a batch of actions, e.g. `rllib_policy_fn(trainer.get_policy())` or
+            `GeneratorRuntime(export_dir).act`.
+        n_envs: Maximum number of requests to serve concurrently (i.e. the maximum batch size).
+        latency_window: Number of most recent requests over which latency percentiles are computed.
+    """
+
+    def __init__(
+        self,
+        cfg: Config,
+        policy_fn: Callable[[np.ndarray], np.ndarray],
+        n_envs: int = 16,
+        latency_window: int = 10_000,
+    ):
+        self.policy_fn = policy_fn
+        # So that control targets are set by requests, and not resampled by the wrappers we use during training.
+        cfg = copy.copy(cfg)
+        cfg.evaluate = True
+        self.envs = [make_env(cfg) for _ in range(n_envs)]
+        # Requests without targets get these (rather than those of whichever request last used the env).
+        self._default_trgs = copy.deepcopy(dict(self.envs[0].metric_trgs))
+        self._queue: Queue = Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._n_completed = 0
+        self._n_failed = 0
+        self._n_forward_passes = 0
+        self._n_env_steps = 0
+        self._t_start = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._t_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, ctrl_trgs: Optional[Dict] = None) -> Future:
+        """Queue a request for a level. Returns a future, resolving to a `GenerationResult`."""
+        future = Future()
+        self._queue.put(_Request(ctrl_trgs, future, time.perf_counter()))
+        return future
+
+    def get_stats(self) -> Dict:
+        """Latency percentiles (in milliseconds) over recent requests, and throughput since the server started."""
+        with self._lock:
+            latencies = np.array(self._latencies)
+            n_completed, n_failed = self._n_completed, self._n_failed
+            n_forward, n_steps = self._n_forward_passes, self._n_env_steps
+        elapsed = time.perf_counter() - self._t_start if self._t_start is not None else 0
+        stats = {
+            "n_completed": n_completed,
+            "n_failed": n_failed,
+            "n_pending": self._queue.qsize(),
+            "requests_per_sec": n_completed / elapsed if elapsed > 0 else 0.0,
+            "env_steps_per_sec": n_steps / elapsed if elapsed > 0 else 0.0,
+            "mean_batch_size": n_steps / n_forward if n_forward > 0 else 0.0,
+        }
+        for p in (50, 99):
+            stats[f"p{p}_latency_ms"] = (
+                float(np.percentile(latencies, p)) * 1000 if len(latencies) else float("nan")
+            )
+        return stats
+
+    def _start_request(self, env, request: _Request):
+        request.t_start = time.perf_counter()
+        # Targets are applied by the `ControlWrapper` on reset.
+        env.set_trgs({**self._default_trgs, **(request.ctrl_trgs or {})})
+        obs, _ = env.reset()
+        return obs
+
+    def _finish_request(self, env, request: _Request):
+        t_end = time.perf_counter()
+        result = GenerationResult(
+            map=env.unwrapped._rep.unwrapped._map.copy(),
+            stats={k: v for k, v in env.metrics.items() if k != "solution"},
+            ctrl_trgs=copy.deepcopy(dict(env.metric_trgs)),
+            latency=t_end - request.t_submit,
+            queue_time=request.t_start - request.t_submit,
+        )
+        with self._lock:
+            self._latencies.append(result.latency)
+            self._n_completed += 1
+        request.future.set_result(result)
+
+    def _fail_request(self, request: _Request, e: Exception):
+        with self._lock:
+            self._n_failed += 1
+        request.future.set_exception(e)
+
+    def _serve(self):
+        # Requests in flight, and their latest observations, by env index.
+        requests: Dict[int, _Request] = {}
+        obs: Dict[int, np.ndarray] = {}
+        free: List[int] = list(range(len(self.envs)))
+
+        while not self._stop.is_set():
+            # Assign queued requests to free envs. Block (briefly) only if there is nothing else to do.
+            while free:
+                try:
+                    request = self._queue.get(block=not requests, timeout=0.01)
+                except Empty:
+                    break
+                i = free.pop()
+                try:
+                    obs[i] = self._start_request(self.envs[i], request)
+                    requests[i] = request
+                except Exception as e:
+                    self._fail_request(request, e)
+                    free.append(i)
+            if not requests:
+                continue
+
+            idxs = list(requests.keys())
+            try:
+                actions = self.policy_fn(np.stack([obs[i] for i in idxs]))
+            except Exception as e:
+                for i in idxs:
+                    self._fail_request(requests.pop(i), e)
+                    free.append(i)
+                continue
+            with self._lock:
+                self._n_forward_passes += 1
+                self._n_env_steps += len(idxs)
+
+            for i, action in zip(idxs, actions):
+                env = self.envs[i]
+                try:
+                    obs[i], _, done, truncated, _ = env.step(action)
+                    if done or truncated:
+                        self._finish_request(env, requests.pop(i))
+                        free.append(i)
+                except Exception as e:
+                    self._fail_request(requests.pop(i), e)
+                    free.append(i)
+
+        # Cancel anything left over.
+        for request in requests.values():
+            request.future.cancel()
+        while True:
+            try:
+                self._queue.get_nowait().future.cancel()
+            except Empty:
+                break
+
+
+class LocalClient:
+    """Client for a `GenerationServer` in the same process."""
+
+    def __init__(self, server: GenerationServer):
+        self.server = server
+
+    def generate(self, ctrl_trgs: Optional[Dict] = None, timeout: Optional[float] = None) -> GenerationResult:
+        return self.server.submit(ctrl_trgs).result(timeout=timeout)
+
+    def generate_many(
+        self, ctrl_trgs: List[Optional[Dict]], timeout: Optional[float] = None
+    ) -> List[GenerationResult]:
+        """Submit many requests at once (so that they are served concurrently), and wait for all of them."""
+        futures = [self.server.submit(trgs) for trgs in ctrl_trgs]
+        return [f.result(timeout=timeout) for f in futures]
@@ -44,6 +44,7 @@ from ray.tune.registry import register_env
 from control_pcgrl.rl.callbacks import StatsCallbacks
 from control_pcgrl.rl.envs import make_env
 from control_pcgrl.rl.evaluate import evaluate
+from control_pcgrl.rl.export import export_policy
 from control_pcgrl.rl.models import (
     NCA,
     ConvDeconv2d,  # noqa : F401
@@ -57,7 +58,6 @@ from control_pcgrl.rl.models import (
     WideModel3DSkip,
 )
 from control_pcgrl.rl.utils import (
-    IdxCounter,
     get_env_name,
     get_log_dir,
     get_map_width,
@@ -72,7 +72,6 @@ from control_pcgrl.envs.probs import PROBLEMS
 # from control_pcgrl.envs.probs.minecraft.minecraft_3D_holey_maze_prob import (
 #     Minecraft3DholeymazeProblem,
 # )
-from control_pcgrl.task_assignment import set_map_fn
 from rllib_inference import get_latest_ckpt
 
 from control_pcgrl.hw_mods import utils as hw_utils
@@ -227,7 +226,9 @@ def main(cfg: Config) -> NoReturn:
     # FIXME: nope
     num_envs_per_worker = cfg.hardware.n_envs_per_worker if not cfg.infer else 1
     logger_type = (
-        {"type": "ray.tune.logger.TBXLogger"} if not (cfg.infer or cfg.evaluate) else {}
+        {"type": "ray.tune.logger.TBXLogger"}
+        if not (cfg.infer or cfg.evaluate or cfg.export)
+        else {}
     )
     eval_num_workers = num_workers if cfg.evaluate else 0
     model_cfg = {**cfg.model}
@@ -278,7 +279,7 @@ def main(cfg: Config) -> NoReturn:
         multiagent_config = {}
 
     # The rllib trainer config (see the docs here: https://docs.ray.io/en/latest/rllib/rllib-training.html)
-    num_workers = num_workers if not (cfg.evaluate or cfg.infer) else 1  #
+    num_workers = num_workers if not (cfg.evaluate or cfg.infer or cfg.export) else 1  #
 
     trainer_config: ppo.PPOConfig | dict[str, Any] = TrainerConfigParsers[
         cfg.algorithm
@@ -316,7 +317,7 @@ def main(cfg: Config) -> NoReturn:
     trainer_name = "CustomTrainer"
 
     # Do inference, i.e., observe agent behavior for many episodes.
-    if cfg.infer or cfg.evaluate:
+    if cfg.infer or cfg.evaluate or cfg.export:
         cfg: EvalConfig = cfg
         # trainer_config.update({
         # FIXME: The name of this config arg seems to have changed in rllib?
@@ -337,6 +338,19 @@ def main(cfg: Config) -> NoReturn:
             trainer = trainer_config.build()
             trainer.restore(ckpt)
 
+        if cfg.export:
+            export_dir = (
+                cfg.export_dir
+                if cfg.export_dir is not None
+                else os.path.join(log_dir, "export")
+            )
+            export_policy(
+                trainer.get_policy(), env, cfg, export_dir, fmt=cfg.export_format
+            )
+            log.info(f"Exported policy to {export_dir}")
+            ray.shutdown()
+            os._exit(0)
+
         if cfg.evaluate:
             eval_stats = evaluate(
                 trainer,
@@ -6,7 +6,6 @@ from pdb import set_trace as TT
 import copy
 import glob
 import os
-import ray
 import re
 
 import numpy as np
@@ -22,7 +21,6 @@ import torch
 
 from control_pcgrl.configs.config import Config, EvalConfig
 from control_pcgrl import wrappers
-from control_pcgrl.task_assignment import set_map_fn
 from control_pcgrl.rl.envs import make_env
 
 PROJ_DIR = Path(__file__).parent.parent.parent
@@ -69,52 +67,6 @@ PROB_CONTROLS = {
 }
 
 
-@ray.remote
-class IdxCounter:
-    """When using rllib trainer to train and simulate on evolved maps, this global object will be
-    responsible for providing unique indices to parallel environments."""
-
-    def __init__(self):
-        self.count = 0
-        self.keys = None
-
-    def get(self, hsh):
-        world_key_queue = self.hashes_to_keys[hsh]
-
-        if not world_key_queue:
-            raise Exception("No world keys provided.")
-
-        return world_key_queue
-
-    def set(self, i):
-        # For inference
-        self.count = i
-
-    def set_keys(self, keys):
-        self.count = 0
-        self.keys = keys
-
-    def set_hashes(self, hashes):
-        """
-        Note that we may assign multiple worlds to a single environment, or a single world to multiple environments.
-
-        We will only assign a single world to multiple environments if duplicate keys were provided to `set_idxs()`.
-
-        Args:
-            hashes: A list of hashes, one per environment object.
-        """
-        hashes_to_keys = {h: [] for h in hashes}
-
-        for i, wk in enumerate(self.keys):
-            h = hashes[i % len(hashes)]
-            hashes_to_keys[h].append(wk)
-
-        self.hashes_to_keys = hashes_to_keys
-
-    def scratch(self):
-        return self.hashes_to_keys
-
-
 def get_map_width(game):
     for k, v in MAP_WIDTHS:
         if k in game:
@@ -427,7 +379,6 @@ def parse_ppo_config(
             **cfg,  # Maybe env should get its own config? (A subset of the original?)
             "evaluation_env": False,
         },
-        env_task_fn=set_map_fn,
         disable_env_checking=True,
     )
     ppo_config.framework("torch")
@@ -0,0 +1,179 @@
+"""
+A lightweight CPU runtime for generators exported with `control_pcgrl/rl/export.py`.
+
+This module deliberately depends only on numpy and torch (or onnxruntime, for ONNX artifacts): it re-implements the
+observation pipeline and representation dynamics described by the exported `spec.json`, so that levels can be generated
+without Ray, gym, or building a PcgrlEnv.
+"""
+import json
+import math
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+SPEC_FILE = "spec.json"
+
+
+class GeneratorRuntime:
+    """Generate levels with an exported generator policy.
+
+    Args:
+        export_dir: Directory containing the exported model and its `spec.json`.
+        n_threads: Number of intra-op threads to use for inference.
+    """
+
+    def __init__(self, export_dir: str, n_threads: int = 1):
+        with open(os.path.join(export_dir, SPEC_FILE), "r") as f:
+            self.spec = spec = json.load(f)
+        self.representation = spec["representation"]
+        self.map_shape = tuple(spec["map_shape"])
+        self.n_tiles = spec["n_tiles"]
+        self.ctrl_metrics = spec["ctrl_metrics"]
+        self.param_ranges = spec["param_ranges"]
+        self.default_ctrl_trgs = spec["default_ctrl_trgs"]
+        if self.representation == "narrow":
+            self.obs_window = np.array(spec["obs_window"])
+            self.act_coords = np.array(spec["act_coords"])
+        self._eye = np.eye(
+            self.n_tiles + 1 if self.representation == "narrow" else self.n_tiles,
+            dtype=np.float32,
+        )
+        self._predict = self._load_model(
+            os.path.join(export_dir, spec["model_file"]), spec["format"], n_threads
+        )
+
+    @staticmethod
+    def _load_model(path: str, fmt: str, n_threads: int) -> Callable[[np.ndarray], np.ndarray]:
+        if fmt == "torchscript":
+            import torch as th
+
+            th.set_num_threads(n_threads)
+            model = th.jit.load(path, map_location="cpu")
+
+            def predict(obs):
+                with th.inference_mode():
+                    return model(th.from_numpy(obs)).numpy()
+
+        elif fmt == "onnx":
+            try:
+                import onnxruntime as ort
+            except ImportError as e:
+                raise ImportError("Running ONNX generators requires `onnxruntime`.") from e
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = n_threads
+            session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+            def predict(obs):
+                return session.run(None, {"obs": obs})[0]
+
+        else:
+            raise ValueError(f"Invalid export format: {fmt}")
+
+        return predict
+
+    def observe(
+        self,
+        int_map: np.ndarray,
+        pos: Optional[np.ndarray] = None,
+        ctrl_trgs: Optional[Dict] = None,
+        metrics: Optional[Dict] = None,
+    ):
+        """Build the generator's observation of a map (as the env's wrappers would)."""
+        ctrl_trgs = {} if ctrl_trgs is None else ctrl_trgs
+        metrics = {} if metrics is None else metrics
+        if self.representation == "narrow":
+            # Out-of-bounds tiles are 0, so tile indices are incremented by 1.
+            pad = self.obs_window // 2
+            padded = np.pad(int_map + 1, np.stack((pad, pad), axis=1), constant_values=0)
+            cropped = padded[
+                tuple(
+                    slice(p + pad[i] - self.obs_window[i] // 2, p + pad[i] + math.ceil(self.obs_window[i] / 2))
+                    for i, p in enumerate(pos)
+                )
+            ]
+            obs = self._eye[cropped]
+        else:
+            obs = self._eye[int_map]
+
+        if self.ctrl_metrics:
+            metrics_ob = np.zeros((*obs.shape[:-1], len(self.ctrl_metrics) * 2), dtype=np.float32)
+            for i, k in enumerate(self.ctrl_metrics):
+                trg = ctrl_trgs.get(k, self.default_ctrl_trgs[k])
+                if isinstance(trg, (tuple, list)):
+                    trg = (trg[0] + trg[1]) / 2
+                metrics_ob[..., i * 2] = trg / self.param_ranges[k]
+                metrics_ob[..., i * 2 + 1] = (metrics.get(k) or 0) / self.param_ranges[k]
+            obs = np.concatenate((metrics_ob, obs), axis=-1)
+
+        return obs
+
+    def act(self, obs: np.ndarray, deterministic: bool = True, rng: Optional[np.random.Generator] = None):
+        """Choose actions for a batch of observations."""
+        logits = self._predict(np.ascontiguousarray(obs, dtype=np.float32))
+        if deterministic:
+            return logits.argmax(axis=-1)
+        rng = np.random.default_rng() if rng is None else rng
+        probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs /= probs.sum(axis=-1, keepdims=True)
+        return np.array([rng.choice(len(p), p=p) for p in probs])
+
+    def random_map(self, rng: np.random.Generator) -> np.ndarray:
+        """Sample an initial map as the env does, with random tile probabilities."""
+        probs = rng.random(self.n_tiles)
+        return rng.choice(self.n_tiles, size=self.map_shape, p=probs / probs.sum()).astype(np.uint8)
+
+    def generate(
+        self,
+        init_map: Optional[np.ndarray] = None,
+        ctrl_trgs: Optional[Dict] = None,
+        stats_fn: Optional[Callable[[np.ndarray], Dict]] = None,
+        deterministic: bool = True,
+        seed: Optional[int] = None,
+    ) -> np.ndarray:
+        """Run the generator for one episode, returning the final map.
+
+        Args:
+            init_map: Map to start from. Sampled at random if not given.
+            ctrl_trgs: Targets for the controllable metrics (defaults to those the env was exported with).
+            stats_fn: Computes the current values of controllable metrics from a map. Required for controllable
+                generators.
+            deterministic: Take the most likely action instead of sampling.
+            seed: Random seed for the initial map and for sampling actions.
+        """
+        if self.ctrl_metrics and stats_fn is None:
+            raise ValueError("A `stats_fn` is required to run controllable generators.")
+        rng = np.random.default_rng(seed)
+        int_map = self.random_map(rng) if init_map is None else np.array(init_map, dtype=np.uint8)
+        metrics = stats_fn(int_map) if stats_fn is not None else {}
+
+        max_iterations, max_changes = self.spec["max_iterations"], self.spec["max_changes"]
+        n_step, iteration, changes = 0, 0, 0
+        pos = self.act_coords[0] if self.representation == "narrow" else None
+        done = False
+        while not done:
+            action = self.act(self.observe(int_map, pos, ctrl_trgs, metrics)[None], deterministic, rng)[0]
+            iteration += 1
+
+            if self.representation == "narrow":
+                coords, tile = tuple(pos), action
+                # Mirrors `NarrowRepresentation.update`.
+                pos = self.act_coords[n_step % len(self.act_coords)]
+                n_step += 1
+            else:
+                # Mirrors `ActionMap`, which passes `[x, y, v]` on to `WideRepresentation.update`.
+                y, x, tile = np.unravel_index(action, (*self.map_shape, self.n_tiles))
+                coords = (x, y)
+
+            change = int(int_map[coords] != tile)
+            int_map[coords] = tile
+            changes += change
+            if change and stats_fn is not None:
+                metrics = stats_fn(int_map)
+
+            done = iteration > max_iterations
+            if max_changes is not None:
+                done = done or changes > max_changes
+
+        return int_map
@@ -1,44 +1,43 @@
-from pdb import set_trace as TT
+"""
+Assignment of evaluation tasks (eval maps, hole pairs, control targets) to the eval envs of RLlib's rollout workers.
+
+Each eval env is given a contiguous slice of the tasks when it is created, computed from its worker and vector index
+alone, and works through the slice locally. Between them, the slices of all eval envs cover the tasks exactly once, and
+no env needs to ask the driver (or a Ray actor) for its next task.
+"""
+from typing import List, Sequence
 
-import numpy as np
-from ray.rllib.env.apis.task_settable_env import TaskSettableEnv, TaskType
 from ray.rllib.env.env_context import EnvContext
 
-from control_pcgrl.envs.pcgrl_env import PcgrlEnv
+
+def get_n_eval_envs(num_workers: int, num_envs_per_worker: int) -> int:
+    """The number of envs evaluating, on the remote workers or, if there are none, on the local one."""
+    return max(1, num_workers) * num_envs_per_worker
+
+
+def get_env_idx(worker_index: int, vector_index: int, num_envs_per_worker: int) -> int:
+    """The index of an env among all eval envs (remote workers are indexed from 1, the local worker is 0)."""
+    return max(0, worker_index - 1) * num_envs_per_worker + vector_index
+
+
+def get_task_slice(n_tasks: int, n_envs: int, env_idx: int) -> slice:
+    """The contiguous slice of `n_tasks` tasks assigned to an env, of sizes differing by at most 1 between envs."""
+    size, n_larger = divmod(n_tasks, n_envs)
+    start = env_idx * size + min(env_idx, n_larger)
+    return slice(start, start + size + (env_idx < n_larger))
 
 
-def set_map_fn(
-    train_results: dict, task_settable_env: PcgrlEnv, env_ctx: EnvContext
-) -> TaskType:
-    """Function returning a possibly new task to set `task_settable_env` to.
+def assign_tasks(tasks: Sequence, env_ctx: EnvContext, num_envs_per_worker: int) -> List:
+    """The tasks assigned to the env with the given context.
 
     Args:
-        train_results (dict): The train results returned by Trainer.train().
-        task_settable_env (TaskSettableEnv): A single TaskSettableEnv object
-            used inside any worker and at any vector position. Use `env_ctx`
-            to get the worker_index, vector_index, and num_workers.
-        env_ctx (EnvContext): The env context object (i.e. env's config dict
-            plus properties worker_index, vector_index and num_workers) used
-            to setup the `task_settable_env`.
-
-    Returns:
-        TaskType: The task to set the env to. This may be the same as the
-            current one.
+        tasks: All tasks, e.g. the indices of the problem's eval maps.
+        env_ctx: The env's context, with its `worker_index`, `vector_index` and the number of remote workers.
+        num_envs_per_worker: The number of (vectorized) envs on each worker.
     """
-    if not task_settable_env.evaluation_env:
-        return None
-    if task_settable_env.unwrapped._has_been_assigned_map:
-        map_idx = task_settable_env.cur_map_idx + env_ctx["num_eval_envs"]
-    else:
-        # This will assign each eval env a unique map_idx from 0 to n_eval_envs - 1
-        map_idx = (
-            task_settable_env.cur_map_idx
-            + env_ctx.worker_index * env_ctx["num_envs_per_worker"]
-            + env_ctx.vector_index
-        )
-        task_settable_env.unwrapped._has_been_assigned_map = True
-    map_idx = map_idx % len(task_settable_env.unwrapped._prob.eval_maps)
-    print(
-        f"Assigning map {map_idx} to environment {env_ctx.vector_index} of worker {env_ctx.worker_index}."
-    )
-    return map_idx
+    # The local worker only evaluates if there are no remote workers (otherwise its envs, if any, are left alone).
+    if env_ctx.worker_index == 0 and env_ctx.num_workers > 0:
+        return []
+    n_envs = get_n_eval_envs(env_ctx.num_workers, num_envs_per_worker)
+    env_idx = get_env_idx(env_ctx.worker_index, env_ctx.vector_index, num_envs_per_worker)
+    return list(tasks[get_task_slice(len(tasks), n_envs, env_idx)])
@@ -6,7 +6,7 @@ import gymnasium as gym
 from gymnasium import spaces
 from control_pcgrl.configs.config import Config
 from control_pcgrl.envs.pcgrl_env import PcgrlEnv
-from control_pcgrl.envs.probs.problem import Problem3D
+from control_pcgrl.envs.probs.problem import Problem, Problem3D
 import numpy as np
 from ray.rllib import MultiAgentEnv
 
@@ -23,6 +23,17 @@ def get_action(a):
     return a.item() if a.shape == [1] else a
 
 
+def unravel_action(action, shape):
+    """Like `np.unravel_index`, but cheaper, for a single (integer) action."""
+    action = int(action)
+    coords = []
+    for dim in reversed(shape[1:]):
+        action, c = divmod(action, dim)
+        coords.append(c)
+    coords.append(action)
+    return tuple(coords[::-1])
+
+
 class AuxTiles(gym.Wrapper):
     """Let the generator write to and observe additional, "invisible" channels."""
 
@@ -226,6 +237,19 @@ class OneHotEncoding(TransformObs):
         self.observation_space.spaces[self.name] = gym.spaces.Box(
             low=0, high=1, shape=new_shape, dtype=np.uint8
         )
+        self._eye = np.eye(self.dim)
+
+        # When observing the whole map (i.e. when it is not cropped around the agent, or modified by the problem), we keep
+        # the last one-hot map, and re-encode only the tiles changed by each step.
+        self._incremental = (
+            not padded
+            and cfg.multiagent.n_agents == 0
+            and type(self.unwrapped._prob).process_observation
+            is Problem.process_observation
+            and tuple(shape) == tuple(cfg.task.map_shape)
+        )
+        self._last_one_hot = None
+        self._last_map = None
 
     def step(self, action, **kwargs):
         # action = get_action(action)
@@ -236,6 +260,8 @@ class OneHotEncoding(TransformObs):
 
     def reset(self, *, seed=None, options=None):
         obs, info = self.env.reset()
+        self._last_one_hot = None
+        self._last_map = None
         obs = self.transform(obs)
 
         return obs, info
@@ -256,7 +282,24 @@ class OneHotEncoding(TransformObs):
         #     new = new[..., 1:]
         # else:
         #     breakpoint()
-        new = np.eye(self.dim)[old]
+        rep = self.unwrapped._rep.unwrapped
+        idxs = rep.get_changed_idxs()
+        # Re-encode the whole map if we don't know which tiles changed, or if the map was replaced since the last call
+        # (e.g. assigned wholesale, or resized), rather than edited by the representation.
+        if (
+            self._last_one_hot is not None
+            and idxs is not None
+            and rep._map is self._last_map
+            and old.shape == self._last_one_hot.shape[:-1]
+        ):
+            # (Copying, since we may have already returned the last one-hot map as an observation.)
+            new = self._last_one_hot.copy()
+            new.reshape(-1, self.dim)[idxs] = self._eye[old.reshape(-1)[idxs]]
+        else:
+            new = self._eye[old]
+        if self._incremental:
+            self._last_one_hot = new
+            self._last_map = rep._map
 
         # add the agent positions back into the observation
         # if self.show_agents:
@@ -268,8 +311,7 @@ class OneHotEncoding(TransformObs):
         return obs
 
     def get_one_hot_map(self):
-        obs = {"map": self.env._rep._map}
-        return self.transform(obs)
+        return {"map": self._eye[self.env._rep._map]}
 
 
 class ActionMap(gym.Wrapper):
@@ -315,7 +357,7 @@ class ActionMap(gym.Wrapper):
 
     def step(self, action, **kwargs):
         # y, x, v = np.unravel_index(np.argmax(action), action.shape)
-        y, x, v = np.unravel_index(action, (self.h, self.w, self.dim))
+        y, x, v = unravel_action(action, (self.h, self.w, self.dim))
 
         if "pos" in self.old_obs:
             o_x, o_y = self.old_obs["pos"]
@@ -617,7 +659,7 @@ class ActionMap3DImagePCGRLWrapper(gym.Wrapper):
         :param action: (int) the unravelled index of the action. We will re-ravel to get spatial (x, y, z) coordinates,
                       and action type.
         """
-        action = np.unravel_index(action, (self.observation_space.shape))
+        action = unravel_action(action, self.observation_space.shape)
 
         return super().step(action, **kwargs)
 
@@ -1,15 +1,12 @@
+from concurrent.futures import ProcessPoolExecutor
 import glob
 import shutil
-import gymnasium as gym
 import hydra
 import numpy as np
 import os
 
-from ray.rllib.models.preprocessors import get_preprocessor
-from ray.rllib.evaluation.sample_batch_builder import SampleBatchBuilder
-from ray.rllib.offline.json_writer import JsonWriter
-
 from control_pcgrl.configs.config import PoDConfig
+from control_pcgrl.il.trajectories import ShardWriter, write_index
 from control_pcgrl.il.utils import make_pod_env
 from control_pcgrl.rl.envs import make_env
 from control_pcgrl.rl.utils import validate_config
@@ -39,88 +36,48 @@ INT_MAP = {
 }
 
 
+# Lookup table from level-file characters (as bytes) to tile ints. 255 marks characters that are not tiles.
+CHAR_TO_INT = np.full(256, 255, dtype=np.uint8)
+for _char, _tile in TILES_MAP.items():
+    CHAR_TO_INT[ord(_char)] = INT_MAP[_tile]
+
+
 def load_goal_levels(cfg):
-    lvl_dir = glob.glob(os.path.join("control_pcgrl", "il", "playable_maps", "*.txt"))
+    lvl_dir = sorted(
+        glob.glob(os.path.join("control_pcgrl", "il", "playable_maps", "*.txt"))
+    )
     levels = []
 
     for f in lvl_dir:
-        levels.append(int_arr_from_str_arr(to_2d_array_level(f)))
+        levels.append(load_level(f))
 
     return np.array(levels)
 
 
-# Converts from string[][] to 2d int[][]
-def int_arr_from_str_arr(map):
-    int_map = []
-    for row_idx in range(len(map)):
-        new_row = []
-        for col_idx in range(len(map[0])):
-            new_row.append(INT_MAP[map[row_idx][col_idx]])
-        int_map.append(new_row)
-    return int_map
-
-
-# Reads in .txt playable map and converts it to string[][]
-def to_2d_array_level(file_name):
-    level = []
-
-    with open(file_name, "r") as f:
-        rows = f.readlines()
-        for row in rows:
-            new_row = []
-            for char in row:
-                if char != "\n":
-                    new_row.append(TILES_MAP[char])
-            level.append(new_row)
+# Reads in .txt playable map and converts it to a 2d array of tile ints, with the border removed.
+def load_level(file_name):
+    with open(file_name, "rb") as f:
+        rows = f.read().splitlines()
+    chars = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1)
+    level = CHAR_TO_INT[chars]
+    assert np.all(level != 255), f"Unknown tile character in {file_name}"
 
     # Remove the border
-    truncated_level = level[1 : len(level) - 1]
-    level = []
-    for row in truncated_level:
-        new_row = row[1 : len(row) - 1]
-        level.append(new_row)
-    return level
+    return level[1:-1, 1:-1]
 
 
 n_train_samples = 1_000_000
+shard_size = 10_000
 
 
-@hydra.main(config_path="control_pcgrl/configs", config_name="pod")
-def main(cfg: PoDConfig):
-    if not validate_config(cfg):
-        print("Invalid config!")
-        return
-
-    traj_dir = os.path.join(cfg.log_dir, "repair-paths")
-
-    if cfg.overwrite:
-        shutil.rmtree(traj_dir, ignore_errors=True)
-
-    goal_levels = load_goal_levels(cfg)
-
-    batch_builder = SampleBatchBuilder()  # or MultiAgentSampleBatchBuilder
-    writer = JsonWriter(
-        # os.path.join(ray._private.utils.get_user_temp_dir(), "demo-out")
-        os.path.join(traj_dir)
-    )
-
-    # You normally wouldn't want to manually create sample batches if a
-    # simulator is available, but let's do it anyways for example purposes:
+def gen_episodes(cfg: PoDConfig, worker_idx: int, eps_ids, goal_levels, traj_dir):
+    """Roll out the given episodes, repairing toward goal levels, and write them to compressed shards. Runs in a worker
+    process. Returns the index entries of the written shards, and the observation shape."""
     env = make_pod_env(cfg=cfg)
-    # env = gym.make("CartPole-v1")
-
-    # RLlib uses preprocessors to implement transforms such as one-hot encoding
-    # and flattening of tuple and dict observations. For CartPole a no-op
-    # preprocessor is used, but this may be relevant for more complex envs.
-    prep = get_preprocessor(env.observation_space)(env.observation_space)
-    print("The preprocessor is", prep)
+    writer = ShardWriter(traj_dir, prefix=f"worker-{worker_idx}", shard_size=shard_size)
 
-    map_id = 0
-
-    n_eps = n_train_samples // env.unwrapped._max_iterations
-
-    for eps_id in range(n_eps):
-        # env.queue_goal_map(goal_levels[map_id])
+    for eps_id in eps_ids:
+        map_id = eps_id % len(goal_levels)
 
         obs, info = env.reset()
         prev_action = np.zeros_like(env.action_space.sample())
@@ -128,34 +85,65 @@ def main(cfg: PoDConfig):
         terminated = truncated = False
         t = 0
         while not terminated and not truncated:
-            # action = env.action_space.sample()
             action = goal_levels[map_id][tuple(env.rep.unwrapped._pos)]
 
-            # repair_action = env.get_repair_action()
             new_obs, rew, terminated, truncated, info = env.step(action)
-            batch_builder.add_values(
-                # t=t,
-                # eps_id=eps_id,
-                # agent_index=0,
-                obs=prep.transform(obs),
+            writer.add(
+                obs=obs,
                 actions=action,
-                # action_prob=1.0,  # put the true action probability here
-                # action_logp=0.0,
                 rewards=-rew,
                 prev_actions=prev_action,
                 prev_rewards=prev_reward,
                 terminateds=terminated,
-                # truncateds=truncated,
-                # infos=info,
-                # new_obs=dummify_observation(prep.transform(new_obs)),
+                eps_id=eps_id,
+                t=t,
             )
             obs = new_obs
             prev_action = action
             prev_reward = -rew
             t += 1
-        writer.write(batch_builder.build_and_reset())
 
-        map_id = (eps_id + 1) % len(goal_levels)
+    return writer.close(), obs.shape
+
+
+@hydra.main(config_path="control_pcgrl/configs", config_name="pod")
+def main(cfg: PoDConfig):
+    if not validate_config(cfg):
+        print("Invalid config!")
+        return
+
+    traj_dir = os.path.join(cfg.log_dir, "repair-paths")
+
+    if cfg.overwrite:
+        shutil.rmtree(traj_dir, ignore_errors=True)
+
+    goal_levels = load_goal_levels(cfg)
+
+    env = make_pod_env(cfg=cfg)
+    n_eps = n_train_samples // env.unwrapped._max_iterations
+    env.close()
+
+    # Split episodes between worker processes, each writing its own shards.
+    n_workers = max(1, min(cfg.hardware.n_cpu, n_eps))
+    worker_eps_ids = [range(i, n_eps, n_workers) for i in range(n_workers)]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(
+            pool.map(
+                gen_episodes,
+                [cfg] * n_workers,
+                range(n_workers),
+                worker_eps_ids,
+                [goal_levels] * n_workers,
+                [traj_dir] * n_workers,
+            )
+        )
+
+    entries = [e for worker_entries, _ in results for e in worker_entries]
+    obs_shape = results[0][1]
+    write_index(traj_dir, entries, obs_shape)
+    print(
+        f"Wrote {sum(e['n_samples'] for e in entries)} samples in {len(entries)} shards to {traj_dir}"
+    )
 
 
 if __name__ == "__main__":
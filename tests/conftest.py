@@ -0,0 +1,25 @@
+import pytest
+from hydra import compose, initialize_config_dir
+from pathlib import Path
+
+from control_pcgrl.rl.utils import validate_config
+
+
+CONFIG_DIR = str(Path(__file__).parent.parent / "control_pcgrl" / "configs")
+
+
+@pytest.fixture
+def make_cfg():
+    """Compose (and validate) the training config, with the given command-line style overrides."""
+
+    def _make_cfg(*overrides, config_name="train"):
+        with initialize_config_dir(config_dir=CONFIG_DIR, version_base=None):
+            cfg = compose(
+                config_name=config_name,
+                overrides=["render=false", "render_mode=null", *overrides],
+            )
+        cfg = validate_config(cfg)
+        assert cfg is not False, "Invalid config!"
+        return cfg
+
+    return _make_cfg
@@ -0,0 +1,101 @@
+import numpy as np
+
+from control_pcgrl import control_wrappers, wrappers
+from control_pcgrl.control_wrappers import ALPGMM
+
+
+def progress_losses(tasks, n_practiced, rng):
+    """Losses on 2D targets in [0, 10]^2, which only improve with practice in the [0, 3]^2 corner."""
+    inside = (tasks < 3).all(axis=1)
+    return np.where(inside, -10 * np.exp(-n_practiced / 300), -10) + rng.normal(0, 0.05, len(tasks))
+
+
+def train_teacher(teacher, n_rounds=30, n_envs=50, seed=0):
+    rng = np.random.default_rng(seed)
+    n_practiced = 0
+    for _ in range(n_rounds):
+        tasks = teacher.sample_tasks(n_envs)
+        inside = (tasks < 3).all(axis=1)
+        teacher.update(tasks, progress_losses(tasks, n_practiced + np.cumsum(inside), rng))
+        n_practiced += inside.sum()
+    return teacher
+
+
+def test_focuses_on_progress():
+    teacher = train_teacher(ALPGMM([0, 0], [10, 10], fit_rate=100, seed=0))
+    tasks = teacher.sample_tasks(5000)
+    assert ((tasks >= 0) & (tasks <= 10)).all()
+    # The corner is 9% of the target space.
+    assert (tasks < 3).all(axis=1).mean() > 0.5
+
+
+def test_uniform_before_first_fit():
+    teacher = ALPGMM([0, -5], [10, 5], fit_rate=100, seed=0)
+    teacher.update(teacher.sample_tasks(99), np.zeros(99))
+    assert teacher.get_state()["means"] is None
+    tasks = teacher.sample_tasks(5000)
+    assert np.allclose(tasks.mean(axis=0), [5, 0], atol=0.3)
+    teacher.update(teacher.sample_tasks(1), np.zeros(1))
+    assert teacher.get_state()["means"] is not None
+
+
+def test_batched_update_is_sequential():
+    rng = np.random.default_rng(0)
+    tasks, losses = rng.random((40, 2)), rng.random(40)
+    batched, sequential = ALPGMM([0, 0], [1, 1]), ALPGMM([0, 0], [1, 1])
+    batched.update(tasks[:10], losses[:10])
+    batched.update(tasks[10:], losses[10:])
+    for task, loss in zip(tasks, losses):
+        sequential.update([task], [loss])
+    assert np.allclose(batched.alps, sequential.alps)
+    assert batched.alps[0] == 0
+
+
+def test_shared_state():
+    teacher = train_teacher(ALPGMM([0, 0], [10, 10], fit_rate=100, seed=0))
+    # A worker samples from the teacher's mixture without fitting its own.
+    worker = ALPGMM([0, 0], [10, 10], seed=1)
+    worker.set_state(teacher.get_state())
+    tasks = worker.sample_tasks(5000)
+    assert len(worker.tasks) == 0
+    assert (tasks < 3).all(axis=1).mean() > 0.5
+
+
+def test_teacher_wrapper(make_cfg):
+    cfg = make_cfg("task=binary_control", "task.alp_gmm_fit_rate=20", "task.alp_gmm_memory=100")
+    env = wrappers.CroppedImagePCGRLWrapper(game=cfg.env_name, cfg=cfg)
+    env = control_wrappers.ControlWrapper(env, cfg=cfg, ctrl_metrics=list(cfg.task.controls))
+    env = control_wrappers.ALPGMMTeacher(env, cfg)
+    assert (env.teacher.fit_rate, env.teacher.window, env.teacher.memory) == (20, 20, 100)
+
+    teacher = ALPGMM(env.teacher.lows, env.teacher.highs, fit_rate=10, seed=0)
+    teacher.update(teacher.sample_tasks(10), np.arange(10))
+    env.set_task(teacher.get_state())
+    for _ in range(3):
+        env.reset()
+        for k, trg in zip(env.ctrl_metrics, env.trg_vec):
+            assert env.metric_trgs[k] == trg
+            assert env.cond_bounds[k][0] <= trg <= env.cond_bounds[k][1]
+        env.step(env.action_space.sample())
+    trg_vecs, losses = env.pop_outcomes()
+    # The last episode is not over yet.
+    assert trg_vecs.shape == (2, len(env.ctrl_metrics)) and losses.shape == (2,)
+    assert len(env.pop_outcomes()[1]) == 0
+    assert len(env.sample_tasks(4)) == 4
+
+
+def test_bounded_memory():
+    rng = np.random.default_rng(0)
+    tasks, losses = rng.random((100, 2)), rng.random(100)
+    bounded, unbounded = ALPGMM([0, 0], [1, 1], window=10, memory=30), ALPGMM([0, 0], [1, 1], window=10)
+    # Under capacity, the bounded teacher computes the same ALPs.
+    bounded.update(tasks[:30], losses[:30])
+    unbounded.update(tasks[:30], losses[:30])
+    assert np.allclose(bounded.alps, unbounded.alps)
+    # Past it, only the most recent pairs are kept, oldest first, whatever the batch sizes.
+    bounded.update(tasks[30:47], losses[30:47])
+    bounded.update(tasks[47:], losses[47:])
+    assert bounded._tasks.shape == (30, 2)
+    assert np.array_equal(bounded.tasks, tasks[-30:])
+    assert np.array_equal(bounded.losses, losses[-30:])
+    assert len(bounded.alps) == 30
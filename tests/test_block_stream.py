@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+try:
+    from control_pcgrl.envs.probs.minecraft.block_stream import BlockStream, FakeMinecraftService
+    from control_pcgrl.envs.probs.minecraft.minecraft_pb2 import (
+        AIR,
+        DIRT,
+        RED_GLAZED_TERRACOTTA,
+        Block,
+        Cube,
+        FillCubeRequest,
+        Point,
+    )
+except (ImportError, TypeError) as e:
+    # The generated protobuf module does not load with every version of protobuf.
+    pytest.skip(f"Cannot import the Minecraft protobuf messages: {e}", allow_module_level=True)
+
+
+def random_level(rng, shape=(6, 7, 8)):
+    return np.where(rng.random(shape) < 0.5, DIRT, AIR)
+
+
+def world_of(service, level, origin):
+    """The blocks in the service's world where the level was put."""
+    return np.array(
+        [service.get_block(x + origin[0], y + origin[1], z + origin[2]) for y, z, x in np.ndindex(level.shape)]
+    ).reshape(level.shape)
+
+
+def test_sends_only_changed_blocks():
+    rng = np.random.default_rng(0)
+    service = FakeMinecraftService()
+    stream = BlockStream(service, asynchronous=False)
+    level = random_level(rng)
+    origin = (1, 5, 2)
+
+    stream.put_array(level, origin)
+    stream.flush()
+    assert service.n_blocks == level.size
+    assert np.array_equal(world_of(service, level, origin), level)
+
+    # Resending the same frame sends nothing.
+    stream.put_array(level, origin)
+    stream.flush()
+    assert service.n_blocks == level.size
+
+    level = level.copy()
+    level[1, 2, 3] = DIRT if level[1, 2, 3] == AIR else AIR
+    level[4, 0, 5] = DIRT if level[4, 0, 5] == AIR else AIR
+    stream.put_array(level, origin)
+    stream.flush()
+    assert service.n_blocks == level.size + 2
+    assert np.array_equal(world_of(service, level, origin), level)
+
+
+def test_coalesces_edits_to_the_same_block():
+    service = FakeMinecraftService()
+    stream = BlockStream(service, asynchronous=False)
+    pos = Point(x=3, y=4, z=5)
+
+    # As when highlighting an edited block, then rendering the new tile.
+    stream.put([Block(position=pos, type=RED_GLAZED_TERRACOTTA), Block(position=pos, type=DIRT)])
+    stream.flush()
+    assert service.n_blocks == 1
+    assert service.get_block(3, 4, 5) == DIRT
+
+    # Edits that undo themselves before being sent are dropped.
+    stream.put([Block(position=pos, type=RED_GLAZED_TERRACOTTA)])
+    stream.put([Block(position=pos, type=DIRT)])
+    stream.flush()
+    assert service.n_blocks == 1
+
+
+def test_batches_are_bounded():
+    service = FakeMinecraftService()
+    stream = BlockStream(service, max_batch_size=100, asynchronous=False)
+    stream.put_array(np.full((10, 10, 10), DIRT))
+    stream.flush()
+    assert service.n_calls["spawnBlocks"] == 10
+    assert service.n_blocks == 1000
+
+
+def test_fill_cube_updates_known_state():
+    service = FakeMinecraftService()
+    stream = BlockStream(service, asynchronous=False)
+    level = np.full((2, 2, 2), DIRT)
+    stream.put_array(level)
+    stream.flush()
+    stream.fill_cube(FillCubeRequest(cube=Cube(min=Point(x=0, y=0, z=0), max=Point(x=1, y=1, z=1)), type=AIR))
+    assert service.get_block(0, 0, 0) == AIR
+
+    # The level has to be resent, even though it has not changed since it was last put.
+    stream.put_array(level)
+    stream.flush()
+    assert np.array_equal(world_of(service, level, (0, 0, 0)), level)
+
+
+def test_async_stream_converges_to_last_frame():
+    rng = np.random.default_rng(0)
+    # A slow server, so that frames are put faster than they can be sent, and are coalesced.
+    service = FakeMinecraftService(call_latency=0.005)
+    n_frames = 50
+    with BlockStream(service, max_batch_size=64) as stream:
+        for _ in range(n_frames):
+            level = random_level(rng)
+            stream.put_array(level)
+        stream.flush()
+        assert np.array_equal(world_of(service, level, (0, 0, 0)), level)
+        stats = stream.get_stats()
+    assert stats["n_pending"] == 0
+    assert stats["n_blocks_sent"] < stats["n_blocks_put"]
+    assert service.n_calls["spawnBlocks"] < n_frames
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import torch as th
+
+# As in `evolve.py`, the evo models are imported from their own directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "control_pcgrl", "evo"))
+try:
+    import models
+except ImportError as e:
+    pytest.skip(f"Cannot import the evo models: {e}", allow_module_level=True)
+
+CPPNS = [
+    models.SinCPPN,
+    models.GenSinCPPN,
+    models.MixCPPN,
+    models.GenMixCPPN,
+    models.FixedGenCPPN,
+    models.GenReluCPPN,
+    models.CoordNCA,
+]
+
+
+def uncached_coord_grid(x, normalize=False, env3d=False):
+    """The coordinate grid, as it was built on every call before grids were cached."""
+    dims = x.shape[-3:] if env3d else x.shape[-2:]
+    axes = [th.arange(n) / (n if normalize else 1) for n in dims]
+    if env3d:
+        axes = axes[1:] + axes[:1]
+    return th.stack(th.meshgrid(*axes, indexing="ij")).unsqueeze(0)
+
+
+@pytest.mark.parametrize("shape, env3d", [((1, 3, 7, 5), False), ((2, 4, 6, 7, 5), True)])
+@pytest.mark.parametrize("normalize", [False, True])
+def test_coord_grid_cache(shape, env3d, normalize):
+    x = th.zeros(shape)
+    grid = models.get_coord_grid(x, normalize=normalize, env3d=env3d)
+    assert th.equal(grid, uncached_coord_grid(x, normalize=normalize, env3d=env3d))
+    assert models.get_coord_grid(th.ones(shape), normalize=normalize, env3d=env3d) is grid
+    scaled = models.get_coord_grid(x, normalize=normalize, env3d=env3d, scale=2)
+    assert scaled is not grid and th.equal(scaled, grid * 2)
+
+
+@pytest.mark.parametrize("model_cls", CPPNS)
+def test_population_matches_individuals(model_cls):
+    model = model_cls(n_in_chans=3, n_actions=4)
+    models.set_nograd(model)
+    init_weights = models.get_init_weights(model, init=False)
+    rng = np.random.default_rng(0)
+    weights = (init_weights + rng.normal(0, 0.3, size=(12, init_weights.size))).astype(np.float32)
+    x = th.rand(1, 3, 9, 11)
+
+    out = model.forward_population(weights, x)
+    assert out.shape == (len(weights), 4, 9, 11)
+    for w, ind_out in zip(weights, out):
+        models.set_weights(model, w)
+        expected, done = model(x)
+        assert done is model.done
+        assert th.allclose(ind_out, expected[0], atol=1e-5)
+
+
+@pytest.mark.parametrize("model_cls", CPPNS)
+def test_population_outputs_on_init_states(model_cls):
+    """As in `evolve.get_population_outputs`, which replaces each generator's first pass on each (latent) initial state
+    in `simulate`."""
+    n_latents = 3
+    model = model_cls(n_in_chans=n_latents, n_actions=4)
+    models.set_nograd(model)
+    init_weights = models.get_init_weights(model, init=False)
+    rng = np.random.default_rng(1)
+    weights = (init_weights + rng.normal(0, 0.3, size=(8, init_weights.size))).astype(np.float32)
+    latents = rng.normal(0, 1, (5, n_latents))
+    init_states = np.tile(latents[:, :, None, None], (1, 1, 7, 6))
+
+    outputs = np.stack(
+        [model.forward_population(weights, th.unsqueeze(th.Tensor(s), 0)).numpy() for s in init_states], axis=1
+    )
+    assert outputs.shape == (len(weights), len(init_states), 4, 7, 6)
+    for w, model_outputs in zip(weights, outputs):
+        models.set_weights(model, w)
+        for init_state, output in zip(init_states, model_outputs):
+            expected, _ = model(th.unsqueeze(th.Tensor(init_state), 0))
+            assert np.allclose(output, expected[0].numpy(), atol=1e-5)
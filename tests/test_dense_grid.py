@@ -0,0 +1,154 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "control_pcgrl", "evo"))
+try:
+    from qdpy import containers, phenotype
+
+    from dense_grid import DenseMEGrid, DenseMEInitStatesArchive
+    from optimizer import MEOptimizer
+except ImportError as e:
+    pytest.skip(f"Cannot import qdpy: {e}", allow_module_level=True)
+
+BIN_SIZES = (20, 15)
+BIN_BOUNDS = ((0.0, 1.0), (-2.0, 5.0))
+N_WEIGHTS = 6
+
+
+class Model:
+    def __init__(self, step_size):
+        self.step_size = step_size
+
+
+class VecIndividual(phenotype.Individual):
+    """An individual that is just a vector of weights, like an `Individual` with a flat-weight model."""
+
+    def __init__(self, weights=None, step_size=0.01):
+        super().__init__()
+        self.model = Model(step_size)
+        self.weights = np.random.normal(size=N_WEIGHTS).astype(np.float32) if weights is None else weights
+        self.fitness = phenotype.Fitness([0], weights=[1])
+        self.fitness.delValues()
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, weights):
+        self.weights = np.array(weights)
+
+    def __eq__(self, ind_1):
+        return self is ind_1
+
+    __hash__ = object.__hash__
+
+
+class ClippingGrid(containers.Grid):
+    """A qdpy grid as built by `MEGrid` (which we cannot import without `ribs`), clipping features to their domain."""
+
+    def add(self, item):
+        item.features.setValues(
+            [np.clip(item.features.values[i], *self.features_domain[i]) for i in range(len(item.features.values))]
+        )
+        return super().add(item)
+
+
+def qdpy_grid():
+    return ClippingGrid(
+        shape=BIN_SIZES, max_items_per_bin=1, features_domain=BIN_BOUNDS, fitness_domain=((-np.inf, np.inf),)
+    )
+
+
+def qdpy_update(grid, weights, fits, bcs):
+    inds = []
+    for w, fit, bc in zip(weights, fits, bcs):
+        ind = VecIndividual(w)
+        ind.fitness.setValues([fit])
+        ind.features.setValues(bc)
+        inds.append(ind)
+    return grid.update(inds, issue_warning=True, ignore_exceptions=False)
+
+
+def random_batch(rng, n):
+    weights = rng.normal(size=(n, N_WEIGHTS)).astype(np.float32)
+    # Few distinct values, so that candidates tie, within and across batches.
+    fits = rng.integers(-5, 5, size=n).astype(float)
+    # Some features out of bounds, and on the upper bounds.
+    bcs = np.stack([rng.uniform(lo - 0.3, hi + 0.3, size=n) for lo, hi in BIN_BOUNDS], axis=1)
+    bcs[: n // 10] = [hi for _, hi in BIN_BOUNDS]
+    # Crowd candidates into few cells.
+    bcs[n // 10 : n // 2] = bcs[n // 10 : n // 2].round(1)
+    return weights, fits, bcs
+
+
+def assert_same_contents(dense, grid):
+    assert len(dense) == len(grid) and dense.filled_bins == grid.filled_bins
+    np.testing.assert_array_equal(dense.quality_array, grid.quality_array)
+    assert dense.fitness_extrema == grid.fitness_extrema
+    for idx in np.ndindex(BIN_SIZES):
+        sols = grid.solutions[idx]
+        assert len(dense.solutions[idx]) == len(sols)
+        if sols:
+            np.testing.assert_array_equal(dense.solutions[idx][0].weights, sols[0].weights)
+            assert dense.features[idx][0].values == pytest.approx(grid.features[idx][0].values)
+
+
+def test_same_contents_as_qdpy_grid():
+    rng = np.random.default_rng(0)
+    dense, grid = DenseMEGrid(BIN_SIZES, BIN_BOUNDS), qdpy_grid()
+    dense.set_template(VecIndividual())
+    for n in [150, 150, 1, 300, 150]:
+        weights, fits, bcs = random_batch(rng, n)
+        assert dense.add_batch(weights, fits, bcs) == qdpy_update(grid, weights, fits, bcs)
+        assert_same_contents(dense, grid)
+    for bcs in [(0.5, 0.0), (1.0, 5.0), (0.0, -2.0)]:
+        assert dense.index_grid(bcs) == grid.index_grid(bcs)
+
+
+def test_init_states_follow_elites():
+    rng = np.random.default_rng(0)
+    archive = DenseMEInitStatesArchive(BIN_SIZES, BIN_BOUNDS, n_init_states=2, map_dims=(3, 4))
+    first_states = rng.integers(2, size=(2, 3, 4))
+    archive.set_init_states(first_states, door_coords=None)
+    weights, fits, bcs = random_batch(rng, 50)
+    archive.add_batch(weights, fits, bcs)
+    second_states = first_states + 2
+    archive.set_init_states(second_states, door_coords=None)
+    weights, fits, bcs = random_batch(rng, 50)
+    # Only the cells whose elite is replaced take on the new initial states.
+    old_fits = archive.fitness_array.copy()
+    archive.add_batch(weights, fits, bcs)
+    replaced = archive.fitness_array != old_fits
+    assert replaced.any() and not replaced.all()
+    for cell in np.flatnonzero(archive.occupied):
+        expected = second_states if replaced[cell] else first_states
+        np.testing.assert_array_equal(archive.init_states_archive[np.unravel_index(cell, BIN_SIZES)], expected)
+
+
+def run_optimizer(grid, n_gens, seed=0):
+    np.random.seed(seed)
+    optimizer = MEOptimizer(grid, VecIndividual, batch_size=40, ind_cls_args={"step_size": 0.1})
+    for _ in range(n_gens):
+        inds = optimizer.ask()
+        weights = np.stack([ind.get_weights() for ind in inds])
+        # Fitness and features are functions of the weights.
+        optimizer.tell(-np.abs(weights).sum(1), weights[:, :2] + 0.5)
+    return optimizer
+
+
+def test_optimizer_dense_grid():
+    # The first generation is inserted as into a qdpy grid.
+    dense, grid = run_optimizer(DenseMEGrid(BIN_SIZES, BIN_BOUNDS), 1).grid, run_optimizer(qdpy_grid(), 1).grid
+    assert_same_contents(dense, grid)
+
+    optimizer = run_optimizer(DenseMEGrid(BIN_SIZES, BIN_BOUNDS), 20)
+    elites = optimizer.grid.weights_array[optimizer.grid.occupied]
+    assert len(elites) >= 40
+    inds = optimizer.ask()
+    assert len(inds) == 40
+    offspring = np.stack([ind.get_weights() for ind in inds])
+    # Every offspring is an elite, plus some noise.
+    dists = np.abs(offspring[:, None] - elites[None]).max(-1)
+    assert np.all(dists.min(1) < 2) and np.all(dists.min(1) > 0)
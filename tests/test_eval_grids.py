@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+import ray
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EVO_DIR = os.path.join(os.path.dirname(TESTS_DIR), "control_pcgrl", "evo")
+sys.path.insert(0, EVO_DIR)
+try:
+    from qdpy import containers, phenotype
+
+    from eval_grids import SCORE_NAMES, EvalScoreGrids, LevelWriter, read_levels, stream_results
+except ImportError as e:
+    pytest.skip(f"Cannot import qdpy: {e}", allow_module_level=True)
+
+TRAIN_BINS = (8, 8)
+TRAIN_BOUNDS = ((0.0, 1.0), (0.0, 4.0))
+# Eval archives bin the same features differently.
+EVAL_BINS = (10, 10)
+EVAL_BOUNDS = ((0.0, 1.0), (-1.0, 5.0))
+MAX_LOSS = 3.0
+
+
+@pytest.fixture(scope="module")
+def local_ray():
+    ray.init(
+        num_cpus=3,
+        include_dashboard=False,
+        runtime_env={"env_vars": {"PYTHONPATH": os.pathsep.join([EVO_DIR, TESTS_DIR])}},
+    )
+    yield
+    ray.shutdown()
+
+
+@ray.remote
+def fake_evo(result, delay):
+    """Return the result of `multi_evo`, after some time."""
+    time.sleep(delay)
+    return result
+
+
+class ClippingGrid(containers.Grid):
+    """A qdpy grid as built by `MEGrid` (which we cannot import without `ribs`), clipping features to their domain."""
+
+    def add(self, item):
+        item.features.setValues(
+            [np.clip(item.features.values[i], *self.features_domain[i]) for i in range(len(item.features.values))]
+        )
+        return super().add(item)
+
+
+class DummyIndividual(phenotype.Individual):
+    """Like the dummy `Individual`s added to eval archives, each with its own model, so that none are equal."""
+
+    def __eq__(self, ind_1):
+        return self is ind_1
+
+    __hash__ = object.__hash__
+
+
+def qdpy_grid(bin_sizes, bin_bounds):
+    return ClippingGrid(
+        shape=bin_sizes, max_items_per_bin=1, features_domain=bin_bounds, fitness_domain=((-np.inf, np.inf),)
+    )
+
+
+def fake_results(rng, n, with_diversity):
+    results = []
+    for _ in range(n):
+        # Few distinct values, so that elites tie in the eval archive.
+        batch_reward = float(rng.integers(-4, 4))
+        targets_penalty = float(rng.integers(-3, 1))
+        diversity_bonus, variance_penalty = (rng.normal(size=2).tolist() if with_diversity else (None, None))
+        # Some features out of bounds, and elites crowded into few cells.
+        final_bcs = [rng.uniform(-0.2, 1.2), rng.uniform(-1.5, 5.5)]
+        if rng.random() < 0.5:
+            final_bcs = [round(bc, 1) for bc in final_bcs]
+        levels = rng.integers(3, size=(2, 4, 5))
+        level_json = {
+            "level": levels.tolist(),
+            "batch_reward": [batch_reward] * 2,
+            "variance": [variance_penalty] * 2,
+            "diversity": [diversity_bonus] * 2,
+            "targets": [targets_penalty] * 2,
+            "emptiness": [final_bcs[0]] * 2,
+            "path-length": [final_bcs[1]] * 2,
+        }
+        results.append(
+            (level_json, batch_reward, final_bcs, (0.0, targets_penalty, variance_penalty, diversity_bonus))
+        )
+    return results
+
+
+def record_scores(id_0, id_1, batch_reward, targets_penalty, diversity_bonus, variance_penalty, scores):
+    scores["fitness"][id_0, id_1] = batch_reward
+    scores["playability"][id_0, id_1] = targets_penalty
+    if diversity_bonus is not None:
+        scores["diversity"][id_0, id_1] = diversity_bonus
+    if variance_penalty is not None:
+        scores["reliability"][id_0, id_1] = variance_penalty
+
+
+def in_order_grids(archive, results):
+    """The score grids, as `EvoPCGRL.infer` used to build them: recording results one by one, in launch order, and
+    adding dummy individuals to a qdpy eval archive."""
+    scores = {name: np.full(TRAIN_BINS, np.nan) for name in SCORE_NAMES}
+    eval_scores = {name: np.full(TRAIN_BINS, np.nan) for name in SCORE_NAMES}
+    eval_archive = qdpy_grid(EVAL_BINS, EVAL_BOUNDS)
+    for _, batch_reward, final_bcs, (_, targets_penalty, variance_penalty, diversity_bonus) in results:
+        grid_bcs = [np.clip(bc, *archive.features_domain[i]) for i, bc in enumerate(final_bcs)]
+        id_0, id_1 = archive.index_grid(tuple(grid_bcs))
+        record_scores(id_0, id_1, batch_reward, targets_penalty, diversity_bonus, variance_penalty, scores)
+
+        individual = DummyIndividual()
+        # Maximizing fitness, as in the training archive and pyribs eval archives.
+        individual.fitness = phenotype.Fitness([batch_reward], weights=[1])
+        individual.features = phenotype.Features(final_bcs)
+        if eval_archive.add(individual) is not None:
+            record_scores(id_0, id_1, batch_reward, targets_penalty, diversity_bonus, variance_penalty, eval_scores)
+    return scores, eval_scores, eval_archive
+
+
+def streamed_grids(archive, results, levels_path):
+    """The score grids, built as results stream in, with the levels written to a file."""
+    eval_archive = qdpy_grid(EVAL_BINS, EVAL_BOUNDS)
+    score_grids = EvalScoreGrids(TRAIN_BINS, [EVAL_BINS])
+    # Later results finish first, within each window of tasks in flight.
+    delays = [0.02 * (-i % 4) for i in range(len(results))]
+    arrivals = []
+    with LevelWriter(levels_path, rows_per_group=16) as level_writer:
+        for batch in stream_results(lambda i: fake_evo.remote(results[i], delays[i]), len(results), 4):
+            for i, (level_json, batch_reward, final_bcs, penalties) in batch:
+                _, targets_penalty, variance_penalty, diversity_bonus = penalties
+                arrivals.append(i)
+                level_writer.write(level_json)
+                clip = lambda grid: tuple(np.clip(bc, *grid.features_domain[k]) for k, bc in enumerate(final_bcs))
+                score_grids.add(
+                    i,
+                    archive.index_grid(clip(archive)),
+                    [eval_archive.index_grid(clip(eval_archive))],
+                    [archive.index_grid(clip(archive))],
+                    batch_reward,
+                    targets_penalty,
+                    diversity_bonus,
+                    variance_penalty,
+                )
+    return score_grids, arrivals
+
+
+@pytest.mark.parametrize("with_diversity", [True, False])
+def test_same_grids_as_in_order(local_ray, tmp_path, with_diversity):
+    rng = np.random.default_rng(0)
+    archive = qdpy_grid(TRAIN_BINS, TRAIN_BOUNDS)
+    results = fake_results(rng, 60, with_diversity)
+    scores, eval_scores, eval_archive = in_order_grids(archive, results)
+    score_grids, arrivals = streamed_grids(archive, results, str(tmp_path / "eval_levels"))
+
+    assert arrivals != sorted(arrivals) and sorted(arrivals) == list(range(len(results)))
+    assert score_grids.n_recorded == len(results) and score_grids.n_pending == 0
+    for name in SCORE_NAMES:
+        np.testing.assert_array_equal(getattr(score_grids.scores, name), scores[name])
+        np.testing.assert_array_equal(getattr(score_grids.eval_scores[0], name), eval_scores[name])
+    assert score_grids.eval_filled_bins(0) == eval_archive.filled_bins
+    assert score_grids.eval_qd_score(0, MAX_LOSS) == np.nansum(eval_archive.quality_array + MAX_LOSS)
+
+    # Every level is written once, in whatever order results arrived.
+    df = read_levels(str(tmp_path / "eval_levels"))
+    assert list(df.columns) == list(results[0][0])
+    written = sorted(level.tobytes() for level in df["level"])
+    expected = sorted(np.array(level).tobytes() for r in results for level in r[0]["level"])
+    assert written == expected
@@ -0,0 +1,91 @@
+import copy
+import importlib.util
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch as th
+from ray.rllib.models import MODEL_DEFAULTS
+
+from control_pcgrl import control_wrappers, wrappers
+from control_pcgrl.rl.export import export_policy
+from control_pcgrl.rl.models import CustomFeedForwardModel
+from control_pcgrl.runtime import GeneratorRuntime
+
+FORMATS = [
+    "torchscript",
+    pytest.param(
+        "onnx",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("onnx") is None or importlib.util.find_spec("onnxruntime") is None,
+            reason="onnx or onnxruntime is not installed",
+        ),
+    ),
+]
+
+
+def make_narrow_env(cfg):
+    """A narrow binary env, wrapped as in training (or, if the task has controls, as a controllable agent's)."""
+    env = wrappers.CroppedImagePCGRLWrapper(game=cfg.env_name, cfg=cfg)
+    ctrl_metrics = list(cfg.task.controls) if "controls" in cfg.task else None
+    return control_wrappers.ControlWrapper(env, cfg=cfg, ctrl_metrics=ctrl_metrics)
+
+
+def untrained_model(env):
+    th.manual_seed(0)
+    return CustomFeedForwardModel(
+        env.observation_space,
+        env.action_space,
+        env.action_space.n,
+        copy.deepcopy(MODEL_DEFAULTS),
+        "model",
+        dummy_env_obs_space=env.observation_space,
+    )
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("task", ["binary", "binary_control"])
+def test_runtime_matches_env(make_cfg, tmp_path, task, fmt):
+    # One scan of the map, so that the episode is short.
+    cfg = make_cfg(f"task={task}", "representation=narrow", "max_board_scans=1")
+    env = make_narrow_env(cfg)
+    model = untrained_model(env)
+    export_policy(SimpleNamespace(model=model), env, cfg, str(tmp_path), fmt=fmt)
+    runtime = GeneratorRuntime(str(tmp_path))
+    assert runtime.ctrl_metrics == list(env.ctrl_metrics if env.controllable else [])
+
+    np.random.seed(0)
+    env.unwrapped.seed(0)
+    obs, _ = env.reset()
+    unwrapped = env.unwrapped
+    init_map = unwrapped._rep._map.copy()
+    ctrl_trgs = dict(env.metric_trgs) if env.controllable else None
+
+    # Step the env with the actions of the exported model, which sees the same observations as the env's model.
+    done, n_steps = False, 0
+    while not done:
+        runtime_obs = runtime.observe(unwrapped._rep._map, unwrapped._rep._pos, ctrl_trgs, unwrapped._rep_stats)
+        np.testing.assert_allclose(runtime_obs, obs, atol=1e-6)
+        with th.no_grad():
+            logits, _ = model({"obs": th.from_numpy(obs[None]).float()}, [], None)
+        action = runtime.act(runtime_obs[None])[0]
+        assert action == logits.argmax(-1).item()
+        obs, _, terminated, truncated, _ = env.step(action)
+        done = terminated or truncated
+        n_steps += 1
+    assert n_steps == runtime.spec["max_iterations"] + 1
+
+    def stats_fn(int_map):
+        return unwrapped._prob.get_stats(unwrapped.get_string_map(int_map, unwrapped._prob.get_tile_types()))
+
+    stats_fn = stats_fn if env.controllable else None
+    final_map = runtime.generate(init_map=init_map, ctrl_trgs=ctrl_trgs, stats_fn=stats_fn)
+    np.testing.assert_array_equal(final_map, unwrapped._rep._map)
+
+
+def test_controllable_runtime_needs_stats_fn(make_cfg, tmp_path):
+    cfg = make_cfg("task=binary_control", "representation=narrow")
+    env = make_narrow_env(cfg)
+    export_policy(SimpleNamespace(model=untrained_model(env)), env, cfg, str(tmp_path))
+    with pytest.raises(ValueError, match="stats_fn"):
+        GeneratorRuntime(str(tmp_path)).generate(seed=0)
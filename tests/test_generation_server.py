@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from control_pcgrl.rl.envs import make_env
+from control_pcgrl.rl.serving import GenerationServer, LocalClient
+
+
+@pytest.fixture
+def cfg(make_cfg):
+    return make_cfg("task=binary")
+
+
+@pytest.fixture
+def random_policy_fn(cfg):
+    """A policy taking random actions from the action space of the served envs."""
+    n_actions = make_env(cfg).action_space.n
+    rng = np.random.default_rng(0)
+    return lambda obs: rng.integers(n_actions, size=len(obs))
+
+
+def test_concurrent_requests_are_batched(cfg, random_policy_fn):
+    server = GenerationServer(cfg, policy_fn=random_policy_fn, n_envs=4)
+
+    with server:
+        results = LocalClient(server).generate_many([None] * 8, timeout=120)
+
+    assert len(results) == 8
+    for result in results:
+        assert result.map.shape == tuple(cfg.task.map_shape)
+        assert "path-length" in result.stats
+        assert result.latency >= result.queue_time >= 0
+
+    stats = server.get_stats()
+    assert stats["n_completed"] == 8
+    assert stats["n_failed"] == 0
+    # With 8 concurrent requests and 4 envs, the policy should always have been run on more than one env at a time.
+    assert stats["mean_batch_size"] > 1
+    assert stats["p99_latency_ms"] >= stats["p50_latency_ms"] > 0
+    assert stats["requests_per_sec"] > 0
+
+
+def test_per_request_control_targets(cfg, random_policy_fn):
+    server = GenerationServer(cfg, policy_fn=random_policy_fn, n_envs=2)
+    default_trgs = dict(server.envs[0].metric_trgs)
+
+    requested = [{"path-length": 10 * i} for i in range(3)]
+    with server:
+        client = LocalClient(server)
+        results = client.generate_many(requested, timeout=120)
+        # Targets of earlier requests do not leak into later ones.
+        default_result = client.generate(timeout=120)
+
+    for trgs, result in zip(requested, results):
+        assert result.ctrl_trgs == {**default_trgs, **trgs}
+    assert default_result.ctrl_trgs == default_trgs
+
+
+def test_policy_errors_are_propagated(cfg):
+    def bad_policy_fn(obs):
+        raise RuntimeError("oops")
+
+    with GenerationServer(cfg, policy_fn=bad_policy_fn, n_envs=2) as server:
+        with pytest.raises(RuntimeError, match="oops"):
+            LocalClient(server).generate(timeout=60)
+    assert server.get_stats()["n_failed"] == 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from control_pcgrl.envs import helper_3D
+
+TILES = ["AIR", "DIRT", "CHEST", "SKULL", "PUMPKIN"]
+
+
+def random_maps(n_maps=50, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n_maps):
+        n = int(rng.integers(2, 8))
+        int_map = rng.choice(len(TILES), size=(n, n, n), p=[0.55, 0.3, 0.05, 0.05, 0.05]).astype(np.uint8)
+        yield int_map, helper_3D.get_string_map(int_map, TILES)
+
+
+def ints(tiles):
+    return [TILES.index(t) for t in tiles]
+
+
+def test_int_map_round_trip():
+    for int_map, string_map in random_maps():
+        assert np.array_equal(helper_3D.get_int_map(string_map, TILES), int_map)
+
+
+@pytest.mark.parametrize("passable", [["AIR"], ["AIR", "CHEST"]])
+def test_int_map_stats_match_string_map_stats(passable):
+    for int_map, string_map in random_maps():
+        str_locs = helper_3D.get_tile_locations(string_map, TILES)
+        int_locs = helper_3D.get_tile_locations(int_map, range(len(TILES)))
+        for i, t in enumerate(TILES):
+            assert [tuple(p) for p in int_locs[i].tolist()] == str_locs[t]
+
+        assert helper_3D.calc_num_regions(string_map, str_locs, passable) == helper_3D.calc_num_regions(
+            int_map, int_locs, ints(passable)
+        )
+        str_len, str_path, str_jumps = helper_3D.calc_longest_path(string_map, str_locs, passable)
+        int_len, int_path, int_jumps = helper_3D.calc_longest_path(int_map, int_locs, ints(passable))
+        assert (str_len, str_jumps) == (int_len, int_jumps)
+        assert [tuple(p) for p in str_path] == [tuple(p) for p in int_path]
+
+        assert helper_3D.get_floor_dist(string_map, ["CHEST", "SKULL"], ["DIRT"]) == helper_3D.get_floor_dist(
+            int_map, ints(["CHEST", "SKULL"]), ints(["DIRT"])
+        )
+        assert helper_3D.calc_certain_tile(str_locs, ["SKULL", "PUMPKIN"]) == helper_3D.calc_certain_tile(
+            int_locs, ints(["SKULL", "PUMPKIN"])
+        )
+
+
+@pytest.mark.parametrize("passable", [["AIR"], ["AIR", "SKULL", "PUMPKIN"]])
+def test_num_reachable_tile_int_map_matches_string_map(passable):
+    n_reached = 0
+    for int_map, string_map in random_maps(n_maps=200):
+        if not (int_map == TILES.index("CHEST")).any():
+            continue
+        str_locs = helper_3D.get_tile_locations(string_map, TILES)
+        int_locs = helper_3D.get_tile_locations(int_map, range(len(TILES)))
+        str_count = helper_3D.calc_num_reachable_tile(string_map, str_locs, "CHEST", passable, ["AIR", "SKULL"])
+        int_count = helper_3D.calc_num_reachable_tile(
+            int_map, int_locs, TILES.index("CHEST"), ints(passable), ints(["AIR", "SKULL"])
+        )
+        assert str_count == int_count
+        n_reached += str_count > 0
+    assert n_reached > 0
@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from control_pcgrl.envs.helper import run_dijkstra
+from control_pcgrl.envs.paths_3D import MoveTable
+from control_pcgrl.envs.probs.holey_prob import HoleyProblem, get_door_path_lengths
+from control_pcgrl.envs.probs.holey_prob_3D import HEAD, HoleyProblem3D, get_door_paths, get_stacked_doors
+
+
+class Holey2D(HoleyProblem):
+    def __init__(self, width, height):
+        self._width, self._height = width, height
+        super().__init__()
+
+
+class Holey3D(HoleyProblem3D):
+    def __init__(self, width, height, length):
+        self._width, self._height, self._length = width, height, length
+        super().__init__()
+
+
+@pytest.mark.parametrize("shape", [(4, 5), (6, 6), (5, 3)])
+def test_hole_pairs_2D(shape):
+    prob = Holey2D(*shape)
+    expected = [p for p in itertools.product(prob._border_idxs, prob._border_idxs) if prob._valid_holes(*p)]
+    pairs = prob.gen_all_holes()
+    assert len(pairs) == len(expected)
+    assert all(np.array_equal(a, b) for pair, exp in zip(pairs, expected) for a, b in zip(pair, exp))
+
+
+@pytest.mark.parametrize("shape", [(4, 5, 6), (3, 4, 3)])
+def test_hole_pairs_3D(shape):
+    prob = Holey3D(*shape)
+    expected = [
+        p
+        for p in itertools.product(prob._border_idxs, prob._border_idxs)
+        if prob._valid_holes((p[0], p[0] + HEAD), p[1])
+    ]
+    pairs = prob.gen_all_holes()
+    assert len(pairs) == len(expected)
+    for ((entrance, entrance_head), (exit, exit_head)), exp in zip(pairs, expected):
+        assert np.array_equal(entrance, exp[0]) and np.array_equal(exit, exp[1])
+        assert np.array_equal(entrance_head, entrance + HEAD) and np.array_equal(exit_head, exit + HEAD)
+
+
+def test_door_path_lengths_2D():
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        prob = Holey2D(6, 6)
+        passable = rng.random((8, 8)) < 0.6
+        pairs = prob.gen_all_holes()
+        lengths = get_door_path_lengths(passable, *(np.array([p[i] for p in pairs]) for i in range(2)))
+        for (entrance, exit), length in zip(pairs, lengths):
+            map = np.where(passable, "empty", "solid")
+            map[[0, -1]] = map[:, [0, -1]] = "solid"
+            map[tuple(entrance)] = map[tuple(exit)] = "empty"
+            dijkstra, _ = run_dijkstra(entrance[1], entrance[0], map.tolist(), ["empty"])
+            assert dijkstra[tuple(exit)] == length
+
+
+def test_door_paths_3D():
+    rng = np.random.default_rng(0)
+    n_connected = 0
+    for shape in [(5, 5, 5), (4, 6, 5)]:
+        prob = Holey3D(*shape)
+        pairs = prob.gen_all_holes()
+        for _ in range(3):
+            # Mostly air, above a bumpy floor.
+            passable = rng.random((shape[1] + 2, shape[0] + 2, shape[2] + 2)) < 0.85
+            floor = rng.integers(1, 4, size=passable.shape[1:])
+            passable[np.arange(passable.shape[0])[:, None, None] < floor] = False
+            pair_idxs = rng.choice(len(pairs), size=200, replace=False)
+            entrances, exits = (np.array([pairs[i][j][0] for i in pair_idxs]) for j in range(2))
+            lengths, n_jumps = get_door_paths(passable, entrances, exits)
+            for entrance, exit, length, n_jump in zip(entrances, exits, lengths, n_jumps):
+                dug = np.zeros_like(passable)
+                dug[1:-1, 1:-1, 1:-1] = passable[1:-1, 1:-1, 1:-1]
+                for foot in (entrance, exit):
+                    dug[tuple(foot)] = dug[tuple(foot + HEAD)] = True
+                paths = MoveTable(dug).search([tuple(entrance[::-1])])
+                assert (paths.get_length(*exit[::-1]), paths.get_n_jump(*exit[::-1])) == (length, n_jump)
+                n_connected += length > 0
+    assert n_connected > 0
+
+
+def test_dungeon_door_stats():
+    try:
+        from control_pcgrl.envs.probs.minecraft.minecraft_3D_holey_dungeon_prob import Minecraft3DholeyDungeonProblem
+    except (ImportError, TypeError) as e:
+        # The generated protobuf module does not load with every version of protobuf.
+        pytest.skip(f"Cannot import the Minecraft protobuf messages: {e}")
+    # Only the tile types and passable tiles are needed to compute stats.
+    dungeon = Minecraft3DholeyDungeonProblem.__new__(Minecraft3DholeyDungeonProblem)
+    dungeon._passable = {"AIR", "CHEST", "SKULL", "PUMPKIN"}
+    air, dirt, chest, skull, pumpkin = range(5)
+
+    rng = np.random.default_rng(0)
+    n_connected = 0
+    for shape, n_chests in [((5, 5, 5), 1), ((4, 6, 5), 1), ((5, 5, 5), 0)]:
+        prob = Holey3D(*shape)
+        pairs = prob.gen_all_holes()
+        # Some pairs with stacked holes, and some others.
+        entrances, exits = (np.array([p[i][0] for p in pairs]) for i in range(2))
+        stacked = np.flatnonzero(get_stacked_doors(entrances, exits))
+        pair_idxs = np.concatenate([rng.choice(stacked, size=30), rng.choice(len(pairs), size=150, replace=False)])
+        for _ in range(3):
+            # Mostly air, above a bumpy floor, with a chest and some enemies.
+            map = np.where(rng.random((shape[1] + 2, shape[0] + 2, shape[2] + 2)) < 0.9, air, dirt)
+            floor = rng.integers(1, 3, size=map.shape[1:])
+            map[np.arange(map.shape[0])[:, None, None] < floor] = dirt
+            map[[0, -1]] = map[:, [0, -1]] = map[:, :, [0, -1]] = dirt
+            interior_air = np.argwhere(map[1:-1, 1:-1, 1:-1] == air) + 1
+            placed = interior_air[rng.choice(len(interior_air), size=n_chests + 3, replace=False)]
+            map[tuple(placed.T)] = [chest] * n_chests + [skull, pumpkin, skull]
+
+            door_stats = dungeon.get_door_stats(map, [pairs[i] for i in pair_idxs])
+            for j, i in enumerate(pair_idxs):
+                (entrance, entrance_head), (exit, exit_head) = pairs[i]
+                dug = map.copy()
+                dug[tuple(entrance)] = dug[tuple(entrance_head)] = dug[tuple(exit)] = dug[tuple(exit_head)] = air
+                dungeon.entrance_coords = np.array([entrance, entrance_head])
+                dungeon.exit_coords = np.array([exit, exit_head])
+                stats = dungeon.get_stats(dug)
+                assert {k: v[j] for k, v in door_stats.items()} == {k: stats[k] for k in door_stats}
+                n_connected += stats["path-length"] > 0
+    assert n_connected > 0
@@ -0,0 +1,82 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import control_pcgrl
+from control_pcgrl.envs.probs import PROBLEMS
+from control_pcgrl.envs.reps import REPRESENTATIONS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["torch", "ray", "matplotlib", "pandas", "grpc", "ribs", "qdpy", "sklearn"]
+
+MAKE_ENV = """
+import json, pickle, sys
+import gymnasium as gym
+import control_pcgrl
+with open(sys.argv[1], "rb") as f:
+    cfg = pickle.load(f)
+env = gym.make(cfg.env_name, cfg=cfg)
+env.reset()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def loaded_modules(code, *args):
+    """The modules loaded after running some code in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, "-c", code, *args],
+        env={**os.environ, "PYTHONPATH": REPO_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return set(json.loads(out.splitlines()[-1]))
+
+
+def test_import_loads_no_problem():
+    modules = loaded_modules("import json, sys; import control_pcgrl; print(json.dumps(sorted(sys.modules)))")
+    assert not any(m.split(".")[0] in HEAVY_MODULES for m in modules)
+    assert {m for m in modules if m.startswith("control_pcgrl.envs.")} == {
+        "control_pcgrl.envs.registry",
+        "control_pcgrl.envs.probs",
+        "control_pcgrl.envs.probs.minecraft",
+        "control_pcgrl.envs.probs.minecraft.utils",
+        "control_pcgrl.envs.reps",
+    }
+
+
+def test_make_2D_binary_env(make_cfg, tmp_path):
+    cfg = make_cfg("task=binary", "representation=narrow")
+    with open(tmp_path / "cfg.pkl", "wb") as f:
+        pickle.dump(cfg, f)
+    modules = loaded_modules(MAKE_ENV, str(tmp_path / "cfg.pkl"))
+    assert not any(m.split(".")[0] in HEAVY_MODULES for m in modules)
+    # Only the binary problem, and the representations that representation wrappers build on.
+    assert {m for m in modules if m.startswith("control_pcgrl.envs.probs.")} == {
+        "control_pcgrl.envs.probs.binary",
+        "control_pcgrl.envs.probs.binary.binary_prob",
+        "control_pcgrl.envs.probs.binary.eval_maps",
+        "control_pcgrl.envs.probs.holey_prob",
+        "control_pcgrl.envs.probs.minecraft",
+        "control_pcgrl.envs.probs.minecraft.utils",
+        "control_pcgrl.envs.probs.problem",
+    }
+    assert {m for m in modules if m.startswith("control_pcgrl.envs.reps.")} == {
+        "control_pcgrl.envs.reps.ca_rep",
+        "control_pcgrl.envs.reps.narrow_rep",
+        "control_pcgrl.envs.reps.representation",
+        "control_pcgrl.envs.reps.turtle_rep",
+        "control_pcgrl.envs.reps.wide_rep",
+        "control_pcgrl.envs.reps.wrappers",
+    }
+
+
+def test_registries():
+    from control_pcgrl.envs.probs.zelda.zelda_ctrl_prob import ZeldaCtrlProblem
+    from control_pcgrl.envs.reps.turtle_rep import TurtleRepresentation
+
+    assert "zelda" in PROBLEMS and "zelda_ctrl" not in PROBLEMS
+    assert PROBLEMS["zelda"] is ZeldaCtrlProblem and REPRESENTATIONS["turtle"] is TurtleRepresentation
+    assert control_pcgrl.envs.PcgrlEnv.__name__ == "PcgrlEnv"
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from control_pcgrl import control_wrappers, wrappers
+from control_pcgrl.rl.callbacks import StatsCallbacks
+from control_pcgrl.rl.metrics import MetricsAggregator, QuantileSketch, RunningMoments
+
+
+def test_moments_merge():
+    values = np.random.default_rng(0).normal(3, 2, 1000)
+    moments = [RunningMoments() for _ in range(3)]
+    for i, v in enumerate(values):
+        moments[i % 3 if i < 900 else 0].add(v)
+    merged = RunningMoments()
+    for m in moments:
+        merged.merge(m)
+    assert merged.count == len(values)
+    assert np.isclose(merged.mean, values.mean()) and np.isclose(merged.std, values.std())
+    assert merged.min == values.min() and merged.max == values.max()
+
+
+def test_quantiles_within_a_bin():
+    values = np.random.default_rng(0).uniform(0, 100, 5000)
+    sketch = QuantileSketch(0, 100, n_bins=50)
+    for v in values:
+        sketch.add(v)
+    for q in [0.01, 0.1, 0.5, 0.9, 0.99]:
+        assert abs(sketch.quantile(q) - np.quantile(values, q)) <= 2
+    # Out-of-bounds values fall in the edge bins.
+    sketch.add(-10)
+    sketch.add(1000)
+    assert sketch.counts.sum() == len(values) + 2
+    assert np.isnan(QuantileSketch(0, 1).quantile(0.5))
+
+
+def test_aggregators_merge():
+    rng = np.random.default_rng(0)
+    bounds = {"regions": (0, 10), "path-length": (0, 100)}
+    episodes = [
+        ({"regions": rng.integers(10), "path-length": rng.integers(100), "other": rng.random()},
+         {"path-length": rng.integers(100)})
+        for _ in range(200)
+    ]
+    whole = MetricsAggregator(bounds, ["path-length"])
+    parts = [MetricsAggregator(bounds, ["path-length"]) for _ in range(4)]
+    for i, (stats, trgs) in enumerate(episodes):
+        whole.add_episode(stats, trgs)
+        parts[i % 4].add_episode(stats, trgs)
+    for part in parts[1:]:
+        parts[0].merge(part)
+
+    summary = parts[0].summary()
+    assert summary.keys() == whole.summary().keys()
+    assert all(np.isclose(summary[k], v) for k, v in whole.summary().items())
+    # Unbounded metrics only get moments.
+    assert "other_mean" in summary and "other_p50" not in summary
+    assert "regions_p90" in summary and "path-length-scc_mean" in summary
+    heatmap = parts[0].get_heatmaps()["path-length"]
+    assert heatmap.sum() == len(episodes) and np.array_equal(heatmap, whole.get_heatmaps()["path-length"])
+
+
+@pytest.mark.parametrize("in_evaluation", [False, True])
+def test_callbacks(make_cfg, in_evaluation):
+    cfg = make_cfg("task=binary_control")
+    env = wrappers.CroppedImagePCGRLWrapper(game=cfg.env_name, cfg=cfg)
+    env = control_wrappers.ControlWrapper(env, cfg=cfg, ctrl_metrics=list(cfg.task.controls))
+    callbacks = StatsCallbacks(cfg)
+    worker = SimpleNamespace(config=SimpleNamespace(in_evaluation=in_evaluation))
+    base_env = SimpleNamespace(get_sub_environments=lambda: [env])
+
+    for _ in range(3):
+        env.reset()
+        episode = SimpleNamespace(length=0, hist_data={}, custom_metrics={})
+        kwargs = dict(worker=worker, base_env=base_env, policies={}, episode=episode, env_index=0)
+        callbacks.on_episode_start(**kwargs)
+        env.step(env.action_space.sample())
+        callbacks.on_episode_end(**kwargs)
+
+    aggregator = callbacks.pop_metrics()
+    if in_evaluation:
+        assert aggregator is None
+        assert episode.hist_data["path-length-trg"] == [env.metric_trgs["path-length"]]
+        assert episode.custom_metrics["regions"] == [env.unwrapped._rep_stats["regions"]]
+    else:
+        # Nothing is sent per episode.
+        assert episode.hist_data == {} and episode.custom_metrics == {}
+        assert aggregator.n_episodes == 3
+        assert aggregator.summary()["regions_max"] == aggregator.moments["regions"].max
+        assert callbacks.pop_metrics() is None
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from control_pcgrl.envs import helper_3D
+from control_pcgrl.envs.paths_3D import MoveTable
+
+
+def random_maps(n_maps=100, seed=0):
+    """Random maps of air (0) and solid (1) tiles, and a few tiles of air to set out from in each."""
+    rng = np.random.default_rng(seed)
+    for _ in range(n_maps):
+        n = int(rng.integers(3, 8))
+        int_map = (rng.random((n, n, n)) < rng.uniform(0.2, 0.6)).astype(np.uint8)
+        air = np.argwhere(int_map == 0)[:, ::-1]
+        sources = [tuple(c) for c in air[rng.choice(len(air), size=min(3, len(air)), replace=False)].tolist()]
+        yield int_map, sources
+
+
+def test_paths_match_run_dijkstra():
+    for int_map, sources in random_maps():
+        moves = MoveTable.from_map(int_map, [0])
+        for source in sources:
+            paths, _, jumps = helper_3D.run_dijkstra(*source, int_map, [0])
+            field = moves.search([source])
+
+            reached = {tuple(c) for c in np.argwhere(field.lengths >= 0)[:, ::-1].tolist()}
+            assert reached == set(paths)
+            for tile, path in paths.items():
+                assert field.get_length(*tile) == len(path)
+                # Of the shortest paths, we find one with the fewest jumps.
+                assert field.get_n_jump(*tile) <= jumps[tile]
+                ordered_path = field.get_path(*tile)
+                assert len(ordered_path) == len(path)
+                assert ordered_path[0] == source and ordered_path[-1] == tile
+                assert helper_3D.debug_path(field.get_path(*tile, footprint=True), int_map, [0])
+
+
+def test_multi_source_search_is_nearest_source():
+    for int_map, sources in random_maps(n_maps=30, seed=1):
+        moves = MoveTable.from_map(int_map, [0])
+        lengths = np.stack([moves.search([s]).lengths for s in sources]).astype(float)
+        lengths[lengths < 0] = np.inf
+        nearest = lengths.min(axis=0)
+        nearest[np.isinf(nearest)] = -1
+        assert np.array_equal(moves.search(sources).lengths, nearest)
+
+
+def test_jump_over_gap():
+    # A floor with a 1-tile wide, 2-tile deep gap, at x = 2.
+    int_map = np.zeros((6, 1, 5), dtype=np.uint8)
+    int_map[:2, 0, :] = 1
+    int_map[:2, 0, 2] = 0
+    field = MoveTable.from_map(int_map, [0]).search([(0, 0, 2)])
+    assert field.get_n_jump(4, 0, 2) == 1
+    assert field.get_path(4, 0, 2) == [(0, 0, 2), (1, 0, 2), (2, 0, 2), (3, 0, 2), (4, 0, 2)]
+
+
+@pytest.mark.parametrize("source", [(0, 0, 3), (0, 0, 2)])
+def test_no_head_room(source):
+    int_map = np.zeros((4, 2, 2), dtype=np.uint8)
+    int_map[3] = 1
+    int_map[:2] = 1
+    field = MoveTable.from_map(int_map, [0]).search([source])
+    # Neither source has head-room: one is at the top of the map, the other is below a solid tile.
+    assert (field.lengths < 0).all()
+    assert field.get_path(*source) == []
+
+
+def test_search_each_is_separate_searches():
+    for int_map, sources in random_maps(n_maps=30, seed=2):
+        moves = MoveTable.from_map(int_map, [0])
+        targets = np.argwhere(int_map >= 0)[:, ::-1]
+        lengths, n_jumps = moves.search_each(sources, targets, chunk_size=2)
+        for source, source_lengths, source_jumps in zip(sources, lengths, n_jumps):
+            field = moves.search([source])
+            assert np.array_equal(source_lengths, field.lengths.ravel())
+            assert np.array_equal(source_jumps, field.n_jumps.ravel())
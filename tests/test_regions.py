@@ -0,0 +1,49 @@
+import numpy as np
+
+from control_pcgrl.envs import helper, helper_3D
+from control_pcgrl.envs.regions import Regions
+
+
+MAP = [
+    ["empty", "solid", "empty", "empty"],
+    ["empty", "solid", "solid", "empty"],
+    ["solid", "empty", "solid", "solid"],
+    ["empty", "empty", "solid", "empty"],
+]
+
+
+def test_regions_2D():
+    regions = Regions.from_map(MAP, ["empty"])
+    # Diagonal neighbors are not connected.
+    assert regions.n_regions == 4
+    assert sorted(regions.sizes.tolist()) == [1, 2, 3, 3]
+    assert regions.largest_region_mask().sum() == 3
+
+    map_locations = helper.get_tile_locations(MAP, ["empty", "solid"])
+    assert helper.calc_num_regions(MAP, map_locations, ["empty"]) == 4
+    assert helper.calc_num_regions(MAP, map_locations, ["empty", "solid"]) == 1
+    # One start per region, in the order of the passable tiles.
+    empty = map_locations["empty"]
+    assert [empty[i] for i in regions.first_tiles(empty)] == [(0, 0), (2, 0), (1, 2), (3, 3)]
+
+
+def test_regions_3D():
+    int_map = np.ones((3, 3, 3), dtype=np.uint8)
+    int_map[0, 0, :] = 0
+    int_map[2, 2, 2] = 0
+    int_map[1, 0, 1] = 0
+    regions = Regions.from_map(int_map, [0])
+    assert regions.n_regions == 2
+    assert regions.sizes.tolist() == [4, 1]
+    assert regions.largest_region_mask()[1, 0, 1]
+
+    string_map = helper_3D.get_string_map(int_map, ["AIR", "DIRT"])
+    map_locations = helper_3D.get_tile_locations(string_map, ["AIR", "DIRT"])
+    assert helper_3D.calc_num_regions(string_map, map_locations, ["AIR"]) == 2
+
+
+def test_no_regions():
+    regions = Regions.from_map([["solid"] * 3] * 3, ["empty"])
+    assert regions.n_regions == 0
+    assert not regions.largest_region_mask().any()
+    assert regions.first_tiles([]) == []
@@ -0,0 +1,128 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import imageio
+import numpy as np
+import pytest
+from PIL import Image
+
+from control_pcgrl.evo import render_gifs
+
+TILE_SHAPE = (6, 5, 3)
+N_STEPS = 8
+# The number of frames of model (x, y), on a 3x3 grid: some models have fewer than `N_STEPS`, and others more.
+N_FRAMES = {(x, y): [4, 8, 11][x] + y for x in range(3) for y in range(3)}
+N_GRID_FRAMES = 8
+
+
+@pytest.fixture
+def render_path(tmp_path):
+    rng = np.random.default_rng(0)
+    for (x, y), n_frames in N_FRAMES.items():
+        model_dir = tmp_path / "model_{}_{}".format(x, y)
+        model_dir.mkdir()
+        for j in range(n_frames):
+            im = rng.integers(256, size=TILE_SHAPE, dtype=np.uint8)
+            Image.fromarray(im).save(model_dir / "frame_{:0>4d}.png".format(j))
+    # Not a tile of the grid.
+    (tmp_path / "model_concat").mkdir()
+    return str(tmp_path)
+
+
+def current_grid_frames(render_path, n_steps):
+    """The grid frames as `render_gifs` used to write them to PNGs."""
+    model_dirs = [m for m in os.listdir(render_path) if re.match(r".*_(\d)_(\d)", m)]
+    model_idxs = [tuple(int(i) for i in re.match(r".*_(\d)_(\d)", m).groups()) for m in model_dirs]
+    grid_tiles_w = max([m[0] for m in model_idxs])
+    model_frame_seqs = []
+    for m_dir in model_dirs:
+        model_path = os.path.join(render_path, m_dir)
+        names = sorted(os.listdir(model_path), key=render_gifs.natural_keys)
+        frames = [os.path.join(model_path, m) for m in names if re.match(r"frame.*.png", m)]
+        if len(frames) < n_steps:
+            frames += [frames[-1]] * (n_steps - len(frames))
+        model_frame_seqs.append(frames)
+    grid_frames = []
+    for frames in zip(*model_frame_seqs):
+        ims = [imageio.v2.imread(f) for f in frames]
+        im_w, im_h = ims[0].shape[0], ims[0].shape[1]
+        grid_frame = np.empty(shape=(im_w * (grid_tiles_w + 1), im_h * (grid_tiles_w + 1), 3), dtype=np.uint8)
+        for j, im in enumerate(ims):
+            x, y = model_idxs[j]
+            grid_frame[(-y - 1) * im_w : (grid_tiles_w + 1 - y) * im_w, (x) * im_h : (x + 1) * im_h, :] = im
+        grid_frames.append(grid_frame)
+    return grid_frames
+
+
+def build_grid(render_path, n_procs):
+    model_dirs, model_idxs = render_gifs.get_model_dirs(render_path)
+    frame_paths = [render_gifs.get_frame_paths(os.path.join(render_path, m)) for m in model_dirs]
+    grid_path = os.path.join(render_path, "grid_frames.npy")
+    if n_procs == 1:
+        return render_gifs.build_grid(grid_path, frame_paths, model_idxs, N_STEPS)
+    with ProcessPoolExecutor(n_procs) as pool:
+        return render_gifs.build_grid(grid_path, frame_paths, model_idxs, N_STEPS, pool)
+
+
+@pytest.mark.parametrize("n_procs", [1, 3])
+def test_same_grid_frames_as_current(render_path, n_procs):
+    grid = build_grid(render_path, n_procs)
+    expected = current_grid_frames(render_path, N_STEPS)
+    assert len(grid) == len(expected) == N_GRID_FRAMES
+    np.testing.assert_array_equal(grid, np.stack(expected))
+
+
+def test_tile_placement_and_padding(render_path):
+    grid = build_grid(render_path, 1)
+    assert grid.shape == (N_GRID_FRAMES, 3 * TILE_SHAPE[0], 3 * TILE_SHAPE[1], 3)
+    for (x, y), n_frames in N_FRAMES.items():
+        frames = render_gifs.load_frames(
+            render_gifs.get_frame_paths(os.path.join(render_path, f"model_{x}_{y}")), N_STEPS
+        )
+        assert len(frames) == max(n_frames, N_STEPS)
+        # Short sequences are padded with their last frame.
+        last = np.asarray(Image.open(os.path.join(render_path, f"model_{x}_{y}", f"frame_{n_frames - 1:04d}.png")))
+        assert (frames[n_frames - 1 :] == last).all()
+        # Model (x, y) is in column x, and in row y from the bottom.
+        row = 2 - y
+        tile = grid[:, row * TILE_SHAPE[0] : (row + 1) * TILE_SHAPE[0], x * TILE_SHAPE[1] : (x + 1) * TILE_SHAPE[1]]
+        np.testing.assert_array_equal(tile, frames[:N_GRID_FRAMES])
+
+
+def gif_frames(path):
+    """The frames of a GIF, each repeated according to its duration (as consecutive duplicate frames are merged)."""
+    frames = []
+    with Image.open(path) as im:
+        for i in range(im.n_frames):
+            im.seek(i)
+            frames.append((np.asarray(im.convert("RGB")), im.info["duration"]))
+    return frames
+
+
+@pytest.mark.parametrize("ffmpeg", [False, True])
+def test_grid_gif(render_path, monkeypatch, ffmpeg):
+    if ffmpeg and render_gifs.FFMPEG is None:
+        pytest.skip("ffmpeg is not installed")
+    if not ffmpeg:
+        monkeypatch.setattr(render_gifs, "FFMPEG", None)
+    # Few colors, so that the GIF's palette holds them exactly.
+    grid = np.zeros((N_GRID_FRAMES, 2 * TILE_SHAPE[0], 2 * TILE_SHAPE[1], 3), dtype=np.uint8)
+    for i in range(N_GRID_FRAMES):
+        grid[i, : TILE_SHAPE[0], : TILE_SHAPE[1]] = [255, 0, 0] if i % 2 else [0, 0, 255]
+    grid_path = os.path.join(render_path, "grid_frames.npy")
+    np.save(grid_path, grid)
+    gif_name = os.path.join(render_path, "grid_frames")
+    render_gifs.encode_grid(grid_path, gif_name, "gif")
+    render_gifs.encode_grid(grid_path, gif_name, "mp4")
+
+    frames = gif_frames(gif_name + ".gif")
+    # The grid frames, then a second on the last one (up to GIFs' resolution of 10ms per frame).
+    duration = sum(duration for _, duration in frames)
+    expected = (N_GRID_FRAMES + render_gifs.GRID_GIF_FPS) * 1000 / render_gifs.GRID_GIF_FPS
+    assert abs(duration - expected) < 10 * len(frames)
+    if not ffmpeg:
+        assert len(frames) == N_GRID_FRAMES
+        for i, (frame, _) in enumerate(frames):
+            np.testing.assert_array_equal(frame, grid[i])
+    assert os.path.isfile(gif_name + ".mp4") == ffmpeg
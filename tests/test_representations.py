@@ -0,0 +1,216 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from control_pcgrl.wrappers import OneHotEncoding
+
+
+REPRESENTATIONS = ["narrow", "narrowcast", "narrowmulti", "turtle", "turtlecast", "wide", "cellular"]
+
+
+def make_base_env(make_cfg, representation):
+    # (Observing the whole map, so that the one-hot encoding of the map is done incrementally.)
+    cfg = make_cfg("task=binary", f"representation={representation}", "task.obs_window=[16,16]")
+    return gym.make(cfg.env_name, cfg=cfg), cfg
+
+
+def sample_action(env, rng):
+    rep = env.unwrapped._rep.unwrapped
+    if type(rep).__name__ == "CARepresentation":
+        # The cellular representation takes a distribution over tile types at each tile.
+        return rng.random((env.unwrapped.get_num_tiles(), *rep._map.shape))
+    return env.unwrapped.action_space.sample()
+
+
+@pytest.mark.parametrize("representation", REPRESENTATIONS)
+def test_changed_idxs(make_cfg, representation):
+    env, _ = make_base_env(make_cfg, representation)
+    env.unwrapped.action_space.seed(0)
+    rng = np.random.default_rng(0)
+    env.reset(seed=0)
+    rep = env.unwrapped._rep.unwrapped
+    n_changed = 0
+    for _ in range(200):
+        old_map = rep._map.copy()
+        env.step(sample_action(env, rng))
+        idxs = rep.get_changed_idxs()
+        assert idxs is not None
+        changed = np.flatnonzero(rep._map != old_map)
+        assert np.isin(changed, idxs).all()
+        n_changed += len(changed)
+    assert n_changed > 0
+
+
+def test_ca_sparse_write(make_cfg):
+    env, _ = make_base_env(make_cfg, "cellular")
+    env.reset(seed=0)
+    rep = env.unwrapped._rep.unwrapped
+    rng = np.random.default_rng(0)
+    n_tiles = env.unwrapped.get_num_tiles()
+    for n_flips in [0, 1, 10, rep._map.size]:
+        old_map = rep._map.copy()
+        next_map = old_map.copy()
+        flips = rng.choice(next_map.size, n_flips, replace=False)
+        next_map.ravel()[flips] = (next_map.ravel()[flips] + 1) % n_tiles
+        change, _ = rep.update(np.eye(n_tiles)[next_map].transpose(2, 0, 1))
+        assert change == (n_flips > 0)
+        assert np.array_equal(rep._map, next_map)
+        assert np.array_equal(rep.get_changed_idxs(), np.sort(flips))
+        # The changes are written into the bordered map, which the map is still a view of.
+        assert rep._map.base is rep._bordered_map
+        assert np.array_equal(rep._bordered_map[1:-1, 1:-1], next_map)
+
+
+@pytest.mark.parametrize("representation", REPRESENTATIONS)
+def test_incremental_one_hot(make_cfg, representation):
+    env, cfg = make_base_env(make_cfg, representation)
+    env = OneHotEncoding(env, "map", cfg=cfg)
+    assert env._incremental
+    env.unwrapped.action_space.seed(0)
+    rng = np.random.default_rng(0)
+    rep = env.unwrapped._rep.unwrapped
+    for i in range(3):
+        obs, _ = env.reset(seed=i)
+        assert np.array_equal(obs["map"], env._eye[rep._map])
+        for t in range(100):
+            if t == 50:
+                # Replace the map wholesale (as when setting maps by hand), behind the representation's back.
+                rep._map = rng.integers(0, env.dim, rep._map.shape, dtype=np.uint8)
+            obs, *_ = env.step(sample_action(env, rng))
+            assert np.array_equal(obs["map"], env._eye[rep._map])
+
+
+def check_bordered_map(rep):
+    """The map is a (uint8) view of the interior of the bordered map, whose border is intact."""
+    assert rep._map.base is rep._bordered_map
+    assert rep._bordered_map.dtype == np.uint8
+    assert np.array_equal(rep._bordered_map[1:-1, 1:-1], rep._map)
+    border = np.ones(rep._bordered_map.shape, dtype=bool)
+    border[1:-1, 1:-1] = False
+    assert (rep._bordered_map[border] == rep._border_tile_index).all()
+
+
+@pytest.mark.parametrize("representation", REPRESENTATIONS)
+def test_bordered_map(make_cfg, representation):
+    env, _ = make_base_env(make_cfg, representation)
+    env.unwrapped.action_space.seed(0)
+    rng = np.random.default_rng(0)
+    rep = env.unwrapped._rep.unwrapped
+    for i in range(3):
+        env.reset(seed=i)
+        check_bordered_map(rep)
+        for t in range(50):
+            env.step(sample_action(env, rng))
+            check_bordered_map(rep)
+            if t == 10:
+                # Edits to the map in place show up in the bordered map.
+                rep._map[0, 0] = 1 - rep._map[0, 0]
+                rep._map[-1, -1] = 1 - rep._map[-1, -1]
+                check_bordered_map(rep)
+            elif t == 20:
+                # As does a map assigned wholesale, once the representation has caught up with it.
+                next_map = rng.integers(0, 2, rep._map.shape, dtype=np.uint8)
+                rep._map = next_map
+                rep._update_bordered_map()
+                check_bordered_map(rep)
+                assert np.array_equal(rep._map, next_map)
+                assert rep.get_changed_idxs() is None
+
+
+def test_ca_replaced_map(make_cfg):
+    env, _ = make_base_env(make_cfg, "cellular")
+    env.reset(seed=0)
+    rep = env.unwrapped._rep.unwrapped
+    n_tiles = env.unwrapped.get_num_tiles()
+    next_map = np.random.default_rng(0).integers(0, n_tiles, rep._map.shape)
+    # With no map (as when generating from a latent seed), the cellular representation adopts the next map wholesale.
+    rep._map = None
+    change, _ = rep.update(np.eye(n_tiles)[next_map].transpose(2, 0, 1))
+    assert change
+    check_bordered_map(rep)
+    assert np.array_equal(rep._map, next_map)
+
+
+def test_multi_action_patches(make_cfg):
+    cfg = make_cfg("task=binary", "representation=narrow", "act_window=[3,3]")
+    env = gym.make(cfg.env_name, cfg=cfg)
+    env.reset(seed=0)
+    rep = env.unwrapped._rep
+    base_rep = rep.unwrapped
+    assert type(rep).__name__ == "MultiActionRepresentation"
+    rng = np.random.default_rng(0)
+    for t in range(100):
+        top_left = base_rep._pos - rep.inner_l_pads
+        patch = tuple(slice(lo, lo + size) for lo, size in zip(top_left, rep.action_size))
+        old_map = base_rep._map.copy()
+        # Half the time, leave the patch as it is.
+        action = old_map[patch].copy() if t % 2 == 0 else rng.integers(0, 2, rep.action_size)
+        change, _ = rep.update(action.ravel())
+        changed = np.flatnonzero(base_rep._map != old_map)
+        assert change == (len(changed) > 0)
+        assert np.array_equal(np.sort(base_rep.get_changed_idxs()), changed)
+        assert np.array_equal(base_rep._map[patch], action)
+        check_bordered_map(base_rep)
+
+
+STATIC_REPRESENTATIONS = [
+    ("narrow", "patch", ["act_window=[3,3]"]),
+    ("turtle", "turtle", []),
+    ("narrow", "narrow", []),
+    ("wide", "wide", []),
+    ("cellular", "map", []),
+    ("narrowcast", "map", []),
+    ("narrowmulti", "map", []),
+    ("turtlecast", "map", []),
+]
+
+
+@pytest.mark.parametrize("representation, edit_mode, overrides", STATIC_REPRESENTATIONS)
+def test_static_tiles(make_cfg, representation, edit_mode, overrides):
+    cfg = make_cfg(
+        "task=binary",
+        f"representation={representation}",
+        "task.obs_window=[16,16]",
+        "static_tile_wrapper=true",
+        "static_prob=0.5",
+        "n_static_walls=2",
+        *overrides,
+    )
+    env = gym.make(cfg.env_name, cfg=cfg)
+    rep = env.unwrapped._rep
+    assert type(rep).__name__ == "StaticTileRepresentation"
+    assert rep._edit_mode == edit_mode
+    env.unwrapped.action_space.seed(0)
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        env.reset(seed=i)
+        static_mask = rep._static_mask.copy()
+        assert static_mask.any() and not static_mask.all()
+        static_tiles = rep.unwrapped._map[static_mask].copy()
+        n_changed = 0
+        for _ in range(100):
+            old_map = rep.unwrapped._map.copy()
+            env.step(sample_action(env, rng))
+            assert np.array_equal(rep.unwrapped._map[static_mask], static_tiles)
+            n_changed += (rep.unwrapped._map != old_map).sum()
+        assert n_changed > 0
+
+
+def test_static_valid_agent_coords(make_cfg):
+    cfg = make_cfg("task=binary", "representation=narrow", "static_tile_wrapper=true", "static_prob=0.5")
+    env = gym.make(cfg.env_name, cfg=cfg)
+    env.reset(seed=0)
+    rep = env.unwrapped._rep
+    all_coords = rep.rep.get_valid_agent_coords()
+    rng = np.random.default_rng(0)
+    for static_prob in [0, 0.1, 0.5, 0.9, 1]:
+        for _ in range(20):
+            rep.static_tiles = (rng.random(rep.unwrapped._bordered_map.shape) < static_prob).astype(np.uint8)
+            rep.static_tiles[(0, -1), :] = rep.static_tiles[:, (0, -1)] = 1
+            rep._static_mask = rep.static_tiles[1:-1, 1:-1].astype(bool)
+            # The old filter (over bordered map coordinates, i.e. offset by the border), which fell back on all
+            # coordinates if every tile was static.
+            valid_coords = np.array([ap for ap in all_coords if rep.static_tiles[tuple(ap + 1)] == 0])
+            if len(valid_coords) == 0:
+                valid_coords = all_coords
+            assert np.array_equal(rep.get_valid_agent_coords(), valid_coords)
@@ -0,0 +1,114 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from control_pcgrl.rl.results_store import EVAL, PROGRESS, STATIC_EVAL, ResultsStore
+
+
+def write_json(path, stats):
+    with open(path, "w") as f:
+        json.dump(stats, f)
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def log_dirs(tmp_path):
+    """Two experiments, each with eval stats, a static eval, and (in a trial directory) a progress file."""
+    dirs = []
+    for i in range(2):
+        log_dir = tmp_path / f"exp_{i}"
+        (log_dir / "trial").mkdir(parents=True)
+        write_json(log_dir / "eval_stats.json", {"episode_reward_mean": float(i), "stats": {"path-length": 2.0 * i}})
+        write_json(log_dir / "static-prob-0.1_static-walls-3_eval_stats.json", {"episode_reward_mean": 10.0 + i})
+        pd.DataFrame({"timesteps_total": [1, 2], "episode_reward_mean": [i, i + 1], "other": [0, 0]}).to_csv(
+            log_dir / "trial" / "progress.csv", index=False
+        )
+        dirs.append(str(log_dir))
+    return dirs
+
+
+def eval_values(store, log_dirs):
+    return store.query_eval(log_dirs, ["episode_reward_mean", "stats_path-length"]).values.tolist()
+
+
+@pytest.mark.parametrize("n_procs", [1, 2])
+def test_ingests_new_files(tmp_path, log_dirs, n_procs):
+    store = ResultsStore(str(tmp_path / "store"), n_procs=n_procs)
+    assert store.refresh(log_dirs, find_progress=True) == 6
+    assert sorted(store.files.kind) == sorted([EVAL, STATIC_EVAL, PROGRESS] * 2)
+    assert eval_values(store, log_dirs) == [[0.0, 0.0], [1.0, 2.0]]
+    static = store.query_static(log_dirs)
+    assert static.value.tolist() == [10.0, 11.0]
+    assert static[["eval_static_prob", "eval_n_static_walls"]].values.tolist() == [[0.1, 3], [0.1, 3]]
+    progress = store.query_progress(log_dirs[1])
+    assert list(progress.columns) == ["timesteps_total", "episode_reward_mean", "log_dir", "path"]
+    assert progress.episode_reward_mean.tolist() == [1, 2]
+
+    # Nothing has changed since.
+    assert store.refresh(log_dirs, find_progress=True) == 0
+
+    # The tables persist.
+    store.save()
+    reloaded = ResultsStore(str(tmp_path / "store"))
+    assert reloaded.refresh(log_dirs, find_progress=True) == 0
+    assert eval_values(reloaded, log_dirs) == [[0.0, 0.0], [1.0, 2.0]]
+
+
+def test_reingests_modified_files(tmp_path, log_dirs):
+    store = ResultsStore(str(tmp_path / "store"), n_procs=1)
+    store.refresh(log_dirs, find_progress=True)
+    eval_path = os.path.join(log_dirs[0], "eval_stats.json")
+    write_json(eval_path, {"episode_reward_mean": 5.0, "stats": {"path-length": 6.0}})
+    bump_mtime(eval_path)
+    # A file whose contents (and size) are unchanged, but was rewritten since.
+    bump_mtime(os.path.join(log_dirs[1], "trial", "progress.csv"))
+
+    assert store.refresh(log_dirs, find_progress=True) == 2
+    assert eval_values(store, log_dirs) == [[5.0, 6.0], [1.0, 2.0]]
+    # Rows of re-ingested files are replaced, not duplicated.
+    assert len(store.stats) == 6
+    assert len(store.progress) == 4 and len(store.files) == 6
+
+
+def test_drops_deleted_files(tmp_path, log_dirs):
+    store = ResultsStore(str(tmp_path / "store"), n_procs=1)
+    store.refresh(log_dirs, find_progress=True)
+    os.remove(os.path.join(log_dirs[0], "eval_stats.json"))
+    os.remove(os.path.join(log_dirs[0], "trial", "progress.csv"))
+    # Files of experiments we do not refresh are kept, whether or not they still exist.
+    os.remove(os.path.join(log_dirs[1], "eval_stats.json"))
+
+    assert store.refresh(log_dirs[:1], find_progress=True) == 0
+    assert store.query_eval(log_dirs, ["episode_reward_mean"]).index.tolist() == [log_dirs[1]]
+    assert len(store.query_progress(log_dirs[0])) == 0 and len(store.query_progress(log_dirs[1])) == 2
+    assert len(store.query_static(log_dirs)) == 2
+    assert not store.files.path.isin(
+        [os.path.join(log_dirs[0], "eval_stats.json"), os.path.join(log_dirs[0], "trial", "progress.csv")]
+    ).any()
+
+
+def test_keeps_progress_without_find_progress(tmp_path, log_dirs):
+    store = ResultsStore(str(tmp_path / "store"), n_procs=1)
+    store.refresh(log_dirs, find_progress=True)
+    eval_path = os.path.join(log_dirs[0], "eval_stats.json")
+    write_json(eval_path, {"episode_reward_mean": 5.0})
+    bump_mtime(eval_path)
+
+    # Progress files are not looked for, so those we have are kept, while other files are refreshed as usual.
+    assert store.refresh(log_dirs, find_progress=False) == 1
+    assert len(store.progress) == 4
+    assert (store.files.kind == PROGRESS).sum() == 2
+    assert store.query_eval(log_dirs, ["episode_reward_mean"]).values.tolist() == [[5.0], [1.0]]
+
+    # Until they are looked for again.
+    os.remove(os.path.join(log_dirs[0], "trial", "progress.csv"))
+    assert store.refresh(log_dirs, find_progress=False) == 0
+    assert len(store.query_progress(log_dirs[0])) == 2
+    assert store.refresh(log_dirs, find_progress=True) == 0
+    assert len(store.query_progress(log_dirs[0])) == 0
@@ -0,0 +1,163 @@
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+import pytest
+import torch as th
+from torch.utils.tensorboard import SummaryWriter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import train_reward_model
+from control_pcgrl.reward_model_wrappers import SharedReplayBuffer, StatsSurrogate, onehot_maps
+from control_pcgrl.rl.envs import make_env
+
+MAP_SHAPE = (4, 3)
+N_METRICS = 2
+
+
+def add_numbered(buffer, start, n):
+    """Add `n` datapoints, numbered from `start`: each map is filled with, and each metric is, its number."""
+    nums = np.arange(start, start + n)
+    maps = np.broadcast_to(nums[:, None, None], (n, *MAP_SHAPE)).astype(np.uint8)
+    metrics = np.repeat(nums[:, None], N_METRICS, axis=1).astype(np.float32)
+    buffer.add(maps, metrics)
+
+
+def test_ring_buffer_wraps_around():
+    buffer = SharedReplayBuffer(5, MAP_SHAPE, N_METRICS)
+    add_numbered(buffer, 0, 3)
+    assert (buffer.n_added, len(buffer)) == (3, 3)
+    add_numbered(buffer, 3, 4)
+    assert (buffer.n_added, len(buffer)) == (7, 5)
+
+    # The two oldest datapoints were overwritten, in place.
+    buf_maps, buf_metrics, buf_added_at = buffer._get_views()
+    assert buf_added_at.tolist() == [5, 6, 2, 3, 4]
+    assert buf_maps[:, 0, 0].tolist() == [5, 6, 2, 3, 4]
+    assert buf_metrics[:, 0].tolist() == [5, 6, 2, 3, 4]
+
+    maps, metrics, _ = buffer.sample(200, np.random.default_rng(0))
+    assert maps.dtype == np.uint8 and maps.shape == (200, *MAP_SHAPE)
+    assert set(metrics[:, 0].tolist()) == {2, 3, 4, 5, 6}
+    # Each map comes with its own metrics.
+    assert (maps[:, 0, 0] == metrics[:, 0]).all()
+
+
+def test_staleness():
+    buffer = SharedReplayBuffer(8, MAP_SHAPE, N_METRICS)
+    add_numbered(buffer, 0, 20)
+    _, metrics, staleness = buffer.sample(64, np.random.default_rng(0))
+    # Datapoint k was added when k datapoints had been.
+    assert staleness == pytest.approx(20 - metrics[:, 0].mean())
+    assert 1 <= staleness <= 8
+
+
+def add_in_process(buffer, start, n):
+    add_numbered(buffer, start, n)
+
+
+def test_add_from_other_process():
+    ctx = mp.get_context()
+    buffer = SharedReplayBuffer(16, MAP_SHAPE, N_METRICS, ctx=ctx)
+    procs = [ctx.Process(target=add_in_process, args=(buffer, start, 5)) for start in (0, 5)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    buf_maps, buf_metrics, buf_added_at = buffer._get_views()
+    assert buffer.n_added == 10
+    # Each batch is added atomically, whatever the order of the processes.
+    assert sorted(buf_metrics[:10, 0].tolist()) == list(range(10))
+    assert (np.diff(buf_added_at[:10]) == 1).all()
+
+
+def test_onehot_uint8_maps():
+    maps = np.random.default_rng(0).integers(3, size=(5, *MAP_SHAPE), dtype=np.uint8)
+    feats = onehot_maps(maps, 3)
+    assert feats.dtype == th.float32 and feats.shape == (5, *MAP_SHAPE, 3)
+    np.testing.assert_array_equal(feats.numpy(), np.eye(3, dtype=np.float32)[maps])
+
+
+@pytest.fixture
+def reward_model_cfg(make_cfg):
+    cfg = make_cfg("task=binary")
+    cfg.train_reward_model = True
+    return cfg
+
+
+@pytest.fixture
+def small_run(monkeypatch):
+    """Collect into a small buffer, which wraps around before training starts, and train for a few iterations."""
+    for name, value in [
+        ("batch_size", 16),
+        ("n_train_iters", 20),
+        ("n_collectors", 2),
+        ("n_envs_per_collector", 2),
+        ("min_buffer_size", 300),
+        ("log_interval", 10),
+    ]:
+        monkeypatch.setattr(train_reward_model, name, value)
+
+
+def test_collect_and_train(reward_model_cfg, small_run, tmp_path):
+    env = make_env(reward_model_cfg)
+    env.reset()
+    map_dims = env.get_map_dims()
+    model, optimizer = train_reward_model.init_reward_model(env)
+    buffer = SharedReplayBuffer(256, map_dims[:-1], len(env.metrics))
+    model_path = str(tmp_path / "reward_model.pt")
+    with SummaryWriter(log_dir=str(tmp_path)) as writer:
+        losses = train_reward_model.collect_and_train(
+            reward_model_cfg, env, model, optimizer, buffer, writer, model_path, mp.get_context()
+        )
+
+    assert len(losses) == 20 and np.isfinite(losses).all()
+    assert buffer.n_added >= 300 and len(buffer) == 256
+
+    # The buffer holds maps (as tile ints) with their exact stats.
+    buf_maps, buf_metrics, _ = buffer._get_views()
+    assert buf_maps.dtype == np.uint8 and buf_maps.max() < map_dims[-1]
+    unwrapped = env.unwrapped
+    for disc_map, metrics in zip(buf_maps[:10], buf_metrics[:10]):
+        unwrapped._rep._map = disc_map.astype(int)
+        stats = unwrapped._prob.get_stats(unwrapped._get_stats_map())
+        np.testing.assert_allclose(metrics, [stats[k] for k in env.metric_keys], rtol=1e-6)
+
+    surrogate = StatsSurrogate(model_path)
+    assert surrogate.metric_keys == env.metric_keys
+    assert surrogate.predict(buf_maps[:3]).shape == (3, len(env.metric_keys))
+
+
+def failing_make_env(cfg):
+    raise RuntimeError("Cannot make env.")
+
+
+def test_dead_collectors_raise(reward_model_cfg, small_run, monkeypatch, tmp_path):
+    monkeypatch.setattr(train_reward_model, "make_env", failing_make_env)
+    env = make_env(reward_model_cfg)
+    model, optimizer = train_reward_model.init_reward_model(env)
+    buffer = SharedReplayBuffer(256, env.get_map_dims()[:-1], len(env.metrics))
+    with SummaryWriter(log_dir=str(tmp_path)) as writer, pytest.raises(RuntimeError, match="collectors have exited"):
+        train_reward_model.collect_and_train(
+            reward_model_cfg, env, model, optimizer, buffer, writer, str(tmp_path / "reward_model.pt"), mp.get_context()
+        )
+
+
+def test_dead_prefetcher_raises():
+    ctx = mp.get_context()
+    stop_event = ctx.Event()
+    collector = ctx.Process(target=stop_event.wait, daemon=True)
+    collector.start()
+    prefetcher = threading.Thread(target=lambda: None)
+    prefetcher.start()
+    prefetcher.join()
+    try:
+        with pytest.raises(RuntimeError, match="prefetch thread has died"):
+            train_reward_model.get_batch(queue.Queue(), [collector], prefetcher, timeout=0.1)
+    finally:
+        stop_event.set()
+        collector.join()
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from control_pcgrl.reward_model_wrappers import init_reward_model, save_reward_model
+from control_pcgrl.rl.envs import make_env
+
+N_STEPS = 600
+# Short episodes (of one scan of the 16x16 map), so that a few of them end.
+OVERRIDES = ["task=binary", "max_board_scans=1"]
+
+
+@pytest.fixture
+def surrogate_path(make_cfg, tmp_path):
+    """An (untrained) reward model for binary, whose predictions are far from exact stats."""
+    env = make_env(make_cfg(*OVERRIDES))
+    model, _ = init_reward_model(env)
+    map_dims = env.get_map_dims()
+    path = str(tmp_path / "reward_model.pt")
+    save_reward_model(path, model, obs_shape=(map_dims[-1], *map_dims[:-1]), metric_keys=list(env.metrics.keys()))
+    return path
+
+
+def make_surrogate_env(make_cfg, surrogate_path, exact_prob):
+    return make_env(make_cfg(*OVERRIDES, f"surrogate_stats={surrogate_path}", f"surrogate_exact_prob={exact_prob}"))
+
+
+class StatsCounter:
+    """Count the calls to a problem's (exact) `get_stats`."""
+
+    def __init__(self, prob):
+        self.n_calls = 0
+        self.get_stats = prob.get_stats
+        prob.get_stats = self
+
+    def __call__(self, *args, **kwargs):
+        self.n_calls += 1
+        return self.get_stats(*args, **kwargs)
+
+
+def play(env, actions, on_step, on_reset=lambda: None):
+    """Step through the actions, resetting at the end of each episode, and calling `on_step` after each step."""
+    np.random.seed(0)
+    env.unwrapped.seed(0)
+    env.reset()
+    on_reset()
+    for action in actions:
+        _, _, done, truncated, _ = env.step(action)
+        on_step(done or truncated)
+        if done or truncated:
+            env.reset()
+            on_reset()
+
+
+def exact_stats(env):
+    unwrapped = env.unwrapped
+    return unwrapped._prob.get_stats(unwrapped._get_stats_map())
+
+
+def random_actions(env, n):
+    env.action_space.seed(0)
+    return [env.action_space.sample() for _ in range(n)]
+
+
+def test_terminal_steps_are_exact(make_cfg, surrogate_path):
+    env = make_surrogate_env(make_cfg, surrogate_path, 0.0)
+    unwrapped = env.unwrapped
+    n_done, n_predicted = 0, 0
+
+    def on_step(done):
+        nonlocal n_done, n_predicted
+        n_predicted += not unwrapped._rep_stats_exact
+        if done:
+            n_done += 1
+            assert unwrapped._rep_stats_exact
+            assert unwrapped._rep_stats == exact_stats(env)
+
+    play(env, random_actions(env, N_STEPS), on_step)
+    assert n_done > 0 and n_predicted > 0
+
+
+def test_always_exact_matches_exact_stats(make_cfg, surrogate_path):
+    env = make_env(make_cfg(*OVERRIDES))
+    actions = random_actions(env, N_STEPS)
+    expected = []
+    play(env, actions, lambda done: expected.append(dict(env.unwrapped._rep_stats)))
+
+    surrogate_env = make_surrogate_env(make_cfg, surrogate_path, 1.0)
+    unwrapped = surrogate_env.unwrapped
+    metrics = []
+
+    def on_step(done):
+        assert unwrapped._rep_stats_exact
+        metrics.append(dict(unwrapped._rep_stats))
+
+    play(surrogate_env, actions, on_step)
+    assert metrics == expected
+
+
+def test_errors_only_on_exact_steps(make_cfg, surrogate_path):
+    env = make_surrogate_env(make_cfg, surrogate_path, 0.3)
+    unwrapped = env.unwrapped
+    counter = StatsCounter(unwrapped._prob)
+    metric_keys = list(env.metrics.keys())
+    n_exact, n_predicted = 0, 0
+
+    def on_step(done):
+        nonlocal n_exact, n_predicted
+        errors = unwrapped._surrogate_errors
+        # One error per metric for each exact computation of the stats in this episode, and none otherwise.
+        assert {len(errors.get(k, [])) for k in metric_keys} == {counter.n_calls}
+        if not unwrapped._rep_stats_exact:
+            n_predicted += 1
+            assert unwrapped._rep_stats != counter.get_stats(unwrapped._get_stats_map())
+        elif counter.n_calls > 0:
+            n_exact += 1
+            assert all(errors[k][-1] >= 0 for k in metric_keys)
+
+    def on_reset():
+        # Stats are computed exactly on reset, without recording an error.
+        counter.n_calls = 0
+
+    play(env, random_actions(env, N_STEPS), on_step, on_reset)
+    assert n_exact > 0 and n_predicted > 0
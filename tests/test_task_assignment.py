@@ -0,0 +1,100 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import ray
+from ray.rllib.env.env_context import EnvContext
+
+from control_pcgrl import wrappers
+from control_pcgrl.rl.callbacks import StatsCallbacks
+from control_pcgrl.task_assignment import assign_tasks
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def eval_env_contexts(num_workers, num_envs_per_worker):
+    """The contexts of the envs that evaluate: those of the remote workers, or, if there are none, the local one's."""
+    worker_idxs = range(1, num_workers + 1) if num_workers > 0 else [0]
+    for worker_index in worker_idxs:
+        for vector_index in range(num_envs_per_worker):
+            yield EnvContext({}, worker_index=worker_index, vector_index=vector_index, num_workers=num_workers)
+
+
+@pytest.mark.parametrize("num_workers", [0, 1, 3])
+@pytest.mark.parametrize("num_envs_per_worker", [1, 4])
+@pytest.mark.parametrize("n_tasks", [0, 1, 7, 24, 101])
+def test_slices_partition_tasks(num_workers, num_envs_per_worker, n_tasks):
+    slices = [
+        assign_tasks(range(n_tasks), env_ctx, num_envs_per_worker)
+        for env_ctx in eval_env_contexts(num_workers, num_envs_per_worker)
+    ]
+    # Contiguous slices, in order of worker and vector index, of balanced sizes.
+    assert sum(slices, []) == list(range(n_tasks))
+    sizes = [len(s) for s in slices]
+    assert max(sizes) - min(sizes) <= 1
+    if num_workers > 0:
+        # The local worker is left alone when there are remote workers.
+        assert assign_tasks(range(n_tasks), EnvContext({}, 0, num_workers=num_workers), num_envs_per_worker) == []
+
+
+@pytest.fixture(scope="module")
+def local_ray():
+    repo_dir = os.path.dirname(TESTS_DIR)
+    ray.init(
+        num_cpus=3,
+        include_dashboard=False,
+        runtime_env={"env_vars": {"PYTHONPATH": os.pathsep.join([repo_dir, TESTS_DIR])}},
+    )
+    yield
+    ray.shutdown()
+
+
+@ray.remote
+class EvalWorker:
+    """Creates a worker's eval envs as RLlib does, calling `StatsCallbacks.on_sub_environment_created` on each."""
+
+    def __init__(self, cfg, eval_maps, worker_index, num_workers, num_envs_per_worker):
+        callbacks = StatsCallbacks(cfg)
+        worker = SimpleNamespace(config=SimpleNamespace(in_evaluation=True, num_envs_per_worker=num_envs_per_worker))
+        self.envs = []
+        for vector_index in range(num_envs_per_worker):
+            env = wrappers.CroppedImagePCGRLWrapper(game=cfg.env_name, cfg=cfg)
+            env.unwrapped._prob.eval_maps = eval_maps
+            env_ctx = EnvContext(cfg, worker_index, vector_index=vector_index, num_workers=num_workers)
+            callbacks.on_sub_environment_created(worker=worker, sub_environment=env, env_context=env_ctx)
+            self.envs.append(env)
+
+    def play(self, n_resets):
+        """The maps played by each env over some resets (as the indices of the eval maps they match)."""
+        played = []
+        for env in self.envs:
+            played.append([])
+            for _ in range(n_resets):
+                env.reset()
+                unwrapped = env.unwrapped
+                assert np.array_equal(unwrapped._rep._map, unwrapped._prob.eval_maps[unwrapped.cur_map_idx])
+                played[-1].append(unwrapped.cur_map_idx)
+        return played
+
+
+@pytest.mark.parametrize("num_workers, num_envs_per_worker, n_maps", [(0, 3, 7), (2, 3, 20), (3, 2, 6)])
+def test_workers_cover_eval_maps(local_ray, make_cfg, num_workers, num_envs_per_worker, n_maps):
+    cfg = make_cfg("task=binary")
+    eval_maps = np.random.default_rng(0).integers(2, size=(n_maps, *cfg.task.map_shape)).tolist()
+    worker_idxs = range(1, num_workers + 1) if num_workers > 0 else [0]
+    workers = [EvalWorker.remote(cfg, eval_maps, i, num_workers, num_envs_per_worker) for i in worker_idxs]
+    n_envs = len(workers) * num_envs_per_worker
+    n_per_env = -(-n_maps // n_envs)
+
+    # Two passes through each env's slice of the maps.
+    played = ray.get([w.play.remote(2 * n_per_env) for w in workers])
+    played = [env_maps for worker_maps in played for env_maps in worker_maps]
+    first_pass = []
+    for env_maps in played:
+        n_assigned = len(set(env_maps))
+        assert n_assigned in (n_maps // n_envs, n_per_env)
+        # Each env plays through its slice, then starts over.
+        assert env_maps[n_assigned : 2 * n_assigned] == env_maps[:n_assigned]
+        first_pass += env_maps[:n_assigned]
+    assert first_pass == list(range(n_maps))
@@ -0,0 +1,152 @@
+import glob
+import os
+import sys
+
+import numpy as np
+import pytest
+from ray.rllib.offline.io_context import IOContext
+from ray.rllib.policy.sample_batch import SampleBatch
+
+from control_pcgrl.il.trajectories import ShardInputReader, ShardWriter, load_index, write_index
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import gen_trajectories
+
+OBS_SHAPE = (5, 4, 3)
+N_SAMPLES = 23
+SHARD_SIZE = 7
+
+
+def make_samples(rng):
+    """Samples of a few episodes, with one-hot (float) observations."""
+    samples = []
+    for i in range(N_SAMPLES):
+        eps_id, t = i // 10, i % 10
+        action = int(rng.integers(OBS_SHAPE[-1]))
+        samples.append(
+            {
+                "obs": np.eye(OBS_SHAPE[-1], dtype=np.float32)[rng.integers(OBS_SHAPE[-1], size=OBS_SHAPE[:-1])],
+                "actions": action,
+                "rewards": float(rng.normal()),
+                "prev_actions": samples[-1]["actions"] if t > 0 else 0,
+                "prev_rewards": samples[-1]["rewards"] if t > 0 else 0.0,
+                "terminateds": t == 9 or i == N_SAMPLES - 1,
+                "eps_id": eps_id,
+                "t": t,
+            }
+        )
+    return samples
+
+
+@pytest.fixture
+def traj_dir(tmp_path):
+    samples = make_samples(np.random.default_rng(0))
+    writer = ShardWriter(str(tmp_path), prefix="worker-0", shard_size=SHARD_SIZE)
+    for sample in samples:
+        writer.add(**sample)
+    write_index(str(tmp_path), writer.close(), OBS_SHAPE)
+    return str(tmp_path), samples
+
+
+def test_index(traj_dir):
+    traj_dir, _ = traj_dir
+    index = load_index(traj_dir)
+    assert index["obs_shape"] == list(OBS_SHAPE)
+    assert index["n_samples"] == N_SAMPLES
+    assert [e["n_samples"] for e in index["shards"]] == [7, 7, 7, 2]
+    assert sorted(e["file"] for e in index["shards"]) == sorted(
+        os.path.basename(p) for p in glob.glob(os.path.join(traj_dir, "*.npz"))
+    )
+
+
+def read_epoch(reader, chunk_size):
+    """Read chunks until we have read every sample once (as each shard is read in chunks that do not cross shards)."""
+    n_chunks = sum(-(-n // chunk_size) for n in [7, 7, 7, 2])
+    return [reader.next() for _ in range(n_chunks)]
+
+
+@pytest.mark.parametrize("worker_index", [None, 1, 2])
+def test_round_trip(traj_dir, worker_index):
+    traj_dir, samples = traj_dir
+    ioctx = IOContext(worker_index=worker_index) if worker_index is not None else None
+    reader = ShardInputReader(traj_dir, ioctx, chunk_size=5)
+
+    for _ in range(2):
+        batches = read_epoch(reader, 5)
+        assert all(len(b) <= 5 for b in batches)
+        assert batches[0][SampleBatch.OBS].dtype == np.float32
+        assert batches[0][SampleBatch.ACTIONS].dtype == np.int64
+        assert batches[0][SampleBatch.REWARDS].dtype == np.float32
+        assert batches[0][SampleBatch.TERMINATEDS].dtype == np.bool_
+        assert not any(b[SampleBatch.TRUNCATEDS].any() for b in batches)
+
+        # Every sample is read back exactly once per epoch, in whatever order.
+        read = {}
+        for b in batches:
+            for j in range(len(b)):
+                key = (int(b[SampleBatch.EPS_ID][j]), int(b[SampleBatch.T][j]))
+                assert key not in read
+                read[key] = {k: b[k][j] for k in b.keys()}
+        assert len(read) == N_SAMPLES
+        for sample in samples:
+            row = read[(sample["eps_id"], sample["t"])]
+            np.testing.assert_array_equal(row[SampleBatch.OBS], sample["obs"])
+            assert row[SampleBatch.ACTIONS] == sample["actions"]
+            assert row[SampleBatch.REWARDS] == np.float32(sample["rewards"])
+            assert row[SampleBatch.PREV_ACTIONS] == sample["prev_actions"]
+            assert row[SampleBatch.PREV_REWARDS] == np.float32(sample["prev_rewards"])
+            assert row[SampleBatch.TERMINATEDS] == sample["terminateds"]
+
+
+def test_shards_store_uint8_obs(traj_dir):
+    traj_dir, _ = traj_dir
+    for path in glob.glob(os.path.join(traj_dir, "*.npz")):
+        with np.load(path) as shard:
+            assert shard["obs"].dtype == np.uint8
+
+
+def test_rejects_non_integer_obs(tmp_path):
+    writer = ShardWriter(str(tmp_path), prefix="worker-0", shard_size=SHARD_SIZE)
+    sample = make_samples(np.random.default_rng(0))[0]
+    sample["obs"] = sample["obs"] * 0.5
+    with pytest.raises(AssertionError):
+        writer.add(**sample)
+
+
+def legacy_load_level(file_name):
+    """`load_level` as it was, parsing tile names, then ints, one character at a time."""
+    level = []
+    with open(file_name, "r") as f:
+        for row in f.readlines():
+            level.append([gen_trajectories.TILES_MAP[char] for char in row if char != "\n"])
+    level = [row[1:-1] for row in level[1:-1]]
+    return [[gen_trajectories.INT_MAP[tile] for tile in row] for row in level]
+
+
+LEVEL_PATHS = sorted(glob.glob(os.path.join(REPO_DIR, "control_pcgrl", "il", "playable_maps", "*.txt")))
+
+
+@pytest.mark.parametrize("path", LEVEL_PATHS, ids=os.path.basename)
+def test_load_level_matches_legacy(path):
+    level = gen_trajectories.load_level(path)
+    assert level.dtype == np.uint8
+    np.testing.assert_array_equal(level, legacy_load_level(path))
+
+
+def test_load_level_crlf(tmp_path):
+    with open(LEVEL_PATHS[0], "rb") as f:
+        text = f.read()
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(text.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n"))
+    np.testing.assert_array_equal(gen_trajectories.load_level(str(path)), legacy_load_level(LEVEL_PATHS[0]))
+
+
+def test_load_level_unknown_tile(tmp_path):
+    with open(LEVEL_PATHS[0], "rb") as f:
+        text = bytearray(f.read())
+    text[text.index(b".")] = ord("?")
+    path = tmp_path / "unknown.txt"
+    path.write_bytes(bytes(text))
+    with pytest.raises(AssertionError, match="Unknown tile"):
+        gen_trajectories.load_level(str(path))
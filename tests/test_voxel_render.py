@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from control_pcgrl.envs.pcgrl_env_3D import PcgrlEnv3D
+from control_pcgrl.envs.pcgrl_holey_env_3D import PcgrlHoleyEnv3D
+from control_pcgrl.envs.probs.minecraft.voxel_render import VoxelRenderer, _cube_sprite
+
+
+TILE_TYPES = ["AIR", "DIRT", "CHEST", "SKULL"]
+
+
+def painter_reference(renderer, int_map, path_coords=(), bordered=False):
+    """Draw the cube of every drawn voxel (hidden or not), one at a time, from farthest to nearest."""
+    a, h = renderer.a, renderer.a // 2
+    n_z, n_y, n_x = int_map.shape
+    frame = np.empty(((n_x + n_y) * h + n_z * a, (n_x + n_y) * a, 3), dtype=np.uint8)
+    frame[:] = renderer.background
+    faces, shades = _cube_sprite(a)
+    sprite = faces >= 0
+
+    colors = {}
+    for z, y, x in np.ndindex(int_map.shape):
+        tile = int_map[z, y, x]
+        on_border = bordered and (
+            z in (0, n_z - 1) or y in (0, n_y - 1) or x in (0, n_x - 1)
+        )
+        if on_border:
+            # Only holes in the border are drawn.
+            if renderer.air[tile]:
+                colors[x, y, z] = renderer.colors[renderer.entrance_idx]
+        elif not renderer.air[tile]:
+            colors[x, y, z] = renderer.colors[tile]
+    for x, y, z in path_coords:
+        colors[x, y, z] = renderer.colors[renderer.path_idx]
+
+    # (Sorting stably, so that voxels at the same depth are drawn in the same order as by the renderer.)
+    order = sorted(colors, key=lambda c: (sum(c), np.ravel_multi_index(c[::-1], int_map.shape)))
+    for x, y, z in order:
+        v0, u0 = (x + y) * h + (n_z - 1 - z) * a, (x - y + n_y - 1) * a
+        cube = frame[v0 : v0 + 2 * a, u0 : u0 + 2 * a]
+        cube[sprite] = (colors[x, y, z] * shades[sprite, None].astype(np.float32)).astype(np.uint8)
+    return frame
+
+
+def random_path(rng, shape, length):
+    n_z, n_y, n_x = shape
+    return [tuple(c) for c in rng.integers(0, (n_x, n_y, n_z), (length, 3))]
+
+
+@pytest.mark.parametrize("shape", [(1, 1, 1), (3, 4, 5), (6, 6, 6), (5, 2, 7)])
+@pytest.mark.parametrize("bordered", [False, True])
+def test_matches_painter(shape, bordered):
+    renderer = VoxelRenderer(TILE_TYPES, voxel_size=4)
+    rng = np.random.default_rng(0)
+    for p_air in [0, 0.3, 0.7, 1]:
+        for path_length in [0, 5]:
+            int_map = np.where(rng.random(shape) < p_air, 0, rng.integers(1, len(TILE_TYPES), shape))
+            path_coords = random_path(rng, shape, path_length)
+            frame = renderer.render(int_map, path_coords=path_coords, bordered=bordered)
+            assert frame.dtype == np.uint8
+            assert frame.shape == (renderer.height, renderer.width, 3)
+            assert np.array_equal(frame, painter_reference(renderer, int_map, path_coords, bordered))
+
+
+def test_hidden_voxels_culled():
+    """Voxels hidden behind their nearer neighbors do not show up in the frame."""
+    renderer = VoxelRenderer(TILE_TYPES)
+    int_map = np.ones((4, 4, 4), dtype=np.uint8)
+    frame = renderer.render(int_map)
+    int_map[:-1, :-1, :-1] = 2
+    assert np.array_equal(renderer.render(int_map), frame)
+    # (Whereas the path is drawn over visible voxels.)
+    assert not np.array_equal(renderer.render(int_map, path_coords=[(3, 3, 3)]), frame)
+
+
+def test_bordered_hides_border():
+    renderer = VoxelRenderer(TILE_TYPES)
+    rng = np.random.default_rng(0)
+    int_map = rng.integers(0, len(TILE_TYPES), (5, 6, 7))
+    interior = np.zeros_like(int_map)
+    interior[1:-1, 1:-1, 1:-1] = int_map[1:-1, 1:-1, 1:-1]
+    # With a solid border, only the interior shows.
+    int_map[0], int_map[-1], int_map[:, 0], int_map[:, -1], int_map[..., 0], int_map[..., -1] = (1,) * 6
+    assert np.array_equal(renderer.render(int_map, bordered=True), renderer.render(interior))
+    # Holes in the border show (as entrances).
+    int_map[-1, 3, 3] = 0
+    frame = renderer.render(int_map, bordered=True)
+    assert not np.array_equal(frame, renderer.render(interior))
+    assert np.array_equal(frame, painter_reference(renderer, int_map, bordered=True))
+
+
+@pytest.mark.parametrize("env_cls", [PcgrlEnv3D, PcgrlHoleyEnv3D])
+def test_render_numpy(env_cls):
+    # Only the problem's tile types and path, and the representation's map, are needed to render.
+    env = env_cls.__new__(env_cls)
+    env.voxel_renderer = None
+    env.is_holey = env_cls is PcgrlHoleyEnv3D
+    rng = np.random.default_rng(0)
+    bordered_map = rng.integers(0, len(TILE_TYPES), (6, 7, 8)).astype(np.uint8)
+    env._rep = SimpleNamespace(
+        unwrapped=SimpleNamespace(_map=bordered_map[1:-1, 1:-1, 1:-1], _bordered_map=bordered_map)
+    )
+    int_map = env._get_rep_map()
+    path_coords = random_path(rng, int_map.shape, 6)
+    env._prob = SimpleNamespace(get_tile_types=lambda: TILE_TYPES, path_coords=path_coords)
+
+    frame = env.render_numpy()
+    renderer = env.voxel_renderer
+    assert frame.dtype == np.uint8
+    assert frame.shape == (renderer.height, renderer.width, 3)
+    assert np.array_equal(frame, painter_reference(renderer, int_map, path_coords, env.is_holey))
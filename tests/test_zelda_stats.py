@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from control_pcgrl.envs.helper import get_distances, run_dijkstra
+from control_pcgrl.envs.probs.zelda.zelda_ctrl_prob import ZeldaCtrlProblem
+from control_pcgrl.envs.probs.zelda.zelda_prob import ZeldaProblem
+from control_pcgrl.envs.regions import get_passable_mask
+
+TILES = ZeldaProblem._tile_types
+PASSABLE = ["empty", "player", "key", "bat", "spider", "scorpion"]
+
+# Handcrafted maps, in which: the key and door are reachable; the key is behind the door; the only enemy is cut off
+# from the player; there is no key; the player is cornered behind the key.
+HANDCRAFTED = [
+    [
+        "p.....",
+        "#####.",
+        "b...k.",
+        "######",
+        "d.....",
+    ],
+    [
+        "p..d.k",
+        "...#..",
+        "b..#..",
+    ],
+    [
+        "p..#b.",
+        "..k#..",
+        "d..#..",
+    ],
+    [
+        "p..s..",
+        "......",
+        "..d...",
+    ],
+    [
+        "pk....",
+        "#.....",
+        "z...d.",
+    ],
+]
+CHARS = {".": "empty", "#": "solid", "p": "player", "k": "key", "d": "door", "b": "bat", "s": "spider", "z": "scorpion"}
+
+
+def random_maps(n_maps=200, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n_maps):
+        height, width = rng.integers(3, 17, size=2)
+        probs = np.array([0.6, rng.uniform(0.1, 0.4), 0.005, 0.005, 0.005, 0.03, 0.03, 0.03])
+        map = rng.choice(TILES, size=(height, width), p=probs / probs.sum()).tolist()
+        # Mostly one player, key and door, so that the paths are searched.
+        for tile in ["player", "key", "door"]:
+            if rng.random() < 0.9:
+                map[rng.integers(height)][rng.integers(width)] = tile
+        yield map
+
+
+def maps():
+    yield from ([[CHARS[c] for c in row] for row in map] for map in HANDCRAFTED)
+    yield from random_maps()
+
+
+def legacy_distances(map):
+    """The distances found by the separate searches of the stats, before they were shared."""
+    tiles = {t: [(x, y) for y, row in enumerate(map) for x, u in enumerate(row) if u == t] for t in TILES}
+    p_x, p_y = tiles["player"][0]
+    dijkstra_e, _ = run_dijkstra(p_x, p_y, map, PASSABLE)
+    dijkstra_k = dijkstra_d = None
+    if len(tiles["key"]) == 1 and len(tiles["door"]) == 1:
+        (k_x, k_y), (d_x, d_y) = tiles["key"][0], tiles["door"][0]
+        dijkstra_k, _ = run_dijkstra(p_x, p_y, map, PASSABLE)
+        dijkstra_d, _ = run_dijkstra(k_x, k_y, map, PASSABLE + ["door"])
+    return tiles, dijkstra_e, dijkstra_k, dijkstra_d
+
+
+@pytest.fixture(params=[ZeldaProblem, ZeldaCtrlProblem])
+def prob(request, make_cfg):
+    prob = request.param(make_cfg("task=zelda"))
+    # Paths are only rendered by the controllable problem (which is the one registered as "zelda").
+    prob.render_path = isinstance(prob, ZeldaCtrlProblem)
+    return prob
+
+
+def test_distances_match_run_dijkstra():
+    for map in random_maps(n_maps=50, seed=1):
+        passable = get_passable_mask(map, PASSABLE)
+        for y in range(len(map)):
+            for x in range(len(map[0])):
+                assert np.array_equal(get_distances(passable, x, y), run_dijkstra(x, y, map, PASSABLE)[0])
+
+
+def test_stats_match_separate_searches(prob):
+    lenient = isinstance(prob, ZeldaCtrlProblem)
+    for map in maps():
+        stats = prob.get_stats(map)
+        n_players = sum(row.count("player") for row in map)
+        if n_players != 1 or not (lenient or stats["regions"] == 1):
+            assert stats["nearest-enemy"] == 0 and stats["path-length"] == 0
+            continue
+
+        tiles, dijkstra_e, dijkstra_k, dijkstra_d = legacy_distances(map)
+        enemies = tiles["spider"] + tiles["bat"] + tiles["scorpion"]
+        dists = [dijkstra_e[y][x] for x, y in enemies if dijkstra_e[y][x] > 0]
+        if not enemies:
+            nearest = 0
+        elif lenient:
+            nearest = min(dists, default=0)
+        else:
+            nearest = min(dists + [prob._width * prob._height])
+        assert stats["nearest-enemy"] == nearest
+
+        if dijkstra_k is None:
+            assert stats["path-length"] == 0
+            continue
+        (k_x, k_y), (d_x, d_y) = tiles["key"][0], tiles["door"][0]
+        assert stats["path-length"] == dijkstra_k[k_y][k_x] + dijkstra_d[d_y][d_x]
+        assert prob.path_length == stats["path-length"]
+
+
+def test_paths_match_separate_searches(prob, monkeypatch):
+    paths = [(prob.get_stats(map), prob.path) for map in maps()]
+    # Search the map tile by tile, as `run_dijkstra` does, instead of over the shared mask.
+    module = __import__(type(prob).__module__, fromlist=["get_distances"])
+    monkeypatch.setattr(module, "get_distances", lambda passable, x, y: run_dijkstra(x, y, passable, [True])[0])
+    for map, (stats, path) in zip(maps(), paths):
+        assert prob.get_stats(map) == stats
+        assert np.array_equal(prob.path, path)
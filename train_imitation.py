@@ -6,9 +6,10 @@ from ray import air, tune
 from ray.rllib.algorithms.bc import BCConfig, BC
 from ray.rllib.algorithms.marwil import MARWILConfig, MARWIL
 from ray.rllib.models import ModelCatalog
-from ray.tune.registry import register_env
+from ray.tune.registry import register_env, register_input
 
 from control_pcgrl.configs.config import Config, PoDConfig
+from control_pcgrl.il.trajectories import ShardInputReader
 from control_pcgrl.il.utils import make_pod_env
 from control_pcgrl.il.wrappers import obfuscate_observation
 from control_pcgrl.rl.envs import make_env
@@ -50,15 +51,14 @@ def main(cfg: PoDConfig):
         lr=0.001,
     )
 
-    # Get all json files in the directory
-    traj_glob = os.path.join(traj_dir, "*.json")
+    # Stream samples from the compressed trajectory shards written by `gen_trajectories.py`.
+    register_input("pcgrl_shards", lambda ioctx: ShardInputReader(traj_dir, ioctx))
 
     # Set the config object's data path.
-    # Run this from the ray directory root.
     algo_config.offline_data(
         # input_="./tmp/demo-out/output-2023-0"
         # input_=os.path.join(cfg.log_dir, "demo-out")
-        input_=traj_glob,
+        input_="pcgrl_shards",
     )
 
     # Set the config object's env, used for evaluation.
@@ -1,4 +1,8 @@
+import multiprocessing as mp
 import os
+import queue
+import threading
+import time
 import hydra
 import numpy as np
 import torch as th
@@ -6,18 +10,147 @@ from torch.utils.tensorboard import SummaryWriter
 
 import control_pcgrl
 from control_pcgrl.configs.config import Config
-from control_pcgrl.reward_model_wrappers import init_reward_model, train_reward_model
+from control_pcgrl.reward_model_wrappers import (
+    SharedReplayBuffer,
+    collect_reward_model_data,
+    init_reward_model,
+    onehot_maps,
+    save_reward_model,
+    train_reward_model,
+)
 from control_pcgrl.rl.envs import make_env
 from control_pcgrl.rl.utils import validate_config
 
 batch_size = 64
 n_train_iters = 10000
 
+# Datapoints are collected by background processes, each stepping a vector of envs, into a shared ring buffer.
+n_collectors = 1
+n_envs_per_collector = 8
+buffer_size = 100_000
+# Don't start training until the buffer holds this many datapoints.
+min_buffer_size = 1_000
+n_prefetch_batches = 4
+# How long to wait for a minibatch before checking that the collectors and the prefetch thread are still alive.
+batch_timeout = 5.0
+log_interval = 100
+
+
+def prefetch_batches(buffer: SharedReplayBuffer, n_tiles: int, batch_queue: queue.Queue, stop_event):
+    """Sample and one-hot encode minibatches in a background thread, so that they are ready when the trainer needs
+    them."""
+    rng = np.random.default_rng()
+    while not stop_event.is_set():
+        maps, metrics, staleness = buffer.sample(batch_size, rng)
+        batch = (onehot_maps(maps, n_tiles), th.from_numpy(metrics), staleness)
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(batch, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+def check_workers(collectors, prefetcher=None):
+    """Raise if every collector process has exited, or if the prefetch thread has died, since we would otherwise wait
+    forever for data."""
+    if not any(p.is_alive() for p in collectors):
+        exitcodes = [p.exitcode for p in collectors]
+        raise RuntimeError(f"All reward model data collectors have exited (exit codes {exitcodes}).")
+    if prefetcher is not None and not prefetcher.is_alive():
+        raise RuntimeError("The minibatch prefetch thread has died.")
+
+
+def wait_for_buffer(buffer: SharedReplayBuffer, collectors, min_size: int):
+    """Wait until the collectors have added `min_size` datapoints to the buffer."""
+    while buffer.n_added < min_size:
+        check_workers(collectors)
+        time.sleep(0.1)
+
+
+def get_batch(batch_queue: queue.Queue, collectors, prefetcher, timeout: float = batch_timeout):
+    """Get the next prefetched minibatch, checking on the collectors and the prefetch thread while we wait."""
+    while True:
+        try:
+            return batch_queue.get(timeout=timeout)
+        except queue.Empty:
+            check_workers(collectors, prefetcher)
+
+
+def collect_and_train(cfg: Config, env, model, optimizer, buffer: SharedReplayBuffer, writer, model_path: str, ctx):
+    """Start the collector processes and the prefetch thread, and train the model for `n_train_iters` minibatches.
+    Returns the loss of each minibatch."""
+    map_dims = env.get_map_dims()
+    stop_event = ctx.Event()
+    collectors = [
+        ctx.Process(
+            target=collect_reward_model_data,
+            args=(make_env, cfg, buffer, n_envs_per_collector, stop_event),
+            daemon=True,
+        )
+        for _ in range(n_collectors)
+    ]
+    for p in collectors:
+        p.start()
+
+    batch_queue = queue.Queue(maxsize=n_prefetch_batches)
+    prefetch_stop_event = threading.Event()
+    prefetcher = threading.Thread(
+        target=prefetch_batches,
+        args=(buffer, map_dims[-1], batch_queue, prefetch_stop_event),
+        daemon=True,
+    )
+
+    losses = []
+    try:
+        wait_for_buffer(buffer, collectors, min_buffer_size)
+        prefetcher.start()
+
+        last_time, last_n_added = time.time(), buffer.n_added
+        stalenesses = []
+        for i in range(n_train_iters):
+            feats, metrics, staleness = get_batch(batch_queue, collectors, prefetcher)
+            loss = train_reward_model(model, optimizer, feats, metrics)
+            losses.append(loss)
+            stalenesses.append(staleness)
+            writer.add_scalar("Loss", loss, i)
+
+            if (i + 1) % log_interval == 0:
+                now, n_added = time.time(), buffer.n_added
+                samples_per_sec = (n_added - last_n_added) / (now - last_time)
+                mean_staleness = np.mean(stalenesses)
+                writer.add_scalar("SamplesPerSec", samples_per_sec, i)
+                writer.add_scalar("Staleness", mean_staleness, i)
+                print(
+                    f"Iter {i + 1}: loss {loss:.4f}, {samples_per_sec:.1f} samples/sec, "
+                    f"staleness {mean_staleness:.1f} samples, buffer size {len(buffer)}"
+                )
+                last_time, last_n_added = now, n_added
+                stalenesses = []
+                save_reward_model(
+                    model_path,
+                    model,
+                    obs_shape=(map_dims[-1], *map_dims[:-1]),
+                    metric_keys=env.metric_keys,
+                )
+    finally:
+        prefetch_stop_event.set()
+        stop_event.set()
+        for p in collectors:
+            p.join(timeout=5)
+    return losses
+
 
 @hydra.main(config_path="control_pcgrl/configs", config_name="config")
 def main(cfg: Config):
     """Train a model to predict relevant metrics in a PCGRL env. Generate data with random actions
     (i.e. random map edits).
+
+    Data is collected asynchronously by background processes, while the model trains on minibatches sampled from a
+    replay buffer. We log the rate at which datapoints are collected (samples/sec), and the staleness of sampled
+    datapoints (the number of datapoints collected since they were added to the buffer).
+
+    The model is saved to `logs_reward_model/reward_model.pt`, which can be passed to the env as `surrogate_stats`.
     """
     if not validate_config(cfg):
         print("Invalid config!")
@@ -32,26 +165,17 @@ def main(cfg: Config):
     cfg.train_reward_model = True
 
     env = make_env(cfg)
-    metric_keys = list(env.metrics.keys())
-    env.reset()
+    map_dims = env.get_map_dims()
+    n_metrics = len(env.metrics)
 
     model, optimizer = init_reward_model(env)
 
     writer = SummaryWriter(log_dir=log_dir)
+    model_path = os.path.join(log_dir, "reward_model.pt")
 
-    for i in range(n_train_iters):
-        # Collect data
-        while len(env.datapoints) < batch_size:
-            env.step(env.action_space.sample())
-            # print(f"Collected {len(env.datapoints)} datapoints")
-        # Train
-        feats, metrics = env.collect_data()
-        loss = train_reward_model(model, optimizer, feats, metrics)
-        writer.add_scalar("Loss", loss, i)
-        print(f"Loss: {loss}")
-        # Reset
-        env.datapoints = []
-        env.reset()
+    ctx = mp.get_context()
+    buffer = SharedReplayBuffer(buffer_size, map_dims[:-1], n_metrics, ctx=ctx)
+    collect_and_train(cfg, env, model, optimizer, buffer, writer, model_path, ctx)
 
 
 if __name__ == "__main__":